@@ -89,6 +89,7 @@ OPTIONS = {
         "requests",
         "regex",
         "numpy",
+        "watchdog",
     ],
     "includes": [
         "PIL",
@@ -100,6 +101,20 @@ OPTIONS = {
         "src.config",
         "src.help_text",
         "src.image_processor",
+        "src.pipeline",
+        "src.metadata_writer",
+        "src.exiftool_pool",
+        "src.file_index",
+        "src.watcher",
+        "src.async_llm",
+        "src.endpoints",
+        "src.structured_output",
+        "src.json_stream",
+        "src.model_profiles",
+        "src.res_benchmark",
+        "src.image_cache",
+        "src.response_cache",
+        "src.near_duplicates",
     ],
     "excludes": [
         "tkinter",
@@ -0,0 +1,197 @@
+import asyncio
+import threading
+import time
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from .llmii import LLMProcessor, Conversation, CHAT_COMPLETIONS_PATH
+
+RETRY_STATUSES = frozenset({500, 502, 503, 504})
+
+class AsyncLLMProcessor(LLMProcessor):
+    """ LLMProcessor that sends its requests from one asyncio event loop
+        using httpx, for servers with many parallel slots. Requests
+        waiting on the server cost a coroutine instead of a blocked
+        socket each, and a semaphore caps how many are sent at once.
+
+        describe_content still blocks until the answer is in, so this
+        can be used anywhere LLMProcessor is. Coroutines can await
+        describe_content_async directly, and submit() runs one on the
+        loop from any thread without waiting for it.
+    """
+    def __init__(self, config, concurrency=None):
+        if httpx is None:
+            raise ImportError("The async LLM client needs httpx, install it with: pip install httpx")
+
+        super().__init__(config)
+
+        self.concurrency = max(1, int(concurrency or getattr(config, 'async_concurrency', 0) or getattr(config, 'parallel', 1) or 1))
+        self.retries = 0 if getattr(config, 'quick_fail', False) else max(0, getattr(config, 'http_retries', 2))
+        self.backoff = 0.5
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="llmii-async-llm", daemon=True)
+        self.thread.start()
+        self._run(self._open())
+
+    async def _open(self):
+        # Both have to be created on the loop that uses them
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        )
+
+    def _open_session(self, config):
+        # Requests go through httpx
+        return None
+
+    def _run(self, coroutine, timeout=None):
+        return self.submit(coroutine).result(timeout)
+
+    def submit(self, coroutine):
+        """ Run a coroutine on the loop, returns its concurrent Future
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    async def describe_content_async(self, task="", processed_image=None, conversation=None, on_keywords=None, image_key=None):
+        if not processed_image:
+            print("No image to describe.")
+
+            return None
+
+        request = self.build_request(task, processed_image, conversation)
+        if request is None:
+            return None
+        payload, headers = request
+
+        if self.response_cache is not None and image_key is not None and self.model_id is None:
+            # Looked up here so cache_key doesn't block the loop
+            self.model_id = await self._served_model() or ""
+        cache_key = self.cache_key(payload, task, image_key, conversation)
+        answer = self.cached_answer(cache_key, task, conversation)
+        if answer is not None:
+            return answer
+
+        async with self.semaphore:
+            attempt = 0
+            delay = 0
+            unreachable = []
+            while True:
+                if delay:
+                    await asyncio.sleep(delay)
+                    delay = 0
+
+                endpoint = self.endpoints.acquire(exclude=unreachable, prefer=conversation and conversation.endpoint)
+                started = time.monotonic()
+                ok = False
+                parser = self.stream_parser(task)
+                try:
+                    request = self.client.build_request(
+                        "POST", f"{endpoint.url}{CHAT_COMPLETIONS_PATH}",
+                        json=dict(payload, stream=True) if parser else payload, headers=headers
+                    )
+                    response = await self.client.send(request, stream=parser is not None)
+                    try:
+                        if response.status_code in RETRY_STATUSES and attempt < self.retries:
+                            delay = self.backoff * 2 ** attempt
+                            attempt += 1
+                            continue
+
+                        response.raise_for_status()
+
+                        if parser is None:
+                            answer = self.parse_response(response.json())
+                        else:
+                            lines = response.aiter_lines()
+                            try:
+                                async for line in lines:
+                                    if self.stream_event(line, parser, on_keywords):
+                                        break
+                            finally:
+                                await lines.aclose()
+                            answer = parser.result()
+                    finally:
+                        # Closing a stream that is still going stops the generation
+                        await response.aclose()
+
+                    ok = True
+                    return self._answered(endpoint, task, answer, conversation, cache_key)
+
+                except httpx.ReadTimeout:
+                    # The server is there but slow. Sending the request
+                    # again would start a second generation.
+                    ok = None
+                    print(f"Error in API call: no answer within {self.timeout[1]} seconds from {endpoint.url}")
+                    return None
+
+                except httpx.TransportError as e:
+                    # Refused, reset or timed out connecting: try the other
+                    # servers first, then the whole lot again after a backoff
+                    unreachable.append(endpoint)
+                    if len(unreachable) < len(self.endpoints):
+                        continue
+                    if attempt < self.retries:
+                        delay = self.backoff * 2 ** attempt
+                        attempt += 1
+                        unreachable = []
+                        continue
+                    print(f"Error in API call: {type(e).__name__}: {str(e)}")
+                    return None
+
+                except Exception as e:
+                    print(f"Error in API call: {str(e)}")
+                    return None
+
+                finally:
+                    self.endpoints.release(endpoint, time.monotonic() - started, ok)
+
+    async def _served_model(self):
+        try:
+            response = await self.client.get(f"{self.api_url}/v1/models", timeout=5)
+            if response.status_code == 200:
+                models = response.json().get("data") or []
+                if models:
+                    return models[0].get("id")
+        except (httpx.HTTPError, ValueError, AttributeError):
+            pass
+        return None
+
+    def served_model(self):
+        return self._run(self._served_model())
+
+    def describe_content(self, task="", processed_image=None, conversation=None, on_keywords=None, image_key=None):
+        return self._run(self.describe_content_async(task, processed_image, conversation, on_keywords, image_key))
+
+    async def describe_tasks_async(self, tasks, processed_image, mode="sequential", on_keywords=None, image_key=None):
+        """ describe_tasks as a coroutine
+        """
+        if mode == "concurrent" and len(tasks) > 1:
+            return list(await asyncio.gather(*(self.describe_content_async(task, processed_image, None, on_keywords, image_key) for task in tasks)))
+
+        conversation = Conversation() if mode == "multiturn" else None
+        answers = []
+        for task in tasks:
+            answers.append(await self.describe_content_async(task, processed_image, conversation, on_keywords, image_key))
+        return answers
+
+    def describe_tasks(self, tasks, processed_image, mode="sequential", on_keywords=None, image_key=None):
+        return self._run(self.describe_tasks_async(tasks, processed_image, mode, on_keywords, image_key))
+
+    def close(self):
+        if self.response_cache is not None:
+            self.response_cache.commit()
+        self.endpoints.close()
+        if not self.loop.is_running():
+            return
+        try:
+            self._run(self.client.aclose(), timeout=5)
+            self._run(self.loop.shutdown_asyncgens(), timeout=5)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=5)
+            if not self.thread.is_alive():
+                self.loop.close()
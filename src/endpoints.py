@@ -0,0 +1,199 @@
+import re
+import threading
+import requests
+
+# Same probes as the GUI's connection check: KoboldCpp answers the
+# first, llama.cpp server and most OpenAI compatible servers the second
+HEALTH_PATHS = ("/api/extra/version", "/health")
+
+def parse_api_urls(api_url):
+    """ A list of API URLs from one URL, several separated by commas
+        or whitespace, or a list of them
+    """
+    if not api_url:
+        return []
+    if isinstance(api_url, str):
+        api_url = re.split(r"[,\s]+", api_url)
+    return [url.strip().rstrip("/") for url in api_url if url and url.strip()]
+
+def probe_api(session, api_url, timeout=(3, 5)):
+    """ True if the server at api_url answers one of the health probes
+    """
+    for path in HEALTH_PATHS:
+        try:
+            if session.get(f"{api_url}{path}", timeout=timeout).status_code == 200:
+                return True
+        except requests.RequestException:
+            continue
+    return False
+
+class Endpoint:
+    def __init__(self, url):
+        self.url = url
+        self.healthy = True
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.failures = 0  # Consecutive, reset by a success
+        self.ejections = 0
+        self.latency = None  # Moving average of successful requests, seconds
+        self.busy_time = 0.0
+        self.repaired = 0  # Answers that only parsed after cleaning up
+        self.invalid = 0  # Answers that could not be used at all
+
+class EndpointPool:
+    """ Spreads requests over several API servers.
+
+        Each request goes to the healthy endpoint with the fewest
+        requests outstanding ("least_outstanding") or the one expected
+        to answer first given its average latency and queue ("latency").
+        An endpoint is ejected after eject_after failed requests in a row
+        or a failed health probe, and readmitted once a probe succeeds.
+        Probes run every health_interval seconds on a background thread.
+
+        With a single endpoint nothing is ever ejected or probed.
+    """
+    STRATEGIES = ("least_outstanding", "latency")
+
+    def __init__(self, urls, strategy="least_outstanding", health_interval=10.0, eject_after=3, probe_timeout=(3, 5)):
+        if not urls:
+            raise ValueError("No API URL given")
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown load balancing strategy: {strategy}")
+
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.strategy = strategy
+        self.health_interval = health_interval
+        self.eject_after = max(1, eject_after)
+        self.probe_timeout = probe_timeout
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.session = None
+
+        if len(self.endpoints) > 1 and health_interval > 0:
+            self.session = requests.Session()
+            self.thread = threading.Thread(target=self._health_loop, name="llmii-health", daemon=True)
+            self.thread.start()
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def _cost(self, endpoint):
+        if self.strategy == "latency":
+            # Untried endpoints go first so every one gets measured
+            if endpoint.latency is None:
+                return (0, endpoint.outstanding, endpoint.requests)
+            return (1, (endpoint.outstanding + 1) * endpoint.latency, endpoint.requests)
+        return (endpoint.outstanding, endpoint.requests)
+
+    def acquire(self, exclude=(), prefer=None):
+        """ Pick an endpoint for the next request and count it as
+            outstanding. Pass it back to release() when done. prefer
+            is used while it is healthy, for follow-up requests that
+            benefit from what that server has cached.
+        """
+        with self.lock:
+            if prefer is not None and prefer.healthy and prefer not in exclude:
+                prefer.outstanding += 1
+                prefer.requests += 1
+                return prefer
+
+            candidates = [e for e in self.endpoints if e.healthy and e not in exclude]
+            if not candidates:
+                # Nothing healthy: let the request try and fail normally
+                candidates = [e for e in self.endpoints if e not in exclude] or self.endpoints
+            endpoint = min(candidates, key=self._cost)
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def release(self, endpoint, elapsed, ok):
+        """ ok is None when the request timed out waiting for the
+            answer, which says nothing about the server's health
+        """
+        with self.lock:
+            endpoint.outstanding -= 1
+            endpoint.busy_time += elapsed
+
+            if ok is None:
+                return
+
+            if ok:
+                endpoint.failures = 0
+                if endpoint.latency is None:
+                    endpoint.latency = elapsed
+                else:
+                    endpoint.latency = 0.8 * endpoint.latency + 0.2 * elapsed
+                return
+
+            endpoint.errors += 1
+            endpoint.failures += 1
+            if endpoint.failures >= self.eject_after:
+                self._eject(endpoint, f"{endpoint.failures} failed requests in a row")
+
+    def record_answer(self, endpoint, outcome):
+        """ Count how usable an answer was: "ok", "repaired" or "invalid"
+        """
+        with self.lock:
+            if outcome == "repaired":
+                endpoint.repaired += 1
+            elif outcome == "invalid":
+                endpoint.invalid += 1
+
+    def _eject(self, endpoint, reason):
+        if len(self.endpoints) == 1 or not endpoint.healthy:
+            return
+        endpoint.healthy = False
+        endpoint.ejections += 1
+        print(f"Ejected API endpoint {endpoint.url}: {reason}")
+
+    def check_health(self):
+        """ Probe every endpoint once, ejecting the ones that don't
+            answer and readmitting the ones that do
+        """
+        session = self.session or requests.Session()
+        try:
+            for endpoint in self.endpoints:
+                if self.stopped.is_set():
+                    break
+                self._update_health(endpoint, probe_api(session, endpoint.url, self.probe_timeout))
+        finally:
+            if session is not self.session:
+                session.close()
+
+    def _update_health(self, endpoint, alive):
+        with self.lock:
+            if alive and not endpoint.healthy:
+                endpoint.healthy = True
+                endpoint.failures = 0
+                print(f"Readmitted API endpoint {endpoint.url}")
+            elif not alive:
+                self._eject(endpoint, "health check failed")
+
+    def _health_loop(self):
+        while not self.stopped.wait(self.health_interval):
+            try:
+                self.check_health()
+            except Exception as e:
+                print(f"Endpoint health check error: {str(e)}")
+
+    def report(self):
+        parts = []
+        with self.lock:
+            for e in self.endpoints:
+                latency = f"{e.latency:.2f}s" if e.latency is not None else "-"
+                part = f"{e.url} {e.requests} requests, {latency} latency, {e.errors} errors, {e.repaired} repaired, {e.invalid} unusable answers"
+                if e.ejections:
+                    part += f", ejected {e.ejections}x"
+                parts.append(part)
+        return "API endpoints: " + "; ".join(parts)
+
+    def close(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join(timeout=self.probe_timeout[0] + self.probe_timeout[1] + 1)
+            self.thread = None
+        if self.session is not None:
+            self.session.close()
+            self.session = None
@@ -0,0 +1,149 @@
+import base64
+import threading
+import exiftool
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from exiftool.exceptions import ExifToolExecuteError
+
+class ExifToolPool:
+    """ A few persistent ExifTool processes for reading metadata.
+        get_tags splits the files into one contiguous shard per
+        process and reads the shards in parallel, so results come
+        back in the same order as the files.
+
+        A process that dies is replaced and its shard read again.
+        Processes are started by the first read that needs them.
+    """
+    def __init__(self, size=2, encoding='utf-8'):
+        self.size = max(1, int(size))
+        self.encoding = encoding
+        self.lock = threading.Lock()
+        self.restarts = 0
+
+        # Processes are started on the executor's threads, which live
+        # as long as the pool. On Linux pyexiftool ties each process to
+        # the thread that started it.
+        self.workers = [None] * self.size
+        self.executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="llmii-exiftool")
+
+    def _start_worker(self):
+        worker = exiftool.ExifToolHelper(encoding=self.encoding)
+        worker.run()
+        return worker
+
+    def _restart_worker(self, index):
+        """ Replace a dead or broken process with a fresh one
+        """
+        try:
+            self.workers[index].terminate()
+        except Exception:
+            pass
+
+        self.workers[index] = self._start_worker()
+        self.restarts += 1
+        print(f"Restarted ExifTool reader {index}")
+
+    def started(self):
+        """ Number of processes running
+        """
+        return sum(1 for worker in self.workers if worker is not None and worker.running)
+
+    def _worker_died(self, index):
+        process = getattr(self.workers[index], "_process", None)
+        return process is not None and process.poll() is not None
+
+    def _read_shard(self, index, files, tags, params):
+        if self.workers[index] is None:
+            self.workers[index] = self._start_worker()
+
+        for attempt in range(2):
+            if not self.workers[index].running:
+                self._restart_worker(index)
+
+            try:
+                return self.workers[index].get_tags(files, tags=tags, params=params)
+
+            except ExifToolExecuteError:
+                # ExifTool ran fine but reported an error for the files
+                raise
+
+            except Exception as e:
+                if attempt:
+                    raise
+                print(f"ExifTool reader {index} failed, restarting: {str(e)}")
+                self._restart_worker(index)
+
+    def _wait(self, index, future):
+        """ Wait for a shard. pyexiftool spins forever if its process
+            dies in the middle of a read, so closing the pipe is the
+            only way to get the reading thread back.
+        """
+        while True:
+            try:
+                return future.result(timeout=0.5)
+            except TimeoutError:
+                if self._worker_died(index):
+                    try:
+                        self.workers[index]._process.stdout.close()
+                    except Exception:
+                        pass
+
+    def get_tags(self, files, tags=None, params=None):
+        """ Read tags for files across the pool. A shard that still
+            fails after a restart is left out of the result.
+        """
+        if not files:
+            return []
+
+        with self.lock:
+            shard_count = min(self.size, len(files))
+            shard_size = -(-len(files) // shard_count)
+            shards = [files[i:i + shard_size] for i in range(0, len(files), shard_size)]
+
+            futures = [
+                self.executor.submit(self._read_shard, index, shard, tags, params)
+                for index, shard in enumerate(shards)
+            ]
+
+            results = []
+            for index, future in enumerate(futures):
+                try:
+                    results.extend(self._wait(index, future))
+                except Exception as e:
+                    print(f"Exiftool error reading {len(shards[index])} files: {str(e)}")
+
+            return results
+
+    def get_binary_tags(self, file_path, tags):
+        """ The values of binary tags such as embedded previews, as
+            bytes in the order of tags. Tags the file doesn't have are
+            left out.
+        """
+        results = self.get_tags([file_path], tags=list(tags), params=["-b"])
+        return binary_values(results[0], tags) if results else []
+
+    def terminate(self):
+        self.executor.shutdown(wait=True)
+        for worker in self.workers:
+            if worker is None or not worker.running:
+                continue
+            try:
+                worker.terminate()
+            except Exception:
+                pass
+
+
+def binary_values(result, tags):
+    """ Decode binary tags from one ExifTool JSON result. With -b
+        ExifTool sends them as "base64:" strings, keyed with their
+        group like "EXIF:PreviewImage".
+    """
+    values = []
+    for tag in tags:
+        for key, value in result.items():
+            if key.split(":")[-1] != tag or not isinstance(value, str) or not value.startswith("base64:"):
+                continue
+            try:
+                values.append(base64.b64decode(value[len("base64:"):]))
+            except ValueError:
+                pass
+    return values
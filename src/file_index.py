@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import urllib.parse
+
+INDEX_FILENAME = ".llmii_index.db"
+
+# Statuses of files that don't need to be processed again
+DONE_STATUSES = ("success", "duplicate")
+
+def file_hash(file_path, block_size=1024 * 1024):
+    """ SHA-256 of the file contents
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def prompt_hash(*parts):
+    """ Short hash identifying the instructions a file was processed with
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part or "").encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+class FileIndex:
+    """ Remembers which files have been processed so unchanged files
+        can be skipped without asking ExifTool. A file matches its
+        entry only while its size and mtime (and optionally its
+        content hash) are the same as when the entry was recorded.
+
+        The metadata in the files stays the source of truth. Deleting
+        the index, or calling clear(), makes the next run read every
+        file again and record it afresh.
+
+        A read_only index opens an existing database for lookups and
+        ignores everything that would change it.
+
+        The caption and keywords a file was saved with are kept too, so
+        a done file can be shown without reading its metadata.
+    """
+    def __init__(self, root_dir, use_hash=False, commit_every=100, read_only=False):
+        self.path = os.path.join(root_dir, INDEX_FILENAME)
+        self.use_hash = use_hash
+        self.commit_every = commit_every
+        self.read_only = read_only
+        self.uncommitted = 0
+        self.lock = threading.Lock()
+
+        if read_only:
+            uri = "file:" + urllib.parse.quote(os.path.abspath(self.path)) + "?mode=ro"
+            self.db = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self.has_text = self._has_text()
+            return
+
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                hash TEXT,
+                uuid TEXT,
+                status TEXT,
+                model TEXT,
+                prompt_hash TEXT,
+                updated REAL,
+                caption TEXT,
+                keywords TEXT
+            )
+        """)
+        if not self._has_text():
+            # Indexes from before captions and keywords were kept
+            self.db.execute("ALTER TABLE files ADD COLUMN caption TEXT")
+            self.db.execute("ALTER TABLE files ADD COLUMN keywords TEXT")
+        self.has_text = True
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS dirs (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                file_count INTEGER NOT NULL,
+                subdirs TEXT NOT NULL,
+                updated REAL
+            )
+        """)
+        self.db.commit()
+
+    def _has_text(self):
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(files)")}
+        return "keywords" in columns
+
+    def _stat(self, file_path):
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def lookup(self, file_path):
+        """ The entry for an unchanged file as a dict, or None
+        """
+        return self.lookup_many([file_path]).get(file_path)
+
+    def lookup_many(self, file_paths, file_stats=None):
+        """ Entries for the files that are unchanged since they were
+            recorded, keyed by path. file_stats maps paths to a
+            (size, mtime_ns, ...) tuple already known to the caller,
+            so those files are not stat'ed again. caption and keywords
+            are None for files recorded without them.
+        """
+        if not file_paths:
+            return {}
+
+        text_columns = "caption, keywords" if self.has_text else "NULL, NULL"
+        with self.lock:
+            placeholders = ",".join("?" * len(file_paths))
+            rows = self.db.execute(
+                f"SELECT path, size, mtime_ns, hash, uuid, status, model, prompt_hash, {text_columns} FROM files WHERE path IN ({placeholders})",
+                list(file_paths)
+            ).fetchall()
+
+        entries = {}
+        for path, size, mtime_ns, content_hash, identifier, status, model, prompt, caption, keywords in rows:
+            if file_stats and path in file_stats:
+                current = tuple(file_stats[path][:2])
+            else:
+                current = self._stat(path)
+            if current != (size, mtime_ns):
+                continue
+            if self.use_hash and content_hash:
+                try:
+                    if file_hash(path) != content_hash:
+                        continue
+                except OSError:
+                    continue
+            entries[path] = {
+                "uuid": identifier,
+                "status": status,
+                "model": model,
+                "prompt_hash": prompt,
+                "caption": caption,
+                "keywords": json.loads(keywords) if keywords is not None else None,
+            }
+        return entries
+
+    def record(self, file_path, identifier, status, model=None, prompt=None, caption=None, keywords=None):
+        """ Store the state of a file as it is on disk right now
+        """
+        if self.read_only:
+            return
+
+        stat = self._stat(file_path)
+        if stat is None:
+            return
+
+        content_hash = None
+        if self.use_hash:
+            try:
+                content_hash = file_hash(file_path)
+            except OSError:
+                pass
+
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, hash, uuid, status, model, prompt_hash, updated, caption, keywords) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (file_path, stat[0], stat[1], content_hash, identifier, status, model, prompt, time.time(),
+                 caption, json.dumps(list(keywords or [])))
+            )
+            self.uncommitted += 1
+            if self.uncommitted >= self.commit_every:
+                self.db.commit()
+                self.uncommitted = 0
+
+    def lookup_dir(self, directory):
+        """ The state of a directory after the last completed scan
+            as a dict, or None
+        """
+        with self.lock:
+            row = self.db.execute(
+                "SELECT mtime_ns, file_count, subdirs FROM dirs WHERE path = ?",
+                (directory,)
+            ).fetchone()
+
+        if row is None:
+            return None
+        return {"mtime_ns": row[0], "file_count": row[1], "subdirs": json.loads(row[2])}
+
+    def record_dir(self, directory, mtime_ns, file_count, subdirs):
+        if self.read_only:
+            return
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO dirs (path, mtime_ns, file_count, subdirs, updated) VALUES (?, ?, ?, ?, ?)",
+                (directory, mtime_ns, file_count, json.dumps(subdirs), time.time())
+            )
+            self.uncommitted += 1
+
+    def count_done(self, directory, statuses=DONE_STATUSES):
+        """ Number of files directly inside a directory recorded as
+            done, successfully processed by default
+        """
+        prefix = os.path.join(directory, "")
+        # Range over the primary key for everything under the directory,
+        # then drop files in subdirectories
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        with self.lock:
+            return self.db.execute(
+                "SELECT COUNT(*) FROM files WHERE path >= ? AND path < ? "
+                f"AND instr(substr(path, ?), ?) = 0 AND status IN ({', '.join('?' * len(statuses))})",
+                (prefix, upper, len(prefix) + 1, os.sep) + tuple(statuses)
+            ).fetchone()[0]
+
+    def clear(self):
+        """ Drop every entry so the index is rebuilt from the files
+        """
+        if self.read_only:
+            return
+        with self.lock:
+            self.db.execute("DELETE FROM files")
+            self.db.execute("DELETE FROM dirs")
+            self.db.commit()
+            self.uncommitted = 0
+
+    def count(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def commit(self):
+        if self.read_only:
+            return
+        with self.lock:
+            self.db.commit()
+            self.uncommitted = 0
+
+    def close(self):
+        with self.lock:
+            if not self.read_only:
+                self.db.commit()
+            self.db.close()
@@ -6,7 +6,7 @@ SETTINGS_HELP = """
 <h2>Settings Help</h2>
 
 <h3>API Settings</h3>
-<p><b>API URL:</b> URL of the LLM API server. Default is http://localhost:5001</p>
+<p><b>API URL:</b> URL of the LLM API server. Default is http://localhost:5001. To spread the work over several servers, enter their URLs separated by commas and raise Parallel requests to the total number of slots. Each request goes to the server with the fewest requests waiting; a server that stops answering is left out until its health check passes again.</p>
 <p><b>API Password:</b> Password for API authentication if required. Leave blank if no authentication needed.</p>
 
 <h3>Instruction Settings</h3>
@@ -16,14 +16,21 @@ SETTINGS_HELP = """
 <h3>Caption Options</h3>
 <p><b>Caption Instruction:</b> Specific instructions for generating a detailed image caption.</p>
 <p><b>Separate caption query:</b> Send a separate query just for captions. This will take twice as long and is of dubious value, but if you are using a model which has issues generating captions and keywords in one generation, you can split them up using this option.</p>
+<p><b>Send queries:</b> How the two separate queries are sent. <i>One after another</i> is the slowest. <i>At the same time</i> sends both at once, which helps when the server has more than one parallel slot. <i>As a conversation</i> asks for the caption as a follow-up to the keywords, so a server that keeps its prompt cache (KoboldCpp, llama.cpp) only has to process the image once.</p>
 <p><b>Combined caption query:</b> Generate captions and keywords in one query (default).</p>
 <p><b>No caption query:</b> Skip caption generation entirely, only create keywords. This option is a bit misleading because it will always generate a caption anyway, but this option will not write it to the metadata. Use this if you have captions you don't want to overwrite, but it won't make processing faster.</p>
 
 <h3>Generation Options</h3>
 <p><b>GenTokens:</b> Maximum number of tokens to generate in response. These are tokens, not words. Fewer tokens means faster processing per generation but may lead to more retries because the model may get cut off mid generation. More is not necessarily better though. Optimal range is between 150 and 300.</p>
+<p><b>Structured output:</b> Make the server only produce valid JSON for keyword queries, so an answer can't come back in a form that has to be repaired or retried. Use <i>Grammar</i> for KoboldCpp and llama.cpp and <i>JSON schema</i> for OpenAI, vLLM and other servers that accept response_format. Leave it off for servers that support neither; they may reject the request. The number of retries and unusable answers is shown at the end of a run.</p>
+<p><b>Stream answers:</b> Receive the answer while it is being generated and stop the generation as soon as the keyword list is complete, instead of letting the model ramble on until GenTokens runs out. Keywords are shown as they arrive.</p>
+<p><b>Reuse answers:</b> Keep the answers the LLM gives and use them again when exactly the same request is made later: the same image, instructions, sampler settings and model. This saves asking again for duplicate images or when running over the same files again. <i>At temperature 0</i> only reuses answers given at temperature 0, where the model would give the same answer anyway. <i>Always</i> also reuses answers given at higher temperatures. Regenerate always asks the LLM again and keeps the new answer; use --refresh-responses from the command line to do the same for a whole run.</p>
+<p><b>Parallel requests:</b> How many images are sent to the LLM at the same time. Leave this at 1 unless the backend was started with multiple parallel slots (for instance KoboldCpp with --multiuser), in which case set it to the number of slots so the GPU is kept busy.</p>
+<p><b>Async client:</b> Send requests from a single asyncio event loop using httpx instead of one blocking connection per request. Worth turning on for servers with many slots (vLLM, llama.cpp server with -np) together with a high Parallel requests value. Needs the httpx package; without it the standard client is used.</p>
 
 <h3>Image Options</h3>
-<p><b>Dimension length:</b> The maximum length of a horizontal or vertical dimension of the image, in pixels. Setting this higher will not necessarily result in better generations. Larger image sizes can take more memory and can lead to much slower processing. It is recommended to keep this between 392 and 896.</p> 
+<p><b>Dimension length:</b> The maximum length of a horizontal or vertical dimension of the image, in pixels. Setting this higher will not necessarily result in better generations. Larger image sizes can take more memory and can lead to much slower processing. It is recommended to keep this between 392 and 896. When the loaded model is in the model list, images are also kept within the resolution that model makes use of and sized to whole vision tokens.</p>
+<p><b>Send images as:</b> The format images are sent to the LLM in. JPEG is the quickest to encode and understood by every server. WebP is smaller at the same quality. PNG is lossless but much larger. Small JPEGs are sent as they are, without re-encoding. Max size lowers the image quality until each image fits in that many kilobytes, which speeds things up when the LLM server is on another computer. Leave it at No limit when the server runs on this computer.</p> 
 
 <h3>Sampler Options</h3>
 <p><b>Temperature:</b> The randomness of the model output. Between 0.0 and 2.0</p>
@@ -36,12 +43,18 @@ SETTINGS_HELP = """
 <p><b>Don't go in subdirectories:</b> Only process images in the main directory, don't look inside others.</p>
 <p><b>Reprocess everything:</b> Process all images, even if they already have metadata. This will treat every image file as if it were brand new and the tool has never seen it before.</p>
 <p><b>Reprocess failures:</b> Only reprocess images that failed in previous runs. Good idea to run with this option after a successful run to clean up stragglers.</p>
+<p><b>Reprocess near-duplicates:</b> Describe the images that were given the metadata of a near-duplicate (see Copy metadata to near-duplicate images) instead of skipping them.</p>
 <p><b>Fix any orphans:</b> When a file gets processed it gets some metadata added to it so that the tool knows it has been processed and what the state of the last processing was. If we find images with what looks like valid metadata that was processed by the tool, but the status markers are missing, we call these orphans. This option will add the status marker to the orphans without regenerating the metadata. Without this checked then files which were produced with versions of the tool before the removal of the need for the json database will be processed again as new files. With this checked then if there is bad metadata in images that looks valid to the tool, it will mark those files as a success. It is recommended to use this option only if you have used previous versions of this tool before March 2025 and are running on those files again.</p>
 <p><b>No backups:</b> Don't create backups of existing metadata before modifying. Exiftool will create a file with an _original label at the end as a backup for every one it alters. If you don't want one of those for every image processed by the tool, check this box.</p>
 <p><b>Pretend mode:</b> Simulate processing without making any changes. This allows you to see what metadata would be generated without writing to any files.</p>
 <p><b>No file validation:</b> Skip verifying file content. If you are seeing a lot of valid files being skipped as invalid, check this. Otherwise leave it alone.</p>
 <p><b>No retries:</b> Don't retry failed API requests. This is when you don't want to bother trying a second time if you get a parse error from the AI. It is recommended to leave this disabled.</p>
 <p><b>Use metadata sidecar instead of writing to image:</b> If you do not want to write anything to the image files themselves, for instance if you have hashed the files and they cannot change, you can instead write the metadata to an xmp file with the same name as the image file but with an xmp extension added. This xmp file will contain the metadata.</p>
+<p><b>Skip unchanged files using the file index:</b> The tool keeps a small database called .llmii_index.db in the chosen directory with the size and modification date of every file it has finished. On the next run those files are skipped without opening them at all, which makes going over a large collection again much faster. A file that has been changed since is read and checked as usual. The metadata in the images is still what counts: delete the database or run with --rebuild-index from the command line and it is built again from the files. Uncheck this to always read every file.</p>
+<p><b>Only scan directories changed since the last run:</b> After a run finishes, the file index also remembers the modification date and number of files of every directory in which all files were done. With this checked, directories that have not changed since are not looked into at all, which saves most of the time spent just finding files on large network shares. Editing a file does not change the date of its directory, so edits made in place are only noticed when this is unchecked. Leave it unchecked to scan every directory. It is ignored when reprocessing everything or failures.</p>
+<p><b>Keep watching for new files:</b> After going through the directory, keep running and process images as soon as they are added or changed, until you press Stop. Files still being copied in are left alone until they stop changing for a couple of seconds. Changes are noticed right away; if the watchdog package is missing, or with --watch-poll from the command line (needed for network shares written to by other machines), the directory is checked every few seconds.</p>
+<p><b>Reuse prepared images from earlier runs:</b> Before an image is sent to the LLM it is decoded, resized and encoded, which takes a noticeable part of the time for large photos and RAW files. With this checked the prepared image is kept in a cache in your user cache folder and used again whenever the same image is sent with the same size and format settings, whether by a later run with different instructions, the preview or Regenerate. Images are recognized by their contents, so moved or renamed files are found too. The least recently used images are removed once the cache reaches 512 MB (change with --image-cache-mb from the command line).</p>
+<p><b>Copy metadata to near-duplicate images:</b> Burst shots and slightly edited copies look almost the same to the model. With this checked, each image is compared with the ones before it in the run, and an image that looks nearly the same as one already described gets its caption and keywords without asking the LLM. Those images are marked with the status <i>duplicate</i>, so they can be described themselves later with Reprocess near-duplicates. How alike images must be can be changed with --duplicate-threshold and --duplicate-hash from the command line.</p>
 
 <h3>Existing Metadata</h3>
 <p><b>Don't clear existing keywords:</b> Keep existing keywords and add new ones. This adds the generated keywords to whatever keywords already exist in the image metadata. Very useful if you want to run the tool again on pictures with a different AI model and get some new keywords. Any existing keywords will be also processed according to the keyword corrections options below and deduplicated when combined with the new ones.</p>
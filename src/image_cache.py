@@ -0,0 +1,351 @@
+import os
+import sys
+import uuid
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+from .file_index import file_hash
+from .image_processor import is_jpeg_metadata, JPEG_SOS, JPEG_EOI
+
+# Bump when ImageProcessor prepares images differently, so old
+# payloads are no longer found
+CACHE_VERSION = 2
+
+CACHE_SUFFIX = ".b64"
+
+# Content hashes of the files prepared, kept next to the payloads
+HASHES_FILENAME = "hashes.db"
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# PNG chunks holding text, EXIF, XMP or a modification time
+PNG_METADATA_CHUNKS = {b"tEXt", b"zTXt", b"iTXt", b"eXIf", b"tIME"}
+
+def _hash_rest(f, digest, block_size):
+    for block in iter(lambda: f.read(block_size), b""):
+        digest.update(block)
+
+def _hash_jpeg(f, digest, block_size):
+    """ Hash the segments of a JPEG strip_jpeg_metadata keeps, False
+        if it doesn't parse
+    """
+    digest.update(f.read(2))
+    while True:
+        prefix = f.read(2)
+        if len(prefix) < 2 or prefix[0] != 0xFF:
+            return False
+        marker = prefix[1]
+        while marker == 0xFF:
+            # Fill bytes before a marker
+            byte = f.read(1)
+            if not byte:
+                return False
+            marker = byte[0]
+        if marker in (JPEG_SOS, JPEG_EOI):
+            digest.update(bytes((0xFF, marker)))
+            _hash_rest(f, digest, block_size)
+            return True
+
+        length = f.read(2)
+        size = int.from_bytes(length, "big") - 2
+        if len(length) < 2 or size < 0:
+            return False
+        payload = f.read(size)
+        if len(payload) < size:
+            return False
+        if not is_jpeg_metadata(marker, payload):
+            digest.update(bytes((0xFF, marker)) + length + payload)
+
+def _hash_png(f, digest, block_size):
+    """ Hash the chunks of a PNG other than metadata, False if it
+        doesn't parse
+    """
+    digest.update(f.read(len(PNG_SIGNATURE)))
+    while True:
+        header = f.read(8)
+        if not header:
+            return True
+        if len(header) < 8:
+            return False
+        length, chunk_type = int.from_bytes(header[:4], "big"), header[4:]
+        if chunk_type in PNG_METADATA_CHUNKS:
+            f.seek(length + 4, os.SEEK_CUR)
+            continue
+        digest.update(header)
+        remaining = length + 4  # Data and CRC
+        while remaining:
+            block = f.read(min(block_size, remaining))
+            if not block:
+                return False
+            digest.update(block)
+            remaining -= len(block)
+        if chunk_type == b"IEND":
+            return True
+
+def image_hash(file_path, block_size=1024 * 1024):
+    """ SHA-256 of the image in a file without the metadata written
+        into it, so tagging the file again leaves it the same. JPEG
+        segments and PNG chunks holding metadata are left out; other
+        formats, where ExifTool rewrites metadata among the image
+        data, are hashed whole.
+    """
+    with open(file_path, "rb") as f:
+        head = f.read(len(PNG_SIGNATURE))
+        f.seek(0)
+        digest = hashlib.sha256()
+        if head[:2] == b"\xff\xd8":
+            parsed = _hash_jpeg(f, digest, block_size)
+        elif head == PNG_SIGNATURE:
+            parsed = _hash_png(f, digest, block_size)
+        else:
+            return file_hash(file_path, block_size)
+    return digest.hexdigest() if parsed else file_hash(file_path, block_size)
+
+def user_cache_dir():
+    """ The directory llmii keeps its caches in for this user
+    """
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser(os.path.join("~", "AppData", "Local"))
+    elif sys.platform == "darwin":
+        base = os.path.expanduser(os.path.join("~", "Library", "Caches"))
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser(os.path.join("~", ".cache"))
+    return os.path.join(base, "llmii")
+
+def default_cache_dir():
+    """ Where prepared images are cached for this user
+    """
+    return os.path.join(user_cache_dir(), "images")
+
+def prepared_image_key(content_hash, settings):
+    """ A key for an image with content_hash prepared with settings
+    """
+    digest = hashlib.sha256()
+    digest.update(content_hash.encode("ascii"))
+    digest.update(repr((CACHE_VERSION,) + tuple(settings)).encode("utf-8"))
+    return digest.hexdigest()
+
+class ImageCache:
+    """ Prepared images (the base64 payloads sent to the LLM) on disk,
+        keyed by the file contents and the settings they were prepared
+        with, so a file is only decoded and encoded once however often
+        it is indexed, previewed or regenerated.
+
+        The least recently used payloads are removed once the cache
+        grows past max_bytes. Recency survives restarts through the
+        files' modification times.
+
+        Files are keyed by image_hash, which leaves out their metadata,
+        so a file whose tags were written since is still found. Those
+        hashes are remembered by path, size and mtime in a small
+        database, so an unchanged file is not read again to find its key
+        in later runs either.
+    """
+    def __init__(self, directory=None, max_bytes=512 * 1024 * 1024, commit_every=100):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Content hashes of files seen this session, by path, size and mtime
+        self.hashes = {}
+        self.commit_every = commit_every
+        self.uncommitted = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+        self.db = self._open_hashes()
+
+    def _open_hashes(self):
+        try:
+            db = sqlite3.connect(os.path.join(self.directory, HASHES_FILENAME), check_same_thread=False)
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS image_hashes (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    hash TEXT NOT NULL
+                )
+            """)
+            db.commit()
+            return db
+        except sqlite3.Error as e:
+            # Hashes are then only remembered for this session
+            print(f"Could not open the image hash cache: {e}")
+            return None
+
+    def _load(self):
+        found = []
+        for root, dirs, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(CACHE_SUFFIX):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                found.append((stat.st_mtime_ns, name[:-len(CACHE_SUFFIX)], stat.st_size))
+
+        for _, key, size in sorted(found):
+            self.entries[key] = size
+            self.total_bytes += size
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + CACHE_SUFFIX)
+
+    def content_hash(self, file_path, file_stat=None):
+        """ image_hash of the file, hashed only once while the file's
+            size and modification time stay the same. file_stat is a
+            (size, mtime_ns, ...) tuple the caller already has.
+        """
+        if file_stat is not None:
+            signature = tuple(file_stat[:2])
+        else:
+            stat = os.stat(file_path)
+            signature = (stat.st_size, stat.st_mtime_ns)
+        cached = self.hashes.get(file_path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        digest = self._stored_hash(file_path, signature)
+        if digest is None:
+            digest = image_hash(file_path)
+            self._store_hash(file_path, signature, digest)
+        self.hashes[file_path] = (signature, digest)
+        return digest
+
+    def _stored_hash(self, file_path, signature):
+        if self.db is None:
+            return None
+        with self.lock:
+            try:
+                row = self.db.execute("SELECT size, mtime_ns, hash FROM image_hashes WHERE path = ?", (file_path,)).fetchone()
+            except sqlite3.Error:
+                return None
+        if row is None or tuple(row[:2]) != signature:
+            return None
+        return row[2]
+
+    def _store_hash(self, file_path, signature, digest):
+        if self.db is None:
+            return
+        with self.lock:
+            try:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO image_hashes (path, size, mtime_ns, hash) VALUES (?, ?, ?, ?)",
+                    (file_path, signature[0], signature[1], digest)
+                )
+                self.uncommitted += 1
+                if self.uncommitted >= self.commit_every:
+                    self.db.commit()
+                    self.uncommitted = 0
+            except sqlite3.Error as e:
+                # Another process holding the database only costs a rehash later
+                print(f"Could not store image hash: {e}")
+
+    def commit(self):
+        """ Write the hashes found since the last commit
+        """
+        if self.db is None:
+            return
+        with self.lock:
+            try:
+                self.db.commit()
+                self.uncommitted = 0
+            except sqlite3.Error as e:
+                print(f"Could not store image hashes: {e}")
+
+    def key(self, file_path, settings, file_stat=None):
+        """ The cache key for file_path prepared with settings, a tuple
+            of everything that changes the payload
+        """
+        return prepared_image_key(self.content_hash(file_path, file_stat), settings)
+
+    def get(self, key):
+        """ The cached payload for key, or None
+        """
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="ascii") as f:
+                payload = f.read()
+            os.utime(path)
+        except OSError:
+            # Removed by another process sharing the cache
+            with self.lock:
+                self.total_bytes -= self.entries.pop(key, 0)
+                self.misses += 1
+            return None
+
+        with self.lock:
+            self.hits += 1
+        return payload
+
+    def put(self, key, payload):
+        """ Store a payload, removing the least recently used ones
+            while the cache is over its size
+        """
+        path = self._path(key)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(temp_path, "w", encoding="ascii") as f:
+                f.write(payload)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Could not cache prepared image: {e}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return
+
+        with self.lock:
+            self.total_bytes -= self.entries.pop(key, 0)
+            self.entries[key] = len(payload)
+            self.total_bytes += len(payload)
+            evicted = []
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                old_key, size = self.entries.popitem(last=False)
+                self.total_bytes -= size
+                self.evictions += 1
+                evicted.append(old_key)
+
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+    def report(self):
+        with self.lock:
+            return (
+                f"Image cache: {self.hits} hits, {self.misses} misses, {self.evictions} evicted, "
+                f"{self.total_bytes / 2**20:.1f} of {self.max_bytes / 2**20:.0f} MB used"
+            )
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+def shared_image_cache(directory=None, max_mb=512):
+    """ The ImageCache for directory, one per process so the indexer,
+        the GUI preview and regeneration use the same one
+    """
+    directory = os.path.normpath(os.path.abspath(directory or default_cache_dir()))
+    with _shared_lock:
+        cache = _shared.get(directory)
+        if cache is None:
+            cache = _shared[directory] = ImageCache(directory, max_bytes=max_mb * 1024 * 1024)
+        else:
+            cache.max_bytes = max_mb * 1024 * 1024
+        return cache
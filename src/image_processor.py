@@ -2,16 +2,78 @@ import base64
 import io 
 import math
 import os
+import time
+import threading
+from collections import Counter
 from pathlib import Path
 from typing import Optional, Tuple, Union, List
 import rawpy
-from PIL import Image
+from PIL import Image, ExifTags
 from pillow_heif import register_heif_opener
 
+# Downscale by whole factors with reduce() until within this factor of
+# the target, then resample. 3 is indistinguishable from a full resample.
+REDUCING_GAP = 3.0
+
+# JPEGs are sent as they are up to this size, past it re-encoding
+# saves more on the upload than it costs
+PASSTHROUGH_MAX_BYTES = 1024 * 1024
+
+# An EXIF thumbnail is sent instead of the image when its long side is
+# at least this share of the size the image would be resized to
+THUMBNAIL_MIN_FRACTION = 0.75
+
+# Formats images can be sent in, and the lowest quality a byte budget
+# may push JPEG and WebP down to
+TRANSFER_FORMATS = ("JPEG", "WEBP", "PNG")
+MIN_QUALITY = 40
+
+# How each format starts in base64, to tell the server what it is getting
+BASE64_SIGNATURES = {
+    "/9j/": "image/jpeg",
+    "iVBORw0KGgo": "image/png",
+    "UklGR": "image/webp",
+}
+
+# Ways a RAW file can be prepared, cheapest first, with report labels
+RAW_STRATEGIES = (
+    ("exiftool_preview", "from the ExifTool preview"),
+    ("embedded_thumbnail", "from the embedded thumbnail"),
+    ("bitmap_thumbnail", "from the bitmap thumbnail"),
+    ("half_size", "demosaiced at half size"),
+)
+
+# Embedded JPEGs ExifTool can pull out of RAW files, in the order they
+# are asked for: the smaller preview, and the usually full size JPEG
+# only when the preview is too small
+RAW_PREVIEW_TAGS = ("PreviewImage", "JpgFromRaw")
+
+# IFD1 tags locating the EXIF thumbnail
+JPEG_INTERCHANGE_FORMAT = 0x0201
+JPEG_INTERCHANGE_FORMAT_LENGTH = 0x0202
+
+# JPEG markers: start of scan ends the headers, APPn segments and
+# comments carry metadata, except the JFIF and Adobe ones decoders use
+JPEG_SOS = 0xDA
+JPEG_EOI = 0xD9
+JPEG_COM = 0xFE
+JPEG_APP_MARKERS = range(0xE0, 0xF0)
+JPEG_KEPT_APP_SEGMENTS = ((0xE0, b"JFIF\x00"), (0xEE, b"Adobe"))
+
 class ImageProcessor:
     def __init__(self, max_dimension: int = 1024,
                  patch_sizes: Optional[List[int]] = None,
-                 max_file_size: int = 50 * 1024 * 1024):
+                 max_file_size: int = 50 * 1024 * 1024,
+                 merge_size: int = 1,
+                 minimize_tokens: bool = False,
+                 passthrough: bool = False,
+                 image_format: str = "JPEG",
+                 quality: int = 95,
+                 max_bytes: Optional[int] = None,
+                 optimize: bool = False,
+                 progressive: bool = False,
+                 preview_extractor=None,
+                 cache=None):
         
         if max_dimension <= 0:
             raise ValueError("max_dimension must be positive")
@@ -19,6 +81,29 @@ class ImageProcessor:
         self.max_file_size = max_file_size
         self.patch_sizes = patch_sizes or [8, 14, 16, 32]
         self.lcm = math.lcm(*self.patch_sizes)
+        # Each vision token covers merge_size x merge_size patches
+        self.token_size = self.lcm * max(1, merge_size)
+        self.minimize_tokens = minimize_tokens
+        # Send small enough JPEGs without decoding and encoding them
+        self.passthrough = passthrough
+        # How prepared images are encoded for the request
+        self.image_format = image_format.upper()
+        if self.image_format not in TRANSFER_FORMATS:
+            raise ValueError(f"image_format must be one of {', '.join(TRANSFER_FORMATS)}")
+        self.quality = quality
+        self.max_bytes = max_bytes or None  # Lower the quality until the image fits
+        self.optimize = optimize  # Smaller files, slower to encode
+        self.progressive = progressive
+        # Called with the path of a RAW file and a tuple of tags, returns
+        # the embedded JPEGs ExifTool found in it under them as bytes
+        self.preview_extractor = preview_extractor
+        # ImageCache of prepared payloads, None to prepare every time
+        self.cache = cache
+        # How many images were prepared each way
+        self.stats = Counter()
+        self.stats_lock = threading.Lock()
+        # How the last image on each thread was prepared, see last_preparation
+        self._local = threading.local()
         self.image_extensions = {
             "JPEG": [
                 ".jpg",
@@ -71,53 +156,303 @@ class ImageProcessor:
         return None
     
     def _calculate_dimensions(self, width, height):
-        """ Calculate dimensions maintaining aspect ratio and patch compatibility 
+        """ Calculate dimensions maintaining aspect ratio and patch compatibility.
+            With minimize_tokens, sides are rounded down to whole vision
+            tokens and small images are not scaled up, so no token is
+            spent on padding or on detail that isn't there.
         """
         scale = min(self.max_dimension / width, self.max_dimension / height)
+        if self.minimize_tokens:
+            scale = min(scale, 1.0)
         
         scaled_width = width * scale
         scaled_height = height * scale
         
-        new_width = math.ceil(scaled_width / self.lcm) * self.lcm
-        new_height = math.ceil(scaled_height / self.lcm) * self.lcm
+        unit = self.token_size
+        if self.minimize_tokens:
+            new_width = max(1, math.floor(scaled_width / unit)) * unit
+            new_height = max(1, math.floor(scaled_height / unit)) * unit
+        else:
+            new_width = math.ceil(scaled_width / unit) * unit
+            new_height = math.ceil(scaled_height / unit) * unit
         
         return new_width, new_height
 
     def _resize_image(self, img):
-        """ Resize image ensuring patch compatibility
+        """ Resize image ensuring patch compatibility. The full size
+            image is never decoded when the format can avoid it, the
+            result is converted to RGB.
         """
         new_width, new_height = self._calculate_dimensions(*img.size)
+        
+        # JPEG decodes straight to 1/2, 1/4 or 1/8 scale from the DCT
+        # coefficients, no larger than needed for the target size
+        if img.format == "JPEG":
+            img.draft("RGB", (new_width, new_height))
+        
+        # Palette and high bit depth images can't be resampled as they are
+        if img.mode not in ("RGB", "RGBA", "L", "LA"):
+            img = img.convert("RGB")
+        
         if new_width != img.width or new_height != img.height:
-            return img.resize((new_width, new_height), Image.Resampling.BICUBIC)
+            img = img.resize((new_width, new_height), Image.Resampling.BICUBIC, reducing_gap=REDUCING_GAP)
+        
+        if img.mode != "RGB":
+            img = img.convert("RGB")
         return img
 
+    def _count(self, method, payload=0, seconds=0.0, encodes=0):
+        self._local.method = method
+        with self.stats_lock:
+            self.stats[method] += 1
+            self.stats["payload_bytes"] += payload
+            self.stats["encode_seconds"] += seconds
+            self.stats["encodes"] += encodes
+
+    def _count_raw(self, strategy, seconds):
+        self._local.method = strategy
+        with self.stats_lock:
+            self.stats[f"raw_{strategy}"] += 1
+            self.stats[f"raw_{strategy}_seconds"] += seconds
+
+    def last_preparation(self):
+        """ How the last image prepared on this thread was made ready,
+            as a dict with the method and the seconds it took, or None
+        """
+        return getattr(self._local, "last", None)
+
+    def _save(self, img, quality):
+        """ img encoded in the transfer format at quality
+        """
+        with io.BytesIO() as buffer:
+            if self.image_format == "JPEG":
+                img.save(buffer, format="JPEG", quality=quality, optimize=self.optimize, progressive=self.progressive)
+            elif self.image_format == "WEBP":
+                img.save(buffer, format="WEBP", quality=quality, method=6 if self.optimize else 0)
+            else:
+                img.save(buffer, format="PNG", optimize=self.optimize, compress_level=9 if self.optimize else 1)
+            return buffer.getvalue()
+
+    def _encode(self, img):
+        """ Encode a prepared image for the request, base64. With a byte
+            budget, JPEG and WebP quality is searched down to the highest
+            that fits, but not below MIN_QUALITY.
+        """
+        started = time.perf_counter()
+        data = self._save(img, self.quality)
+        encodes = 1
+        
+        if self.max_bytes and len(data) > self.max_bytes and self.image_format != "PNG":
+            low, high = MIN_QUALITY, self.quality - 1
+            fitting = None
+            while low <= high:
+                quality = (low + high) // 2
+                candidate = self._save(img, quality)
+                encodes += 1
+                if len(candidate) <= self.max_bytes:
+                    fitting, low = candidate, quality + 1
+                else:
+                    data, high = min(data, candidate, key=len), quality - 1
+            data = fitting or data
+        
+        encoded = base64.b64encode(data).decode()
+        self._count("encoded", len(encoded), time.perf_counter() - started, encodes)
+        return encoded
+
+    def report(self):
+        """ One line on how the images were prepared
+        """
+        with self.stats_lock:
+            stats = dict(self.stats)
+        images = stats.get('encoded', 0) + stats.get('passthrough', 0) + stats.get('exif_thumbnail', 0) + stats.get('cached', 0)
+        encoded = stats.get('encoded', 0)
+        return (
+            f"Image preparation: {encoded} resized and encoded, "
+            f"{stats.get('passthrough', 0)} sent as they are, "
+            f"{stats.get('exif_thumbnail', 0)} sent as their EXIF thumbnail, "
+            f"{stats.get('cached', 0)} from the cache. "
+            f"Payload {stats.get('payload_bytes', 0) / max(1, images) / 1024:.1f} KB per image, "
+            f"encode {stats.get('encode_seconds', 0.0) * 1000 / max(1, encoded):.1f} ms per image "
+            f"({self.image_format}, {stats.get('encodes', 0)} encodes)"
+            + self._raw_report(stats)
+        )
+
+    def _raw_report(self, stats):
+        parts = []
+        for strategy, label in RAW_STRATEGIES:
+            count = stats.get(f"raw_{strategy}", 0)
+            if count:
+                seconds = stats.get(f"raw_{strategy}_seconds", 0.0) / count
+                parts.append(f"{count} {label} ({seconds:.2f}s each)")
+        return ". RAW files: " + ", ".join(parts) if parts else ""
+
+    def _sendable(self, img):
+        """ True if a JPEG can be sent as it is, judged from its header:
+            baseline, RGB or grayscale, and within max_dimension
+        """
+        return (
+            img.format == "JPEG"
+            and img.mode in ("RGB", "L")
+            and not img.info.get("progressive")
+            and 0 < max(img.size) <= self.max_dimension
+        )
+
+    def _exif_thumbnail(self, img):
+        """ The EXIF thumbnail of img if it can be sent in its place,
+            otherwise None. Only the headers are read.
+        """
+        raw = img.info.get("exif")
+        if not raw:
+            return None
+        try:
+            ifd1 = img.getexif().get_ifd(ExifTags.IFD.IFD1)
+        except Exception:
+            return None
+        
+        offset = ifd1.get(JPEG_INTERCHANGE_FORMAT)
+        length = ifd1.get(JPEG_INTERCHANGE_FORMAT_LENGTH)
+        if not offset or not length:
+            return None
+        
+        # Offsets count from the TIFF header, after the APP1 identifier
+        start = offset + (6 if raw.startswith(b"Exif\x00\x00") else 0)
+        data = raw[start:start + length]
+        if len(data) != length:
+            return None
+        
+        try:
+            with Image.open(io.BytesIO(data)) as thumb:
+                if not self._sendable(thumb):
+                    return None
+                
+                # Big enough to stand in for the resized image, and not
+                # letterboxed to a different shape
+                target = max(self._calculate_dimensions(*img.size))
+                if max(thumb.size) < THUMBNAIL_MIN_FRACTION * target:
+                    return None
+                if abs(thumb.width / thumb.height - img.width / img.height) > 0.02 * img.width / img.height:
+                    return None
+        except (IOError, OSError):
+            return None
+        
+        return data
+
+    def _passthrough_limit(self):
+        return min(PASSTHROUGH_MAX_BYTES, self.max_bytes or PASSTHROUGH_MAX_BYTES)
+
+    def _passthrough(self, img, file_path, file_size):
+        """ The image as base64 without decoding and encoding it: the
+            file itself, or its EXIF thumbnail. None if neither will do.
+        """
+        if img.format != "JPEG":
+            return None
+        
+        limit = self._passthrough_limit()
+        if self._sendable(img) and file_size <= limit:
+            with open(file_path, "rb") as f:
+                method, data = "passthrough", f.read()
+        else:
+            method, data = "exif_thumbnail", self._exif_thumbnail(img)
+            if data is None or len(data) > limit:
+                return None
+        
+        # The pixels are sent, not what was written about them
+        encoded = base64.b64encode(strip_jpeg_metadata(data)).decode()
+        self._count(method, len(encoded))
+        return encoded
+
+    def _large_enough(self, size):
+        """ True if an embedded preview of this size can stand in for
+            the RAW image without being scaled up much
+        """
+        return max(size) >= THUMBNAIL_MIN_FRACTION * self.max_dimension
+
+    def _pick_preview(self, previews):
+        """ The smallest of the JPEG previews that is large enough,
+            judged from their headers, or None
+        """
+        usable = []
+        for data in previews:
+            try:
+                with Image.open(io.BytesIO(data)) as img:
+                    if img.format == "JPEG" and self._large_enough(img.size):
+                        usable.append((img.width * img.height, data))
+            except (IOError, OSError):
+                continue
+        return min(usable, key=lambda item: item[0])[1] if usable else None
+
+    def _from_jpeg(self, data):
+        """ base64 for JPEG bytes: as they are if they can be sent that
+            way, otherwise reduced while decoding and encoded
+        """
+        with Image.open(io.BytesIO(data)) as img:
+            if self.passthrough and self._sendable(img) and len(data) <= self._passthrough_limit():
+                encoded = base64.b64encode(strip_jpeg_metadata(data)).decode()
+                self._count("passthrough", len(encoded))
+                return encoded
+            return self._encode(self._resize_image(img))
+
     def process_raw_image(self, file_path):
-        """ Process RAW image files
+        """ Process RAW image files, trying the cheapest way first: the
+            embedded JPEGs ExifTool finds, the thumbnail LibRaw finds
+            (JPEG or bitmap), and last a half size demosaic, which is
+            still seconds per file but a quarter of a full one.
         """
+        started = time.perf_counter()
+        
+        if self.preview_extractor is not None:
+            try:
+                # One tag at a time, so the full size JPEG isn't read and
+                # sent as base64 when the preview will do
+                for tag in RAW_PREVIEW_TAGS:
+                    preview = self._pick_preview(self.preview_extractor(file_path, (tag,)) or [])
+                    if preview is not None:
+                        encoded = self._from_jpeg(preview)
+                        self._count_raw("exiftool_preview", time.perf_counter() - started)
+                        return encoded
+            except (IOError, OSError, ValueError) as e:
+                print(f"Could not use the ExifTool preview of {file_path}: {e}")
+        
         with rawpy.imread(file_path) as raw:
             try:
-                # Try to extract embedded JPEG thumbnail first
                 thumb = raw.extract_thumb()
-                if thumb.format == rawpy.ThumbFormat.JPEG:
-                    thumb_img = Image.open(io.BytesIO(thumb.data))
-                    resized = self._resize_image(thumb_img)
-                    buffer = io.BytesIO()
-                    resized.save(buffer, format="JPEG", quality=95)
-                    return base64.b64encode(buffer.getvalue()).decode()
-            except:
-                pass
-
-            rgb = raw.postprocess()
-            img = Image.fromarray(rgb)
-            resized = self._resize_image(img)
-            buffer = io.BytesIO()
-            resized.save(buffer, format="JPEG", quality=95)
-            return base64.b64encode(buffer.getvalue()).decode()
+            except (rawpy.LibRawNoThumbnailError, rawpy.LibRawUnsupportedThumbnailError):
+                thumb = None
             
-    def route_image(self, file_path):
-        """ Process image """
-        if os.path.getsize(file_path) > self.max_file_size:
+            try:
+                if thumb is not None and thumb.format == rawpy.ThumbFormat.JPEG:
+                    preview = self._pick_preview([thumb.data])
+                    if preview is not None:
+                        encoded = self._from_jpeg(preview)
+                        self._count_raw("embedded_thumbnail", time.perf_counter() - started)
+                        return encoded
+                
+                elif thumb is not None and thumb.format == rawpy.ThumbFormat.BITMAP:
+                    img = Image.fromarray(thumb.data)
+                    if self._large_enough(img.size):
+                        encoded = self._encode(self._resize_image(img))
+                        self._count_raw("bitmap_thumbnail", time.perf_counter() - started)
+                        return encoded
+            except (IOError, OSError, ValueError) as e:
+                print(f"Could not use the embedded thumbnail of {file_path}: {e}")
+            
+            rgb = raw.postprocess(half_size=True, use_camera_wb=True)
+            encoded = self._encode(self._resize_image(Image.fromarray(rgb)))
+            self._count_raw("half_size", time.perf_counter() - started)
+            return encoded
+            
+    def _file_size(self, file_path, file_stat=None):
+        """ The size of the file, from file_stat when the caller has
+            one, checked against max_file_size
+        """
+        size = file_stat.size if file_stat is not None else os.path.getsize(file_path)
+        if size > self.max_file_size:
             raise ValueError(f"File exceeds size limit of {self.max_file_size} bytes")
+        return size
+    
+    def route_image(self, file_path, file_stat=None):
+        """ Process image """
+        file_size = self._file_size(file_path, file_stat)
             
         image_type = self._get_image_type(file_path)
         if image_type is None:
@@ -131,30 +466,116 @@ class ImageProcessor:
                 register_heif_opener()
                 
             with Image.open(file_path) as img:
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                    
                 if img.width <= 0 or img.height <= 0:
                     raise ValueError("Invalid image dimensions")
-                    
-                resized = self._resize_image(img)
                 
-                with io.BytesIO() as buffer:
-                    resized.save(buffer, format="JPEG", quality=95)
-                    return base64.b64encode(buffer.getvalue()).decode()
+                if self.passthrough:
+                    encoded = self._passthrough(img, file_path, file_size)
+                    if encoded is not None:
+                        return encoded
+                    
+                # Reduced while decoding, the image is only converted
+                # to RGB once it is small
+                return self._encode(self._resize_image(img))
                     
         except (IOError, OSError) as e:
             raise ValueError(f"Image processing failed: {str(e)}")
             
         return None
         
-    def process_image(self, file_path):    
-        """ Process an image through the LLM
+    def cache_settings(self):
+        """ Everything besides the file that changes the payload
+        """
+        return (
+            self.max_dimension, self.token_size, self.minimize_tokens, self.image_format,
+            self.quality, self.max_bytes, self.optimize, self.progressive, self.passthrough,
+        )
+
+    def _cached_route(self, file_path, file_stat=None):
+        """ route_image, looked up in and added to the cache. Files
+            over the size limit are turned down before they are hashed.
+        """
+        try:
+            self._file_size(file_path, file_stat)
+            key = self.cache.key(file_path, self.cache_settings(), file_stat)
+        except OSError:
+            # route_image reports a missing or unreadable file
+            return self.route_image(file_path, file_stat)
+
+        encoded = self.cache.get(key)
+        if encoded is not None:
+            self._count("cached", len(encoded))
+            return encoded
+
+        encoded = self.route_image(file_path, file_stat)
+        if encoded:
+            self.cache.put(key, encoded)
+        return encoded
+
+    def process_image(self, file_path, file_stat=None):    
+        """ Process an image through the LLM. file_stat is the FileStat
+            the indexer found the file with, so it is not stat'ed again.
         """
         file_path = os.path.normpath(file_path)
-        encoded = self.route_image(file_path)
+        self._local.method = None
+        started = time.perf_counter()
+        if self.cache is not None:
+            encoded = self._cached_route(file_path, file_stat)
+        else:
+            encoded = self.route_image(file_path, file_stat)
+        self._local.last = {"method": self._local.method, "seconds": time.perf_counter() - started}
         
         if not encoded:
             return None, file_path
 
         return encoded, file_path
+
+def is_jpeg_metadata(marker, payload):
+    """ True for a JPEG segment that only carries metadata
+    """
+    if marker == JPEG_COM:
+        return True
+    return marker in JPEG_APP_MARKERS and not any(
+        marker == kept and payload.startswith(prefix) for kept, prefix in JPEG_KEPT_APP_SEGMENTS
+    )
+
+def strip_jpeg_metadata(data):
+    """ JPEG bytes without their EXIF, XMP, IPTC and other APPn segments
+        and comments, so a file is sent without the metadata written
+        into it. Nothing is decoded, the image data is copied as is.
+        Bytes that don't parse as a JPEG are returned unchanged.
+    """
+    if data[:2] != b"\xff\xd8":
+        return data
+    
+    kept = [data[:2]]
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return data
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            pos += 1
+            continue
+        if marker in (JPEG_SOS, JPEG_EOI):
+            kept.append(data[pos:])
+            return b"".join(kept)
+        
+        length = int.from_bytes(data[pos + 2:pos + 4], "big")
+        end = pos + 2 + length
+        if length < 2 or end > len(data):
+            return data
+        
+        if not is_jpeg_metadata(marker, data[pos + 4:end]):
+            kept.append(data[pos:end])
+        pos = end
+    return data
+
+def image_mime(encoded):
+    """ The MIME type of a base64 encoded image, JPEG if it isn't known
+    """
+    for signature, mime in BASE64_SIGNATURES.items():
+        if encoded.startswith(signature):
+            return mime
+    return "image/jpeg"
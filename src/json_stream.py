@@ -0,0 +1,141 @@
+import json
+
+class KeywordStreamParser:
+    """ Follows a JSON answer as it is generated, a few characters at a
+        time, and picks out the keywords as each one is finished.
+
+        The answer is complete once its top level object is closed, or
+        once the Keywords value is closed and every required key has
+        been seen. Anything the model writes after that is not needed,
+        so the request can be stopped there.
+
+        Text before the first { (a markdown fence, a preamble) is
+        skipped. Nothing is ever thrown away from text, so an answer
+        that turns out not to be JSON can still go to clean_json.
+    """
+    def __init__(self, required=("Keywords",)):
+        self.required = frozenset(required)
+        self.text = ""
+        self.keywords = []
+        self.seen_keys = set()
+        self.complete = False
+        self.end = None  # Length of text the answer ends at
+
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string = []
+        self._last_string = None
+        self._key = None  # Top level key whose value is being read
+        self._started = False
+
+    def feed(self, chunk):
+        """ Add generated text. Returns the keywords finished in it.
+        """
+        finished = []
+        if self.complete:
+            self.text += chunk
+            return finished
+
+        for char in chunk:
+            self.text += char
+            if self.complete:
+                continue
+
+            if not self._started:
+                if char == "{":
+                    self._started = True
+                    self._stack.append("{")
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    self._string.append(char)
+                elif char == "\\":
+                    self._escape = True
+                    self._string.append(char)
+                elif char == '"':
+                    self._in_string = False
+                    value = self._decode("".join(self._string))
+                    self._last_string = value
+                    if self._key == "Keywords" and self._stack == ["{", "["] and value is not None:
+                        self.keywords.append(value)
+                        finished.append(value)
+                else:
+                    self._string.append(char)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string = []
+            elif char in "{[":
+                self._stack.append(char)
+            elif char in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if not self._stack:
+                    self._finish()
+                elif len(self._stack) == 1 and self._key == "Keywords" and self.required <= self.seen_keys:
+                    self._finish()
+            elif len(self._stack) == 1:
+                if char == ":" and self._last_string is not None:
+                    self._key = self._last_string
+                    self.seen_keys.add(self._key)
+                elif char == ",":
+                    self._key = None
+                    self._last_string = None
+
+        return finished
+
+    def _decode(self, raw):
+        try:
+            return json.loads(f'"{raw}"')
+        except ValueError:
+            return None
+
+    def _finish(self):
+        self.complete = True
+        self.end = len(self.text)
+
+    def result(self):
+        """ The answer up to where it was complete, closed off so it
+            parses as JSON, or everything generated if it never was
+        """
+        if not self.complete:
+            return self.text
+
+        answer = self.text[:self.end]
+        start = answer.find("{")
+        answer = answer[start:] if start != -1 else answer
+        if self._stack:
+            answer += "}"
+        return answer
+
+def sse_data(line):
+    """ The JSON payload of a server-sent event line, None for other
+        lines, or "[DONE]" at the end of the stream
+    """
+    if isinstance(line, bytes):
+        line = line.decode("utf-8", errors="replace")
+    if not line.startswith("data:"):
+        return None
+
+    data = line[5:].strip()
+    if data == "[DONE]":
+        return data
+    try:
+        return json.loads(data)
+    except ValueError:
+        return None
+
+def stream_delta(event):
+    """ The text added by a chat or text completion stream event
+    """
+    choices = event.get("choices") or []
+    if not choices:
+        return ""
+    choice = choices[0]
+    if "delta" in choice:
+        return choice["delta"].get("content") or ""
+    return choice.get("text") or ""
@@ -1,7 +1,25 @@
-import os, json, time, re, argparse, exiftool, threading, queue, calendar, io, uuid, requests
+import os, json, time, re, argparse, exiftool, threading, queue, calendar, io, uuid, requests, sqlite3
 from json_repair import repair_json as rj
 from datetime import timedelta
-from .image_processor import ImageProcessor
+from collections import namedtuple
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.exceptions import ReadTimeoutError
+from .pipeline import Pipeline, PipelineStage
+from .metadata_writer import MetadataWriter, build_write_params
+from .exiftool_pool import ExifToolPool
+from .file_index import FileIndex, prompt_hash, DONE_STATUSES, INDEX_FILENAME
+from .watcher import Debouncer, open_watcher
+from .endpoints import EndpointPool, parse_api_urls, probe_api
+from .structured_output import apply_structured_output, schema_for_task
+from .json_stream import KeywordStreamParser, sse_data, stream_delta
+from .model_profiles import find_model_profile, make_image_processor
+from .image_processor import image_mime
+from .image_cache import shared_image_cache, image_hash as file_image_hash, prepared_image_key
+from .response_cache import request_key, shared_response_cache
+from .near_duplicates import NearDuplicateIndex, DUPLICATE_STATUS, HASH_METHODS
 from .llmii_utils import first_json, de_pluralize, AND_EXCEPTIONS
     
 def split_on_internal_capital(word):
@@ -22,7 +40,37 @@ def split_on_internal_capital(word):
             
     return word
 
-def normalize_keyword(keyword, banned_words, config=None):
+# Words in the prompt tend to get repeated back by certain models
+BANNED_WORDS = ("no", "unspecified", "unknown", "unidentified", "identify", "topiary", "themes concepts", "items animals", "animals objects", "structures landmarks", "Foreground and background", "notable colors", "textures styles", "actions activities", "physical appearance", "Gender", "Age range", "visibly apparent", "apparent ancestry", "Occupation/role", "Relationships between individuals", "Emotions expressions", "body language")
+
+# Keyword rules used when there is no config
+DEFAULT_KEYWORD_RULES = {
+    "normalize_keywords": True,
+    "depluralize_keywords": True,
+    "limit_word_count": True,
+    "max_words_per_keyword": 2,
+    "split_and_entries": True,
+    "ban_prompt_words": True,
+    "no_digits_start": True,
+    "min_word_length": True,
+    "latin_only": True,
+}
+
+NON_LATIN = re.compile(r'[^\x00-\x7F]')
+NON_WORD = re.compile(r'[^\w\s-]')
+SPACES = re.compile(r'\s+')
+HYPHENS = re.compile(r'-+')
+HYPHENATED = re.compile(r'^[\w]+-[\w]+$')
+DIGITS_START = re.compile(r'^\d{3,}')
+
+def keyword_rules(config=None):
+    """ The keyword rules set in config, in DEFAULT_KEYWORD_RULES order
+    """
+    if config is None:
+        return tuple(DEFAULT_KEYWORD_RULES.values())
+    return tuple(getattr(config, rule, default) for rule, default in DEFAULT_KEYWORD_RULES.items())
+
+class KeywordNormalizer:
     """ Normalizes keywords according to specific rules:
         - Splits unhyphenated compound words on internal capitals
         - Max words determined by config (default 2) unless middle word is 'and'/'or' (then +1)
@@ -34,117 +82,128 @@ def normalize_keyword(keyword, banned_words, config=None):
         - Checks against banned words if ban_prompt_words enabled
         - Makes singular if depluralize_keywords enabled
         - Returns lowercase result
-    """   
-    if config is None:
-        class DefaultConfig:
-            def __init__(self):
-                self.normalize_keywords = True
-                self.depluralize_keywords = True
-                self.limit_word_count = True
-                self.max_words_per_keyword = 2
-                self.split_and_entries = True
-                self.ban_prompt_words = True
-                self.no_digits_start = True
-                self.min_word_length = True
-                self.latin_only = True
         
-        config = DefaultConfig()
-    
-    if not config.normalize_keywords:
-        return keyword.strip()
-    
-    if not isinstance(keyword, str):
-        keyword = str(keyword)
-    
-    # Handle internal capitalization before lowercase conversion
-    words = keyword.strip().split()
-    split_words = []
-    
-    for word in words:
-        split_words.extend(split_on_internal_capital(word).split())
-    
-    keyword = " ".join(split_words)
-    
-    # Convert to lowercase after handling capitals
-    keyword = keyword.lower().strip()
-    
-    # Remove non-Latin characters if latin_only is enabled
-    if config.latin_only:
-        keyword = re.sub(r'[^\x00-\x7F]', '', keyword)
-    
-    # Remove all non-alphanumeric chars except spaces and hyphens
-    keyword = re.sub(r'[^\w\s-]', '', keyword)
-    
-    # Replace multiple spaces/hyphens with single space/hyphen
-    keyword = re.sub(r'\s+', ' ', keyword)
-    keyword = re.sub(r'-+', '-', keyword)
-    keyword = re.sub(r'_', ' ', keyword)
+        The rules are read from config once. Models repeat the same
+        keywords across images, so results are remembered for the
+        last memo_size different keywords.
+    """
+    def __init__(self, config=None, banned_words=BANNED_WORDS, memo_size=4096):
+        for rule, value in zip(DEFAULT_KEYWORD_RULES, keyword_rules(config)):
+            setattr(self, rule, value)
+        self.banned_words = frozenset(banned_words)
+        self._memo = lru_cache(maxsize=memo_size)(self._normalize)
     
-    # Check for banned words if enabled
-    if config.ban_prompt_words and keyword in banned_words:
-        return None
+    def normalize(self, keyword):
+        """ The normalized keyword, or None if it should be dropped
+        """
+        if not isinstance(keyword, str):
+            keyword = str(keyword)
+        return self._memo(keyword)
     
-    # For validation, we'll track both original tokens and split words
-    tokens = keyword.split()
-    words = []
+    def memo_info(self):
+        return self._memo.cache_info()
     
-    # Validate and collect words for length checking
-    for token in tokens:    
+    def _normalize(self, keyword):
+        if not self.normalize_keywords:
+            return keyword.strip()
         
-        # Handle hyphenated words
-        if '-' in token:
-            
-            # Check if hyphen is between alphanumeric chars
-            if not re.match(r'^[\w]+-[\w]+$', token):
-                return None
-           
-            # Add hyphenated parts to words list for validation
-            parts = token.split('-')
-            words.extend(parts)
+        # Handle internal capitalization before lowercase conversion
+        split_words = []
+        for word in keyword.strip().split():
+            split_words.extend(split_on_internal_capital(word).split())
         
-        else:
-            words.append(token)
-    
-    # Validate word count if limit_word_count is enabled
-    if config.limit_word_count:
-        max_words = config.max_words_per_keyword
-        if len(words) > max_words + 1:
+        # Convert to lowercase after handling capitals
+        keyword = " ".join(split_words).lower().strip()
+        
+        # Remove non-Latin characters if latin_only is enabled
+        if self.latin_only:
+            keyword = NON_LATIN.sub('', keyword)
+        
+        # Remove all non-alphanumeric chars except spaces and hyphens
+        keyword = NON_WORD.sub('', keyword)
+        
+        # Replace multiple spaces/hyphens with single space/hyphen
+        keyword = SPACES.sub(' ', keyword)
+        keyword = HYPHENS.sub('-', keyword)
+        keyword = keyword.replace('_', ' ')
+        
+        # Check for banned words if enabled
+        if self.ban_prompt_words and keyword in self.banned_words:
             return None
         
-    # Handle and/or splitting if enabled
-    if config.split_and_entries and len(words) == 3 and words[1] in ['and', 'or']:
-        if ' '.join(words) in AND_EXCEPTIONS:
-            pass
-        else:
-            # Remove and/or and make singular if depluralize_keywords is enabled
-            if config.depluralize_keywords:
-                tokens = [de_pluralize(words[0]), de_pluralize(words[2])]
+        # For validation, we'll track both original tokens and split words
+        tokens = keyword.split()
+        words = []
+        
+        # Validate and collect words for length checking
+        for token in tokens:
+            
+            # Handle hyphenated words
+            if '-' in token:
+                
+                # Check if hyphen is between alphanumeric chars
+                if not HYPHENATED.match(token):
+                    return None
+                
+                # Add hyphenated parts to words list for validation
+                words.extend(token.split('-'))
+            
             else:
-                tokens = [words[0], words[2]]
-    
-    # Word validation
-    for word in words:
+                words.append(token)
+        
+        # Validate word count if limit_word_count is enabled
+        if self.limit_word_count and len(words) > self.max_words_per_keyword + 1:
+            return None
+        
+        # Handle and/or splitting if enabled
+        if self.split_and_entries and len(words) == 3 and words[1] in ('and', 'or'):
+            if ' '.join(words) not in AND_EXCEPTIONS:
+                # Remove and/or and make singular if depluralize_keywords is enabled
+                if self.depluralize_keywords:
+                    tokens = [de_pluralize(words[0]), de_pluralize(words[2])]
+                else:
+                    tokens = [words[0], words[2]]
         
         # Check minimum length if enabled
-        if config.min_word_length:
-            if len(word) < 2 and word not in ['x', 'u']:
-                return None
+        if self.min_word_length:
+            for word in words:
+                if len(word) < 2 and word not in ('x', 'u'):
+                    return None
         
-    # Check if starts with 3+ digits if enabled
-    if config.no_digits_start and re.match(r'^\d{3,}', words[0]):
-        return None
-    
-    # Make words singular if depluralize_keywords is enabled
-    if config.depluralize_keywords:
-        # Make solo words singular
-        if len(words) == 1:
-            tokens = [de_pluralize(words[0])]
-        # If two or more words make the last word singular
-        elif len(tokens) > 1:
-            tokens[-1] = de_pluralize(tokens[-1])
-    
-    # Return the original tokens (preserving hyphens)
-    return ' '.join(tokens)
+        # Check if starts with 3+ digits if enabled
+        if self.no_digits_start and DIGITS_START.match(words[0]):
+            return None
+        
+        # Make words singular if depluralize_keywords is enabled
+        if self.depluralize_keywords:
+            # Make solo words singular
+            if len(words) == 1:
+                tokens = [de_pluralize(words[0])]
+            # If two or more words make the last word singular
+            elif len(tokens) > 1:
+                tokens[-1] = de_pluralize(tokens[-1])
+        
+        # Return the original tokens (preserving hyphens)
+        return ' '.join(tokens)
+
+_normalizers = {}
+_normalizers_lock = threading.Lock()
+
+def keyword_normalizer(config=None, banned_words=BANNED_WORDS):
+    """ The KeywordNormalizer for the keyword rules in config, shared by
+        everything normalizing with the same rules so they share one memo
+    """
+    key = (keyword_rules(config), tuple(banned_words))
+    with _normalizers_lock:
+        normalizer = _normalizers.get(key)
+        if normalizer is None:
+            normalizer = _normalizers[key] = KeywordNormalizer(config, banned_words)
+        return normalizer
+
+def normalize_keyword(keyword, banned_words, config=None):
+    """ Normalize one keyword, see KeywordNormalizer
+    """
+    return keyword_normalizer(config, banned_words).normalize(keyword)
     
 def clean_string(data):
     """ Makes sure the string is clean for addition
@@ -243,6 +302,29 @@ def clean_json(data):
 
     return None
 
+def check_answer(task, answer):
+    """ How usable an answer is: "ok" if it can be used as it came,
+        "repaired" if clean_json had to dig the JSON out of it and
+        "invalid" if it would make the file be retried
+    """
+    if answer is None:
+        return "invalid"
+    
+    if schema_for_task(task) is None:
+        return "ok" if clean_string(answer) else "invalid"
+    
+    try:
+        data = json.loads(answer)
+        if isinstance(data, dict) and data.get("Keywords"):
+            return "ok"
+    except (ValueError, TypeError):
+        pass
+    
+    data = clean_json(answer)
+    if isinstance(data, dict) and data.get("Keywords"):
+        return "repaired"
+    return "invalid"
+
 
 class Config:
     def __init__(self):
@@ -259,6 +341,18 @@ class Config:
         self.text_completion = False
         self.gen_count = 250
         self.res_limit = 448
+        self.no_passthrough = False  # Always re-encode images, even JPEGs small enough to send as they are
+        self.image_format = "jpeg"  # Format prepared images are sent in: jpeg, webp or png
+        self.image_quality = 95  # JPEG and WebP quality
+        self.image_max_kb = 0  # Lower the quality until each image fits in this many KB, 0 for no limit
+        self.image_optimize = False  # Smaller images that take longer to encode
+        self.image_progressive = False  # Progressive JPEG, slower to encode and decode
+        self.image_cache = False  # Keep prepared images, downscaled copies of the photos, on disk to reuse them
+        self.image_cache_dir = None  # Where prepared images are cached, None for the user cache directory
+        self.image_cache_mb = 512  # Least recently used prepared images are removed past this size
+        self.model_profile = None  # Model list entry to size images for, None to look up the model the server reports
+        self.benchmark_res = None  # Comma separated res_limit values to compare instead of indexing
+        self.benchmark_files = 10  # Images the resolution benchmark is run on
         self.detailed_caption = False
         self.short_caption = True
         self.skip_verify = False
@@ -266,6 +360,36 @@ class Config:
         self.no_caption = False
         self.update_caption = False
         self.use_sidecar = False
+        self.parallel = 1  # Number of files in flight at once, match the server's parallel slots
+        self.decode_workers = 2  # Threads preparing the next images while the LLM works
+        self.write_batch_size = 16  # Files written per ExifTool round trip
+        self.read_workers = 2  # ExifTool processes reading metadata in parallel
+        self.incremental = False  # Skip directories unchanged since the last completed scan
+        self.http_pool_size = 4  # Connections kept open to the API, at least one per parallel request
+        self.http_retries = 2  # Retries for connection errors and 5xx responses
+        self.connect_timeout = 10  # Seconds to wait for a connection to the API
+        self.read_timeout = 120  # Seconds to wait for the API to answer
+        self.load_balance = "least_outstanding"  # How requests are spread over several API URLs: least_outstanding or latency
+        self.health_interval = 10.0  # Seconds between health checks of several API URLs
+        self.stream = False  # Stream answers and stop as soon as the JSON is complete
+        self.structured_output = "off"  # Constrain JSON answers: off, grammar (KoboldCpp, llama.cpp) or json_schema (OpenAI, vLLM)
+        self.detailed_requests = "sequential"  # How the two detailed caption queries are sent: sequential, concurrent or multiturn
+        self.async_llm = False  # Send requests from an asyncio event loop with httpx
+        self.async_concurrency = 0  # Requests the async client sends at once, 0 to match parallel
+        self.watch = False  # Keep running and process files as they are added
+        self.watch_poll = False  # Poll for new files instead of listening for file system events
+        self.watch_interval = 5.0  # Seconds between polls
+        self.watch_settle = 2.0  # Seconds a file must stay unchanged before it is read
+        self.no_index = False  # Don't use the file index to skip unchanged files
+        self.rebuild_index = False  # Empty the file index so it is rebuilt from the files' metadata
+        self.index_hash = False  # Also compare file contents before trusting the index
+        self.near_duplicates = False  # Give near-duplicate images the metadata of the first one instead of describing each
+        self.duplicate_threshold = 6  # Most bits two 64 bit image hashes may differ in to count as near-duplicates
+        self.duplicate_hash = "dhash"  # Perceptual hash to compare images with: dhash or phash
+        self.reprocess_duplicates = False  # Describe images that were given the metadata of a near-duplicate
+        self.response_cache = "deterministic"  # Reuse answers to identical requests: off, deterministic (temperature 0 only) or all
+        self.refresh_responses = False  # Ask the LLM again even when an answer is cached, and keep the new one
+        self.response_cache_path = None  # Database of cached answers, None for the user cache directory
         self.generation_mode = "both"  # Options: "description_only", "keywords_only", "both"
         self.auto_save = False  # If False, preview mode (don't auto-write). If True, auto-write like current behavior.
         self.normalize_keywords = True
@@ -383,7 +507,14 @@ Use ENGLISH only. Generate ONLY a JSON object with the keys Description and Keyw
         parser = argparse.ArgumentParser(description="Image Indexer")
         parser.add_argument("directory", help="Directory containing the files")
         parser.add_argument(
-            "--api-url", default="http://localhost:5001", help="URL for the LLM API"
+            "--api-url", default="http://localhost:5001", help="URL for the LLM API, or several separated by commas to spread the work over them"
+        )
+        parser.add_argument(
+            "--load-balance", choices=["least_outstanding", "latency"], default="least_outstanding",
+            help="With several API URLs, send each request to the one with the fewest requests waiting or the lowest expected latency"
+        )
+        parser.add_argument(
+            "--health-interval", type=float, default=10.0, help="Seconds between health checks of the API URLs when there are several"
         )
         parser.add_argument(
             "--api-password", default="", help="Password for the LLM API"
@@ -418,6 +549,18 @@ Use ENGLISH only. Generate ONLY a JSON object with the keys Description and Keyw
             "--gen-count", default=150, help="Number of tokens to generate"
         )
         parser.add_argument("--detailed-caption", action="store_true", help="Write a detailed caption along with keywords")
+        parser.add_argument(
+            "--stream", action="store_true", help="Stream answers from the API and stop generating as soon as the keywords are complete"
+        )
+        parser.add_argument(
+            "--structured-output", choices=["off", "grammar", "json_schema"], default="off",
+            help="Make the server only produce valid JSON, with a GBNF grammar (KoboldCpp, llama.cpp) or an OpenAI json_schema response_format (OpenAI, vLLM)"
+        )
+        parser.add_argument(
+            "--detailed-requests", choices=["sequential", "concurrent", "multiturn"], default="sequential",
+            help="With --detailed-caption, send the keyword and caption queries one after another, at the same time, "
+                 "or as one conversation so the server only processes the image once"
+        )
         parser.add_argument(
             "--skip-verify", action="store_true", help="Skip verifying file metadata validity before processing"
         )
@@ -429,6 +572,119 @@ Use ENGLISH only. Generate ONLY a JSON object with the keys Description and Keyw
             "--normalize-keywords", action="store_true", help="Enable keyword normalization"
         )
         parser.add_argument("--res-limit", type=int, default=448, help="Limit the resolution of the image")
+        parser.add_argument(
+            "--no-passthrough", action="store_true", help="Always re-encode images instead of sending small JPEGs and EXIF thumbnails as they are"
+        )
+        parser.add_argument(
+            "--image-format", choices=["jpeg", "webp", "png"], default="jpeg", help="Format to send prepared images in"
+        )
+        parser.add_argument(
+            "--image-quality", type=int, default=95, help="JPEG and WebP quality of prepared images"
+        )
+        parser.add_argument(
+            "--image-max-kb", type=int, default=0, help="Lower the quality until each image fits in this many KB (0 for no limit), for servers on another host"
+        )
+        parser.add_argument(
+            "--image-optimize", action="store_true", help="Spend more time encoding images to make them smaller"
+        )
+        parser.add_argument(
+            "--image-progressive", action="store_true", help="Send progressive JPEGs"
+        )
+        parser.add_argument(
+            "--image-cache", action="store_true",
+            help="Reuse prepared images from earlier runs. This keeps downscaled copies of your photos on disk, in the user cache directory unless --image-cache-dir is given"
+        )
+        parser.add_argument(
+            "--image-cache-dir", default=None, help="Directory to cache prepared images in (default: the user cache directory)"
+        )
+        parser.add_argument(
+            "--image-cache-mb", type=int, default=512, help="Size the image cache is kept under, in MB"
+        )
+        parser.add_argument(
+            "--near-duplicates", action="store_true", help="Give near-duplicate images, like burst shots, the metadata of the first one instead of describing each"
+        )
+        parser.add_argument(
+            "--duplicate-threshold", type=int, default=6, help="Most bits the 64 bit hashes of near-duplicates may differ in"
+        )
+        parser.add_argument(
+            "--duplicate-hash", choices=sorted(HASH_METHODS), default="dhash", help="Perceptual hash used to find near-duplicates"
+        )
+        parser.add_argument(
+            "--reprocess-duplicates", action="store_true", help="Describe images that were given the metadata of a near-duplicate"
+        )
+        parser.add_argument(
+            "--response-cache", choices=["off", "deterministic", "all"], default="deterministic",
+            help="Reuse answers to identical requests: deterministic only at temperature 0, all also for sampled answers"
+        )
+        parser.add_argument(
+            "--refresh-responses", action="store_true", help="Ask the LLM again even when an answer is cached, and cache the new answer"
+        )
+        parser.add_argument(
+            "--response-cache-path", default=None, help="Database file for cached answers (default: in the user cache directory)"
+        )
+        parser.add_argument(
+            "--model-profile", default=None, help="Name of the model in model_list.json to size images for (default: the model the server reports)"
+        )
+        parser.add_argument(
+            "--benchmark-res", default=None, help="Compare speed and keyword agreement at several resolutions, e.g. 224,336,448,672, instead of indexing"
+        )
+        parser.add_argument(
+            "--benchmark-files", type=int, default=10, help="Number of images in the directory to run --benchmark-res on"
+        )
+        parser.add_argument(
+            "--parallel", type=int, default=1, help="Number of files to process concurrently (set to the number of parallel slots on the LLM server)"
+        )
+        parser.add_argument(
+            "--decode-workers", type=int, default=2, help="Number of threads preparing images ahead of the LLM"
+        )
+        parser.add_argument(
+            "--write-batch-size", type=int, default=16, help="Number of files written per ExifTool command"
+        )
+        parser.add_argument(
+            "--read-workers", type=int, default=2, help="Number of ExifTool processes reading metadata in parallel"
+        )
+        parser.add_argument(
+            "--no-index", action="store_true", help="Don't use the file index to skip unchanged files"
+        )
+        parser.add_argument(
+            "--rebuild-index", action="store_true", help="Rebuild the file index from the metadata in the files"
+        )
+        parser.add_argument(
+            "--http-pool-size", type=int, default=4, help="Connections kept open to the API (at least one per parallel request)"
+        )
+        parser.add_argument(
+            "--http-retries", type=int, default=2, help="Retries with backoff for connection errors and 5xx responses from the API"
+        )
+        parser.add_argument(
+            "--connect-timeout", type=float, default=10, help="Seconds to wait for a connection to the API"
+        )
+        parser.add_argument(
+            "--read-timeout", type=float, default=120, help="Seconds to wait for the API to answer a request"
+        )
+        parser.add_argument(
+            "--async-llm", action="store_true", help="Send API requests from an asyncio event loop (needs httpx), for servers with many parallel slots"
+        )
+        parser.add_argument(
+            "--async-concurrency", type=int, default=0, help="Most API requests in flight at once with --async-llm (default: same as --parallel)"
+        )
+        parser.add_argument(
+            "--watch", action="store_true", help="Keep running and process new or changed files as they appear. Changes are noticed through watchdog, or by polling if it is not installed"
+        )
+        parser.add_argument(
+            "--watch-poll", action="store_true", help="Poll for changes instead of listening for file system events through watchdog (needed for changes made from other machines on network shares)"
+        )
+        parser.add_argument(
+            "--watch-interval", type=float, default=5.0, help="Seconds between polls when polling for changes"
+        )
+        parser.add_argument(
+            "--watch-settle", type=float, default=2.0, help="Seconds a new file must stay unchanged before it is processed"
+        )
+        parser.add_argument(
+            "--incremental", action="store_true", help="Skip directories that have not changed since the last completed scan"
+        )
+        parser.add_argument(
+            "--index-hash", action="store_true", help="Hash file contents when checking the file index (slower, catches changes that keep size and date)"
+        )
         args = parser.parse_args()
 
         config = cls()
@@ -438,15 +694,109 @@ Use ENGLISH only. Generate ONLY a JSON object with the keys Description and Keyw
         
         return config
 
+CHAT_COMPLETIONS_PATH = "/v1/chat/completions"
+
+def image_options(config):
+    """ The ImageProcessor options for how images are sent, from config
+    """
+    return {
+        "passthrough": not getattr(config, 'no_passthrough', False),
+        "image_format": getattr(config, 'image_format', 'jpeg'),
+        "quality": getattr(config, 'image_quality', 95),
+        "max_bytes": (getattr(config, 'image_max_kb', 0) or 0) * 1024,
+        "optimize": getattr(config, 'image_optimize', False),
+        "progressive": getattr(config, 'image_progressive', False),
+        "cache": image_cache(config),
+    }
+
+def image_cache(config):
+    """ The shared cache of prepared images, or None when it is off
+        or can't be created
+    """
+    if not getattr(config, 'image_cache', False):
+        return None
+    try:
+        return shared_image_cache(getattr(config, 'image_cache_dir', None), getattr(config, 'image_cache_mb', 512))
+    except OSError as e:
+        print(f"Image cache not available: {e}")
+        return None
+
+def make_http_session(pool_size=4, retries=2, backoff=0.5, hosts=1):
+    """ A requests session that keeps up to pool_size connections
+        alive to each of hosts servers and retries connection errors
+        and 5xx responses with exponential backoff.
+        
+        Read errors are never retried: the server may still be
+        generating the answer, and sending the request again would
+        start a second generation.
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=False,
+        other=0,
+        status=retries,
+        backoff_factor=backoff,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "POST"}),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=max(1, hosts), pool_maxsize=max(1, pool_size), max_retries=retry)
+    
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def read_timed_out(error):
+    """ True if a requests error means the server took too long to
+        answer. Timeouts while streaming come as ConnectionError.
+    """
+    if isinstance(error, requests.ReadTimeout):
+        return True
+    return any(isinstance(arg, ReadTimeoutError) for arg in error.args)
+
+def make_llm_processor(config, callback=print):
+    """ The async httpx client when asked for and available,
+        otherwise the pooled requests one
+    """
+    if getattr(config, 'async_llm', False):
+        try:
+            from .async_llm import AsyncLLMProcessor
+            return AsyncLLMProcessor(config)
+        except ImportError as e:
+            callback(f"Async LLM client not available, using the standard one: {str(e)}")
+    
+    return LLMProcessor(config)
+
+class Conversation:
+    """ The turns so far of a chat about one image. Follow-up turns
+        go to the same endpoint, where the image is already cached.
+    """
+    def __init__(self):
+        self.turns = []  # (task, answer)
+        self.endpoint = None
+    
+    def add(self, task, answer, endpoint=None):
+        if answer is None:
+            return
+        self.turns.append((task, answer))
+        self.endpoint = self.endpoint or endpoint
+
 class LLMProcessor:
     def __init__(self, config):
-        self.api_url = config.api_url
+        # Several servers can share the work, see EndpointPool
+        self.endpoints = EndpointPool(
+            parse_api_urls(config.api_url) or [config.api_url],
+            strategy=getattr(config, 'load_balance', 'least_outstanding'),
+            health_interval=getattr(config, 'health_interval', 10.0)
+        )
+        self.api_url = self.endpoints.endpoints[0].url
         self.config = config
         self.instruction = config.instruction
         self.system_instruction = config.system_instruction
         self.caption_instruction = config.caption_instruction
         self.keyword_instruction = config.keyword_instruction or config.instruction  # Fallback to full instruction if empty
-        self.requests = requests
         self.api_password = config.api_password
         self.max_tokens = config.gen_count
         self.temperature = config.temperature
@@ -454,189 +804,537 @@ class LLMProcessor:
         self.rep_pen = config.rep_pen
         self.top_k = config.top_k
         self.min_p = config.min_p
-
-    def describe_content(self, task="", processed_image=None):
-        if not processed_image:
-            print("No image to describe.")
-            
-            return None
+        self.model = None  # Reported by the server with each response
+        self.prompt_tokens = 0  # Totals of the usage servers report
+        self.completion_tokens = 0
         
+        self.session = self._open_session(config)
+        self.timeout = (getattr(config, 'connect_timeout', 10), getattr(config, 'read_timeout', 120))
+        self.executor = None  # Started for the first concurrent describe_tasks
+        self.executor_lock = threading.Lock()
+        self.structured_output = getattr(config, 'structured_output', 'off')
+        self.stream = getattr(config, 'stream', False)
+        self.stats_lock = threading.Lock()
+        self.early_stops = 0  # Streamed answers cut off once the JSON was complete
+        
+        # Answers to identical requests are reused, see cached_answer
+        self.response_cache_mode = getattr(config, 'response_cache', 'deterministic')
+        self.refresh_responses = getattr(config, 'refresh_responses', False)
+        self.response_cache = None
+        # Only opened when an answer could ever be reused
+        if self.response_cache_mode == "all" or (self.response_cache_mode == "deterministic" and self.temperature == 0):
+            try:
+                self.response_cache = shared_response_cache(getattr(config, 'response_cache_path', None))
+            except (OSError, sqlite3.Error) as e:
+                print(f"Response cache not available: {str(e)}")
+        self.model_id = None  # The served model, looked up for the first cached request
+        self.model_id_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_stores = 0
+
+    def _open_session(self, config):
+        """ One pooled session for every request, so each image doesn't
+            pay for a new connection. Every worker needs its own
+            connection.
+        """
+        return make_http_session(
+            pool_size=max(getattr(config, 'http_pool_size', 4), getattr(config, 'parallel', 1)),
+            retries=0 if getattr(config, 'quick_fail', False) else getattr(config, 'http_retries', 2),
+            hosts=len(self.endpoints)
+        )
+
+    def get_instruction(self, task):
+        """ The instruction for a task, or None if the task is not known
+        """
         if task == "caption":
-            instruction = self.caption_instruction
+            return self.caption_instruction
         
         elif task == "keywords":
-            instruction = self.instruction
+            return self.instruction
         
         elif task == "caption_and_keywords":
-            instruction = self.instruction
+            return self.instruction
         
         elif task == "keywords_only":
-            instruction = self.keyword_instruction
+            return self.keyword_instruction
         
-        else:
-            print(f"invalid task: {task}")
-            
-            return None
-            
-        try:
-            messages = [
-                {"role": "system", "content": self.system_instruction},
-                {
-                    "role": "user", 
-                    "content": [
-                        {"type": "text", "text": instruction},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{processed_image}"
-                            }
-                        }
-                    ]
-                }
-            ]
-            
-            payload = {
-                "messages": messages,
-                "max_tokens": self.max_tokens,
-                "temperature": self.temperature,
-                "top_p": self.top_p,
-                "top_k": self.top_k,
-                "min_p": self.min_p,
-                "rep_pen": self.rep_pen
-            }
-            
-            endpoint = f"{self.api_url}/v1/chat/completions"
-            headers = {
-                "Content-Type": "application/json"
-            }
-            if self.api_password:
-                headers["Authorization"] = f"Bearer {self.api_password}"
-            
-            # Add timeout to prevent hanging (120 seconds should be enough for most LLM responses)
-            response = self.requests.post(
-                endpoint,
-                json=payload,
-                headers=headers,
-                timeout=120
-            )
-            
-            response.raise_for_status()
-            response_json = response.json()
-            
-            if "choices" in response_json and len(response_json["choices"]) > 0:
-                if "message" in response_json["choices"][0]:
-                    return response_json["choices"][0]["message"]["content"]
-                else:
-                    return response_json["choices"][0].get("text", "")
-            return None
-            
-        except Exception as e:
-            print(f"Error in API call: {str(e)}")
-            return None
+        print(f"invalid task: {task}")
+        return None
 
-class BackgroundIndexer(threading.Thread):
-    def __init__(self, root_dir, metadata_queue, file_extensions, no_crawl=False, chunk_size=100):
-        threading.Thread.__init__(self)
-        self.root_dir = root_dir
-        self.metadata_queue = metadata_queue
-        self.file_extensions = file_extensions
-        self.no_crawl = no_crawl
-        self.total_files_found = 0
-        self.indexing_complete = False
-        self.chunk_size = chunk_size
-        self.checkpoint_path = os.path.join(root_dir, ".llmii_checkpoint")
-        self.last_processed_dir = self._load_checkpoint()
+    def build_request(self, task, processed_image, conversation=None):
+        """ The payload and headers for a task, or None if a task is
+            not known. Earlier turns in the conversation are sent first,
+            with the image only in the first one.
+        """
+        turns = (conversation.turns if conversation is not None else []) + [(task, None)]
         
-    def _load_checkpoint(self):
-        """Load directory checkpoint if it exists"""
-        if os.path.exists(self.checkpoint_path):
-            try:
-                with open(self.checkpoint_path, 'r') as f:
-                    return f.read().strip()
-            except:
+        messages = [{"role": "system", "content": self.system_instruction}]
+        for turn_task, answer in turns:
+            instruction = self.get_instruction(turn_task)
+            if instruction is None:
                 return None
-        return None
-        
-    def _save_checkpoint(self, directory):
-        """Save current directory as checkpoint"""
-        try:
-            with open(self.checkpoint_path, 'w') as f:
-                f.write(directory)
-        except:
-            pass
             
-    def run(self):
-        if self.no_crawl:
-            self._index_directory(self.root_dir)
-        else:
-            # Get ordered list of directories to process
-            directories = []
-            for root, _, _ in os.walk(self.root_dir):
-                directories.append(os.path.normpath(root))
+            content = [{"type": "text", "text": instruction}]
+            if len(messages) == 1:
+                content.append({
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:{image_mime(processed_image)};base64,{processed_image}"
+                    }
+                })
+            messages.append({"role": "user", "content": content})
             
-            directories.sort()
+            if answer is not None:
+                messages.append({"role": "assistant", "content": answer})
             
-            # Skip to last processed directory if resuming
-            start_idx = 0
-            if self.last_processed_dir:
-                try:
-                    start_idx = directories.index(self.last_processed_dir) + 1
-                    # If already completed the last directory, just start from beginning
-                    if start_idx >= len(directories):
-                        start_idx = 0
-                except ValueError:
-                    start_idx = 0
-                    
-            for i in range(start_idx, len(directories)):
-                self._index_directory(directories[i])
-                self._save_checkpoint(directories[i])
-                
-        self.indexing_complete = True
-
-    def _index_directory(self, directory):
-        """Process directory in chunks"""
-        directory = os.path.normpath(directory)
-        file_batch = []
+        payload = {
+            "messages": messages,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "top_k": self.top_k,
+            "min_p": self.min_p,
+            "rep_pen": self.rep_pen
+        }
         
+        headers = {
+            "Content-Type": "application/json"
+        }
+        if self.api_password:
+            headers["Authorization"] = f"Bearer {self.api_password}"
+        
+        apply_structured_output(payload, task, self.structured_output)
+        return payload, headers
+
+    def served_model(self):
+        """ The id of the model loaded on the first server, or None if
+            it doesn't say
+        """
         try:
-            for filename in os.listdir(directory):
-                file_path = os.path.normpath(os.path.join(directory, filename))
-                
-                # Skip if not a valid file type
-                if not any(file_path.lower().endswith(ext) for ext in self.file_extensions):
-                    continue
-                        
-                try:
-                    # Check for 0 byte files
-                    size = os.path.getsize(file_path)
-                    if size > 0:
-                        file_batch.append(file_path)
-                        
-                        # When we reach chunk size, send batch to queue
-                        if len(file_batch) >= self.chunk_size:
-                            self.total_files_found += len(file_batch)
-                            self.metadata_queue.put((directory, file_batch))
-                            file_batch = []
-                            
-                except (FileNotFoundError, PermissionError, OSError):
-                    continue
-                    
-            # Don't forget the last batch
-            if file_batch:
-                self.total_files_found += len(file_batch)
-                self.metadata_queue.put((directory, file_batch))
-                
-        except (PermissionError, OSError):
-            print(f"Permission denied or error accessing directory: {directory}")
+            response = self.session.get(f"{self.api_url}/v1/models", timeout=(3, 5))
+            if response.status_code == 200:
+                models = response.json().get("data") or []
+                if models:
+                    return models[0].get("id")
+        except (requests.RequestException, ValueError, AttributeError):
+            pass
+        return None
 
+    def cache_model_id(self):
+        """ The model answers are cached for, asked of the first server
+            once. AsyncLLMProcessor looks it up on its event loop before
+            the first cached request.
+        """
+        with self.model_id_lock:
+            if self.model_id is None:
+                self.model_id = LLMProcessor.served_model(self) or ""
+            return self.model_id
 
-class FileProcessor:
-    def __init__(self, config, check_paused_or_stopped=None, callback=None):
-        self.config = config
-        self.llm_processor = LLMProcessor(config)
-        
-        if check_paused_or_stopped is None:
-            self.check_paused_or_stopped = lambda: False
+    def cache_key(self, payload, task, image_key, conversation=None):
+        """ The response cache key for a request, or None if its answer
+            should not be reused. image_key identifies the image without
+            the metadata in its file, requests without one are not
+            cached. Sampled answers are only reused when the cache is
+            set to all.
+        """
+        if self.response_cache is None or image_key is None:
+            return None
+        if self.response_cache_mode == "deterministic" and payload.get("temperature") != 0:
+            return None
+        turns = conversation.turns if conversation is not None else []
+        instructions = [self.system_instruction]
+        for turn_task, answer in turns + [(task, None)]:
+            instructions.append([self.get_instruction(turn_task), answer])
+        settings = {name: value for name, value in payload.items() if name != "messages"}
+        return request_key(image_key, instructions, settings, self.cache_model_id())
+
+    def cached_answer(self, key, task, conversation=None):
+        """ The cached answer for key, added to the conversation, or
+            None if it has to be asked for
+        """
+        if key is None or self.refresh_responses:
+            return None
+        answer = self.response_cache.get(key)
+        if answer is None:
+            return None
+        with self.stats_lock:
+            self.cache_hits += 1
+        if conversation is not None:
+            conversation.add(task, answer)
+        return answer
+
+    def cache_report(self):
+        return (
+            f"Response cache: {self.cache_hits} answers reused, {self.cache_stores} stored "
+            f"({self.response_cache_mode}{', refreshing' if self.refresh_responses else ''})"
+        )
+
+    def count_usage(self, response_json):
+        """ Add the tokens a response says it used to the totals
+        """
+        usage = response_json.get("usage") or {}
+        with self.stats_lock:
+            self.prompt_tokens += usage.get("prompt_tokens") or 0
+            self.completion_tokens += usage.get("completion_tokens") or 0
+
+    def parse_response(self, response_json):
+        """ The generated text from a chat completion response
+        """
+        self.model = response_json.get("model") or self.model
+        self.count_usage(response_json)
+        
+        if "choices" in response_json and len(response_json["choices"]) > 0:
+            if "message" in response_json["choices"][0]:
+                return response_json["choices"][0]["message"]["content"]
+            else:
+                return response_json["choices"][0].get("text", "")
+        return None
+
+    def _answered(self, endpoint, task, answer, conversation=None, cache_key=None):
+        """ Count how usable the answer from endpoint was, add it to
+            the conversation and cache it if it can be used
+        """
+        usable = check_answer(task, answer)
+        self.endpoints.record_answer(endpoint, usable)
+        if conversation is not None:
+            conversation.add(task, answer, endpoint)
+        if cache_key is not None and usable != "invalid":
+            self.response_cache.put(cache_key, answer, self.model)
+            with self.stats_lock:
+                self.cache_stores += 1
+        return answer
+
+    def stream_parser(self, task):
+        """ A parser to follow a streamed answer to task with, or None
+            if it should not be streamed. Only JSON answers are worth
+            streaming, they can be cut off as soon as they are complete.
+        """
+        schema = schema_for_task(task)
+        if not self.stream or schema is None:
+            return None
+        return KeywordStreamParser(required=schema["required"])
+
+    def stream_event(self, line, parser, on_keywords=None):
+        """ Feed one line of a server-sent event stream to parser.
+            Returns True once nothing more needs to be read.
+        """
+        event = sse_data(line)
+        if event is None:
+            return False
+        if event == "[DONE]":
+            return True
+        
+        self.model = event.get("model") or self.model
+        self.count_usage(event)
+        if parser.feed(stream_delta(event)) and on_keywords is not None:
+            on_keywords(list(parser.keywords))
+        
+        if parser.complete:
+            with self.stats_lock:
+                self.early_stops += 1
+            return True
+        return False
+
+    def describe_content(self, task="", processed_image=None, conversation=None, on_keywords=None, image_key=None):
+        """ Ask the LLM to do a task for an image. With a conversation,
+            the task is asked as a follow-up to its earlier turns and
+            the answer added to it.
+            
+            When streaming, on_keywords is called with the keywords so
+            far each time one is finished. image_key identifies the image
+            for the response cache.
+        """
+        if not processed_image:
+            print("No image to describe.")
+            
+            return None
+        
+        request = self.build_request(task, processed_image, conversation)
+        if request is None:
+            return None
+        payload, headers = request
+        
+        cache_key = self.cache_key(payload, task, image_key, conversation)
+        answer = self.cached_answer(cache_key, task, conversation)
+        if answer is not None:
+            return answer
+        
+        unreachable = []
+        while True:
+            endpoint = self.endpoints.acquire(exclude=unreachable, prefer=conversation and conversation.endpoint)
+            started = time.monotonic()
+            ok = False
+            
+            parser = self.stream_parser(task)
+            
+            try:
+                # Connect fails fast, the read timeout covers generation
+                with self.session.post(
+                    f"{endpoint.url}{CHAT_COMPLETIONS_PATH}",
+                    json=dict(payload, stream=True) if parser else payload,
+                    headers=headers,
+                    timeout=self.timeout,
+                    stream=parser is not None
+                ) as response:
+                    response.raise_for_status()
+                    
+                    if parser is None:
+                        answer = self.parse_response(response.json())
+                    else:
+                        # Leaving early closes the connection, which
+                        # tells the server to stop generating
+                        for line in response.iter_lines():
+                            if self.stream_event(line, parser, on_keywords):
+                                break
+                        answer = parser.result()
+                
+                ok = True
+                return self._answered(endpoint, task, answer, conversation, cache_key)
+                
+            except (requests.ReadTimeout, requests.ConnectionError) as e:
+                if read_timed_out(e):
+                    # The server is there but slow. Another one would
+                    # only generate the same answer again.
+                    ok = None
+                    print(f"Error in API call: no answer within {self.timeout[1]} seconds from {endpoint.url}")
+                    return None
+                
+                # Send it to another server if there is one left to try
+                unreachable.append(endpoint)
+                if len(unreachable) < len(self.endpoints):
+                    print(f"Could not reach {endpoint.url}, trying another endpoint")
+                    continue
+                print(f"Error in API call: {str(e)}")
+                return None
+                
+            except Exception as e:
+                print(f"Error in API call: {str(e)}")
+                return None
+                
+            finally:
+                self.endpoints.release(endpoint, time.monotonic() - started, ok)
+
+    def describe_tasks(self, tasks, processed_image, mode="sequential", on_keywords=None, image_key=None):
+        """ Answers to several tasks about the same image, in order.
+            
+            sequential sends the requests one after another.
+            concurrent sends them all at once, so they are worked on in
+            parallel slots. multiturn asks them one after another as a
+            single conversation, so a server that caches prompts (KoboldCpp,
+            llama.cpp) only processes the image for the first one.
+        """
+        if mode == "concurrent" and len(tasks) > 1:
+            with self.executor_lock:
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(thread_name_prefix="llmii-request")
+            futures = [self.executor.submit(self.describe_content, task, processed_image, None, on_keywords, image_key) for task in tasks[1:]]
+            return [self.describe_content(tasks[0], processed_image, None, on_keywords, image_key)] + [future.result() for future in futures]
+        
+        conversation = Conversation() if mode == "multiturn" else None
+        return [self.describe_content(task, processed_image, conversation, on_keywords, image_key) for task in tasks]
+
+    def close(self):
+        with self.executor_lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+                self.executor = None
+        if self.response_cache is not None:
+            self.response_cache.commit()
+        self.endpoints.close()
+        self.session.close()
+
+# What the indexer learned about a file while listing its directory, so
+# later stages don't have to ask the filesystem again
+FileStat = namedtuple("FileStat", ["size", "mtime_ns", "sidecar"])
+
+class BackgroundIndexer(threading.Thread):
+    def __init__(self, root_dir, metadata_queue, file_extensions, no_crawl=False, chunk_size=100, file_index=None, incremental=False):
+        threading.Thread.__init__(self)
+        self.root_dir = root_dir
+        self.metadata_queue = metadata_queue
+        self.file_extensions = frozenset(ext.lower() for ext in file_extensions)
+        self.no_crawl = no_crawl
+        self.total_files_found = 0
+        self.indexing_complete = False
+        self.chunk_size = chunk_size
+        self.checkpoint_path = os.path.join(root_dir, ".llmii_checkpoint")
+        self.last_processed_dir = self._load_checkpoint()
+        
+        # Directory states from the last completed scan live in the file
+        # index. In incremental mode a directory whose mtime has not
+        # changed is not listed again.
+        self.file_index = file_index
+        self.incremental = incremental and file_index is not None
+        self.scanned_dirs = {}
+        self.skipped_dirs = 0
+        self.skipped_files = 0
+        
+    def _load_checkpoint(self):
+        """Load directory checkpoint if it exists"""
+        if os.path.exists(self.checkpoint_path):
+            try:
+                with open(self.checkpoint_path, 'r') as f:
+                    return f.read().strip()
+            except:
+                return None
+        return None
+        
+    def _save_checkpoint(self, directory):
+        """Save current directory as checkpoint"""
+        try:
+            with open(self.checkpoint_path, 'w') as f:
+                f.write(directory)
+        except:
+            pass
+    
+    def _clear_checkpoint(self):
+        try:
+            os.remove(self.checkpoint_path)
+        except OSError:
+            pass
+    
+    def _resume_directory(self):
+        """ The checkpointed directory to resume after, if it is still
+            somewhere under the root
+        """
+        if self.no_crawl or not self.last_processed_dir:
+            return None
+        
+        root = os.path.normpath(self.root_dir)
+        directory = os.path.normpath(self.last_processed_dir)
+        if not directory.startswith(os.path.join(root, "")) and directory != root:
+            return None
+        if not os.path.isdir(directory):
+            return None
+        return directory
+    
+    def _scan_directory(self, directory):
+        """ List a directory once, keeping the stat data that comes with
+            each entry. Returns the files to index sorted by path, their
+            FileStat by path, and the sorted subdirectories. Files is
+            None if the directory can't be read.
+        """
+        found = []
+        subdirs = []
+        names = set()
+        
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    names.add(entry.name)
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(os.path.normpath(entry.path))
+                            
+                        # Skip if not a valid file type
+                        elif os.path.splitext(entry.name)[1].lower() in self.file_extensions and entry.is_file():
+                            stat = entry.stat()
+                            
+                            # Check for 0 byte files
+                            if stat.st_size > 0:
+                                found.append((os.path.normpath(entry.path), entry.name, stat))
+                                
+                    except OSError:
+                        continue
+                        
+        except OSError:
+            print(f"Permission denied or error accessing directory: {directory}")
+            return None, {}, []
+        
+        found.sort()
+        subdirs.sort()
+        files = [file_path for file_path, _, _ in found]
+        file_stats = {
+            file_path: FileStat(stat.st_size, stat.st_mtime_ns, name + ".xmp" in names)
+            for file_path, name, stat in found
+        }
+        return files, file_stats, subdirs
+    
+    def _queue_files(self, directory, files, file_stats):
+        """Send a directory's files to the queue in chunks"""
+        for i in range(0, len(files), self.chunk_size):
+            file_batch = files[i:i + self.chunk_size]
+            self.total_files_found += len(file_batch)
+            self.metadata_queue.put((directory, file_batch, file_stats))
+    
+    def run(self):
+        """ Walk the tree depth first in sorted order, queueing each
+            directory's files as soon as it has been listed.
+        """
+        # Skip up to the last processed directory if resuming
+        resume_dir = self._resume_directory()
+        stack = [os.path.normpath(self.root_dir)]
+        
+        while stack:
+            directory = stack.pop()
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue
+            
+            stored = self.file_index.lookup_dir(directory) if self.incremental else None
+            if stored and stored["mtime_ns"] == mtime_ns:
+                subdirs = stored["subdirs"]
+                if resume_dir is None:
+                    self.skipped_dirs += 1
+                    self.skipped_files += stored["file_count"]
+            else:
+                files, file_stats, subdirs = self._scan_directory(directory)
+                if resume_dir is None and files is not None:
+                    self._queue_files(directory, files, file_stats)
+                    self.scanned_dirs[directory] = (mtime_ns, len(files), subdirs)
+            
+            if resume_dir is None:
+                self._save_checkpoint(directory)
+            elif directory == resume_dir:
+                resume_dir = None
+            
+            if not self.no_crawl:
+                stack.extend(reversed(subdirs))
+        
+        # Everything has been queued, so the next run starts from the top
+        self._clear_checkpoint()
+        self.indexing_complete = True
+    
+    def save_directory_states(self):
+        """ Remember the directories scanned in this run so the next
+            incremental scan can skip them. Call once every file has
+            been processed and written. A directory is only stored when
+            all of its files are done, and writing metadata changes its
+            mtime, so the mtime is read again here. If it changed for
+            another reason the directory is listed once more to make
+            sure no file was added.
+        """
+        if self.file_index is None:
+            return 0
+        
+        saved = 0
+        for directory, (mtime_ns, file_count, subdirs) in self.scanned_dirs.items():
+            try:
+                current_mtime_ns = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue
+            
+            if self.file_index.count_done(directory) < file_count:
+                continue
+            if current_mtime_ns != mtime_ns:
+                files, _, current_subdirs = self._scan_directory(directory)
+                if files is None or len(files) != file_count or current_subdirs != subdirs:
+                    continue
+                    
+            self.file_index.record_dir(directory, current_mtime_ns, file_count, subdirs)
+            saved += 1
+            
+        self.file_index.commit()
+        return saved
+
+
+class FileProcessor:
+    def __init__(self, config, check_paused_or_stopped=None, callback=None):
+        self.config = config
+        
+        if check_paused_or_stopped is None:
+            self.check_paused_or_stopped = lambda: False
         else:
             self.check_paused_or_stopped = check_paused_or_stopped
             
@@ -645,17 +1343,99 @@ class FileProcessor:
         else:
             self.callback = callback
         
+        # Keywords streamed in while generating only go to a callback
+        # that was handed in, printing them would flood the console
+        self.report_partial = callback is not None
+        # Likewise files the index skips are still shown to a callback
+        # that was handed in, such as the GUI's history
+        self.report_skipped = callback is not None
+        
+        self.llm_processor = make_llm_processor(config, self.callback)
+        
         self.files_in_queue = 0
         self.total_processing_time = 0
         self.files_processed = 0
         self.files_completed = 0
+        self.files_retried = 0  # Each one cost a full extra inference
+        self.files_failed = 0
+        
+        # Near-duplicates of an image described earlier in the run are
+        # given its metadata instead of being described themselves
+        self.near_duplicates = None
+        if getattr(config, 'near_duplicates', False):
+            self.near_duplicates = NearDuplicateIndex(
+                threshold=getattr(config, 'duplicate_threshold', 6),
+                method=getattr(config, 'duplicate_hash', 'dhash')
+            )
+        self.done_statuses = tuple(
+            status for status in DONE_STATUSES
+            if not (status == DUPLICATE_STATUS and getattr(config, 'reprocess_duplicates', False))
+        )
         
-        self.image_processor = ImageProcessor(max_dimension=self.config.res_limit, patch_sizes=[14])
+        # Files flow through three stages: prepare (decode/resize), infer
+        # (LLM requests, several in flight when the server has more than
+        # one slot) and write. Bounded queues between the stages apply
+        # backpressure so only a few prepared images are held in memory.
+        self.parallel = max(1, int(getattr(config, 'parallel', 1) or 1))
+        self.decode_workers = max(1, int(getattr(config, 'decode_workers', 2) or 1))
+        self.stats_lock = threading.Lock()
+        self.in_flight = []
+        self.stopped = threading.Event()  # Set once the user stops processing
         
+        # The async client works on files as coroutines on its event loop.
+        # One thread hands them over; the client's concurrency is the only
+        # limit on files in flight, and on prepared images held in memory.
+        self.async_infer = hasattr(self.llm_processor, 'submit')
+        if self.async_infer:
+            self.infer_concurrency = self.llm_processor.concurrency
+            self.infer_slots = threading.BoundedSemaphore(self.infer_concurrency)
+            self.infer_stage = PipelineStage("infer", self._infer_stage, workers=1, concurrency=self.infer_concurrency)
+        else:
+            self.infer_concurrency = self.parallel
+            self.infer_stage = PipelineStage("infer", self._infer_stage, workers=self.parallel)
+        self.pipeline = Pipeline([
+            PipelineStage("prepare", self._prepare_stage, workers=self.decode_workers),
+            self.infer_stage,
+            # Room for every file in flight, so finishing one never waits
+            PipelineStage("write", self._write_stage, workers=1, queue_size=self.infer_concurrency + 2),
+        ])
+        
+        # ExifTool runs as a single persistent process and is not thread safe.
+        # It is started by the metadata writer once a file needs writing.
         self.et = exiftool.ExifToolHelper(encoding='utf-8')
+        self.et_lock = threading.RLock()
+        
+        # Metadata is read by its own small pool of ExifTool processes
+        # so reads run in parallel and never wait on writes. They start
+        # on the first read, a run where the index skips every file
+        # starts none.
+        self.reader_pool = ExifToolPool(size=getattr(config, 'read_workers', 2) or 1)
+        
+        # Images are sized for the model when it is in the model list.
+        # RAW previews are pulled out by the reader pool's ExifTools.
+        self.model_profile = find_model_profile(getattr(config, 'model_profile', None) or self.llm_processor.served_model())
+        self.image_processor = make_image_processor(
+            self.config.res_limit, self.model_profile,
+            preview_extractor=self.reader_pool.get_binary_tags,
+            **image_options(config)
+        )
+        if self.model_profile is not None:
+            self.callback(f"Sizing images for {self.model_profile['model']}, up to {self.image_processor.max_dimension} pixels")
+        
+        # Finished files are written in groups by a write-behind queue.
+        # A file only leaves the in-flight list once it is on disk.
+        self.metadata_writer = MetadataWriter(
+            self.et,
+            self.et_lock,
+            params=self._write_params(),
+            batch_size=getattr(config, 'write_batch_size', 16) or 1,
+            dry_run=self.config.dry_run,
+            on_result=self._write_finished
+        )
         
         # Words in the prompt tend to get repeated back by certain models
-        self.banned_words = ["no", "unspecified", "unknown", "unidentified", "identify", "topiary", "themes concepts", "items animals", "animals objects", "structures landmarks", "Foreground and background", "notable colors", "textures styles", "actions activities", "physical appearance", "Gender", "Age range", "visibly apparent", "apparent ancestry", "Occupation/role", "Relationships between individuals", "Emotions expressions", "body language"]
+        self.banned_words = list(BANNED_WORDS)
+        self.keyword_normalizer = keyword_normalizer(config, self.banned_words)
                 
         self.keyword_fields = [
             "Keywords",
@@ -693,21 +1473,66 @@ class FileProcessor:
         ]
         
         self.image_extensions = config.image_extensions
+        self.extension_types = {
+            ext.lower(): file_type
+            for file_type, extensions in self.image_extensions.items()
+            for ext in extensions
+        }
         self.metadata_queue = queue.Queue()
 
         chunk_size = getattr(config, 'chunk_size', 100)
         
+        # Index of processed files next to the checkpoints. Files that are
+        # unchanged since they were recorded as done are skipped without
+        # reading their metadata. A dry run only reads an index that is
+        # already there, it never writes to the directory.
+        self.file_index = None
+        index_exists = os.path.exists(os.path.join(config.directory, INDEX_FILENAME))
+        if not getattr(config, 'no_index', False) and (index_exists or not config.dry_run):
+            try:
+                self.file_index = FileIndex(
+                    config.directory,
+                    use_hash=getattr(config, 'index_hash', False),
+                    read_only=config.dry_run
+                )
+                if getattr(config, 'rebuild_index', False) and not config.dry_run:
+                    self.file_index.clear()
+                    self.callback("File index cleared, it will be rebuilt from file metadata")
+            except Exception as e:
+                self.callback(f"File index unavailable: {str(e)}")
+                self.file_index = None
+        
+        # Reprocessing has to look at every file again
+        incremental = (
+            getattr(config, 'incremental', False)
+            and not config.reprocess_all
+            and not config.reprocess_failed
+            and not getattr(config, 'reprocess_duplicates', False)
+        )
+        if incremental and self.file_index is None:
+            self.callback("Incremental scan needs the file index, scanning every directory")
+        
         self.indexer = BackgroundIndexer(
             config.directory, 
             self.metadata_queue, 
             [ext for exts in self.image_extensions.values() for ext in exts], 
             config.no_crawl,
-            chunk_size=chunk_size
+            chunk_size=chunk_size,
+            file_index=self.file_index,
+            incremental=incremental
         )
         
         self.file_checkpoint_path = os.path.join(config.directory, ".llmii_file_checkpoint")
         self.last_processed_file = self._load_file_checkpoint()
         
+        self.prompt_hash = prompt_hash(
+            config.system_instruction,
+            config.instruction,
+            config.caption_instruction,
+            config.keyword_instruction,
+            getattr(config, 'generation_mode', 'both')
+        )
+        
         self.indexer.start()
         
     def _load_file_checkpoint(self):
@@ -728,14 +1553,392 @@ class FileProcessor:
         except:
             pass
     
+    def _start_in_flight(self, file_path):
+        """ Track a file handed to the worker pool. The checkpoint
+            always points at the oldest file that has not finished.
+        """
+        with self.stats_lock:
+            self.in_flight.append(file_path)
+            self._save_file_checkpoint(self.in_flight[0])
+    
+    def _finish_in_flight(self, file_path):
+        """ Stop tracking a finished file and move the checkpoint
+            forward, clearing it when nothing is left in flight.
+        """
+        with self.stats_lock:
+            if file_path in self.in_flight:
+                self.in_flight.remove(file_path)
+            
+            if self.in_flight:
+                self._save_file_checkpoint(self.in_flight[0])
+            elif os.path.exists(self.file_checkpoint_path):
+                os.remove(self.file_checkpoint_path)
+    
+    def _submit_file(self, metadata, file_stat=None):
+        """ Hand a file to the pipeline along with the FileStat the
+            indexer found it with. Blocks while the first stage is
+            full. Returns False if the user stopped processing while
+            waiting.
+        """
+        self.pipeline.start()
+        self.metadata_writer.start()
+        
+        file_path = metadata["SourceFile"]
+        self._start_in_flight(file_path)
+        
+        while not self.pipeline.offer((metadata, file_stat), timeout=0.5):
+            if self.check_pause_stop():
+                self._finish_in_flight(file_path)
+                return False
+        
+        return True
+    
+    def _wait_for_workers(self):
+        """ Drain the pipeline so every file handed to it is finished,
+            write whatever is still queued and report how busy each
+            stage was.
+        """
+        if not self.pipeline.running:
+            self.metadata_writer.close()
+            return
+        
+        self.pipeline.close()
+        self.metadata_writer.close()
+        self.callback(self.pipeline.utilization_report())
+        self.callback(
+            f"Generation: {self.files_retried} files retried, {self.files_failed} failed, "
+            f"{self.llm_processor.early_stops} answers stopped early "
+            f"(structured output: {self.llm_processor.structured_output})"
+        )
+        self.callback(self.llm_processor.endpoints.report())
+        if self.near_duplicates is not None:
+            self.callback(
+                f"Near-duplicates: {self.near_duplicates.matched} files given the metadata of an earlier image "
+                f"({self.near_duplicates.method}, within {self.near_duplicates.threshold} bits)"
+            )
+        self.callback(self.image_processor.report())
+        if self.image_processor.cache is not None:
+            self.callback(self.image_processor.cache.report())
+        if self.llm_processor.response_cache is not None:
+            self.callback(self.llm_processor.cache_report())
+        self.callback(f"---")
+    
+    def _stop_requested(self):
+        """ Waits while paused and tells whether the user stopped
+            processing. Stages drop the files still queued without
+            reporting an error for each of them.
+        """
+        if self.stopped.is_set():
+            return True
+        try:
+            return self.check_pause_stop()
+        except Exception:
+            return True
+    
+    def _prepare_stage(self, item):
+        """ Pipeline stage one: decode and resize the image
+        """
+        metadata, file_stat = item
+        if self._stop_requested():
+            self._finish_in_flight(metadata["SourceFile"])
+            return None
+        
+        try:
+            job = self.prepare_file(metadata, file_stat)
+        except Exception as e:
+            self.callback(f"<b>Error processing:</b> {metadata.get('SourceFile')}: {str(e)}")
+            self.callback(f"---")
+            job = None
+        
+        if job is None:
+            self._finish_in_flight(metadata["SourceFile"])
+        return job
+    
+    def _infer_stage(self, job):
+        """ Pipeline stage two: generate metadata with the LLM
+        """
+        file_path = job["file_path"]
+        if self._stop_requested():
+            self._finish_in_flight(file_path)
+            return None
+        
+        if self.async_infer:
+            self.infer_slots.acquire()
+            done = self.infer_stage.defer()
+            future = self.llm_processor.submit(self.infer_file_async(job))
+            future.add_done_callback(lambda future: self._infer_finished(future, file_path, done))
+            return None
+        
+        try:
+            job = self.infer_file(job)
+        except Exception as e:
+            self.callback(f"<b>Error processing:</b> {file_path}: {str(e)}")
+            self.callback(f"---")
+            job = None
+        
+        if job is None:
+            self._finish_in_flight(file_path)
+        return job
+    
+    def _infer_finished(self, future, file_path, done):
+        """ Called on the event loop when infer_file_async is done,
+            passes the job on to the write stage
+        """
+        try:
+            job = future.result()
+        except Exception as e:
+            self.callback(f"<b>Error processing:</b> {file_path}: {str(e)}")
+            self.callback(f"---")
+            job = None
+        
+        if job is None:
+            self._finish_in_flight(file_path)
+        try:
+            done(job)
+        finally:
+            self.infer_slots.release()
+    
+    def _write_stage(self, job):
+        """ Pipeline stage three: queue metadata for writing and report
+            the result. Results that reached this stage are always
+            written, even when the user has stopped processing.
+        """
+        queued = False
+        try:
+            queued = self.finish_file(job)
+        except Exception as e:
+            self.callback(f"<b>Error processing:</b> {job['file_path']}: {str(e)}")
+            self.callback(f"---")
+        finally:
+            # Queued files leave the in-flight list once they are written
+            if not queued:
+                self._finish_in_flight(job["file_path"])
+        return None
+    
+    def _write_finished(self, job, success):
+        """ Called by the metadata writer for every file it wrote
+        """
+        file_path = job["file_path"]
+        try:
+            if not success:
+                self.callback(f"\nError writing metadata to {file_path}")
+                self.callback(f"---")
+                job["save_status"] = "pending"
+            elif not self.config.dry_run:
+                self._record_in_index(file_path, job["updated_metadata"], self.llm_processor.model)
+            self.report_file(job)
+        finally:
+            self._finish_in_flight(file_path)
+    
+    def _record_in_index(self, file_path, metadata, model=None):
+        if self.file_index is None or self.config.dry_run:
+            return
+        try:
+            self.file_index.record(
+                file_path,
+                metadata.get("XMP:Identifier"),
+                metadata.get("XMP:Status"),
+                model=model,
+                prompt=self.prompt_hash if model else None,
+                caption=metadata.get("MWG:Description"),
+                keywords=metadata.get("MWG:Keywords")
+            )
+        except Exception as e:
+            print(f"File index error for {file_path}: {str(e)}")
+    
+    def _skip_indexed(self, files, file_stats=None, quiet=False):
+        """ Drop files the index knows are done and unchanged.
+            Returns the files that still need their metadata read, and
+            the metadata of the dropped ones to report when skipped
+            files are shown. Files recorded without their caption and
+            keywords are read as before in that case.
+        """
+        if self.file_index is None or self.config.reprocess_all:
+            return files, []
+        
+        try:
+            entries = self.file_index.lookup_many(files, file_stats)
+        except Exception as e:
+            print(f"File index error: {str(e)}")
+            return files, []
+        
+        done = {
+            path: entry for path, entry in entries.items()
+            if entry["status"] in self.done_statuses and (not self.report_skipped or entry["keywords"] is not None)
+        }
+        if not done:
+            return files, []
+        
+        self.files_processed += len(done)
+        if not quiet:
+            self.callback(f"Skipped {len(done)} unchanged files that are already done")
+            self.callback(f"---")
+        
+        known = []
+        if self.report_skipped:
+            # The same fields _process_files takes from ExifTool
+            for path, entry in done.items():
+                metadata = {"SourceFile": path}
+                if entry["keywords"]:
+                    metadata["MWG:Keywords"] = entry["keywords"]
+                if entry["caption"]:
+                    metadata["MWG:Description"] = entry["caption"]
+                metadata["XMP:Status"] = entry["status"]
+                if entry["uuid"]:
+                    metadata["XMP:Identifier"] = entry["uuid"]
+                known.append(metadata)
+        return [f for f in files if f not in done], known
+    
+    def _process_files(self, files, file_stats=None, quiet=False):
+        """ Read metadata for files in batches and hand each one to
+            the pipeline. Returns False if processing was stopped.
+        """
+        batch_size = 50 
+        for i in range(0, len(files), batch_size):
+            batch, known = self._skip_indexed(files[i:i+batch_size], file_stats, quiet)
+            for metadata in known:
+                # Shown like files found done by reading them, without an image
+                file_stat = file_stats.get(metadata["SourceFile"]) if file_stats else None
+                if not self._submit_file(metadata, file_stat):
+                    return False
+            if not batch:
+                continue
+            metadata_list = self._get_metadata_batch(batch, file_stats)
+            
+            for metadata in metadata_list:
+                if metadata:
+                    if not self.config.skip_verify:
+                        # Check ExifTool validation
+                        if "ExifTool:Validate" in metadata:
+                            errors, warnings, minor = map(int, metadata.get("ExifTool:Validate", "0 0 0").split())
+                            source_file = metadata.get("SourceFile")
+                            
+                            if errors > 0:
+                                print(f"{source_file}: failed to validate. Skipping!")
+                                self.callback(f"\n{source_file}: failed to validate. Skipping!")
+                                self.callback(f"---")
+                                self.files_processed +=1
+                                continue
+                                           
+                    # Process metadata
+                    keywords = []
+                    status = None
+                    identifier = None
+                    caption = None
+                    
+                    # Make a copy with only the fields we want to write
+                    new_metadata = {}
+                    
+                    # Check if we actually have a sidecar in the path
+                    if self.config.use_sidecar and metadata["SourceFile"].lower().endswith(".xmp"):
+                        metadata["SourceFile"] = os.path.splitext(metadata["SourceFile"])[0]
+                          
+                    new_metadata["SourceFile"] = metadata.get("SourceFile")
+                    
+                    # Collect keywords and caption from all fields (original working behavior)
+                    # This ensures we read metadata regardless of which field ExifTool returns it in
+                    for key, value in metadata.items():
+                        if key in self.keyword_fields:
+                            keywords.extend(value)
+                        if key in self.caption_fields:
+                            caption = value
+                        if key in self.identifier_fields:
+                            identifier = value
+                        if key in self.status_fields:
+                            status = value
+                    
+                    # Deduplicate keywords immediately after collection to prevent duplicates from multiple fields
+                    if keywords:
+                        seen = {}
+                        deduplicated = []
+                        for kw in keywords:
+                            if kw:  # Skip empty strings
+                                kw_lower = kw.lower().strip()
+                                if kw_lower and kw_lower not in seen:
+                                    seen[kw_lower] = kw
+                                    deduplicated.append(kw)
+                        keywords = deduplicated
+                            
+                    # Standardize the fields                             
+                    if keywords:
+                        new_metadata["MWG:Keywords"] = keywords
+                    if caption:
+                        new_metadata["MWG:Description"] = caption
+                    if status:
+                        new_metadata["XMP:Status"] = status
+                    if identifier:
+                        new_metadata["XMP:Identifier"] = identifier
+                        
+                    self.files_processed += 1
+                    
+                    # Checkpoint is kept by the worker pool while the file is in flight
+                    file_stat = file_stats.get(new_metadata["SourceFile"]) if file_stats else None
+                    if not self._submit_file(new_metadata, file_stat):
+                        return False
+
+                if self.check_pause_stop():
+                    return False
+        
+        return True
+    
+    def _open_watcher(self):
+        return open_watcher(
+            self.config.directory,
+            self.extension_types.keys(),
+            recursive=not self.config.no_crawl,
+            poll=getattr(self.config, 'watch_poll', False),
+            interval=getattr(self.config, 'watch_interval', 5.0)
+        )
+    
+    def watch_directory(self, watcher):
+        """ Process new and changed files as they show up until stopped.
+            ExifTool, the reader pool and the pipeline stay running
+            between files, so a dropped file is tagged within seconds.
+        """
+        debouncer = Debouncer(settle=getattr(self.config, 'watch_settle', 2.0))
+        self.callback(f"Watching {self.config.directory} for new files ({watcher.name})")
+        self.callback(f"---")
+        
+        while True:
+            if self.check_pause_stop():
+                return
+            
+            for file_path in watcher.poll(timeout=0.5):
+                debouncer.touch(file_path)
+            
+            settled = debouncer.ready()
+            if not settled:
+                continue
+            
+            files = sorted(settled)
+            file_stats = {
+                file_path: FileStat(
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    self.config.use_sidecar and os.path.exists(file_path + ".xmp")
+                )
+                for file_path, stat in settled.items()
+            }
+            
+            # Our own metadata writes show up here too. The file index
+            # drops those without a word.
+            self.indexer.total_files_found += len(files)
+            if not self._process_files(files, file_stats, quiet=True):
+                return
+    
     def process_directory(self, directory):
+        completed = False
+        
+        # Start watching before the first pass so nothing dropped
+        # in the meantime is missed
+        watcher = self._open_watcher() if getattr(self.config, 'watch', False) else None
         try:
             while not (self.indexer.indexing_complete and self.metadata_queue.empty()):
                 if self.check_pause_stop():
                     return
                 
                 try:
-                    directory, files = self.metadata_queue.get(timeout=1)
+                    directory, files, file_stats = self.metadata_queue.get(timeout=1)
                     self.callback(f"Processing directory: {directory}")
                     self.callback(f"---")
                     
@@ -752,96 +1955,44 @@ class FileProcessor:
                             # File not in this batch, process normally
                             pass
                     
-                    batch_size = 50 
-                    for i in range(0, len(files), batch_size):
-                        batch = files[i:i+batch_size]
-                        metadata_list = self._get_metadata_batch(batch)
-                        
-                        for metadata in metadata_list:
-                            if metadata:
-                                if not self.config.skip_verify:
-                                    # Check ExifTool validation
-                                    if "ExifTool:Validate" in metadata:
-                                        errors, warnings, minor = map(int, metadata.get("ExifTool:Validate", "0 0 0").split())
-                                        source_file = metadata.get("SourceFile")
-                                        
-                                        if errors > 0:
-                                            print(f"{source_file}: failed to validate. Skipping!")
-                                            self.callback(f"\n{source_file}: failed to validate. Skipping!")
-                                            self.callback(f"---")
-                                            self.files_processed +=1
-                                            continue
-                                                       
-                                # Process metadata
-                                keywords = []
-                                status = None
-                                identifier = None
-                                caption = None
-                                
-                                # Make a copy with only the fields we want to write
-                                new_metadata = {}
-                                
-                                # Check if we actually have a sidecar in the path
-                                if self.config.use_sidecar and metadata["SourceFile"].lower().endswith(".xmp"):
-                                    metadata["SourceFile"] = os.path.splitext(metadata["SourceFile"])[0]
-                                      
-                                new_metadata["SourceFile"] = metadata.get("SourceFile")
-                                
-                                # Collect keywords and caption from all fields (original working behavior)
-                                # This ensures we read metadata regardless of which field ExifTool returns it in
-                                for key, value in metadata.items():
-                                    if key in self.keyword_fields:
-                                        keywords.extend(value)
-                                    if key in self.caption_fields:
-                                        caption = value
-                                    if key in self.identifier_fields:
-                                        identifier = value
-                                    if key in self.status_fields:
-                                        status = value
-                                
-                                # Deduplicate keywords immediately after collection to prevent duplicates from multiple fields
-                                if keywords:
-                                    seen = {}
-                                    deduplicated = []
-                                    for kw in keywords:
-                                        if kw:  # Skip empty strings
-                                            kw_lower = kw.lower().strip()
-                                            if kw_lower and kw_lower not in seen:
-                                                seen[kw_lower] = kw
-                                                deduplicated.append(kw)
-                                    keywords = deduplicated
-                                        
-                                # Standardize the fields                             
-                                if keywords:
-                                    new_metadata["MWG:Keywords"] = keywords
-                                if caption:
-                                    new_metadata["MWG:Description"] = caption
-                                if status:
-                                    new_metadata["XMP:Status"] = status
-                                if identifier:
-                                    new_metadata["XMP:Identifier"] = identifier
-                                    
-                                self.files_processed += 1
-                                
-                                # Save checkpoint before processing file
-                                self._save_file_checkpoint(new_metadata["SourceFile"])
-                                
-                                self.process_file(new_metadata)
-                                
-                                # Clear checkpoint after successful processing
-                                if os.path.exists(self.file_checkpoint_path):
-                                    os.remove(self.file_checkpoint_path)
-
-                            if self.check_pause_stop():
-                                return
+                    if not self._process_files(files, file_stats):
+                        return
                     
                     self.update_progress()
                     
                 except queue.Empty:
                     continue
+                    
+            completed = True
+            
+            if watcher is not None:
+                self.watch_directory(watcher)
         finally:
+            if watcher is not None:
+                watcher.close()
+            
+            self._wait_for_workers()
+            self.llm_processor.close()
+            
+            if self.indexer.skipped_dirs:
+                self.callback(f"Skipped {self.indexer.skipped_dirs} directories ({self.indexer.skipped_files} files) unchanged since the last scan")
+            
+            if self.file_index is not None:
+                # Only a finished run can vouch for the directories it scanned
+                if completed and not self.config.dry_run:
+                    try:
+                        self.indexer.save_directory_states()
+                    except Exception as e:
+                        print(f"Could not save directory states: {str(e)}")
+                self.file_index.close()
+            
+            if self.image_processor.cache is not None:
+                self.image_processor.cache.commit()
+            
             try:
-                self.et.terminate()
+                if self.et.running:
+                    self.et.terminate()
+                self.reader_pool.terminate()
                 self.callback("ExifTool process terminated cleanly")
                 
             except Exception as e:
@@ -857,14 +2008,7 @@ class FileProcessor:
         if not file_ext.startswith("."):
             file_ext = "." + file_ext
         
-        file_ext = file_ext.lower()
-        
-        for file_type, extensions in self.image_extensions.items():
-            if file_ext in [ext.lower() for ext in extensions]:
-                
-                return file_type
-        
-        return None
+        return self.extension_types.get(file_ext.lower())
 
     def check_uuid(self, metadata, file_path):
         """ Very important or we end up processing 
@@ -909,6 +2053,15 @@ class FileProcessor:
                     
                     return metadata
                 
+                # Near-duplicates are shown like finished files until
+                # they are asked to be described themselves
+                if status == DUPLICATE_STATUS:
+                    if getattr(self.config, 'reprocess_duplicates', False):
+                        metadata["XMP:Status"] = None
+                    else:
+                        metadata["_skip_llm"] = True
+                    return metadata
+                
                 # If it is fail, don't do it unless we specifically want to
                 if status == "failed":
                     if self.config.reprocess_failed or self.config.reprocess_all:
@@ -940,19 +2093,35 @@ class FileProcessor:
             return None
                         
     def check_pause_stop(self):
-        if self.check_paused_or_stopped():
-            
-            while self.check_paused_or_stopped():
-                time.sleep(0.1)
+        try:
+            paused = self.check_paused_or_stopped()
+        except Exception:
+            # Stopped, get finished files on disk before unwinding
+            self.stopped.set()
+            self.metadata_writer.flush()
+            raise
+        
+        if paused:
+            self.metadata_writer.flush()
             
-            if self.check_paused_or_stopped():
-                return True
+            try:
+                while self.check_paused_or_stopped():
+                    time.sleep(0.1)
+                
+                if self.check_paused_or_stopped():
+                    self.stopped.set()
+                    return True
+            except Exception:
+                self.stopped.set()
+                raise
         
         return False
 
-    def _get_metadata_batch(self, files):
+    def _get_metadata_batch(self, files, file_stats=None):
         """ Get metadata for a batch of files
-            using persistent ExifTool instance.
+            using the pool of persistent ExifTool readers.
+            file_stats from the indexer says which files have
+            sidecars without asking the filesystem again.
         """
         exiftool_fields = self.keyword_fields + self.caption_fields + self.identifier_fields + self.status_fields 
         
@@ -969,13 +2138,19 @@ class FileProcessor:
                 for file in files:
                     
                     # Check for files named file.ext.xmp for sidecar
-                    if os.path.exists(file + ".xmp"):
+                    if file_stats and file in file_stats:
+                        has_sidecar = file_stats[file].sidecar
+                    else:
+                        has_sidecar = os.path.exists(file + ".xmp")
+                        
+                    if has_sidecar:
                        xmp_files.append(file  + ".xmp")
 
                     else:
                         xmp_files.append(file)
                 files = xmp_files
-            return self.et.get_tags(files, tags=exiftool_fields, params=params)
+            
+            return self.reader_pool.get_tags(files, tags=exiftool_fields, params=params)
             
         except Exception as e:
             print("Exiftool error")
@@ -996,138 +2171,356 @@ class FileProcessor:
     def process_file(self, metadata):
         """ Process a file and update its metadata in one operation.
             This minimizes the number of writes to the file.
-        """
-        try:    
             
-            
-            file_path = metadata["SourceFile"]
+            Runs the three pipeline steps back to back on the calling
+            thread; process_directory runs them as separate stages.
+        """
+        file_path = metadata.get("SourceFile")
+        try:
+            job = self.prepare_file(metadata)
+            if job:
+                job = self.infer_file(job)
+            if job and self.finish_file(job):
+                self.metadata_writer.flush()
                 
-            # If the file doesn't exist anymore, skip it
-            if not os.path.exists(file_path):
-                self.callback(f"File no longer exists: {file_path}")
-                self.callback(f"---")
+            if self.check_pause_stop():
                 return
             
-            metadata = self.check_uuid(metadata, file_path)
-            if not metadata:
-                return
-                
-            image_type = self.get_file_type(os.path.splitext(file_path)[1].lower())
-            if image_type is None:
-                self.callback(f"Not a supported image type: {file_path}")
-                self.callback(f"---")
-                return
-                
-            start_time = time.time()
+        except Exception as e:
+            print(f"<b>Error processing:</b> {file_path}: {str(e)}")
+            self.callback(f"<b>Error processing:</b> {file_path}: {str(e)}")
+            self.callback(f"---")
+            return
+    
+    def prepare_file(self, metadata, file_stat=None):
+        """ Check whether a file needs processing and prepare its image.
+            file_stat is the FileStat the indexer found the file with.
+            Returns a job dict for infer_file, or None if the file
+            should be skipped.
+        """
+        file_path = metadata["SourceFile"]
             
-            # Check if we should skip LLM processing (for already-saved files)
-            skip_llm = metadata.get("_skip_llm", False)
+        # If the file doesn't exist anymore, skip it. A file the indexer
+        # just listed is only opened, and reported if it is gone by then.
+        if file_stat is None and not os.path.exists(file_path):
+            self.callback(f"File no longer exists: {file_path}")
+            self.callback(f"---")
+            return None
+        
+        metadata = self.check_uuid(metadata, file_path)
+        if not metadata:
+            return None
             
-            processed_image, image_path = self.image_processor.process_image(file_path)
+        image_type = self.get_file_type(os.path.splitext(file_path)[1].lower())
+        if image_type is None:
+            self.callback(f"Not a supported image type: {file_path}")
+            self.callback(f"---")
+            return None
             
-            if skip_llm:
-                # Skip LLM processing, use existing metadata
-                # Remove the flag before sending to GUI
-                updated_metadata = metadata.copy()
-                updated_metadata.pop("_skip_llm", None)
-                status = updated_metadata.get("XMP:Status", "success")
-                # File is already saved, so save_status is "saved"
-                save_status = "saved"
-            else:
-                # Normal processing: generate new metadata via LLM
-                updated_metadata = self.generate_metadata(metadata, processed_image)
-               
-                status = updated_metadata.get("XMP:Status")
-                
-                # Retry one time if failed
-                if not self.config.quick_fail and status == "retry":
-                    print(f"Retrying {file_path} once")
-                    self.callback(f"Retrying {file_path}...")
-                    self.callback(f"---")
-                    updated_metadata = self.generate_metadata(metadata, processed_image)      
-                    status = updated_metadata.get("XMP:Status")
-                
-                # If retry didn't work, mark failed
-                if not status == "success":
-                    print(f"failed: {file_path}")
-                    self.callback(f"Retry failed: {file_path}")
-                    self.callback(f"---")
-                    metadata["XMP:Status"] = "failed"
-                    
-                    # Failed files are never auto-written, even if auto_save is on
-                    # (They can be manually saved later if user wants)
-                    return
-                    
-                # Determine save status
-                if self.config.auto_save and not self.config.dry_run:
-                    # Auto-save mode: write immediately
-                    save_status = "saved"
-                    if not self.config.dry_run:
-                        self.write_metadata(file_path, updated_metadata)
-                else:
-                    # Preview mode: don't write, mark as pending
-                    save_status = "pending"
+        start_time = time.time()
+        
+        # Files that are already done only need their metadata reported.
+        # The GUI renders a preview from the path when the user looks
+        # at one, so the image is never decoded here.
+        if metadata.get("_skip_llm"):
+            processed_image = None
+            preparation = None
+            self._record_in_index(file_path, metadata)
+        else:
+            processed_image, image_path = self.image_processor.process_image(file_path, file_stat)
+            preparation = self.image_processor.last_preparation()
+        
+        # Answers are cached by what the image shows, not by the bytes
+        # sent, which change when its file is tagged
+        image_key = None
+        if processed_image and self.llm_processor.response_cache is not None:
+            try:
+                image_key = self._image_key(file_path, file_stat)
+            except OSError as e:
+                print(f"Could not hash {file_path}: {str(e)}")
+        
+        # Hashed from the prepared image, which is small and cheap to decode
+        image_hash = None
+        if self.near_duplicates is not None and processed_image:
+            try:
+                image_hash = self.near_duplicates.hash(processed_image)
+            except (IOError, OSError, ValueError) as e:
+                print(f"Could not hash {file_path}: {str(e)}")
+        
+        return {
+            "file_path": file_path,
+            "metadata": metadata,
+            "processed_image": processed_image,
+            "preparation": preparation,
+            "image_hash": image_hash,
+            "image_key": image_key,
+            "start_time": start_time,
+        }
+    
+    def _image_key(self, file_path, file_stat=None):
+        """ A key for the image prepared from file_path: the hash of the
+            file without its metadata and the settings it was prepared
+            with. The image cache has the hash already, or remembers it.
+        """
+        settings = self.image_processor.cache_settings()
+        cache = self.image_processor.cache
+        if cache is not None:
+            return cache.key(os.path.normpath(file_path), settings, file_stat)
+        return prepared_image_key(file_image_hash(file_path), settings)
+    
+    def infer_file(self, job):
+        """ Generate metadata for a prepared file, retrying once on a
+            bad response. Returns the job with the results filled in, or
+            None if generation failed.
+        """
+        # Check if we should skip LLM processing (for already-saved files)
+        if job["metadata"].get("_skip_llm", False):
+            return self._infer_result(job, None, None)
+        
+        # Near-duplicates of an image described earlier get its metadata
+        group, source = self._match_duplicate(job)
+        if source is not None:
+            return self._infer_result(job, group, source)
+        
+        updated_metadata, status = None, None
+        try:
+            updated_metadata, status = self._generate_with_retry(job["metadata"], job["processed_image"], job["file_path"], job.get("image_key"))
+        finally:
+            self._settle_duplicate(group, updated_metadata, status)
+        return self._infer_result(job, group, None, updated_metadata, status)
+    
+    async def infer_file_async(self, job):
+        """ infer_file on the async client's event loop, so a file
+            waiting on the LLM doesn't hold a thread
+        """
+        if job["metadata"].get("_skip_llm", False):
+            return self._infer_result(job, None, None)
+        
+        group, source = None, None
+        if self.near_duplicates is not None and job.get("image_hash") is not None:
+            group, source = await self.near_duplicates.match_async(job["image_hash"], job["file_path"])
+        if source is not None:
+            return self._infer_result(job, group, source)
+        
+        updated_metadata, status = None, None
+        try:
+            updated_metadata, status = await self._generate_with_retry_async(job["metadata"], job["processed_image"], job["file_path"], job.get("image_key"))
+        finally:
+            self._settle_duplicate(group, updated_metadata, status)
+        return self._infer_result(job, group, None, updated_metadata, status)
+    
+    def _settle_duplicate(self, group, updated_metadata, status):
+        """ Hand a representative's metadata to the images waiting on
+            it, or let them be described themselves if it failed
+        """
+        if group is None:
+            return
+        if status == "success":
+            self.near_duplicates.resolve(group, updated_metadata)
+        else:
+            self.near_duplicates.abandon(group)
+    
+    def _infer_result(self, job, group, source, updated_metadata=None, status=None):
+        """ Fill in the job once its metadata is known: taken from the
+            file when it was already done, from source for a
+            near-duplicate, or generated. Returns None if it failed.
+        """
+        metadata = job["metadata"]
+        file_path = job["file_path"]
+        
+        if metadata.get("_skip_llm", False):
+            # Skip LLM processing, use existing metadata
+            # Remove the flag before sending to GUI
+            updated_metadata = metadata.copy()
+            updated_metadata.pop("_skip_llm", None)
+            status = updated_metadata.get("XMP:Status", "success")
+            # File is already saved, so save_status is "saved"
+            save_status = "saved"
+            write = False
+        else:
+            if source is not None:
+                updated_metadata = self._duplicate_metadata(metadata, source)
+                status = DUPLICATE_STATUS
+                job["duplicate_of"] = group.file_path
             
-            # Send image data to callback for GUI display
-            if self.callback and hasattr(self.callback, '__call__'):
-                
-                # Create a dictionary with image data for GUI
-                image_data = {
-                    'type': 'image_data',
-                    'base64_image': processed_image,
-                    'caption': updated_metadata.get('MWG:Description', ''),
-                    'keywords': updated_metadata.get('MWG:Keywords', []),
-                    'file_path': file_path,
-                    'metadata': updated_metadata,  # Include full metadata for saving later
-                    'save_status': save_status
-                }
+            # If retry didn't work, mark failed
+            if status not in ("success", DUPLICATE_STATUS):
+                print(f"failed: {file_path}")
+                self.callback(f"Retry failed: {file_path}")
+                self.callback(f"---")
+                metadata["XMP:Status"] = "failed"
+                with self.stats_lock:
+                    self.files_failed += 1
                 
-                self.callback(image_data)
+                # Failed files are never auto-written, even if auto_save is on
+                # (They can be manually saved later if user wants)
+                return None
                 
-            print(f"{status}: {file_path}")
-            end_time = time.time()
-            processing_time = end_time - start_time
-            self.total_processing_time += processing_time
-            self.files_completed += 1
-            
-            # Calculate and display progress info
-            in_queue = self.indexer.total_files_found - self.files_processed
-            average_time = self.total_processing_time / self.files_completed
-            time_left = average_time * in_queue
-            time_left_unit = "s"
+            # Determine save status
+            if self.config.auto_save and not self.config.dry_run:
+                # Auto-save mode: write immediately
+                save_status = "saved"
+                write = True
+            else:
+                # Preview mode: don't write, mark as pending
+                save_status = "pending"
+                write = False
+        
+        job["updated_metadata"] = updated_metadata
+        job["status"] = status
+        job["save_status"] = save_status
+        job["write"] = write
+        return job
+    
+    def _generate_with_retry(self, metadata, processed_image, file_path, image_key=None):
+        """ Generate metadata via the LLM, once more if the answer was
+            not usable. Returns the metadata and its status.
+        """
+        updated_metadata = self.generate_metadata(metadata, processed_image, image_key)
+        status = updated_metadata.get("XMP:Status")
+        
+        # Retry one time if failed
+        if self._should_retry(status, file_path):
+            updated_metadata = self.generate_metadata(metadata, processed_image, image_key)      
+            status = updated_metadata.get("XMP:Status")
+        
+        return updated_metadata, status
+    
+    async def _generate_with_retry_async(self, metadata, processed_image, file_path, image_key=None):
+        updated_metadata = await self.generate_metadata_async(metadata, processed_image, image_key)
+        status = updated_metadata.get("XMP:Status")
+        
+        if self._should_retry(status, file_path):
+            updated_metadata = await self.generate_metadata_async(metadata, processed_image, image_key)
+            status = updated_metadata.get("XMP:Status")
+        
+        return updated_metadata, status
+    
+    def _should_retry(self, status, file_path):
+        if self.config.quick_fail or status != "retry":
+            return False
+        
+        print(f"Retrying {file_path} once")
+        with self.stats_lock:
+            self.files_retried += 1
+        self.callback(f"Retrying {file_path}...")
+        self.callback(f"---")
+        return True
+    
+    def _match_duplicate(self, job):
+        """ (group, metadata) from NearDuplicateIndex.match, or
+            (None, None) when near-duplicates are not looked for
+        """
+        if self.near_duplicates is None or job.get("image_hash") is None:
+            return None, None
+        return self.near_duplicates.match(job["image_hash"], job["file_path"])
+    
+    def _duplicate_metadata(self, metadata, source):
+        """ The caption and keywords of source for a near-duplicate,
+            marked so it can be described itself later
+        """
+        return {
+            "MWG:Description": source.get("MWG:Description"),
+            "MWG:Keywords": list(source.get("MWG:Keywords") or []),
+            "XMP:Status": DUPLICATE_STATUS,
+            "XMP:Identifier": metadata.get("XMP:Identifier", str(uuid.uuid4())),
+            "SourceFile": metadata["SourceFile"],
+        }
+    
+    def finish_file(self, job):
+        """ Queue the generated metadata for writing if needed,
+            otherwise report the result straight away. Returns True
+            if the file was queued; the metadata writer reports it
+            once it has been written.
+        """
+        if job["write"]:
+            self.metadata_writer.add(self._write_path(job["file_path"]), job["updated_metadata"], job)
+            return True
+        
+        self.report_file(job)
+        return False
+    
+    def report_file(self, job):
+        """ Report a finished file to the callback and update the
+            progress estimate.
+        """
+        file_path = job["file_path"]
+        processed_image = job["processed_image"]
+        updated_metadata = job["updated_metadata"]
+        status = job["status"]
+        save_status = job["save_status"]
+        
+        # Send image data to callback for GUI display
+        if self.callback and hasattr(self.callback, '__call__'):
             
-            if time_left > 180:
-                time_left = time_left / 60
-                time_left_unit = "mins"
+            # Create a dictionary with image data for GUI
+            image_data = {
+                'type': 'image_data',
+                'base64_image': processed_image,  # None when the preview should be loaded from file_path
+                'caption': updated_metadata.get('MWG:Description', ''),
+                'keywords': updated_metadata.get('MWG:Keywords', []),
+                'file_path': file_path,
+                'metadata': updated_metadata,  # Include full metadata for saving later
+                'save_status': save_status
+            }
             
-            if time_left < 0:
-                time_left = 0
+            self.callback(image_data)
             
-            if in_queue < 0:
-                in_queue = 0
-            if status == "success":
-                 
-                self.callback(f"<b>Image:</b> {os.path.basename(file_path)}")
-                self.callback(f"<b>Status:</b> {status}")
-
-                self.callback(
-                    f"<b>Processing time:</b> {processing_time:.2f}s, <b>Average processing time:</b> {average_time:.2f}s"
-                )
-                self.callback(
-                    f"<b>Processed:</b> {self.files_processed}, <b>In queue:</b> {in_queue}, <b>Time remaining (est):</b> {time_left:.2f}{time_left_unit}"
-                )
-                self.callback("---")   
-                
-            if self.check_pause_stop():
-                return
+        print(f"{status}: {file_path}")
+        end_time = time.time()
+        processing_time = end_time - job["start_time"]
+        
+        with self.stats_lock:
+            self.total_processing_time += processing_time
+            self.files_completed += 1
+            average_time = self.total_processing_time / self.files_completed
+        
+        # Calculate and display progress info
+        # Files in flight overlap, so divide the estimate by how many are
+        in_queue = self.indexer.total_files_found - self.files_processed
+        time_left = average_time * in_queue / self.infer_concurrency
+        time_left_unit = "s"
+        
+        if time_left > 180:
+            time_left = time_left / 60
+            time_left_unit = "mins"
+        
+        if time_left < 0:
+            time_left = 0
+        
+        if in_queue < 0:
+            in_queue = 0
+        if status in ("success", DUPLICATE_STATUS):
+             
+            self.callback(f"<b>Image:</b> {os.path.basename(file_path)}")
+            self.callback(f"<b>Status:</b> {status}")
+            if job.get("duplicate_of"):
+                self.callback(f"<b>Near-duplicate of:</b> {os.path.basename(job['duplicate_of'])}")
             
-        except Exception as e:
-            print(f"<b>Error processing:</b> {file_path}: {str(e)}")
-            self.callback(f"<b>Error processing:</b> {file_path}: {str(e)}")
-            self.callback(f"---")
-            return
+            preparation = job.get("preparation")
+            if preparation:
+                self.callback(f"<b>Image preparation:</b> {preparation['method']}, {preparation['seconds']:.2f}s")
+
+            self.callback(
+                f"<b>Processing time:</b> {processing_time:.2f}s, <b>Average processing time:</b> {average_time:.2f}s"
+            )
+            self.callback(
+                f"<b>Processed:</b> {self.files_processed}, <b>In queue:</b> {in_queue}, <b>Time remaining (est):</b> {time_left:.2f}{time_left_unit}"
+            )
+            self.callback("---")   
+    
+    def _keyword_progress(self, file_path):
+        """ A callback that passes the keywords streamed so far for
+            file_path on to the GUI, or None when not streaming
+        """
+        if not self.report_partial or not self.llm_processor.stream:
+            return None
+        
+        def on_keywords(keywords):
+            self.callback({'type': 'partial_keywords', 'file_path': file_path, 'keywords': keywords})
+        return on_keywords
     
-    def generate_metadata(self, metadata, processed_image):
+    def generate_metadata(self, metadata, processed_image, image_key=None):
         """ Generate metadata without writing to file.
             Returns (metadata_dict)
             
@@ -1138,6 +2531,42 @@ class FileProcessor:
             
             update_caption appends new caption to existing caption to the existing description.
             
+            image_key identifies the image for the response cache.
+        """
+        steps = self._metadata_steps(metadata, processed_image)
+        answers = error = None
+        while True:
+            try:
+                tasks, mode, on_keywords = steps.throw(error) if error else steps.send(answers)
+            except StopIteration as done:
+                return done.value
+            answers = error = None
+            try:
+                answers = self.llm_processor.describe_tasks(tasks, processed_image, mode=mode, on_keywords=on_keywords, image_key=image_key)
+            except Exception as e:
+                error = e
+    
+    async def generate_metadata_async(self, metadata, processed_image, image_key=None):
+        """ generate_metadata on the async client's event loop
+        """
+        steps = self._metadata_steps(metadata, processed_image)
+        answers = error = None
+        while True:
+            try:
+                tasks, mode, on_keywords = steps.throw(error) if error else steps.send(answers)
+            except StopIteration as done:
+                return done.value
+            answers = error = None
+            try:
+                answers = await self.llm_processor.describe_tasks_async(tasks, processed_image, mode=mode, on_keywords=on_keywords, image_key=image_key)
+            except Exception as e:
+                error = e
+    
+    def _metadata_steps(self, metadata, processed_image):
+        """ What generate_metadata does, as a generator that yields the
+            requests it needs as (tasks, mode, on_keywords) and is sent
+            the answers, so the blocking and the async client share it.
+            Returns the metadata.
         """
         new_metadata = {}
         existing_caption = metadata.get("MWG:Description")
@@ -1154,7 +2583,8 @@ class FileProcessor:
             
             if generation_mode == "description_only":
                 # Generate only description
-                detailed_caption = clean_string(self.llm_processor.describe_content(task="caption", processed_image=processed_image))
+                answer, = yield ["caption"], "sequential", None
+                detailed_caption = clean_string(answer)
                 
                 if existing_caption and self.config.update_caption:
                     caption = existing_caption + "<generated>" + detailed_caption + "</generated>"
@@ -1166,7 +2596,8 @@ class FileProcessor:
                 
             elif generation_mode == "keywords_only":
                 # Generate only keywords
-                data = clean_json(self.llm_processor.describe_content(task="keywords_only", processed_image=processed_image))
+                answer, = yield ["keywords_only"], "sequential", self._keyword_progress(file_path)
+                data = clean_json(answer)
                 
                 if isinstance(data, dict):
                     keywords = data.get("Keywords")
@@ -1185,8 +2616,13 @@ class FileProcessor:
                 # Generate both description and keywords
                 if not self.config.no_caption and self.config.detailed_caption:
                     # Use separate instructions for description and keywords
-                    data = clean_json(self.llm_processor.describe_content(task="keywords_only", processed_image=processed_image))
-                    detailed_caption = clean_string(self.llm_processor.describe_content(task="caption", processed_image=processed_image))               
+                    keywords_answer, caption_answer = yield (
+                        ["keywords_only", "caption"],
+                        getattr(self.config, 'detailed_requests', 'sequential'),
+                        self._keyword_progress(file_path)
+                    )
+                    data = clean_json(keywords_answer)
+                    detailed_caption = clean_string(caption_answer)
                     
                     if existing_caption and self.config.update_caption:
                         caption = existing_caption + "<generated>" + detailed_caption + "</generated>"
@@ -1198,7 +2634,8 @@ class FileProcessor:
                         keywords = data.get("Keywords")
                        
                 else:
-                    data = clean_json(self.llm_processor.describe_content(task="caption_and_keywords", processed_image=processed_image))
+                    answer, = yield ["caption_and_keywords"], "sequential", self._keyword_progress(file_path)
+                    data = clean_json(answer)
                              
                     if isinstance(data, dict):
                         keywords = data.get("Keywords")
@@ -1238,6 +2675,19 @@ class FileProcessor:
             
             return metadata
             
+    def _write_params(self):
+        params = ["-P"]
+        
+        if self.config.no_backup or self.config.use_sidecar:
+            params.append("-overwrite_original")
+        
+        return params
+    
+    def _write_path(self, file_path):
+        if self.config.use_sidecar:
+            return file_path + ".xmp"
+        return file_path
+    
     def write_metadata(self, file_path, metadata):
         """Write metadata using persistent ExifTool instance"""
         if self.config.dry_run:
@@ -1246,73 +2696,12 @@ class FileProcessor:
             return True
 
         try:
-            params = ["-P"]
-            
-            if self.config.no_backup or self.config.use_sidecar:
-                params.append("-overwrite_original")
-            if self.config.use_sidecar:
-                file_path = file_path + ".xmp"
-            
-            # FIRST PASS: Use a SEPARATE ExifTool instance for deletion
-            # This prevents any state/cache issues from interfering with deletion
-            # The deletion instance is created, used, and terminated before writing
-            delete_et = None
-            try:
-                # Create a fresh ExifTool instance specifically for deletion
-                delete_et = exiftool.ExifToolHelper(encoding='utf-8')
-                
-                # Delete ALL keyword and description fields comprehensively
-                # Use comprehensive list of all possible fields to ensure complete deletion
-                delete_params = [
-                    "-Keywords=",
-                    "-IPTC:Keywords=",
-                    "-XMP:Subject=",
-                    "-XMP-dc:Subject=",
-                    "-DC:Subject=",
-                    "-Subject=",
-                    "-Composite:Keywords=",
-                    "-MWG:Keywords=",
-                    "-Description=",
-                    "-XMP:Description=",
-                    "-XMP-dc:Description=",
-                    "-DC:Description=",
-                    "-ImageDescription=",
-                    "-EXIF:ImageDescription=",
-                    "-Composite:Description=",
-                    "-Caption=",
-                    "-IPTC:Caption=",
-                    "-IPTC:Caption-Abstract=",
-                    "-MWG:Description="
-                ]
-                
-                if self.config.no_backup or self.config.use_sidecar:
-                    delete_params.append("-overwrite_original")
-                
-                delete_params.append("-P")
-                delete_params.append(file_path)
-                
-                # Execute deletion with separate instance
-                print(f"DEBUG WRITE: Deleting with separate ExifTool instance, params: {delete_params}")
-                delete_et.execute(*delete_params)
-                print(f"DEBUG WRITE: Deletion completed with separate instance")
-                
-            except Exception as delete_error:
-                print(f"DEBUG WRITE: Warning - deletion failed: {delete_error}")
-                # Continue anyway - the write might still work
-            finally:
-                # CRITICAL: Terminate the deletion instance before proceeding
-                # This ensures no state is carried over to the main instance
-                if delete_et is not None:
-                    try:
-                        delete_et.terminate()
-                        print(f"DEBUG WRITE: Deletion instance terminated")
-                    except Exception as term_error:
-                        print(f"DEBUG WRITE: Warning - termination error: {term_error}")
+            file_path = self._write_path(file_path)
             
-            # SECOND PASS: Use the main instance for writing
-            # The deletion instance is now terminated, so this is a clean write
-            print(f"DEBUG WRITE: Writing metadata with main instance, keywords: {metadata.get('MWG:Keywords', 'NOT FOUND')}")
-            self.et.set_tags(file_path, tags=metadata, params=params)
+            # Clear the old keyword and description fields and write the
+            # new ones in a single command on the persistent instance
+            with self.et_lock:
+                self.et.execute(*build_write_params(metadata, self._write_params()), file_path)
             
             return True
             
@@ -1333,7 +2722,7 @@ class FileProcessor:
         for keyword in new_keywords:
             if not keyword:
                 continue
-            normalized = normalize_keyword(keyword, self.banned_words, self.config)
+            normalized = self.keyword_normalizer.normalize(keyword)
             
             if normalized:
                 # Use lowercase as key for case-insensitive deduplication
@@ -1352,6 +2741,11 @@ def main(config=None, callback=None, check_paused_or_stopped=None):
     
     if not hasattr(config, 'chunk_size'):
         config.chunk_size = 100
+    
+    if getattr(config, 'benchmark_res', None):
+        from .res_benchmark import run_res_benchmark
+        run_res_benchmark(config, callback or print)
+        return
              
     file_processor = FileProcessor(
         config, check_paused_or_stopped, callback
@@ -3,7 +3,6 @@ import os
 import json
 import shutil
 import base64
-import requests
 import uuid
 import exiftool
 
@@ -297,6 +296,20 @@ class SettingsDialog(QDialog):
         both_options_layout.addWidget(self.combined_query_radio)
         both_options_layout.addWidget(self.separate_query_radio)
         
+        # How the two separate queries are sent
+        detailed_requests_layout = QHBoxLayout()
+        detailed_requests_layout.setContentsMargins(20, 0, 0, 0)
+        self.detailed_requests_combo = QComboBox()
+        self.detailed_requests_combo.addItem("One after another", "sequential")
+        self.detailed_requests_combo.addItem("At the same time", "concurrent")
+        self.detailed_requests_combo.addItem("As a conversation", "multiturn")
+        detailed_requests_layout.addWidget(QLabel("Send queries: "))
+        detailed_requests_layout.addWidget(self.detailed_requests_combo)
+        detailed_requests_layout.addStretch()
+        both_options_layout.addLayout(detailed_requests_layout)
+        self.separate_query_radio.toggled.connect(self.detailed_requests_combo.setEnabled)
+        self.detailed_requests_combo.setEnabled(self.separate_query_radio.isChecked())
+        
         generation_mode_layout.addWidget(self.both_options_widget)
         generation_mode_layout.addWidget(self.description_only_radio)
         generation_mode_layout.addWidget(self.keywords_only_radio)
@@ -317,6 +330,26 @@ class SettingsDialog(QDialog):
         gen_count_layout.addWidget(self.gen_count)
         scroll_layout.addLayout(gen_count_layout)
         
+        structured_output_layout = QHBoxLayout()
+        self.structured_output_combo = QComboBox()
+        self.structured_output_combo.addItem("Off", "off")
+        self.structured_output_combo.addItem("Grammar (KoboldCpp, llama.cpp)", "grammar")
+        self.structured_output_combo.addItem("JSON schema (OpenAI, vLLM)", "json_schema")
+        structured_output_layout.addWidget(QLabel("Structured output: "))
+        structured_output_layout.addWidget(self.structured_output_combo)
+        self.stream_checkbox = QCheckBox("Stream answers")
+        structured_output_layout.addWidget(self.stream_checkbox)
+        scroll_layout.addLayout(structured_output_layout)
+        
+        response_cache_layout = QHBoxLayout()
+        self.response_cache_combo = QComboBox()
+        self.response_cache_combo.addItem("Off", "off")
+        self.response_cache_combo.addItem("At temperature 0", "deterministic")
+        self.response_cache_combo.addItem("Always", "all")
+        response_cache_layout.addWidget(QLabel("Reuse answers: "))
+        response_cache_layout.addWidget(self.response_cache_combo)
+        scroll_layout.addLayout(response_cache_layout)
+        
         res_limit_layout = QHBoxLayout()
         self.res_limit = QSpinBox()
         self.res_limit.setMinimum(112)
@@ -326,6 +359,33 @@ class SettingsDialog(QDialog):
         res_limit_layout.addWidget(QLabel("Dimension length: "))
         res_limit_layout.addWidget(self.res_limit)
         scroll_layout.addLayout(res_limit_layout)
+        
+        image_format_layout = QHBoxLayout()
+        self.image_format_combo = QComboBox()
+        self.image_format_combo.addItem("JPEG", "jpeg")
+        self.image_format_combo.addItem("WebP", "webp")
+        self.image_format_combo.addItem("PNG", "png")
+        self.image_max_kb = QSpinBox()
+        self.image_max_kb.setRange(0, 4096)
+        self.image_max_kb.setSingleStep(16)
+        self.image_max_kb.setSpecialValueText("No limit")
+        self.image_max_kb.setSuffix(" KB")
+        image_format_layout.addWidget(QLabel("Send images as: "))
+        image_format_layout.addWidget(self.image_format_combo)
+        image_format_layout.addWidget(QLabel("Max size: "))
+        image_format_layout.addWidget(self.image_max_kb)
+        scroll_layout.addLayout(image_format_layout)
+        
+        parallel_layout = QHBoxLayout()
+        self.parallel_spinbox = QSpinBox()
+        self.parallel_spinbox.setMinimum(1)
+        self.parallel_spinbox.setMaximum(64)
+        self.parallel_spinbox.setValue(1)
+        parallel_layout.addWidget(QLabel("Parallel requests: "))
+        parallel_layout.addWidget(self.parallel_spinbox)
+        self.async_llm_checkbox = QCheckBox("Async client")
+        parallel_layout.addWidget(self.async_llm_checkbox)
+        scroll_layout.addLayout(parallel_layout)
 
         # Sampler Settings Group
         sampler_group = QGroupBox("Sampler Settings")
@@ -408,21 +468,33 @@ class SettingsDialog(QDialog):
         self.no_crawl_checkbox = QCheckBox("Don't go in subdirectories")
         self.reprocess_all_checkbox = QCheckBox("Reprocess everything")
         self.reprocess_failed_checkbox = QCheckBox("Reprocess failures")
+        self.reprocess_duplicates_checkbox = QCheckBox("Reprocess near-duplicates")
         self.reprocess_orphans_checkbox = QCheckBox("Fix any orphans")
         self.no_backup_checkbox = QCheckBox("No backups")
         self.dry_run_checkbox = QCheckBox("Pretend mode")
         self.skip_verify_checkbox = QCheckBox("No file validation")
         self.quick_fail_checkbox = QCheckBox("No retries")
         self.use_sidecar_checkbox = QCheckBox("Use metadata sidecar file instead of writing to image") 
+        self.use_index_checkbox = QCheckBox("Skip unchanged files using the file index")
+        self.incremental_checkbox = QCheckBox("Only scan directories changed since the last run")
+        self.watch_checkbox = QCheckBox("Keep watching for new files")
+        self.image_cache_checkbox = QCheckBox("Reuse prepared images from earlier runs (keeps downscaled copies of your photos in the user cache directory)")
+        self.near_duplicates_checkbox = QCheckBox("Copy metadata to near-duplicate images")
         options_layout.addWidget(self.no_crawl_checkbox)
         options_layout.addWidget(self.reprocess_all_checkbox)
         options_layout.addWidget(self.reprocess_failed_checkbox)
+        options_layout.addWidget(self.reprocess_duplicates_checkbox)
         options_layout.addWidget(self.reprocess_orphans_checkbox)
         options_layout.addWidget(self.no_backup_checkbox)
         options_layout.addWidget(self.dry_run_checkbox)
         options_layout.addWidget(self.skip_verify_checkbox)
         options_layout.addWidget(self.quick_fail_checkbox)
         options_layout.addWidget(self.use_sidecar_checkbox)
+        options_layout.addWidget(self.use_index_checkbox)
+        options_layout.addWidget(self.incremental_checkbox)
+        options_layout.addWidget(self.watch_checkbox)
+        options_layout.addWidget(self.image_cache_checkbox)
+        options_layout.addWidget(self.near_duplicates_checkbox)
         
         options_group.setLayout(options_layout)
         scroll_layout.addWidget(options_group)
@@ -522,7 +594,17 @@ class SettingsDialog(QDialog):
                 self.api_password_input.setText(settings.get('api_password', ''))
                 self.system_instruction_input.setText(settings.get('system_instruction', 'You are a helpful assistant.'))
                 self.gen_count.setValue(settings.get('gen_count', 250))
+                index = self.structured_output_combo.findData(settings.get('structured_output', 'off'))
+                self.structured_output_combo.setCurrentIndex(max(0, index))
+                index = self.response_cache_combo.findData(settings.get('response_cache', 'deterministic'))
+                self.response_cache_combo.setCurrentIndex(max(0, index))
+                self.stream_checkbox.setChecked(settings.get('stream', False))
                 self.res_limit.setValue(settings.get('res_limit', 448))
+                index = self.image_format_combo.findData(settings.get('image_format', 'jpeg'))
+                self.image_format_combo.setCurrentIndex(max(0, index))
+                self.image_max_kb.setValue(settings.get('image_max_kb', 0))
+                self.parallel_spinbox.setValue(settings.get('parallel', 1))
+                self.async_llm_checkbox.setChecked(settings.get('async_llm', False))
                 
                 # Load instruction settings with migration support
                 # If old 'instruction' key exists but new keys don't, migrate it
@@ -546,6 +628,7 @@ class SettingsDialog(QDialog):
                 
                 self.no_crawl_checkbox.setChecked(settings.get('no_crawl', False))
                 self.reprocess_failed_checkbox.setChecked(settings.get('reprocess_failed', False))
+                self.reprocess_duplicates_checkbox.setChecked(settings.get('reprocess_duplicates', False))
                 self.reprocess_all_checkbox.setChecked(settings.get('reprocess_all', False))
                 self.reprocess_orphans_checkbox.setChecked(settings.get('reprocess_orphans', True))
                 self.no_backup_checkbox.setChecked(settings.get('no_backup', False))
@@ -553,6 +636,11 @@ class SettingsDialog(QDialog):
                 self.skip_verify_checkbox.setChecked(settings.get('skip_verify', False))
                 self.quick_fail_checkbox.setChecked(settings.get('quick_fail', False))
                 self.use_sidecar_checkbox.setChecked(settings.get('use_sidecar', False))
+                self.use_index_checkbox.setChecked(settings.get('use_index', True))
+                self.incremental_checkbox.setChecked(settings.get('incremental', False))
+                self.watch_checkbox.setChecked(settings.get('watch', False))
+                self.image_cache_checkbox.setChecked(settings.get('image_cache', False))
+                self.near_duplicates_checkbox.setChecked(settings.get('near_duplicates', False))
                 self.auto_save_checkbox.setChecked(settings.get('auto_save', False))
                 
                 # Load generation mode setting
@@ -591,6 +679,9 @@ class SettingsDialog(QDialog):
                     self.combined_query_radio.setChecked(True)
                     self.separate_query_radio.setChecked(False)
                 
+                index = self.detailed_requests_combo.findData(settings.get('detailed_requests', 'sequential'))
+                self.detailed_requests_combo.setCurrentIndex(max(0, index))
+                
                 # Update visibility based on selected mode
                 self.update_both_options_visibility(self.both_radio.isChecked())
                     
@@ -626,9 +717,17 @@ class SettingsDialog(QDialog):
             'description_instruction': self.description_instruction_input.toPlainText(),
             'keyword_instruction': self.keyword_instruction_input.toPlainText(),
             'gen_count': self.gen_count.value(),
+            'structured_output': self.structured_output_combo.currentData(),
+            'response_cache': self.response_cache_combo.currentData(),
+            'stream': self.stream_checkbox.isChecked(),
             'res_limit': self.res_limit.value(),
+            'image_format': self.image_format_combo.currentData(),
+            'image_max_kb': self.image_max_kb.value(),
+            'parallel': self.parallel_spinbox.value(),
+            'async_llm': self.async_llm_checkbox.isChecked(),
             'no_crawl': self.no_crawl_checkbox.isChecked(),
             'reprocess_failed': self.reprocess_failed_checkbox.isChecked(),
+            'reprocess_duplicates': self.reprocess_duplicates_checkbox.isChecked(),
             'reprocess_all': self.reprocess_all_checkbox.isChecked(),
             'reprocess_orphans': self.reprocess_orphans_checkbox.isChecked(),
             'no_backup': self.no_backup_checkbox.isChecked(),
@@ -639,7 +738,13 @@ class SettingsDialog(QDialog):
             'update_caption': self.update_caption_checkbox.isChecked(),
             'generation_mode': 'description_only' if self.description_only_radio.isChecked() else ('keywords_only' if self.keywords_only_radio.isChecked() else 'both'),
             'both_query_method': 'separate' if self.separate_query_radio.isChecked() else 'combined',
+            'detailed_requests': self.detailed_requests_combo.currentData(),
             'use_sidecar': self.use_sidecar_checkbox.isChecked(),
+            'use_index': self.use_index_checkbox.isChecked(),
+            'incremental': self.incremental_checkbox.isChecked(),
+            'watch': self.watch_checkbox.isChecked(),
+            'image_cache': self.image_cache_checkbox.isChecked(),
+            'near_duplicates': self.near_duplicates_checkbox.isChecked(),
             'auto_save': self.auto_save_checkbox.isChecked(),
             'depluralize_keywords': self.depluralize_checkbox.isChecked(),
             'limit_word_count': self.word_limit_checkbox.isChecked(),
@@ -671,21 +776,21 @@ class APICheckThread(QThread):
         self.running = True
         
     def run(self):
-
-        while self.running:
-            try:
-                # Direct HTTP request to the version endpoint
-                response = requests.get(f"{self.api_url}/api/extra/version", timeout=5)
-                if response.status_code == 200:
-                    self.api_status.emit(True)
-                    break
-                response = requests.get(f"{self.api_url}/health", timeout=5)
-                if response.status_code == 200:
+        # Reuse one connection between polls. No retries here, the
+        # loop already tries again every second.
+        # With several API URLs any one of them answering is enough
+        api_urls = llmii.parse_api_urls(self.api_url)
+        session = llmii.make_http_session(pool_size=1, retries=0, hosts=len(api_urls))
+        
+        try:
+            while self.running:
+                if any(llmii.probe_api(session, api_url, timeout=(3, 5)) for api_url in api_urls):
                     self.api_status.emit(True)
                     break
-            except Exception:
                 self.api_status.emit(False)
-            self.msleep(1000)
+                self.msleep(1000)
+        finally:
+            session.close()
             
     def stop(self):
         self.running = False
@@ -694,16 +799,20 @@ class RegenerationHelper:
     """Lightweight helper for regenerating metadata for a single image"""
     def __init__(self, config):
         self.config = config
-        self.llm_processor = llmii.LLMProcessor(config)
+        # Only regeneration talks to the LLM, reading and saving don't
+        self._llm_processor = None
         self.et = exiftool.ExifToolHelper(encoding='utf-8')
         
-        # Banned words for keyword processing (same as FileProcessor)
-        self.banned_words = ["no", "unspecified", "unknown", "unidentified", "identify", "topiary", 
-                            "themes concepts", "items animals", "animals objects", "structures landmarks", 
-                            "Foreground and background", "notable colors", "textures styles", 
-                            "actions activities", "physical appearance", "Gender", "Age range", 
-                            "visibly apparent", "apparent ancestry", "Occupation/role", 
-                            "Relationships between individuals", "Emotions expressions", "body language"]
+        # Banned words for keyword processing (same as FileProcessor),
+        # and the normalizer FileProcessor uses for the same settings
+        self.banned_words = list(llmii.BANNED_WORDS)
+        self.keyword_normalizer = llmii.keyword_normalizer(config, self.banned_words)
+    
+    @property
+    def llm_processor(self):
+        if self._llm_processor is None:
+            self._llm_processor = llmii.LLMProcessor(self.config)
+        return self._llm_processor
     
     def read_metadata(self, file_path):
         """Read current metadata from file"""
@@ -743,15 +852,13 @@ class RegenerationHelper:
         Returns only the new keywords (no merging with existing).
         Uses case-insensitive deduplication to prevent duplicates.
         """
-        from src.llmii import normalize_keyword
-        
         all_keywords = {}  # Use dict to preserve original case while deduplicating case-insensitively
         
         # Process only new keywords (no merging with existing)
         for keyword in new_keywords:
             if not keyword:
                 continue
-            normalized = normalize_keyword(keyword, self.banned_words, self.config)
+            normalized = self.keyword_normalizer.normalize(keyword)
             if normalized:
                 # Use lowercase as key for case-insensitive deduplication
                 # Only add if not already present (case-insensitive check)
@@ -807,8 +914,12 @@ class RegenerationHelper:
                     
             else:  # generation_mode == "both"
                 if not self.config.no_caption and self.config.detailed_caption:
-                    data = clean_json(self.llm_processor.describe_content(task="keywords_only", processed_image=processed_image))
-                    detailed_caption = clean_string(self.llm_processor.describe_content(task="caption", processed_image=processed_image))
+                    keywords_answer, caption_answer = self.llm_processor.describe_tasks(
+                        ["keywords_only", "caption"], processed_image,
+                        mode=getattr(self.config, 'detailed_requests', 'sequential')
+                    )
+                    data = clean_json(keywords_answer)
+                    detailed_caption = clean_string(caption_answer)
                     if existing_caption and self.config.update_caption:
                         caption = existing_caption + "<generated>" + detailed_caption + "</generated>"
                     else:
@@ -952,66 +1063,10 @@ class RegenerationHelper:
             if use_sidecar:
                 write_path = file_path + ".xmp"
             
-            # FIRST PASS: Use a SEPARATE ExifTool instance for deletion
-            # This prevents any state/cache issues from interfering with deletion
-            # The deletion instance is created, used, and terminated before writing
-            delete_et = None
-            try:
-                # Create a fresh ExifTool instance specifically for deletion
-                delete_et = exiftool.ExifToolHelper(encoding='utf-8')
-                
-                # Delete ALL keyword and description fields comprehensively
-                # Use comprehensive list of all possible fields to ensure complete deletion
-                delete_params = [
-                    "-Keywords=",
-                    "-IPTC:Keywords=",
-                    "-XMP:Subject=",
-                    "-XMP-dc:Subject=",
-                    "-DC:Subject=",
-                    "-Subject=",
-                    "-Composite:Keywords=",
-                    "-MWG:Keywords=",
-                    "-Description=",
-                    "-XMP:Description=",
-                    "-XMP-dc:Description=",
-                    "-DC:Description=",
-                    "-ImageDescription=",
-                    "-EXIF:ImageDescription=",
-                    "-Composite:Description=",
-                    "-Caption=",
-                    "-IPTC:Caption=",
-                    "-IPTC:Caption-Abstract=",
-                    "-MWG:Description="
-                ]
-                
-                if no_backup or use_sidecar:
-                    delete_params.append("-overwrite_original")
-                
-                delete_params.append("-P")
-                delete_params.append(write_path)
-                
-                # Execute deletion with separate instance
-                print(f"DEBUG WRITE: Deleting with separate ExifTool instance, params: {delete_params}")
-                delete_et.execute(*delete_params)
-                print(f"DEBUG WRITE: Deletion completed with separate instance")
-                
-            except Exception as delete_error:
-                print(f"DEBUG WRITE: Warning - deletion failed: {delete_error}")
-                # Continue anyway - the write might still work
-            finally:
-                # CRITICAL: Terminate the deletion instance before proceeding
-                # This ensures no state is carried over to the main instance
-                if delete_et is not None:
-                    try:
-                        delete_et.terminate()
-                        print(f"DEBUG WRITE: Deletion instance terminated")
-                    except Exception as term_error:
-                        print(f"DEBUG WRITE: Warning - termination error: {term_error}")
-            
-            # SECOND PASS: Use the main instance for writing
-            # The deletion instance is now terminated, so this is a clean write
-            print(f"DEBUG WRITE: Writing metadata with main instance, keywords: {metadata.get('MWG:Keywords', 'NOT FOUND')}")
-            self.et.set_tags(write_path, tags=metadata, params=params)
+            # Clear the old keyword and description fields and write the
+            # new ones in a single command on the persistent instance
+            from src.llmii import build_write_params
+            self.et.execute(*build_write_params(metadata, params), write_path)
             
             return True
             
@@ -1021,6 +1076,12 @@ class RegenerationHelper:
     
     def cleanup(self):
         """Clean up resources"""
+        if self._llm_processor is not None:
+            try:
+                self._llm_processor.close()
+            except Exception as e:
+                print(f"Error closing LLM client: {str(e)}")
+            self._llm_processor = None
         try:
             self.et.terminate()
         except:
@@ -1110,6 +1171,7 @@ class RegenerateThread(QThread):
 class IndexerThread(QThread):
     output_received = pyqtSignal(str)
     image_processed = pyqtSignal(str, str, list, str, dict, str)  # base64_image, caption, keywords, filename, metadata, save_status
+    keywords_streamed = pyqtSignal(str, list)  # file_path, keywords so far
 
     def __init__(self, config):
         super().__init__()
@@ -1122,13 +1184,15 @@ class IndexerThread(QThread):
         # Check if message is a dictionary with image data
         if isinstance(message, dict) and 'type' in message and message['type'] == 'image_data':
             # Extract the image data and emit signal
-            base64_image = message.get('base64_image', '')
+            base64_image = message.get('base64_image') or ''  # Empty for already processed files, loaded on demand
             caption = message.get('caption', '')
             keywords = message.get('keywords') or []  # Handle None explicitly
             file_path = message.get('file_path', '')
             metadata = message.get('metadata', {})
             save_status = message.get('save_status', 'pending')
             self.image_processed.emit(base64_image, caption, keywords, file_path, metadata, save_status)
+        elif isinstance(message, dict) and message.get('type') == 'partial_keywords':
+            self.keywords_streamed.emit(message.get('file_path', ''), list(message.get('keywords') or []))
         else:
             # Regular text message for the log
             self.output_received.emit(str(message))
@@ -1386,8 +1450,8 @@ class KeywordWidget(QWidget):
         # Force immediate update to ensure widgets are removed
         QApplication.processEvents()
     
-    def show_generating_message(self):
-        """Show a temporary 'Regenerating Keywords...' message"""
+    def show_generating_message(self, text="Regenerating Keywords..."):
+        """Show a temporary 'Regenerating Keywords...' message, or another text"""
         self.clear()
         # Create a container widget for the message (similar to how keywords are displayed in rows)
         message_widget = QWidget()
@@ -1395,7 +1459,7 @@ class KeywordWidget(QWidget):
         message_layout.setContentsMargins(0, 0, 0, 0)
         message_layout.setSpacing(2)
         
-        generating_label = QLabel("Regenerating Keywords...")
+        generating_label = QLabel(text)
         generating_label.setStyleSheet("color: #2196F3; font-style: italic; padding: 4px;")
         generating_label.setAlignment(Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop)
         generating_label.setWordWrap(True)
@@ -1892,6 +1956,13 @@ class ImageIndexerGUI(QMainWindow):
         self.manual_edits = {}  # {file_path: {'caption_edited': bool, 'keywords_manual': set}}
         self._updating_caption = False  # Flag to prevent signal handler during programmatic updates
         
+        # Already processed files arrive without an image. The preview is
+        # rendered from the file once the user has stayed on it briefly,
+        # so a fast stream of skipped files never decodes anything.
+        self.preview_timer = QTimer()
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.timeout.connect(self.load_current_preview)
+        
         if os.path.exists('settings.json'):
             try:
                 with open('settings.json', 'r') as f:
@@ -2020,8 +2091,67 @@ class ImageIndexerGUI(QMainWindow):
                 _, _, _, _, _, current_status, _ = self.image_history[self.current_position]
                 self.update_action_buttons(current_status)
             
-    def display_image(self, base64_image, caption, keywords, filename, save_status="pending"):
-        # Update the UI with the image data
+    def show_streamed_keywords(self, file_path, keywords):
+        """Show keywords as they are generated, unless the user is looking back through history"""
+        if self.current_position != -1 or not keywords:
+            return
+        self.keywords_widget.show_generating_message(
+            f"Generating keywords for {os.path.basename(file_path)}: {', '.join(keywords)}"
+        )
+    
+    def current_history_index(self):
+        """Index in image_history of the image being shown, or None"""
+        if not self.image_history:
+            return None
+        idx = len(self.image_history) - 1 if self.current_position == -1 else self.current_position
+        if idx < 0 or idx >= len(self.image_history):
+            return None
+        return idx
+    
+    def ensure_preview(self, idx):
+        """Render the preview for a history entry that arrived without one
+        
+        Returns the base64 image, or an empty string if it could not be rendered.
+        """
+        base64_image, caption, keywords, filename, file_path, save_status, metadata = self.image_history[idx]
+        if base64_image or not file_path:
+            return base64_image
+        
+        try:
+            from src.model_profiles import make_image_processor
+            # Previews are only shown here, so the default JPEG settings
+            # do whatever format the LLM is sent
+            config = llmii.Config()
+            image_cache_checkbox = getattr(self.settings_dialog, 'image_cache_checkbox', None)
+            if image_cache_checkbox is not None:
+                config.image_cache = image_cache_checkbox.isChecked()
+            image_processor = make_image_processor(self.settings_dialog.res_limit.value(), **llmii.image_options(config))
+            base64_image, _ = image_processor.process_image(file_path)
+        except Exception as e:
+            print(f"Error loading preview for {file_path}: {e}")
+            base64_image = None
+        
+        if not base64_image:
+            return ""
+        
+        # Keep the rendered preview so navigating back does not decode again
+        _, caption, keywords, filename, file_path, save_status, metadata = self.image_history[idx]
+        self.image_history[idx] = (base64_image, caption, keywords, filename, file_path, save_status, metadata)
+        return base64_image
+    
+    def load_current_preview(self):
+        """Render the preview of the image being shown if it has none yet"""
+        idx = self.current_history_index()
+        if idx is None or self.image_history[idx][0]:
+            return
+        
+        base64_image = self.ensure_preview(idx)
+        if base64_image:
+            self.show_preview_pixmap(base64_image)
+        else:
+            self.image_preview.setText("Preview not available")
+    
+    def show_preview_pixmap(self, base64_image):
         try:
             # Convert base64 to QImage
             image_data = base64.b64decode(base64_image)
@@ -2043,6 +2173,16 @@ class ImageIndexerGUI(QMainWindow):
                 self.image_preview.setText("Error loading image")
         except Exception as e:
             self.image_preview.setText(f"Error: {str(e)}")
+    
+    def display_image(self, base64_image, caption, keywords, filename, save_status="pending"):
+        # Update the UI with the image data
+        if base64_image:
+            self.preview_timer.stop()
+            self.show_preview_pixmap(base64_image)
+        else:
+            # Already processed file, render it if the user stays on it
+            self.image_preview.setText("Loading preview...")
+            self.preview_timer.start(300)
         
         file_basename = os.path.basename(filename)
         
@@ -2795,16 +2935,27 @@ class ImageIndexerGUI(QMainWindow):
         # Removed config.update_keywords - feature removed
         config.update_caption = self.settings_dialog.update_caption_checkbox.isChecked()
         config.detailed_caption = self.settings_dialog.separate_query_radio.isChecked() if config.generation_mode == "both" else False
+        config.detailed_requests = self.settings_dialog.detailed_requests_combo.currentData()
         config.short_caption = not config.detailed_caption if config.generation_mode == "both" else True
         config.no_caption = False
         config.gen_count = self.settings_dialog.gen_count.value()
+        config.structured_output = self.settings_dialog.structured_output_combo.currentData()
+        config.response_cache = self.settings_dialog.response_cache_combo.currentData()
+        # Regenerating asks for a new answer, which replaces the cached one
+        config.refresh_responses = True
+        config.stream = self.settings_dialog.stream_checkbox.isChecked()
         config.res_limit = self.settings_dialog.res_limit.value()
+        config.image_format = self.settings_dialog.image_format_combo.currentData()
+        config.image_max_kb = self.settings_dialog.image_max_kb.value()
+        config.image_cache = self.settings_dialog.image_cache_checkbox.isChecked()
         config.temperature = self.settings_dialog.temperature_spinbox.value()
         config.top_p = self.settings_dialog.top_p_spinbox.value()
         config.top_k = self.settings_dialog.top_k_spinbox.value()
         config.min_p = self.settings_dialog.min_p_spinbox.value()
         config.rep_pen = self.settings_dialog.rep_pen_spinbox.value()
         config.use_sidecar = self.settings_dialog.use_sidecar_checkbox.isChecked()
+        config.no_index = not self.settings_dialog.use_index_checkbox.isChecked()
+        config.incremental = self.settings_dialog.incremental_checkbox.isChecked()
         config.normalize_keywords = True
         config.depluralize_keywords = self.settings_dialog.depluralize_checkbox.isChecked()
         config.limit_word_count = self.settings_dialog.word_limit_checkbox.isChecked()
@@ -2812,6 +2963,13 @@ class ImageIndexerGUI(QMainWindow):
         config.split_and_entries = self.settings_dialog.split_and_checkbox.isChecked()
         config.ban_prompt_words = self.settings_dialog.ban_prompt_words_checkbox.isChecked()
         
+        # Already processed files arrive without an image, the LLM needs one
+        base64_image = self.ensure_preview(idx)
+        if not base64_image:
+            self.update_output(f"Could not load image for {os.path.basename(filename)}.")
+            self.update_action_buttons(save_status)
+            return
+        
         # Store the index for updating history when regeneration completes
         self.regenerate_idx = idx
         self.regenerate_original_data = (base64_image, current_caption, keywords, filename, save_status)
@@ -3014,6 +3172,8 @@ class ImageIndexerGUI(QMainWindow):
         config.system_instruction = self.settings_dialog.system_instruction_input.text()
         config.no_crawl = self.settings_dialog.no_crawl_checkbox.isChecked()
         config.reprocess_failed = self.settings_dialog.reprocess_failed_checkbox.isChecked()
+        config.reprocess_duplicates = self.settings_dialog.reprocess_duplicates_checkbox.isChecked()
+        config.near_duplicates = self.settings_dialog.near_duplicates_checkbox.isChecked()
         config.reprocess_all = self.settings_dialog.reprocess_all_checkbox.isChecked()
         config.reprocess_orphans = self.settings_dialog.reprocess_orphans_checkbox.isChecked()
         config.no_backup = self.settings_dialog.no_backup_checkbox.isChecked()
@@ -3021,6 +3181,9 @@ class ImageIndexerGUI(QMainWindow):
         config.skip_verify = self.settings_dialog.skip_verify_checkbox.isChecked()
         config.quick_fail = self.settings_dialog.quick_fail_checkbox.isChecked()
         config.use_sidecar = self.settings_dialog.use_sidecar_checkbox.isChecked()
+        config.no_index = not self.settings_dialog.use_index_checkbox.isChecked()
+        config.incremental = self.settings_dialog.incremental_checkbox.isChecked()
+        config.watch = self.settings_dialog.watch_checkbox.isChecked()
         config.normalize_keywords = True
         config.depluralize_keywords = self.settings_dialog.depluralize_checkbox.isChecked()
         config.limit_word_count = self.settings_dialog.word_limit_checkbox.isChecked()
@@ -3052,6 +3215,7 @@ class ImageIndexerGUI(QMainWindow):
             if self.settings_dialog.separate_query_radio.isChecked():
                 config.detailed_caption = True
                 config.short_caption = False
+                config.detailed_requests = self.settings_dialog.detailed_requests_combo.currentData()
             else:
                 config.detailed_caption = False
                 config.short_caption = True
@@ -3065,7 +3229,15 @@ class ImageIndexerGUI(QMainWindow):
         # Use auto-save button state (which is synced with settings dialog)
         config.auto_save = self.auto_save_button.isChecked()
         config.gen_count = self.settings_dialog.gen_count.value()
+        config.structured_output = self.settings_dialog.structured_output_combo.currentData()
+        config.response_cache = self.settings_dialog.response_cache_combo.currentData()
+        config.stream = self.settings_dialog.stream_checkbox.isChecked()
         config.res_limit = self.settings_dialog.res_limit.value()
+        config.image_format = self.settings_dialog.image_format_combo.currentData()
+        config.image_max_kb = self.settings_dialog.image_max_kb.value()
+        config.image_cache = self.settings_dialog.image_cache_checkbox.isChecked()
+        config.parallel = self.settings_dialog.parallel_spinbox.value()
+        config.async_llm = self.settings_dialog.async_llm_checkbox.isChecked()
 
         # Load sampler settings
         config.temperature = self.settings_dialog.temperature_spinbox.value()
@@ -3077,6 +3249,7 @@ class ImageIndexerGUI(QMainWindow):
         self.indexer_thread = IndexerThread(config)
         self.indexer_thread.output_received.connect(self.update_output)
         self.indexer_thread.image_processed.connect(self.update_image_preview)
+        self.indexer_thread.keywords_streamed.connect(self.show_streamed_keywords)
         self.indexer_thread.finished.connect(self.indexer_finished)
         self.pause_handler.pause_signal.connect(self.set_paused)
         self.pause_handler.stop_signal.connect(self.set_stopped)
@@ -0,0 +1,198 @@
+import re
+import threading
+import time
+from exiftool.exceptions import ExifToolExecuteError
+
+# Every field a keyword or description can end up in. These are
+# cleared in the same ExifTool command that writes the new values
+# so nothing stale survives from a previous run or another program.
+CLEAR_METADATA_PARAMS = [
+    "-Keywords=",
+    "-IPTC:Keywords=",
+    "-XMP:Subject=",
+    "-XMP-dc:Subject=",
+    "-DC:Subject=",
+    "-Subject=",
+    "-Composite:Keywords=",
+    "-MWG:Keywords=",
+    "-Description=",
+    "-XMP:Description=",
+    "-XMP-dc:Description=",
+    "-DC:Description=",
+    "-ImageDescription=",
+    "-EXIF:ImageDescription=",
+    "-Composite:Description=",
+    "-Caption=",
+    "-IPTC:Caption=",
+    "-IPTC:Caption-Abstract=",
+    "-MWG:Description="
+]
+
+# ExifTool prints one of these per file that was written
+_WRITE_OK = re.compile(r"^\s*[1-9]\d* image files (updated|created|unchanged)", re.MULTILINE)
+
+def build_write_params(metadata, params=None):
+    """ Arguments for a clear-then-set write in one ExifTool command.
+        ExifTool applies assignments in order, so the empty
+        assignments wipe the old values and the ones after them
+        write the new values. List values become one assignment
+        per item like set_tags does.
+    """
+    write_params = list(CLEAR_METADATA_PARAMS)
+
+    for tag, value in metadata.items():
+        if tag == "SourceFile":
+            continue
+        if isinstance(value, list):
+            for item in value:
+                write_params.append(f"-{tag}={item}")
+        else:
+            write_params.append(f"-{tag}={value}")
+
+    if params:
+        write_params.extend(params)
+
+    return write_params
+
+class MetadataWriter:
+    """ Write-behind queue for metadata writes. Files are collected
+        and written in groups, one ExifTool command per file stacked
+        with -execute so the persistent process handles the whole
+        group in a single round trip.
+
+        A group is written when batch_size files are waiting or when
+        the oldest one has waited flush_interval seconds. on_result
+        is called with (context, success) for every file once its
+        group has been written.
+    """
+    def __init__(self, et, et_lock, params=None, batch_size=16, flush_interval=2.0, dry_run=False, on_result=None):
+        self.et = et
+        self.et_lock = et_lock
+        self.params = params or []
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = flush_interval
+        self.dry_run = dry_run
+        self.on_result = on_result
+        self.pending = []
+        self.pending_since = None
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """ Start the thread that writes groups which have waited
+            too long, e.g. while processing is paused.
+        """
+        if self.thread is not None:
+            return
+
+        # pyexiftool starts ExifTool on first use and on Linux the
+        # process dies with the thread that started it, so make sure
+        # that is not the flush thread
+        with self.et_lock:
+            if not self.et.running:
+                self.et.run()
+
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._flush_loop, name="llmii-writer", daemon=True)
+        self.thread.start()
+
+    def close(self):
+        """ Write everything still waiting and stop the flush thread
+        """
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+        self.flush()
+
+    def add(self, file_path, metadata, context=None):
+        """ Queue a file for writing. Writes the group straight away
+            once it is full.
+        """
+        with self.lock:
+            if not self.pending:
+                self.pending_since = time.time()
+            self.pending.append((file_path, metadata, context))
+            full = len(self.pending) >= self.batch_size
+
+        if full:
+            self.flush()
+
+    def flush(self):
+        """ Write every queued file and report the results.
+            Returns a list of (file_path, success).
+        """
+        with self.flush_lock:
+            with self.lock:
+                batch = self.pending
+                self.pending = []
+                self.pending_since = None
+
+            if not batch:
+                return []
+
+            if self.dry_run:
+                print("Dry run. Not writing.")
+                results = [True] * len(batch)
+            else:
+                results = self._write_batch(batch)
+
+            for (file_path, metadata, context), success in zip(batch, results):
+                if self.on_result is not None:
+                    try:
+                        self.on_result(context, success)
+                    except Exception as e:
+                        print(f"Error reporting write result for {file_path}: {str(e)}")
+
+            return [(file_path, success) for (file_path, _, _), success in zip(batch, results)]
+
+    def _flush_loop(self):
+        while not self.stop_event.wait(min(self.flush_interval, 0.5)):
+            with self.lock:
+                waiting = self.pending_since is not None and time.time() - self.pending_since >= self.flush_interval
+            if waiting:
+                self.flush()
+
+    def _write_batch(self, batch):
+        """ Send the whole group as stacked commands. ExifTool prints
+            {ready} after each command but the last, so the output
+            splits into one section per file.
+        """
+        args = []
+        for i, (file_path, metadata, _) in enumerate(batch):
+            if i:
+                args.append("-execute")
+            args.extend(build_write_params(metadata, self.params))
+            args.append(file_path)
+
+        try:
+            with self.et_lock:
+                output = self.et.execute(*args)
+        except ExifToolExecuteError as e:
+            # Only the status of the last command is checked, the
+            # output still says which files were written
+            output = e.stdout
+        except Exception as e:
+            print(f"Batch write failed, writing files one at a time: {str(e)}")
+            return self._write_each(batch)
+
+        sections = re.split(r"^\{ready\}\s*$", output or "", flags=re.MULTILINE)
+        if len(sections) != len(batch):
+            print("Could not match batch write output to files, writing files one at a time")
+            return self._write_each(batch)
+
+        return [bool(_WRITE_OK.search(section)) for section in sections]
+
+    def _write_each(self, batch):
+        results = []
+        for file_path, metadata, _ in batch:
+            try:
+                with self.et_lock:
+                    self.et.execute(*build_write_params(metadata, self.params), file_path)
+                results.append(True)
+            except Exception as e:
+                print(f"Error writing metadata to {file_path}: {str(e)}")
+                results.append(False)
+        return results
@@ -0,0 +1,72 @@
+import os
+import json
+import math
+
+from .config import RESOURCES_DIR
+from .image_processor import ImageProcessor
+
+MODEL_LIST_PATH = os.path.join(RESOURCES_DIR, "model_list.json")
+
+# What every model is assumed to use when it isn't in the model list
+DEFAULT_PATCH_SIZE = 14
+
+def load_model_list(path=MODEL_LIST_PATH):
+    """ The entries in model_list.json, or an empty list if it can't be read
+    """
+    try:
+        with open(path, "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return []
+
+def find_model_profile(name, models=None):
+    """ The model list entry for name, which is either the name shown in
+        the model list or the id a server reports for the loaded model
+        (KoboldCpp reports the file name of the language model).
+        None if nothing matches.
+    """
+    if not name:
+        return None
+    if models is None:
+        models = load_model_list()
+
+    wanted = name.strip().lower()
+    for model in models:
+        if model.get("model", "").lower() == wanted:
+            return model
+
+    for model in models:
+        stem = os.path.splitext(os.path.basename(model.get("language_url", "")))[0].lower()
+        if stem and stem in wanted:
+            return model
+
+    return None
+
+def vision_tokens(width, height, profile=None):
+    """ About how many tokens the model spends on an image of this size.
+        Models that resize every image to one size cost the same for all.
+    """
+    profile = profile or {}
+    if profile.get("vision_tokens"):
+        return profile["vision_tokens"]
+
+    unit = profile.get("patch_size", DEFAULT_PATCH_SIZE) * profile.get("merge_size", 1)
+    return math.ceil(width / unit) * math.ceil(height / unit)
+
+def make_image_processor(res_limit, profile=None, **options):
+    """ An ImageProcessor sizing images for the model in profile, never
+        larger than res_limit or than what the model makes use of.
+        Without a profile images are sized as they always were. Other
+        ImageProcessor options, like the transfer encoding, are passed on.
+    """
+    if profile is None:
+        return ImageProcessor(max_dimension=res_limit, patch_sizes=[DEFAULT_PATCH_SIZE], **options)
+
+    max_dimension = min(res_limit, profile.get("preferred_resolution") or res_limit)
+    return ImageProcessor(
+        max_dimension=max_dimension,
+        patch_sizes=[profile.get("patch_size", DEFAULT_PATCH_SIZE)],
+        merge_size=profile.get("merge_size", 1),
+        minimize_tokens=True,
+        **options
+    )
@@ -0,0 +1,181 @@
+import io
+import asyncio
+import base64
+import threading
+
+import numpy as np
+from PIL import Image
+
+# Status written to files that were given the metadata of a near-duplicate
+# instead of being described themselves
+DUPLICATE_STATUS = "duplicate"
+
+HASH_SIZE = 8  # 64 bit hashes
+PHASH_SAMPLE = 32  # pHash takes the DCT of a 32x32 thumbnail
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+def _bits(flags):
+    value = 0
+    for flag in flags:
+        value = (value << 1) | int(flag)
+    return value
+
+def dhash(img, size=HASH_SIZE):
+    """ Difference hash: whether each pixel of a small grayscale copy
+        is brighter than its right neighbour
+    """
+    pixels = np.asarray(img.convert("L").resize((size + 1, size), Image.Resampling.BILINEAR), dtype=np.int16)
+    return _bits((pixels[:, 1:] > pixels[:, :-1]).flatten())
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    return np.cos(np.pi * (2 * x + 1) * k / (2 * n))
+
+_DCT = _dct_matrix(PHASH_SAMPLE)
+
+def phash(img, size=HASH_SIZE):
+    """ Perceptual hash: whether each of the lowest frequencies of a
+        32x32 grayscale copy is above their median. Holds up better
+        than dHash against edits that shift brightness or contrast.
+    """
+    pixels = np.asarray(img.convert("L").resize((PHASH_SAMPLE, PHASH_SAMPLE), Image.Resampling.LANCZOS), dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:size, :size].flatten()
+    # The DC term is the overall brightness, leave it out of the median
+    return _bits(low > np.median(low[1:]))
+
+HASH_METHODS = {
+    "dhash": dhash,
+    "phash": phash,
+}
+
+def image_hash(encoded, method="dhash"):
+    """ The perceptual hash of a base64 encoded image, as an int
+    """
+    with Image.open(io.BytesIO(base64.b64decode(encoded))) as img:
+        # A JPEG only has to be decoded at 1/8 size for a 32 pixel hash
+        img.draft("RGB", (PHASH_SAMPLE * 2, PHASH_SAMPLE * 2))
+        return HASH_METHODS[method](img)
+
+class BKTree:
+    """ Burkhard-Keller tree of hashes, for finding every hash within
+        a Hamming distance without comparing against all of them
+    """
+    def __init__(self):
+        self.root = None  # [hash, item, {distance: child}]
+        self.size = 0
+
+    def add(self, value, item):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, item, {}]
+            return
+
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, item, {}]
+                return
+            node = child
+
+    def search(self, value, threshold):
+        """ (distance, item) for every hash within threshold of value
+        """
+        found = []
+        nodes = [self.root] if self.root is not None else []
+        while nodes:
+            node = nodes.pop()
+            distance = hamming(value, node[0])
+            if distance <= threshold:
+                found.append((distance, node[1]))
+            # Only children this close can hold a match
+            for child_distance, child in node[2].items():
+                if distance - threshold <= child_distance <= distance + threshold:
+                    nodes.append(child)
+        return found
+
+class DuplicateGroup:
+    """ Images that look the same as their representative, the first of
+        them to be described
+    """
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.metadata = None  # Set once the representative is described
+        self.abandoned = False  # The representative could not be described
+        self.done = threading.Event()
+
+class NearDuplicateIndex:
+    """ Groups images whose perceptual hashes are within threshold bits
+        of each other, so only one image per group has to be described.
+        Entries are kept for the run only.
+    """
+    def __init__(self, threshold=6, method="dhash"):
+        if method not in HASH_METHODS:
+            raise ValueError(f"Unknown hash method: {method}")
+        self.threshold = threshold
+        self.method = method
+        self.tree = BKTree()
+        self.lock = threading.Lock()
+        self.matched = 0
+
+    def hash(self, encoded):
+        return image_hash(encoded, self.method)
+
+    def _claim(self, value, file_path):
+        with self.lock:
+            matches = [(distance, group) for distance, group in self.tree.search(value, self.threshold) if not group.abandoned]
+            if matches:
+                return min(matches, key=lambda match: match[0])[1], False
+            group = DuplicateGroup(file_path)
+            self.tree.add(value, group)
+            return group, True
+
+    def match(self, value, file_path):
+        """ (group, metadata). metadata is that of an image described
+            earlier that file_path is a near-duplicate of. Otherwise it
+            is None and file_path is the representative of the new
+            group: describe it, then call resolve or abandon.
+
+            Waits for a representative that is still being described.
+        """
+        while True:
+            group, is_new = self._claim(value, file_path)
+            if is_new:
+                return group, None
+            group.done.wait()
+            if group.metadata is not None:
+                with self.lock:
+                    self.matched += 1
+                return group, group.metadata
+
+    async def match_async(self, value, file_path, poll=0.05):
+        """ match for coroutines: waits for a representative without
+            blocking the event loop it may be described on
+        """
+        while True:
+            group, is_new = self._claim(value, file_path)
+            if is_new:
+                return group, None
+            while not group.done.is_set():
+                await asyncio.sleep(poll)
+            if group.metadata is not None:
+                with self.lock:
+                    self.matched += 1
+                return group, group.metadata
+
+    def resolve(self, group, metadata):
+        group.metadata = metadata
+        group.done.set()
+
+    def abandon(self, group):
+        """ Give up on a representative, images waiting on it are
+            described themselves
+        """
+        if group.done.is_set():
+            return
+        group.abandoned = True
+        group.done.set()
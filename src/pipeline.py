@@ -0,0 +1,190 @@
+import threading
+import queue
+import time
+
+_STOP = object()
+
+class PipelineStage:
+    """ A pool of worker threads reading from a bounded input queue.
+        Each item is passed to func and whatever it returns (unless
+        None) is put on the next stage. A full queue blocks the stage
+        in front of it, which keeps memory bounded.
+
+        func can also hand an item off to finish later, see defer().
+        concurrency is how many items the stage works on at once when
+        that is more than its worker threads.
+    """
+    def __init__(self, name, func, workers=1, queue_size=None, concurrency=None):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+        self.concurrency = max(self.workers, int(concurrency or 0))
+        self.queue = queue.Queue(maxsize=queue_size or self.workers * 2)
+        self.next_stage = None
+        self.threads = []
+        self.lock = threading.Lock()
+        self.items = 0
+        self.busy_time = 0.0
+        self.blocked_time = 0.0
+        self.started_at = None
+        self.stopped_at = None
+        self.deferred = 0
+        self.settled = threading.Condition(self.lock)
+
+    def start(self):
+        self.started_at = time.time()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"llmii-{self.name}-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def put(self, item):
+        self.queue.put(item)
+
+    def defer(self):
+        """ For func to call when it finishes its item later, e.g. on
+            an event loop, and returns None for now. Returns done(result)
+            to call once from any thread: the result then goes on to the
+            next stage like a returned one. close() waits for every
+            deferred item.
+        """
+        started = time.time()
+        with self.lock:
+            self.deferred += 1
+
+        def done(result):
+            if result is not None and self.next_stage is not None:
+                self.next_stage.put(result)
+            with self.lock:
+                self.deferred -= 1
+                self.busy_time += time.time() - started
+                self.settled.notify_all()
+        return done
+
+    def close(self):
+        """ Tell the workers to exit once the queue is drained
+            and wait for them and the items they deferred.
+        """
+        for _ in self.threads:
+            self.queue.put(_STOP)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        with self.lock:
+            while self.deferred:
+                self.settled.wait()
+        self.stopped_at = time.time()
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                break
+
+            start = time.time()
+            try:
+                result = self.func(item)
+            except Exception as e:
+                print(f"Pipeline stage {self.name} error: {str(e)}")
+                result = None
+            busy = time.time() - start
+
+            blocked = 0.0
+            if result is not None and self.next_stage is not None:
+                put_start = time.time()
+                self.next_stage.put(result)
+                blocked = time.time() - put_start
+
+            with self.lock:
+                self.items += 1
+                self.busy_time += busy
+                self.blocked_time += blocked
+
+    def stats(self):
+        """ Busy is time spent working, blocked is time spent waiting
+            for room in the next stage. Both are fractions of the
+            total worker time since the stage started.
+        """
+        end = self.stopped_at or time.time()
+        elapsed = (end - self.started_at) if self.started_at else 0.0
+        capacity = elapsed * self.concurrency
+
+        with self.lock:
+            return {
+                "name": self.name,
+                "workers": self.workers,
+                "concurrency": self.concurrency,
+                "items": self.items,
+                "busy_time": self.busy_time,
+                "utilization": self.busy_time / capacity if capacity > 0 else 0.0,
+                "blocked": self.blocked_time / capacity if capacity > 0 else 0.0,
+                "queued": self.queue.qsize(),
+            }
+
+class Pipeline:
+    """ Chains stages together. Items put on the pipeline go to the
+        first stage and flow through the rest in order.
+    """
+    def __init__(self, stages):
+        self.stages = stages
+        self.running = False
+        for stage, next_stage in zip(stages, stages[1:]):
+            stage.next_stage = next_stage
+
+    def start(self):
+        if self.running:
+            return
+        for stage in self.stages:
+            stage.start()
+        self.running = True
+
+    def put(self, item):
+        self.stages[0].put(item)
+
+    def offer(self, item, timeout):
+        """ Put an item on the first stage, waiting at most timeout
+            seconds for room. Returns False if the stage stayed full.
+        """
+        try:
+            self.stages[0].queue.put(item, timeout=timeout)
+            return True
+        except queue.Full:
+            return False
+
+    def close(self):
+        """ Drain the stages front to back so that nothing put on
+            the pipeline is lost.
+        """
+        if not self.running:
+            return
+        for stage in self.stages:
+            stage.close()
+        self.running = False
+
+    def stats(self):
+        return [stage.stats() for stage in self.stages]
+
+    def bottleneck(self):
+        """ The stage with the highest utilization limits throughput
+        """
+        stats = self.stats()
+        if not stats or not any(s["items"] for s in stats):
+            return None
+        return max(stats, key=lambda s: s["utilization"])["name"]
+
+    def utilization_report(self):
+        parts = []
+        for s in self.stats():
+            if s['concurrency'] > s['workers']:
+                capacity = f"{s['concurrency']} at once"
+            else:
+                capacity = f"{s['workers']} worker{'s' if s['workers'] != 1 else ''}"
+            parts.append(
+                f"{s['name']} {s['utilization'] * 100:.0f}% busy, {s['blocked'] * 100:.0f}% blocked "
+                f"({capacity}, {s['items']} files)"
+            )
+        report = "Pipeline utilization: " + "; ".join(parts)
+        bottleneck = self.bottleneck()
+        if bottleneck:
+            report += f". Limiting stage: {bottleneck}"
+        return report
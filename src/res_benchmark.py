@@ -0,0 +1,146 @@
+import os
+import io
+import copy
+import time
+import base64
+
+from PIL import Image
+
+from .llmii import make_llm_processor, clean_json, image_options
+from .image_processor import ImageProcessor
+from .model_profiles import find_model_profile, make_image_processor, vision_tokens
+
+# Keywords shared with the answer at the highest resolution, as a share
+# of both sets together, for a resolution to count as good enough
+ACCEPTABLE_AGREEMENT = 0.8
+
+def parse_resolutions(value):
+    """ Sorted resolutions from "224,336,448" or a list of numbers
+    """
+    if isinstance(value, str):
+        value = [part for part in value.replace(" ", "").split(",") if part]
+    resolutions = sorted({int(part) for part in value})
+    if not resolutions or resolutions[0] <= 0:
+        raise ValueError("Resolutions must be positive numbers")
+    return resolutions
+
+def sample_images(directory, count, no_crawl=False):
+    """ The first count images under directory, in name order
+    """
+    image_types = ImageProcessor()
+    found = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        if no_crawl:
+            dirs.clear()
+        for name in sorted(files):
+            if image_types._get_image_type(name) is not None:
+                found.append(os.path.join(root, name))
+                if len(found) >= count:
+                    return found
+    return found
+
+def keyword_set(answer):
+    """ The keywords in an answer, lower cased, or an empty set
+    """
+    data = clean_json(answer)
+    keywords = data.get("Keywords") if isinstance(data, dict) else None
+    if not isinstance(keywords, list):
+        return set()
+    return {str(keyword).strip().lower() for keyword in keywords if str(keyword).strip()}
+
+def agreement(keywords, reference):
+    """ Jaccard similarity of two keyword sets
+    """
+    if not keywords and not reference:
+        return 1.0
+    return len(keywords & reference) / len(keywords | reference)
+
+def run_res_benchmark(config, callback=print):
+    """ Index a sample of the images in config.directory at each of the
+        resolutions in config.benchmark_res without writing anything, and
+        report vision tokens, speed and how well the keywords agree with
+        the ones found at the highest resolution.
+
+        Returns a list with a dict of results for each resolution.
+    """
+    resolutions = parse_resolutions(config.benchmark_res)
+    files = sample_images(config.directory, getattr(config, 'benchmark_files', 10) or 10, config.no_crawl)
+    if not files:
+        callback(f"No images found in {config.directory}")
+        return []
+
+    # Cached answers would come back without the model doing any work
+    llm_config = copy.copy(config)
+    llm_config.response_cache = "off"
+    llm_processor = make_llm_processor(llm_config, callback)
+    try:
+        profile = find_model_profile(getattr(config, 'model_profile', None) or llm_processor.served_model())
+        callback(f"Resolution benchmark on {len(files)} images, model: {profile['model'] if profile else 'not in model list'}")
+
+        answers = {}
+        results = []
+        for res_limit in resolutions:
+            image_processor = make_image_processor(res_limit, profile, **image_options(config))
+            prepare_time = infer_time = 0.0
+            tokens = []
+            completion_tokens = llm_processor.completion_tokens
+            answers[res_limit] = []
+
+            for file_path in files:
+                started = time.monotonic()
+                try:
+                    encoded, _ = image_processor.process_image(file_path)
+                except ValueError as e:
+                    callback(f"Could not prepare {file_path}: {e}")
+                    encoded = None
+                prepare_time += time.monotonic() - started
+
+                if not encoded:
+                    answers[res_limit].append(None)
+                    continue
+
+                with Image.open(io.BytesIO(base64.b64decode(encoded))) as img:
+                    tokens.append(vision_tokens(*img.size, profile))
+
+                started = time.monotonic()
+                answers[res_limit].append(llm_processor.describe_content("caption_and_keywords", encoded))
+                infer_time += time.monotonic() - started
+
+            completion_tokens = llm_processor.completion_tokens - completion_tokens
+            results.append({
+                "max_dimension": image_processor.max_dimension,
+                "requested": res_limit,
+                "vision_tokens": sum(tokens) / len(tokens) if tokens else 0,
+                "seconds_per_image": (prepare_time + infer_time) / len(files),
+                "tokens_per_second": completion_tokens / infer_time if completion_tokens and infer_time else None,
+                "failed": sum(1 for answer in answers[res_limit] if not keyword_set(answer)),
+            })
+
+        reference = [keyword_set(answer) for answer in answers[resolutions[-1]]]
+        for result in results:
+            scores = [agreement(keyword_set(answer), expected)
+                      for answer, expected in zip(answers[result["requested"]], reference)]
+            result["agreement"] = sum(scores) / len(scores)
+
+        callback(format_results(results))
+        acceptable = [r for r in results if r["agreement"] >= ACCEPTABLE_AGREEMENT and not r["failed"]]
+        if acceptable:
+            fastest = min(acceptable, key=lambda r: r["seconds_per_image"])
+            callback(f"Fastest with at least {ACCEPTABLE_AGREEMENT:.0%} keyword agreement: --res-limit {fastest['requested']}")
+        return results
+
+    finally:
+        llm_processor.close()
+
+def format_results(results):
+    """ The benchmark results as a table
+    """
+    lines = [f"{'res limit':>9}  {'vision tokens':>13}  {'s/image':>7}  {'tokens/s':>8}  {'agreement':>9}  {'failed':>6}"]
+    for r in results:
+        speed = f"{r['tokens_per_second']:.1f}" if r["tokens_per_second"] else "n/a"
+        lines.append(
+            f"{r['requested']:>9}  {r['vision_tokens']:>13.0f}  {r['seconds_per_image']:>7.2f}  "
+            f"{speed:>8}  {r['agreement']:>9.0%}  {r['failed']:>6}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,113 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from .image_cache import user_cache_dir
+
+RESPONSE_CACHE_FILENAME = "responses.db"
+
+def request_key(image_key, instructions, settings, model_id):
+    """ A key for a request: the image it is about, as a key that
+        leaves out the file's metadata rather than the bytes sent, the
+        instructions and earlier answers in order, the sampler and
+        output settings, and the model that answers it
+    """
+    request = {"image": image_key, "instructions": instructions, "settings": settings, "model": model_id or ""}
+    return hashlib.sha256(json.dumps(request, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """ Answers the LLM gave, by request_key, so a request that was
+        already answered is not sent again. Only answers that could be
+        used are stored.
+
+        The least recently used answers are removed when the cache is
+        opened with more than max_entries. When answers were last used
+        is written in batches of commit_every, with the next put, or on
+        commit().
+    """
+    def __init__(self, path=None, max_entries=100000, commit_every=100):
+        self.path = path or os.path.join(user_cache_dir(), RESPONSE_CACHE_FILENAME)
+        self.lock = threading.Lock()
+        self.commit_every = commit_every
+        self.used = {}  # key -> time, not written yet
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                answer TEXT NOT NULL,
+                model TEXT,
+                used REAL
+            )
+        """)
+        self.db.execute("""
+            DELETE FROM responses WHERE key NOT IN (
+                SELECT key FROM responses ORDER BY used DESC LIMIT ?
+            )
+        """, (max_entries,))
+        self.db.commit()
+
+    def get(self, key):
+        """ The stored answer for key, or None
+        """
+        with self.lock:
+            row = self.db.execute("SELECT answer FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.used[key] = time.time()
+            if len(self.used) >= self.commit_every:
+                self._write_used()
+                self.db.commit()
+            return row[0]
+
+    def _write_used(self):
+        if self.used:
+            self.db.executemany("UPDATE responses SET used = ? WHERE key = ?", [(used, key) for key, used in self.used.items()])
+            self.used = {}
+
+    def put(self, key, answer, model=None):
+        with self.lock:
+            self.used.pop(key, None)
+            self._write_used()
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, answer, model, used) VALUES (?, ?, ?, ?)",
+                (key, answer, model, time.time())
+            )
+            self.db.commit()
+
+    def commit(self):
+        """ Write when the answers looked up since the last commit were used
+        """
+        with self.lock:
+            self._write_used()
+            self.db.commit()
+
+    def clear(self):
+        with self.lock:
+            self.used = {}
+            self.db.execute("DELETE FROM responses")
+            self.db.commit()
+
+    def close(self):
+        with self.lock:
+            self._write_used()
+            self.db.commit()
+            self.db.close()
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+def shared_response_cache(path=None):
+    """ The ResponseCache at path, one per process so every
+        LLMProcessor uses the same connection
+    """
+    path = os.path.normpath(os.path.abspath(path or os.path.join(user_cache_dir(), RESPONSE_CACHE_FILENAME)))
+    with _shared_lock:
+        cache = _shared.get(path)
+        if cache is None:
+            cache = _shared[path] = ResponseCache(path)
+        return cache
@@ -0,0 +1,83 @@
+import json
+
+# What the model is asked to answer for each task that expects JSON.
+# Properties are listed in the order the model should write them.
+CAPTION_AND_KEYWORDS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "Description": {"type": "string"},
+        "Keywords": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["Description", "Keywords"],
+    "additionalProperties": False,
+}
+
+KEYWORDS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "Keywords": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["Keywords"],
+    "additionalProperties": False,
+}
+
+TASK_SCHEMAS = {
+    "keywords": CAPTION_AND_KEYWORDS_SCHEMA,
+    "caption_and_keywords": CAPTION_AND_KEYWORDS_SCHEMA,
+    "keywords_only": KEYWORDS_SCHEMA,
+}
+
+MODES = ("off", "grammar", "json_schema")
+
+# JSON strings without raw control characters. Whitespace is limited to
+# a single optional space so the model can't pad its way to max_tokens.
+GBNF_COMMON = r'''string ::= "\"" ( [^"\\\x7F\x00-\x1F] | "\\" ( ["\\/bfnrt] | "u" [0-9a-fA-F] [0-9a-fA-F] [0-9a-fA-F] [0-9a-fA-F] ) )* "\""
+string-array ::= "[" ws ( string ( ws "," ws string )* )? ws "]"
+ws ::= " "?'''
+
+def schema_for_task(task):
+    """ The JSON schema an answer to task must follow, or None for
+        free text tasks like caption
+    """
+    return TASK_SCHEMAS.get(task)
+
+def gbnf_for_schema(schema):
+    """ A GBNF grammar for an object schema whose properties are strings
+        or arrays of strings, as KoboldCpp and llama.cpp accept it.
+        Properties are written in the order they are listed.
+    """
+    members = []
+    for name, prop in schema["properties"].items():
+        if prop.get("type") == "string":
+            value = "string"
+        elif prop.get("type") == "array" and prop.get("items", {}).get("type") == "string":
+            value = "string-array"
+        else:
+            raise ValueError(f"Unsupported property type for grammar: {name}")
+        key = json.dumps(json.dumps(name))
+        members.append(f'{key} ws ":" ws {value}')
+
+    root = 'root ::= "{" ws ' + ' ws "," ws '.join(members) + ' ws "}"'
+    return root + "\n" + GBNF_COMMON
+
+def apply_structured_output(payload, task, mode):
+    """ Constrain the answer to a task to its schema. grammar sends a
+        GBNF grammar (KoboldCpp, llama.cpp), json_schema an OpenAI
+        style response_format (OpenAI, vLLM, llama.cpp). Free text
+        tasks and mode off leave the payload alone.
+    """
+    schema = schema_for_task(task)
+    if schema is None or mode in (None, "off"):
+        return payload
+
+    if mode == "grammar":
+        payload["grammar"] = gbnf_for_schema(schema)
+    elif mode == "json_schema":
+        payload["response_format"] = {
+            "type": "json_schema",
+            "json_schema": {"name": task, "schema": schema, "strict": True},
+        }
+    else:
+        raise ValueError(f"Unknown structured output mode: {mode}")
+
+    return payload
@@ -0,0 +1,210 @@
+import os
+import time
+import queue
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+# Events that may leave an image with new content behind
+CHANGE_EVENTS = frozenset(("created", "modified", "moved", "closed"))
+
+class _QueueHandler(FileSystemEventHandler):
+    """ Passes the watchdog events we care about to the watching thread
+    """
+    def __init__(self, events):
+        super().__init__()
+        self.events = events
+
+    def on_any_event(self, event):
+        if event.event_type in CHANGE_EVENTS:
+            path = event.dest_path if event.event_type == "moved" else event.src_path
+            self.events.put((os.fsdecode(path), event.is_directory))
+
+class WatchdogWatcher:
+    """ Reports image files created, changed or moved into a directory
+        tree using watchdog, which uses inotify on Linux, FSEvents on
+        macOS and ReadDirectoryChangesW on Windows. The images already
+        in new subdirectories are reported as well, since they can be
+        written before the subdirectory is watched.
+
+        None of these see changes made by other machines on network
+        shares, use PollingWatcher for those.
+    """
+    name = "watchdog"
+
+    def __init__(self, root_dir, file_extensions, recursive=True):
+        if Observer is None:
+            raise ImportError("watchdog is not installed, install it with: pip install watchdog")
+
+        self.file_extensions = frozenset(ext.lower() for ext in file_extensions)
+        self.recursive = recursive
+        self.events = queue.Queue()
+
+        self.observer = Observer()
+        self.observer.schedule(_QueueHandler(self.events), os.path.normpath(root_dir), recursive=recursive)
+        self.observer.start()
+
+    def _wanted(self, name):
+        return os.path.splitext(name)[1].lower() in self.file_extensions
+
+    def _images_in(self, directory):
+        """ The image files already in a new directory and below it
+        """
+        found = []
+        stack = [directory]
+
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif self._wanted(entry.name):
+                            found.append(os.path.normpath(entry.path))
+            except OSError:
+                pass
+
+        return found
+
+    def poll(self, timeout):
+        """ Wait up to timeout seconds for changes. Returns the paths
+            of image files that were created or written to.
+        """
+        try:
+            pending = [self.events.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+
+        while True:
+            try:
+                pending.append(self.events.get_nowait())
+            except queue.Empty:
+                break
+
+        changed = []
+        for path, is_directory in pending:
+            if is_directory:
+                if self.recursive:
+                    changed.extend(self._images_in(path))
+            elif self._wanted(path):
+                changed.append(os.path.normpath(path))
+
+        return changed
+
+    def close(self):
+        if self.observer.is_alive():
+            self.observer.stop()
+            self.observer.join()
+
+class PollingWatcher:
+    """ Reports image files created or changed in a directory tree by
+        listing it every interval seconds and comparing sizes and
+        modification times with the previous listing.
+    """
+    name = "polling"
+
+    def __init__(self, root_dir, file_extensions, recursive=True, interval=5.0):
+        self.root_dir = os.path.normpath(root_dir)
+        self.file_extensions = frozenset(ext.lower() for ext in file_extensions)
+        self.recursive = recursive
+        self.interval = interval
+        self.snapshot = self._snapshot()
+        self.next_scan = time.monotonic() + interval
+
+    def _snapshot(self):
+        files = {}
+        stack = [self.root_dir]
+
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if self.recursive:
+                                    stack.append(entry.path)
+                            elif os.path.splitext(entry.name)[1].lower() in self.file_extensions:
+                                stat = entry.stat()
+                                files[os.path.normpath(entry.path)] = (stat.st_size, stat.st_mtime_ns)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+
+        return files
+
+    def poll(self, timeout):
+        """ Wait up to timeout seconds. Returns the image files that are
+            new or changed if a listing was due in that time.
+        """
+        wait = self.next_scan - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return []
+        if wait > 0:
+            time.sleep(wait)
+
+        current = self._snapshot()
+        self.next_scan = time.monotonic() + self.interval
+
+        changed = [path for path, state in current.items() if self.snapshot.get(path) != state]
+        self.snapshot = current
+        return changed
+
+    def close(self):
+        pass
+
+def open_watcher(root_dir, file_extensions, recursive=True, poll=False, interval=5.0):
+    """ A watchdog watcher where possible, otherwise a polling one
+    """
+    if not poll:
+        try:
+            return WatchdogWatcher(root_dir, file_extensions, recursive=recursive)
+        except (ImportError, OSError) as e:
+            print(f"Can't watch for file events, polling every {interval} seconds instead: {str(e)}")
+
+    return PollingWatcher(root_dir, file_extensions, recursive=recursive, interval=interval)
+
+class Debouncer:
+    """ Holds changed files back until they have stopped changing, so
+        files that are still being copied in are not read half written.
+        A file is ready once its size and modification time have stayed
+        the same for settle seconds.
+    """
+    def __init__(self, settle=2.0):
+        self.settle = settle
+        self.pending = {}
+
+    def touch(self, file_path):
+        if file_path not in self.pending:
+            self.pending[file_path] = (None, time.monotonic())
+
+    def ready(self):
+        """ Files that have settled, mapped to their stat result.
+            Files that vanished or stayed empty are dropped.
+        """
+        now = time.monotonic()
+        settled = {}
+
+        for file_path, (last_state, since) in list(self.pending.items()):
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                del self.pending[file_path]
+                continue
+
+            state = (stat.st_size, stat.st_mtime_ns)
+            if state != last_state:
+                self.pending[file_path] = (state, now)
+            elif now - since >= self.settle:
+                del self.pending[file_path]
+                if stat.st_size > 0:
+                    settled[file_path] = stat
+
+        return settled
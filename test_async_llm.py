@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Test script for the asyncio/httpx LLM client:
+1. Verifies that describe_content blocks and returns the answer like LLMProcessor
+2. Verifies that dozens of requests are in flight at once, capped by the semaphore
+3. Verifies that 5xx responses are retried and client errors and slow answers are not
+4. Verifies that --async-llm picks it and worker threads can share it
+5. Verifies that FileProcessor keeps files in flight as coroutines, up to --async-concurrency
+"""
+
+import sys
+import os
+import time
+import asyncio
+import threading
+
+# Add project root to path
+project_root = os.path.dirname(__file__)
+sys.path.insert(0, project_root)
+
+from tests.test_utils import StubLLMServer, chat_response
+
+def httpx_available():
+    try:
+        import httpx
+        return True
+    except ImportError:
+        return False
+
+def make_processor(server, **options):
+    from src.llmii import Config
+    from src.async_llm import AsyncLLMProcessor
+
+    config = Config()
+    config.api_url = server.url
+    for key, value in options.items():
+        setattr(config, key, value)
+    processor = AsyncLLMProcessor(config)
+    processor.backoff = 0.01
+    return processor
+
+def test_blocking_describe_content():
+    """Test that the blocking interface behaves like LLMProcessor"""
+    if not httpx_available():
+        print("✗ httpx not available - skipping test")
+        return False
+
+    with StubLLMServer([(200, chat_response("caption"))]) as server:
+        processor = make_processor(server)
+        try:
+            for _ in range(3):
+                assert processor.describe_content("caption", "aW1hZ2U=") == "caption", "Should get the answer"
+
+            assert processor.describe_content("unknown", "aW1hZ2U=") is None, "Unknown task should fail"
+            assert processor.describe_content("caption", None) is None, "Missing image should fail"
+            assert len(server.requests) == 3, "Invalid requests should not be sent"
+            assert server.connections == 1, f"Requests should reuse one connection, got {server.connections}"
+            assert processor.model == "stub-model", "Model reported by the server should be kept"
+        finally:
+            processor.close()
+
+        assert not processor.thread.is_alive(), "Closing should stop the event loop thread"
+
+    print("✓ describe_content blocks and returns the answer")
+    return True
+
+def test_many_requests_in_flight():
+    """Test that the semaphore caps concurrent requests"""
+    if not httpx_available():
+        print("✗ httpx not available - skipping test")
+        return False
+
+    with StubLLMServer(delay=0.3) as server:
+        processor = make_processor(server, async_concurrency=24)
+        try:
+            async def run_all():
+                tasks = [processor.describe_content_async("caption", "aW1hZ2U=") for _ in range(48)]
+                return await asyncio.gather(*tasks)
+
+            def client_threads():
+                # Leave out the stub server's handler threads
+                return [t for t in threading.enumerate() if "process_request" not in t.name]
+
+            threads_before = len(client_threads())
+            started = time.time()
+            results = asyncio.run_coroutine_threadsafe(run_all(), processor.loop).result()
+            elapsed = time.time() - started
+
+            assert len(results) == 48 and all(results), "Every request should be answered"
+            assert server.peak_in_flight == 24, f"Expected 24 requests in flight, got {server.peak_in_flight}"
+            assert elapsed < 0.3 * 48 / 24 + 1.0, f"Requests should overlap, took {elapsed:.1f}s"
+            assert len(client_threads()) == threads_before, "No thread should be started per request"
+        finally:
+            processor.close()
+
+    print("✓ Dozens of requests in flight, capped by the semaphore")
+    return True
+
+def test_retries():
+    """Test that 5xx responses are retried and 4xx are not"""
+    if not httpx_available():
+        print("✗ httpx not available - skipping test")
+        return False
+
+    responses = [
+        (503, {"error": "busy"}),
+        (502, {"error": "bad gateway"}),
+        (200, chat_response("after retries")),
+    ]
+    with StubLLMServer(responses) as server:
+        processor = make_processor(server, http_retries=2)
+        try:
+            assert processor.describe_content("caption", "aW1hZ2U=") == "after retries", "Retried request should succeed"
+            assert len(server.requests) == 3, f"Expected two retries, got {len(server.requests) - 1}"
+        finally:
+            processor.close()
+
+    with StubLLMServer([(400, {"error": "bad request"})]) as server:
+        processor = make_processor(server)
+        try:
+            assert processor.describe_content("caption", "aW1hZ2U=") is None, "Client errors should fail"
+            assert len(server.requests) == 1, "Client errors should not be retried"
+        finally:
+            processor.close()
+
+    with StubLLMServer([(500, {"error": "broken"})]) as server:
+        processor = make_processor(server, quick_fail=True)
+        try:
+            assert processor.describe_content("caption", "aW1hZ2U=") is None, "Failed request should return None"
+            assert len(server.requests) == 1, "No retries with quick fail"
+        finally:
+            processor.close()
+
+    with StubLLMServer(delay=1.0) as server:
+        processor = make_processor(server, read_timeout=0.3, http_retries=2)
+        try:
+            assert processor.describe_content("caption", "aW1hZ2U=") is None, "Timed out request should return None"
+            assert len(server.requests) == 1, f"A slow answer should not be asked for again, sent {len(server.requests)}"
+        finally:
+            processor.close()
+
+    print("✓ Server errors are retried")
+    return True
+
+def test_async_llm_option():
+    """Test that --async-llm picks the async client and worker threads can share it"""
+    if not httpx_available():
+        print("✗ httpx not available - skipping test")
+        return False
+
+    from src.llmii import Config, make_llm_processor, LLMProcessor
+    from src.async_llm import AsyncLLMProcessor
+
+    with StubLLMServer([(200, chat_response('{"Keywords": ["tree"]}'))]) as server:
+        config = Config()
+        config.api_url = server.url
+
+        processor = make_llm_processor(config)
+        assert type(processor) is LLMProcessor, "Standard client should be the default"
+        processor.close()
+
+        config.async_llm = True
+        config.parallel = 8
+        messages = []
+        processor = make_llm_processor(config, messages.append)
+        try:
+            assert isinstance(processor, AsyncLLMProcessor), "Async client should be used when asked for"
+            assert processor.concurrency == 8, "Concurrency should default to --parallel"
+
+            results = []
+            threads = [threading.Thread(target=lambda: results.append(processor.describe_content("keywords", "aW1hZ2U="))) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            assert len(results) == 8 and all(results), "Worker threads should all get answers"
+            assert messages == [], f"Nothing should be reported, got {messages}"
+        finally:
+            processor.close()
+
+    print("✓ --async-llm picks the async client")
+    return True
+
+def test_file_processor_coroutines():
+    """Test that the infer stage does not hold a thread per request"""
+    if not httpx_available():
+        print("✗ httpx not available - skipping test")
+        return False
+
+    import shutil
+    import tempfile
+    from src.llmii import Config, FileProcessor
+
+    temp_dir = tempfile.mkdtemp()
+    with StubLLMServer(delay=0.3) as server:
+        config = Config()
+        config.api_url = server.url
+        config.health_interval = 0
+        config.directory = temp_dir
+        config.async_llm = True
+        config.parallel = 1
+        config.async_concurrency = 12
+        messages = []
+        processor = FileProcessor(config, callback=messages.append)
+        processor.indexer.join()
+
+        def fake_prepare_file(metadata, file_stat=None):
+            return {
+                "file_path": metadata["SourceFile"],
+                "metadata": dict(metadata, **{"XMP:Identifier": "uuid"}),
+                "processed_image": "aW1hZ2U=",
+                "preparation": None,
+                "image_hash": None,
+                "start_time": time.time(),
+            }
+
+        processor.prepare_file = fake_prepare_file
+        try:
+            files = [f"/test/image_{i}.jpg" for i in range(36)]
+            for file_path in files:
+                assert processor._submit_file({"SourceFile": file_path}), "Submit should succeed"
+            infer_threads = [t for t in threading.enumerate() if t.name.startswith("llmii-infer")]
+            processor._wait_for_workers()
+
+            reported = [m for m in messages if isinstance(m, dict)]
+            assert sorted(m["file_path"] for m in reported) == sorted(files), "Every file should be described"
+            assert all(m["metadata"]["XMP:Status"] == "success" for m in reported), "Every file should succeed"
+            assert server.peak_in_flight == 12, f"Expected 12 requests in flight, got {server.peak_in_flight}"
+            assert len(infer_threads) == 1, f"One thread should hand files to the loop, got {len(infer_threads)}"
+            assert not processor.in_flight, "Nothing should be left in flight"
+        finally:
+            processor.llm_processor.close()
+            processor.reader_pool.terminate()
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Files are described as coroutines, up to --async-concurrency")
+    return True
+
+def main():
+    """Run all tests"""
+    print("Testing async LLM client...\n")
+
+    tests = [
+        test_blocking_describe_content,
+        test_many_requests_in_flight,
+        test_retries,
+        test_async_llm_option,
+        test_file_processor_coroutines,
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+            print()
+        except Exception as e:
+            print(f"✗ Test failed: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append(False)
+            print()
+
+    if all(results):
+        print("✓ All async LLM client tests passed!")
+        return 0
+    else:
+        print("✗ Some tests failed")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Test script for the ways the two detailed caption queries can be sent:
+1. Verifies that sequential mode sends two full requests in order
+2. Verifies that concurrent mode has both requests in flight at once, from one thread pool
+3. Verifies that multiturn mode sends the image once and asks the caption as a follow-up
+4. Verifies that multiturn follow-ups stay on the same server
+5. Verifies that generate_metadata uses the configured mode
+"""
+
+import sys
+import os
+import time
+import json
+import shutil
+import tempfile
+
+# Add project root to path
+project_root = os.path.dirname(__file__)
+sys.path.insert(0, project_root)
+
+from tests.test_utils import StubLLMServer, chat_response, verify_exiftool_available
+
+KEYWORDS_ANSWER = json.dumps({"Keywords": ["tree", "river"]})
+CAPTION_ANSWER = "A river runs past a tall tree."
+
+def answer(payload):
+    """Keywords for the keyword instruction, a caption otherwise"""
+    instruction = payload["messages"][-1]["content"][0]["text"]
+    return chat_response(KEYWORDS_ANSWER if instruction == "keywords please" else CAPTION_ANSWER)
+
+def make_config(urls, **options):
+    from src.llmii import Config
+
+    config = Config()
+    config.api_url = ",".join(urls)
+    config.health_interval = 0
+    config.instruction = "keywords and caption please"
+    config.keyword_instruction = "keywords please"
+    config.caption_instruction = "caption please"
+    config.system_instruction = "You describe images."
+    for key, value in options.items():
+        setattr(config, key, value)
+    return config
+
+def images_sent(payload):
+    return sum(1 for message in payload["messages"] if isinstance(message["content"], list)
+               for part in message["content"] if part["type"] == "image_url")
+
+def test_sequential():
+    """Test that sequential mode sends two independent requests"""
+    from src.llmii import LLMProcessor
+
+    with StubLLMServer([(200, answer)], delay=0.1) as server:
+        processor = LLMProcessor(make_config([server.url]))
+        results = processor.describe_tasks(["keywords_only", "caption"], "aW1hZ2U=")
+        processor.close()
+
+        assert results == [KEYWORDS_ANSWER, CAPTION_ANSWER], f"Answers should come back in order, got {results}"
+        assert len(server.requests) == 2 and server.peak_in_flight == 1, "Requests should be sent one at a time"
+        assert [images_sent(p) for p in server.requests] == [1, 1], "Each request should carry the image"
+
+    print("✓ Sequential mode sends two requests in order")
+    return True
+
+def test_concurrent():
+    """Test that concurrent mode sends both requests at once"""
+    from src.llmii import LLMProcessor
+
+    with StubLLMServer([(200, answer)], delay=0.3) as server:
+        processor = LLMProcessor(make_config([server.url]))
+        started = time.time()
+        results = processor.describe_tasks(["keywords_only", "caption"], "aW1hZ2U=", mode="concurrent")
+        elapsed = time.time() - started
+        processor.close()
+
+        assert results == [KEYWORDS_ANSWER, CAPTION_ANSWER], f"Answers should come back in order, got {results}"
+        assert server.peak_in_flight == 2, "Both requests should be in flight together"
+        assert elapsed < 0.55, f"Requests should overlap, took {elapsed:.2f}s"
+
+    # Workers racing to the first concurrent request share one pool
+    import threading
+    import src.llmii as llmii
+    pools = []
+    class CountingExecutor(llmii.ThreadPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            pools.append(self)
+            time.sleep(0.05)
+            super().__init__(*args, **kwargs)
+
+    original_executor = llmii.ThreadPoolExecutor
+    llmii.ThreadPoolExecutor = CountingExecutor
+    try:
+        with StubLLMServer([(200, answer)]) as server:
+            processor = LLMProcessor(make_config([server.url]))
+            workers = [threading.Thread(target=processor.describe_tasks, args=(["keywords_only", "caption"], "aW1hZ2U="), kwargs={"mode": "concurrent"}) for _ in range(4)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            processor.close()
+    finally:
+        llmii.ThreadPoolExecutor = original_executor
+    assert len(pools) == 1, f"Workers should share one thread pool, {len(pools)} were started"
+    assert processor.executor is None, "close should shut the pool down"
+
+    try:
+        import httpx
+    except ImportError:
+        print("✓ Concurrent mode sends both requests at once (async client not tested, no httpx)")
+        return True
+
+    from src.async_llm import AsyncLLMProcessor
+    with StubLLMServer([(200, answer)], delay=0.3) as server:
+        processor = AsyncLLMProcessor(make_config([server.url], parallel=2))
+        try:
+            results = processor.describe_tasks(["keywords_only", "caption"], "aW1hZ2U=", mode="concurrent")
+        finally:
+            processor.close()
+
+        assert results == [KEYWORDS_ANSWER, CAPTION_ANSWER], f"Async answers should come back in order, got {results}"
+        assert server.peak_in_flight == 2, "Async client should send both at once"
+
+    print("✓ Concurrent mode sends both requests at once")
+    return True
+
+def test_multiturn():
+    """Test that the caption is asked as a follow-up without the image"""
+    from src.llmii import LLMProcessor
+
+    with StubLLMServer([(200, answer)]) as server:
+        processor = LLMProcessor(make_config([server.url]))
+        results = processor.describe_tasks(["keywords_only", "caption"], "aW1hZ2U=", mode="multiturn")
+        processor.close()
+
+        assert results == [KEYWORDS_ANSWER, CAPTION_ANSWER], f"Answers should come back in order, got {results}"
+        follow_up = server.requests[1]["messages"]
+        roles = [message["role"] for message in follow_up]
+        assert roles == ["system", "user", "assistant", "user"], f"Follow-up should carry the first turn, got {roles}"
+        assert follow_up[2]["content"] == KEYWORDS_ANSWER, "First answer should be in the conversation"
+        assert follow_up[3]["content"] == [{"type": "text", "text": "caption please"}], "Follow-up should be text only"
+        assert [images_sent(p) for p in server.requests] == [1, 1], "The image should be sent once per request, in the first turn"
+        assert server.requests[0]["messages"] == follow_up[:2], "Follow-up should start with the exact first prompt so it can be cached"
+
+    # A failed first turn leaves nothing to follow up on
+    with StubLLMServer([(400, {"error": "bad request"}), (200, answer)]) as server:
+        processor = LLMProcessor(make_config([server.url]))
+        results = processor.describe_tasks(["keywords_only", "caption"], "aW1hZ2U=", mode="multiturn")
+        processor.close()
+
+        assert results == [None, CAPTION_ANSWER], f"Second query should still be answered, got {results}"
+        assert len(server.requests[1]["messages"]) == 2, "Without a first answer the caption is asked on its own"
+        assert images_sent(server.requests[1]) == 1, "The image should be sent again"
+
+    print("✓ Multiturn mode sends the image once and follows up")
+    return True
+
+def test_multiturn_same_server():
+    """Test that follow-ups go where the image is cached"""
+    from src.llmii import LLMProcessor
+
+    with StubLLMServer([(200, answer)]) as a, StubLLMServer([(200, answer)]) as b:
+        processor = LLMProcessor(make_config([a.url, b.url]))
+        for _ in range(3):
+            processor.describe_tasks(["keywords_only", "caption"], "aW1hZ2U=", mode="multiturn")
+        processor.close()
+
+        for server in (a, b):
+            turns = [len(p["messages"]) for p in server.requests]
+            assert turns.count(2) == turns.count(4), f"Every follow-up should go to the server that saw the image, got {turns}"
+        assert a.requests and b.requests, "Conversations should still be spread over the servers"
+
+    print("✓ Multiturn follow-ups stay on the same server")
+    return True
+
+def test_generate_metadata_uses_mode():
+    """Test that detailed caption mode goes through the configured mode"""
+    if not verify_exiftool_available():
+        print("✗ ExifTool not available - skipping test")
+        return False
+
+    from src.llmii import FileProcessor
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        with StubLLMServer([(200, answer)]) as server:
+            config = make_config([server.url], detailed_caption=True, detailed_requests="multiturn")
+            config.directory = temp_dir
+            processor = FileProcessor(config, callback=lambda message: None)
+            try:
+                metadata = {"SourceFile": os.path.join(temp_dir, "image.jpg")}
+                result = processor.generate_metadata(metadata, "aW1hZ2U=")
+            finally:
+                processor.indexer.join()
+                processor.llm_processor.close()
+                processor.reader_pool.terminate()
+                processor.et.terminate()
+
+            assert result["MWG:Description"] == CAPTION_ANSWER, f"Caption should come from the follow-up, got {result}"
+            assert "tree" in [k.lower() for k in result["MWG:Keywords"]], f"Keywords should come from the first turn, got {result}"
+            assert len(server.requests[1]["messages"]) == 4, "Caption should be asked as a follow-up"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ generate_metadata uses the configured mode")
+    return True
+
+def main():
+    """Run all tests"""
+    print("Testing detailed caption requests...\n")
+
+    tests = [
+        test_sequential,
+        test_concurrent,
+        test_multiturn,
+        test_multiturn_same_server,
+        test_generate_metadata_uses_mode,
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+            print()
+        except Exception as e:
+            print(f"✗ Test failed: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append(False)
+            print()
+
+    if all(results):
+        print("✓ All detailed caption request tests passed!")
+        return 0
+    else:
+        print("✗ Some tests failed")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Test script for the streaming directory scanner:
+1. Verifies that only non-empty image files are queued, with their size, mtime and sidecar
+2. Verifies that files are queued as each directory is listed, not after the whole walk
+3. Verifies that the file index trusts the queued stats instead of stat'ing again
+4. Verifies that a run resumes after the checkpointed directory and clears it when done
+5. Verifies that preparing a queued file uses its stats instead of stat'ing again
+"""
+
+import sys
+import os
+import queue
+import shutil
+import tempfile
+
+# Add project root to path
+project_root = os.path.dirname(__file__)
+sys.path.insert(0, project_root)
+
+def write(root, relative, content=b"image data"):
+    file_path = os.path.join(root, relative)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "wb") as f:
+        f.write(content)
+    return os.path.normpath(file_path)
+
+def drain(found):
+    items = []
+    while not found.empty():
+        items.append(found.get())
+    return items
+
+def test_queued_files_carry_stats():
+    """Test that the queue gets image files with their stat data"""
+    from src.llmii import BackgroundIndexer, FileStat
+
+    root = tempfile.mkdtemp()
+    try:
+        photo = write(root, "photo.JPG")
+        write(root, "photo.JPG.xmp", b"<xmp/>")
+        plain = write(root, "plain.png", b"png data")
+        write(root, "empty.jpg", b"")
+        write(root, "notes.txt")
+        os.makedirs(os.path.join(root, "folder.jpg"))
+
+        found = queue.Queue()
+        indexer = BackgroundIndexer(root, found, [".jpg", ".png"], no_crawl=True)
+        indexer.run()
+
+        items = drain(found)
+        assert len(items) == 1, f"One batch expected, got {len(items)}"
+        directory, files, file_stats = items[0]
+
+        assert files == [photo, plain], f"Only non-empty images should be queued, got {files}"
+        stat = os.stat(photo)
+        assert file_stats[photo] == FileStat(stat.st_size, stat.st_mtime_ns, True), "Stats should match the file"
+        assert file_stats[plain].sidecar is False, "File without sidecar should say so"
+        assert indexer.total_files_found == 2, "Found files should be counted"
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print("✓ Queued files carry size, mtime and sidecar")
+    return True
+
+def test_files_stream_while_walking():
+    """Test that a directory's files are queued before later directories are listed"""
+    from src.llmii import BackgroundIndexer
+
+    root = tempfile.mkdtemp()
+    try:
+        for name in ("a", "b", "c"):
+            write(root, os.path.join(name, "image.jpg"))
+
+        events = []
+
+        class RecordingQueue(queue.Queue):
+            def put(self, item, *args, **kwargs):
+                events.append(("queued", item[0]))
+                super().put(item, *args, **kwargs)
+
+        indexer = BackgroundIndexer(root, RecordingQueue(), [".jpg"])
+        original = indexer._scan_directory
+
+        def recording_scan(directory):
+            events.append(("listed", directory))
+            return original(directory)
+
+        indexer._scan_directory = recording_scan
+        indexer.run()
+
+        first_queued = events.index(("queued", os.path.join(root, "a")))
+        last_listed = events.index(("listed", os.path.join(root, "c")))
+        assert first_queued < last_listed, f"Files should be queued while walking: {events}"
+
+        queued = [directory for event, directory in events if event == "queued"]
+        assert queued == [os.path.join(root, name) for name in ("a", "b", "c")], f"Directories should be queued in order: {queued}"
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print("✓ Files stream into the queue during the walk")
+    return True
+
+def test_index_uses_queued_stats():
+    """Test that the file index does not stat files it has stats for"""
+    from src.llmii import BackgroundIndexer
+    from src.file_index import FileIndex
+
+    root = tempfile.mkdtemp()
+    try:
+        photo = write(root, "photo.jpg")
+        index = FileIndex(root)
+        index.record(photo, "uuid", "success")
+
+        found = queue.Queue()
+        BackgroundIndexer(root, found, [".jpg"], no_crawl=True).run()
+        _, files, file_stats = drain(found)[0]
+
+        stat_calls = []
+        original = os.stat
+
+        def counting_stat(path, *args, **kwargs):
+            stat_calls.append(path)
+            return original(path, *args, **kwargs)
+
+        os.stat = counting_stat
+        try:
+            entries = index.lookup_many(files, file_stats)
+        finally:
+            os.stat = original
+
+        assert photo in entries, "Unchanged file should be found"
+        assert stat_calls == [], f"Index should not stat again, got {stat_calls}"
+        index.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print("✓ File index uses the stats from the scan")
+    return True
+
+def test_prepare_uses_queued_stats():
+    """Test that preparing and caching an image does not stat it again"""
+    from src.llmii import BackgroundIndexer
+    from src.image_processor import ImageProcessor
+    from src.image_cache import ImageCache
+
+    root = tempfile.mkdtemp()
+    try:
+        photo = os.path.join(root, "photo.jpg")
+        shutil.copy(os.path.join(project_root, "tests", "fixtures", "test_image.jpg"), photo)
+
+        found = queue.Queue()
+        BackgroundIndexer(root, found, [".jpg"], no_crawl=True).run()
+        _, files, file_stats = drain(found)[0]
+
+        cache = ImageCache(os.path.join(root, "cache"))
+        processor = ImageProcessor(max_dimension=448, patch_sizes=[14], cache=cache)
+
+        stat_calls = []
+        original = os.stat
+
+        def counting_stat(path, *args, **kwargs):
+            if os.fspath(path) == photo:
+                stat_calls.append(path)
+            return original(path, *args, **kwargs)
+
+        os.stat = counting_stat
+        try:
+            encoded, _ = processor.process_image(photo, file_stats[photo])
+            cached, _ = processor.process_image(photo, file_stats[photo])
+        finally:
+            os.stat = original
+
+        assert encoded and cached == encoded, "Image should be prepared and then found in the cache"
+        assert stat_calls == [], f"Preparing should not stat again, got {stat_calls}"
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print("✓ Preparing uses the stats from the scan")
+    return True
+
+def test_resume_after_checkpoint():
+    """Test that directories up to the checkpoint are not queued again"""
+    from src.llmii import BackgroundIndexer
+
+    root = tempfile.mkdtemp()
+    try:
+        for name in ("a", "b", "c"):
+            write(root, os.path.join(name, "image.jpg"))
+
+        checkpoint = os.path.join(root, ".llmii_checkpoint")
+        with open(checkpoint, "w") as f:
+            f.write(os.path.join(root, "b"))
+
+        found = queue.Queue()
+        BackgroundIndexer(root, found, [".jpg"]).run()
+
+        queued = [item[0] for item in drain(found)]
+        assert queued == [os.path.join(root, "c")], f"Only directories after the checkpoint should be queued, got {queued}"
+        assert not os.path.exists(checkpoint), "Checkpoint should be cleared once everything is queued"
+
+        found = queue.Queue()
+        BackgroundIndexer(root, found, [".jpg"]).run()
+        assert len(drain(found)) == 3, "Next run should start from the top"
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print("✓ Scan resumes after the checkpointed directory")
+    return True
+
+def main():
+    """Run all tests"""
+    print("Testing directory scanning...\n")
+
+    tests = [
+        test_queued_files_carry_stats,
+        test_files_stream_while_walking,
+        test_index_uses_queued_stats,
+        test_prepare_uses_queued_stats,
+        test_resume_after_checkpoint,
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+            print()
+        except Exception as e:
+            print(f"✗ Test failed: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append(False)
+            print()
+
+    if all(results):
+        print("✓ All directory scan tests passed!")
+        return 0
+    else:
+        print("✗ Some tests failed")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Test script for the file state index:
+1. Verifies that recorded files are found while they are unchanged
+2. Verifies that a changed size or modification time invalidates an entry
+3. Verifies that content hashing catches changes that keep size and date
+4. Verifies that entries persist between runs and that clear() empties the index
+5. Verifies that FileProcessor skips indexed files without reading their metadata
+6. Verifies that a dry run and a run with nothing to do start no ExifTool and write no index
+7. Verifies that files the index skips are still shown, from the caption and keywords it kept
+"""
+
+import sys
+import os
+import shutil
+import tempfile
+
+# Add project root to path
+project_root = os.path.dirname(__file__)
+sys.path.insert(0, project_root)
+
+from tests.test_utils import verify_exiftool_available
+
+def make_file(directory, name, content=b"image data"):
+    file_path = os.path.join(directory, name)
+    with open(file_path, "wb") as f:
+        f.write(content)
+    return file_path
+
+def test_lookup_unchanged():
+    """Test that a recorded file is found with its state"""
+    from src.file_index import FileIndex
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        file_path = make_file(temp_dir, "a.jpg")
+        index = FileIndex(temp_dir)
+
+        assert index.lookup(file_path) is None, "Unknown file should have no entry"
+
+        index.record(file_path, "uuid-a", "success", model="test-model", prompt="abc")
+        entry = index.lookup(file_path)
+
+        assert entry == {"uuid": "uuid-a", "status": "success", "model": "test-model", "prompt_hash": "abc", "caption": None, "keywords": []}, f"Unexpected entry: {entry}"
+        assert index.lookup_many([file_path, os.path.join(temp_dir, "missing.jpg")]) == {file_path: entry}, "Only known files should be returned"
+        index.close()
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Unchanged files are found in the index")
+    return True
+
+def test_changed_file_invalidates_entry():
+    """Test that a new size or mtime makes the entry stale"""
+    from src.file_index import FileIndex
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        file_path = make_file(temp_dir, "a.jpg")
+        index = FileIndex(temp_dir)
+        index.record(file_path, "uuid-a", "success")
+
+        stat = os.stat(file_path)
+        os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        assert index.lookup(file_path) is None, "New mtime should invalidate the entry"
+
+        index.record(file_path, "uuid-a", "success")
+        make_file(temp_dir, "a.jpg", b"longer image data")
+        assert index.lookup(file_path) is None, "New size should invalidate the entry"
+        index.close()
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Changed files are not trusted")
+    return True
+
+def test_hash_catches_same_size_edit():
+    """Test that hashing notices edits that keep size and mtime"""
+    from src.file_index import FileIndex
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        file_path = make_file(temp_dir, "a.jpg", b"image data")
+        stat = os.stat(file_path)
+
+        plain = FileIndex(temp_dir)
+        plain.record(file_path, "uuid-a", "success")
+        plain.close()
+
+        hashed = FileIndex(temp_dir, use_hash=True)
+        hashed.record(file_path, "uuid-a", "success")
+
+        make_file(temp_dir, "a.jpg", b"IMAGE DATA")
+        os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        assert hashed.lookup(file_path) is None, "Hash should catch the edit"
+        hashed.close()
+
+        plain = FileIndex(temp_dir)
+        assert plain.lookup(file_path) is not None, "Without hashing only size and mtime are compared"
+        plain.close()
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Content hashing catches edits that keep size and date")
+    return True
+
+def test_persist_and_clear():
+    """Test that entries survive reopening and clear() drops them"""
+    from src.file_index import FileIndex, INDEX_FILENAME
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        file_path = make_file(temp_dir, "a.jpg")
+
+        index = FileIndex(temp_dir)
+        index.record(file_path, "uuid-a", "success")
+        index.close()
+
+        assert os.path.exists(os.path.join(temp_dir, INDEX_FILENAME)), "Index should be stored in the directory"
+
+        index = FileIndex(temp_dir)
+        assert index.count() == 1, "Entry should persist between runs"
+        index.clear()
+        assert index.count() == 0, "clear() should drop every entry"
+        index.close()
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Index persists between runs and can be rebuilt")
+    return True
+
+def test_processor_skips_indexed_files():
+    """Test that indexed files never reach ExifTool"""
+    if not verify_exiftool_available():
+        print("✗ ExifTool not available - skipping test")
+        return False
+
+    from src.llmii import FileProcessor, Config
+    from src.file_index import FileIndex
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        fixture = os.path.join(project_root, "tests", "fixtures", "test_image.jpg")
+        done = os.path.join(temp_dir, "done.jpg")
+        failed = os.path.join(temp_dir, "failed.jpg")
+        new = os.path.join(temp_dir, "new.jpg")
+        for file_path in (done, failed, new):
+            shutil.copy(fixture, file_path)
+
+        index = FileIndex(temp_dir)
+        index.record(done, "uuid-done", "success")
+        index.record(failed, "uuid-failed", "failed")
+        index.close()
+
+        def run(**options):
+            config = Config()
+            config.directory = temp_dir
+            for key, value in options.items():
+                setattr(config, key, value)
+
+            processor = FileProcessor(config, callback=lambda message: None)
+            read = []
+
+            def fake_get_metadata_batch(files, file_stats=None):
+                read.extend(files)
+                return []
+
+            processor._get_metadata_batch = fake_get_metadata_batch
+            processor.process_directory(temp_dir)
+            processor.indexer.join()
+            return processor, read
+
+        processor, read = run()
+        assert sorted(read) == sorted([failed, new]), f"Only files not done should be read, got {read}"
+        assert processor.files_processed == 1, "Skipped file should count as processed"
+
+        processor, read = run(no_index=True)
+        assert sorted(read) == sorted([done, failed, new]), "Every file should be read without the index"
+
+        processor, read = run(reprocess_all=True)
+        assert sorted(read) == sorted([done, failed, new]), "Reprocessing everything should ignore the index"
+
+        processor, read = run(rebuild_index=True)
+        assert sorted(read) == sorted([done, failed, new]), "Rebuilding should read every file"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ FileProcessor skips indexed files without reading them")
+    return True
+
+def test_unchanged_run_and_dry_run():
+    """Test that nothing is started or written when there is nothing to do"""
+    if not verify_exiftool_available():
+        print("✗ ExifTool not available - skipping test")
+        return False
+
+    from src.llmii import FileProcessor, Config
+    from src.file_index import FileIndex, INDEX_FILENAME
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        fixture = os.path.join(project_root, "tests", "fixtures", "test_image.jpg")
+        done = os.path.join(temp_dir, "done.jpg")
+        shutil.copy(fixture, done)
+
+        def run(**options):
+            config = Config()
+            config.directory = temp_dir
+            for key, value in options.items():
+                setattr(config, key, value)
+
+            processor = FileProcessor(config, callback=lambda message: None)
+            processor.process_directory(temp_dir)
+            processor.indexer.join()
+            return processor
+
+        run(dry_run=True)
+        assert not os.path.exists(os.path.join(temp_dir, INDEX_FILENAME)), "A dry run should not create the index"
+
+        index = FileIndex(temp_dir)
+        index.record(done, "uuid-done", "success")
+        index.close()
+
+        processor = run()
+        assert processor.reader_pool.started() == 0, "No reader should start when every file is skipped"
+        assert not processor.et.running, "No writer should start when every file is skipped"
+
+        processor = run(dry_run=True, rebuild_index=True)
+        assert processor.files_processed == 1, "A dry run should still skip indexed files"
+        index = FileIndex(temp_dir)
+        try:
+            assert index.count() == 1, "A dry run should not clear the index"
+        finally:
+            index.close()
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Nothing is started or written when there is nothing to do")
+    return True
+
+def test_skipped_files_reported():
+    """Test that indexed files still reach the GUI without being read"""
+    if not verify_exiftool_available():
+        print("✗ ExifTool not available - skipping test")
+        return False
+
+    from src.llmii import FileProcessor, Config
+    from src.file_index import FileIndex
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        fixture = os.path.join(project_root, "tests", "fixtures", "test_image.jpg")
+        done = os.path.join(temp_dir, "done.jpg")
+        old = os.path.join(temp_dir, "old.jpg")
+        for file_path in (done, old):
+            shutil.copy(fixture, file_path)
+
+        index = FileIndex(temp_dir)
+        index.record(done, "uuid-done", "success", caption="A gray test image.", keywords=["gray", "test"])
+        index.record(old, "uuid-old", "success")
+        # Recorded by a version that did not keep the text
+        index.db.execute("UPDATE files SET keywords = NULL WHERE path = ?", (old,))
+        index.close()
+
+        def run(callback):
+            config = Config()
+            config.directory = temp_dir
+            processor = FileProcessor(config, callback=callback)
+            read = []
+
+            def fake_get_metadata_batch(files, file_stats=None):
+                read.extend(files)
+                return []
+
+            processor._get_metadata_batch = fake_get_metadata_batch
+            processor.process_directory(temp_dir)
+            processor.indexer.join()
+            return processor, read
+
+        messages = []
+        processor, read = run(messages.append)
+        image_data = [m for m in messages if isinstance(m, dict) and m.get("type") == "image_data"]
+        assert read == [old], f"Only files indexed without their text should be read, got {read}"
+        assert len(image_data) == 1, f"The skipped file should be shown, got {len(image_data)}"
+        shown = image_data[0]
+        assert shown["file_path"] == done and shown["base64_image"] is None, "It should arrive without an image"
+        assert shown["caption"] == "A gray test image." and shown["keywords"] == ["gray", "test"], f"Text should come from the index, got {shown}"
+        assert shown["save_status"] == "saved" and shown["metadata"]["XMP:Identifier"] == "uuid-done", f"Got {shown}"
+        assert processor.reader_pool.started() == 0, "Nothing should be read with ExifTool"
+
+        processor, read = run(None)
+        assert sorted(read) == [], f"Without a callback indexed files are skipped silently, got {read}"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Files the index skips are still shown")
+    return True
+
+def main():
+    """Run all tests"""
+    print("Testing file index...\n")
+
+    tests = [
+        test_lookup_unchanged,
+        test_changed_file_invalidates_entry,
+        test_hash_catches_same_size_edit,
+        test_persist_and_clear,
+        test_processor_skips_indexed_files,
+        test_unchanged_run_and_dry_run,
+        test_skipped_files_reported,
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+            print()
+        except Exception as e:
+            print(f"✗ Test failed: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append(False)
+            print()
+
+    if all(results):
+        print("✓ All file index tests passed!")
+        return 0
+    else:
+        print("✗ Some tests failed")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
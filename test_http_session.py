@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Test script for the pooled HTTP session used to talk to the LLM API:
+1. Verifies that consecutive requests reuse one connection
+2. Verifies that 5xx responses are retried and the answer is returned
+3. Verifies that retries are off with "No retries" and capped otherwise
+4. Verifies that the read timeout applies separately from the connect timeout
+5. Verifies that a slow answer is not sent again, to the same or another server
+6. Verifies that the pool keeps a connection per parallel request
+"""
+
+import sys
+import os
+import time
+import threading
+
+# Add project root to path
+project_root = os.path.dirname(__file__)
+sys.path.insert(0, project_root)
+
+from tests.test_utils import StubLLMServer, chat_response
+
+def make_processor(server, **options):
+    from src.llmii import LLMProcessor, Config
+
+    config = Config()
+    config.api_url = server.url
+    for key, value in options.items():
+        setattr(config, key, value)
+    return LLMProcessor(config)
+
+def test_connection_reused():
+    """Test that requests share one keep-alive connection"""
+    with StubLLMServer([(200, chat_response("caption"))]) as server:
+        processor = make_processor(server)
+
+        for _ in range(5):
+            assert processor.describe_content("caption", "aW1hZ2U=") == "caption", "Should get the answer"
+
+        assert len(server.requests) == 5, "Every request should reach the server"
+        assert server.connections == 1, f"Requests should reuse one connection, got {server.connections}"
+        assert processor.model == "stub-model", "Model reported by the server should be kept"
+
+    print("✓ Requests reuse one connection")
+    return True
+
+def test_server_errors_retried():
+    """Test that 5xx responses are retried with backoff"""
+    responses = [
+        (503, {"error": "busy"}),
+        (502, {"error": "bad gateway"}),
+        (200, chat_response("after retries")),
+    ]
+    with StubLLMServer(responses) as server:
+        processor = make_processor(server, http_retries=2)
+        processor.session.adapters["http://"].max_retries.backoff_factor = 0.01
+
+        assert processor.describe_content("caption", "aW1hZ2U=") == "after retries", "Retried request should succeed"
+        assert len(server.requests) == 3, f"Expected two retries, got {len(server.requests) - 1}"
+
+    with StubLLMServer([(400, {"error": "bad request"})]) as server:
+        processor = make_processor(server)
+        assert processor.describe_content("caption", "aW1hZ2U=") is None, "Client errors should fail"
+        assert len(server.requests) == 1, "Client errors should not be retried"
+
+    print("✓ Server errors are retried")
+    return True
+
+def test_retry_limits():
+    """Test that quick fail turns retries off and they are capped otherwise"""
+    with StubLLMServer([(500, {"error": "broken"})]) as server:
+        processor = make_processor(server, quick_fail=True)
+        assert processor.describe_content("caption", "aW1hZ2U=") is None, "Failed request should return None"
+        assert len(server.requests) == 1, "No retries with quick fail"
+
+    with StubLLMServer([(500, {"error": "broken"})]) as server:
+        processor = make_processor(server, http_retries=1)
+        processor.session.adapters["http://"].max_retries.backoff_factor = 0.01
+        assert processor.describe_content("caption", "aW1hZ2U=") is None, "Failed request should return None"
+        assert len(server.requests) == 2, f"Expected one retry, got {len(server.requests) - 1}"
+
+    print("✓ Retries are limited")
+    return True
+
+def test_read_timeout():
+    """Test that a slow answer hits the read timeout, not the connect one"""
+    with StubLLMServer(delay=1.0) as server:
+        processor = make_processor(server, read_timeout=0.2, http_retries=0)
+        assert processor.timeout == (10, 0.2), f"Timeouts should be (connect, read), got {processor.timeout}"
+
+        started = time.time()
+        assert processor.describe_content("caption", "aW1hZ2U=") is None, "Timed out request should return None"
+        assert time.time() - started < 0.9, "Request should give up after the read timeout"
+
+    print("✓ Read timeout is separate from connect timeout")
+    return True
+
+def test_read_timeout_not_resent():
+    """Test that a request that timed out waiting for the answer is not sent again"""
+    import requests
+    from urllib3.exceptions import ReadTimeoutError
+    from src.llmii import read_timed_out
+
+    with StubLLMServer(delay=1.5) as slow, StubLLMServer() as fast:
+        for task in ("caption", "keywords"):
+            processor = make_processor(
+                slow, api_url=f"{slow.url},{fast.url}", health_interval=0,
+                read_timeout=0.5, http_retries=2, stream=True
+            )
+            try:
+                assert processor.describe_content(task, "aW1hZ2U=") is None, "Timed out request should return None"
+                endpoint = processor.endpoints.endpoints[0]
+                assert endpoint.healthy and endpoint.failures == 0, "A slow server should not count as failing"
+            finally:
+                processor.close()
+
+        assert len(slow.requests) == 2, f"Each request should be sent once, got {len(slow.requests)}"
+        assert not fast.requests, "A slow answer should not be sent to another server"
+
+    # Streams that stall come back from requests as ConnectionError
+    assert read_timed_out(requests.ConnectionError(ReadTimeoutError(None, None, "Read timed out.")))
+    assert not read_timed_out(requests.ConnectionError("Connection refused"))
+
+    print("✓ Slow answers are not sent again")
+    return True
+
+def test_pool_matches_parallel():
+    """Test that parallel requests each keep their own connection"""
+    with StubLLMServer(delay=0.2) as server:
+        processor = make_processor(server, parallel=4, http_pool_size=1)
+        assert processor.session.adapters["http://"]._pool_maxsize == 4, "Pool should be at least --parallel"
+
+        def run_batch():
+            threads = [threading.Thread(target=processor.describe_content, args=("caption", "aW1hZ2U=")) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        run_batch()
+        run_batch()
+
+        assert server.peak_in_flight == 4, f"Requests should run in parallel, got {server.peak_in_flight}"
+        assert server.connections == 4, f"Second batch should reuse the pooled connections, got {server.connections}"
+
+    print("✓ Pool keeps a connection per parallel request")
+    return True
+
+def main():
+    """Run all tests"""
+    print("Testing pooled HTTP session...\n")
+
+    tests = [
+        test_connection_reused,
+        test_server_errors_retried,
+        test_retry_limits,
+        test_read_timeout,
+        test_read_timeout_not_resent,
+        test_pool_matches_parallel,
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+            print()
+        except Exception as e:
+            print(f"✗ Test failed: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append(False)
+            print()
+
+    if all(results):
+        print("✓ All HTTP session tests passed!")
+        return 0
+    else:
+        print("✗ Some tests failed")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
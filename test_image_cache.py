@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Test script for the cache of prepared images:
+1. Verifies that a file prepared once is served from the cache afterwards
+2. Verifies that other settings or changed contents are not served the old payload
+3. Verifies that the least recently used payloads are removed past the size cap
+4. Verifies that the cache and its recency survive a restart
+5. Verifies that Config turns the cache on when asked and shares one per directory
+6. Verifies that content hashes are remembered across restarts until the file changes
+7. Verifies that writing metadata into a file doesn't stop its prepared image being reused
+"""
+
+import sys
+import os
+import time
+import shutil
+import tempfile
+
+# Add project root to path
+project_root = os.path.dirname(__file__)
+sys.path.insert(0, project_root)
+
+from PIL import Image
+
+def save_image(directory, name, color="gray", size=(1200, 900)):
+    path = os.path.join(directory, name)
+    Image.new("RGB", size, color).save(path, quality=90)
+    return path
+
+def test_cache_hit():
+    """Test that a prepared image is reused"""
+    from src.image_processor import ImageProcessor
+    from src.image_cache import ImageCache
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = save_image(temp_dir, "photo.jpg")
+        cache = ImageCache(os.path.join(temp_dir, "cache"))
+        processor = ImageProcessor(max_dimension=448, patch_sizes=[14], cache=cache)
+
+        first, _ = processor.process_image(path)
+        second, _ = processor.process_image(path)
+        assert first == second, "Cached payload should be the same"
+        assert processor.stats["encoded"] == 1 and processor.stats["cached"] == 1, f"Second call should hit the cache, got {processor.stats}"
+        assert processor.last_preparation()["method"] == "cached", "Per file record should show the cache"
+
+        # Another processor with the same settings, like the GUI preview, shares it
+        other = ImageProcessor(max_dimension=448, patch_sizes=[14], cache=cache)
+        assert other.process_image(path)[0] == first and other.stats["encoded"] == 0, "Same settings should share payloads"
+
+        # A renamed copy has the same contents
+        copy = os.path.join(temp_dir, "renamed.jpg")
+        shutil.copy(path, copy)
+        other.process_image(copy)
+        assert other.stats["cached"] == 2, "Files are recognized by their contents"
+
+        assert "2 from the cache" in other.report(), f"Report should show cache use: {other.report()}"
+        assert "3 hits, 1 misses" in cache.report(), f"Cache should count hits and misses: {cache.report()}"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Prepared images are served from the cache")
+    return True
+
+def test_cache_misses():
+    """Test that settings and contents are part of the key"""
+    from src.image_processor import ImageProcessor
+    from src.image_cache import ImageCache
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = save_image(temp_dir, "photo.jpg")
+        cache = ImageCache(os.path.join(temp_dir, "cache"))
+        ImageProcessor(max_dimension=448, patch_sizes=[14], cache=cache).process_image(path)
+
+        for options in ({"max_dimension": 224}, {"image_format": "webp"}, {"quality": 80}, {"max_bytes": 4096}):
+            args = {"max_dimension": 448, "patch_sizes": [14], "cache": cache}
+            args.update(options)
+            processor = ImageProcessor(**args)
+            processor.process_image(path)
+            assert processor.stats["cached"] == 0, f"{options} should not reuse the payload"
+
+        # Same path, new contents
+        time.sleep(0.01)
+        save_image(temp_dir, "photo.jpg", color="red")
+        processor = ImageProcessor(max_dimension=448, patch_sizes=[14], cache=cache)
+        processor.process_image(path)
+        assert processor.stats["cached"] == 0, "Changed files should be prepared again"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Other settings and changed files are prepared again")
+    return True
+
+def test_eviction():
+    """Test that the least recently used payloads go first"""
+    from src.image_cache import ImageCache
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        cache = ImageCache(temp_dir, max_bytes=2500)
+        for key in ("a1", "b2", "c3"):
+            cache.put(key, "x" * 1000)
+        assert "a1" not in cache.entries and cache.evictions == 1, "Oldest payload should be evicted"
+        assert not os.path.exists(cache._path("a1")), "Evicted payload should be deleted"
+
+        cache.get("b2")
+        cache.put("d4", "x" * 1000)
+        assert list(cache.entries) == ["b2", "d4"], f"Recently read payloads should be kept, got {list(cache.entries)}"
+        assert cache.total_bytes == 2000, f"Size should be tracked, got {cache.total_bytes}"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Least recently used payloads are evicted past the cap")
+    return True
+
+def test_persistence():
+    """Test that a new cache finds the payloads and their order"""
+    from src.image_cache import ImageCache
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        cache = ImageCache(temp_dir, max_bytes=10000)
+        for key in ("a1", "b2", "c3"):
+            cache.put(key, f"payload {key}")
+            time.sleep(0.01)
+        time.sleep(0.01)
+        cache.get("a1")
+
+        reopened = ImageCache(temp_dir, max_bytes=10000)
+        assert list(reopened.entries) == ["b2", "c3", "a1"], f"Recency should survive a restart, got {list(reopened.entries)}"
+        assert reopened.get("c3") == "payload c3", "Payloads should survive a restart"
+
+        # Another process removed a payload
+        os.remove(reopened._path("b2"))
+        assert reopened.get("b2") is None and "b2" not in reopened.entries, "Missing payloads are misses"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ The cache survives a restart")
+    return True
+
+def test_config():
+    """Test the cache options"""
+    from src.llmii import Config, image_options
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        config = Config()
+        assert image_options(config)["cache"] is None, "The cache should be off unless asked for"
+
+        config.image_cache = True
+        config.image_cache_dir = temp_dir
+        config.image_cache_mb = 64
+        cache = image_options(config)["cache"]
+        assert cache is not None and cache.max_bytes == 64 * 1024 * 1024, "Cache should be on with its size"
+        assert image_options(config)["cache"] is cache, "One cache per directory should be shared"
+
+        config.image_cache = False
+        assert image_options(config)["cache"] is None, "Cache should be off when asked"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Config turns the cache on and off")
+    return True
+
+def test_hashes_remembered():
+    """Test that an unchanged file is not hashed again by a new cache"""
+    import src.image_cache as image_cache
+    from src.image_cache import ImageCache
+
+    temp_dir = tempfile.mkdtemp()
+    hashed = []
+    original = image_cache.image_hash
+
+    def counting_image_hash(file_path):
+        hashed.append(file_path)
+        return original(file_path)
+
+    image_cache.image_hash = counting_image_hash
+    try:
+        path = save_image(temp_dir, "photo.jpg")
+        cache_dir = os.path.join(temp_dir, "cache")
+        cache = ImageCache(cache_dir)
+        key = cache.key(path, ("settings",))
+        assert cache.key(path, ("settings",)) == key and hashed == [path], "A file should be hashed once per session"
+        cache.commit()
+
+        reopened = ImageCache(cache_dir)
+        assert reopened.key(path, ("settings",)) == key, "Keys should not change across restarts"
+        assert hashed == [path], "An unchanged file should not be hashed again after a restart"
+
+        # Same size, new contents and modification time
+        save_image(temp_dir, "photo.jpg", color="white")
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        assert ImageCache(cache_dir).key(path, ("settings",)) != key, "A changed file should get a new key"
+        assert hashed == [path, path], "A changed file should be hashed again"
+    finally:
+        image_cache.image_hash = original
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Content hashes are remembered across restarts")
+    return True
+
+def test_tagged_file_hits():
+    """Test that a file is found again after its metadata was written"""
+    import struct
+    from PIL.PngImagePlugin import PngInfo
+    from src.image_processor import ImageProcessor
+    from src.image_cache import ImageCache
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        jpeg = save_image(temp_dir, "photo.jpg")
+        png = os.path.join(temp_dir, "photo.png")
+        Image.new("RGB", (1200, 900), "gray").save(png)
+        cache = ImageCache(os.path.join(temp_dir, "cache"))
+        ImageProcessor(max_dimension=448, patch_sizes=[14], cache=cache).process_image(jpeg)
+        ImageProcessor(max_dimension=448, patch_sizes=[14], cache=cache).process_image(png)
+
+        # Tag both the way a save does: XMP after the JFIF header, text chunks in the PNG
+        time.sleep(0.01)
+        with open(jpeg, "rb") as f:
+            data = f.read()
+        xmp = b"http://ns.adobe.com/xap/1.0/\x00<x:xmpmeta><dc:subject>gray</dc:subject></x:xmpmeta>"
+        segment = b"\xff\xe1" + struct.pack(">H", len(xmp) + 2) + xmp
+        jfif_end = 4 + struct.unpack(">H", data[4:6])[0]
+        with open(jpeg, "wb") as f:
+            f.write(data[:jfif_end] + segment + data[jfif_end:])
+        info = PngInfo()
+        info.add_itxt("XML:com.adobe.xmp", "<x:xmpmeta><dc:subject>gray</dc:subject></x:xmpmeta>")
+        info.add_text("Description", "A gray image.")
+        Image.new("RGB", (1200, 900), "gray").save(png, pnginfo=info)
+
+        reopened = ImageCache(os.path.join(temp_dir, "cache"))
+        processor = ImageProcessor(max_dimension=448, patch_sizes=[14], cache=reopened)
+        processor.process_image(jpeg)
+        processor.process_image(png)
+        assert processor.stats["cached"] == 2, f"Tagged files should still hit the cache, got {processor.stats}"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Writing metadata into a file keeps its prepared image")
+    return True
+
+def main():
+    """Run all tests"""
+    print("Testing the image cache...\n")
+
+    tests = [
+        test_cache_hit,
+        test_cache_misses,
+        test_eviction,
+        test_persistence,
+        test_config,
+        test_hashes_remembered,
+        test_tagged_file_hits,
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+            print()
+        except Exception as e:
+            print(f"✗ Test failed: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append(False)
+            print()
+
+    if all(results):
+        print("✓ All image cache tests passed!")
+        return 0
+    else:
+        print("✗ Some tests failed")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Test script for incremental directory scans:
+1. Verifies that a full scan finds every file and records finished directories
+2. Verifies that an incremental scan skips unchanged directories without listing them
+3. Verifies that new files and new subdirectories are still found
+4. Verifies that directories with unfinished files are not recorded
+5. Verifies that done files are counted per directory, not per subtree
+"""
+
+import sys
+import os
+import queue
+import shutil
+import tempfile
+
+# Add project root to path
+project_root = os.path.dirname(__file__)
+sys.path.insert(0, project_root)
+
+def make_tree(root):
+    """Create root/a.jpg, root/sub/b.jpg, root/sub/deep/c.jpg and root/other/d.jpg"""
+    files = []
+    for relative in ("a.jpg", "sub/b.jpg", "sub/deep/c.jpg", "other/d.jpg"):
+        file_path = os.path.join(root, relative)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "wb") as f:
+            f.write(b"image data")
+        files.append(os.path.normpath(file_path))
+    return files
+
+def scan(root, index, incremental):
+    """Run an indexer to completion and return it with the files it queued"""
+    from src.llmii import BackgroundIndexer
+
+    # Resuming from a checkpoint is not what these tests are about
+    checkpoint = os.path.join(root, ".llmii_checkpoint")
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+
+    found = queue.Queue()
+    indexer = BackgroundIndexer(root, found, [".jpg"], file_index=index, incremental=incremental)
+    indexer.start()
+    indexer.join()
+
+    files = []
+    while not found.empty():
+        files.extend(found.get()[1])
+    return indexer, sorted(files)
+
+def finish_scan(indexer, index, files):
+    """Pretend every file was processed and save the directory states"""
+    for file_path in files:
+        index.record(file_path, "uuid", "success")
+    return indexer.save_directory_states()
+
+def root_file(root):
+    return os.path.normpath(os.path.join(root, "a.jpg"))
+
+def touch_dir(directory):
+    """Move a directory's mtime forward so the change is seen on coarse clocks"""
+    stat = os.stat(directory)
+    os.utime(directory, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+def test_full_scan_records_directories():
+    """Test that a completed full scan stores every finished directory"""
+    from src.file_index import FileIndex
+
+    root = tempfile.mkdtemp()
+    try:
+        files = make_tree(root)
+        index = FileIndex(root)
+
+        indexer, found = scan(root, index, incremental=False)
+        assert found == sorted(files), f"Full scan should find every file, got {found}"
+        assert indexer.skipped_dirs == 0, "Full scan should not skip directories"
+
+        saved = finish_scan(indexer, index, found)
+        assert saved == 4, f"Every directory should be recorded, got {saved}"
+
+        state = index.lookup_dir(os.path.normpath(os.path.join(root, "sub")))
+        assert state["file_count"] == 1, "Directory should store its file count"
+        assert state["subdirs"] == [os.path.normpath(os.path.join(root, "sub", "deep"))], "Directory should store its subdirectories"
+        index.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print("✓ Full scan records finished directories")
+    return True
+
+def test_incremental_skips_unchanged():
+    """Test that unchanged directories are not listed again"""
+    from src.file_index import FileIndex
+
+    root = tempfile.mkdtemp()
+    try:
+        files = make_tree(root)
+        index = FileIndex(root)
+        indexer, found = scan(root, index, incremental=True)
+        finish_scan(indexer, index, found)
+
+        # The root holds the index and checkpoints, so it always changes
+        touch_dir(root)
+
+        listed = []
+        original = os.scandir
+
+        def counting_scandir(path="."):
+            listed.append(path)
+            return original(path)
+
+        os.scandir = counting_scandir
+        try:
+            indexer, found = scan(root, index, incremental=True)
+        finally:
+            os.scandir = original
+
+        assert found == [root_file(root)], f"Only the root should be queued, got {found}"
+        assert indexer.skipped_dirs == 3, f"Every other directory should be skipped, got {indexer.skipped_dirs}"
+        assert indexer.skipped_files == len(files) - 1, "Skipped file count should come from the last scan"
+        assert listed == [os.path.normpath(root)], f"Unchanged directories should not be listed, got {listed}"
+
+        indexer, found = scan(root, index, incremental=False)
+        assert found == sorted(files), "Full scan should still find every file"
+        index.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print("✓ Incremental scan skips unchanged directories")
+    return True
+
+def test_incremental_finds_changes():
+    """Test that new files and subdirectories are found"""
+    from src.file_index import FileIndex
+
+    root = tempfile.mkdtemp()
+    try:
+        make_tree(root)
+        index = FileIndex(root)
+        indexer, found = scan(root, index, incremental=True)
+        finish_scan(indexer, index, found)
+
+        # A new file two levels down below unchanged parents
+        deep = os.path.join(root, "sub", "deep")
+        new_file = os.path.normpath(os.path.join(deep, "new.jpg"))
+        with open(new_file, "wb") as f:
+            f.write(b"image data")
+        touch_dir(deep)
+
+        # A new subdirectory in a directory that was already scanned
+        new_dir = os.path.join(root, "other", "added")
+        os.makedirs(new_dir)
+        added_file = os.path.normpath(os.path.join(new_dir, "e.jpg"))
+        with open(added_file, "wb") as f:
+            f.write(b"image data")
+        touch_dir(os.path.join(root, "other"))
+
+        indexer, found = scan(root, index, incremental=True)
+        expected = sorted([
+            root_file(root),
+            new_file,
+            os.path.normpath(os.path.join(deep, "c.jpg")),
+            os.path.normpath(os.path.join(root, "other", "d.jpg")),
+            added_file,
+        ])
+        assert found == expected, f"Changed directories should be scanned, got {found}"
+        assert indexer.skipped_dirs == 1, f"Only sub should be skipped, got {indexer.skipped_dirs}"
+        index.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print("✓ Incremental scan finds new files and directories")
+    return True
+
+def test_unfinished_directory_not_recorded():
+    """Test that a directory is only recorded when all its files are done"""
+    from src.file_index import FileIndex
+
+    root = tempfile.mkdtemp()
+    try:
+        files = make_tree(root)
+        index = FileIndex(root)
+        indexer, found = scan(root, index, incremental=True)
+
+        unfinished = os.path.normpath(os.path.join(root, "other", "d.jpg"))
+        finish_scan(indexer, index, [f for f in found if f != unfinished])
+        index.record(unfinished, "uuid", "failed")
+        indexer.save_directory_states()
+
+        assert index.lookup_dir(os.path.dirname(unfinished)) is None, "Directory with a failed file should not be recorded"
+
+        indexer, found = scan(root, index, incremental=True)
+        assert found == [root_file(root), unfinished], f"Only the root and the unfinished directory should be scanned, got {found}"
+        index.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print("✓ Directories with unfinished files are scanned again")
+    return True
+
+def test_count_done_per_directory():
+    """Test that done files are counted only directly inside a directory"""
+    from src.file_index import FileIndex
+
+    root = tempfile.mkdtemp()
+    try:
+        index = FileIndex(root)
+        for relative in ("a/1.jpg", "a/2.jpg", "a/deep/3.jpg", "ab/4.jpg", "a_/5.jpg"):
+            file_path = os.path.join(root, relative)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, "wb") as f:
+                f.write(b"x")
+            index.record(file_path, "uuid", "success")
+
+        assert index.count_done(os.path.join(root, "a")) == 2, "Only files directly in the directory should count"
+        assert index.count_done(os.path.join(root, "ab")) == 1, "Similar names should not be mixed up"
+        index.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print("✓ Done files are counted per directory")
+    return True
+
+def main():
+    """Run all tests"""
+    print("Testing incremental scans...\n")
+
+    tests = [
+        test_full_scan_records_directories,
+        test_incremental_skips_unchanged,
+        test_incremental_finds_changes,
+        test_unfinished_directory_not_recorded,
+        test_count_done_per_directory,
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+            print()
+        except Exception as e:
+            print(f"✗ Test failed: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append(False)
+            print()
+
+    if all(results):
+        print("✓ All incremental scan tests passed!")
+        return 0
+    else:
+        print("✗ Some tests failed")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
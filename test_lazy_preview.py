@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Test script for lazy previews of already processed files:
+1. Verifies that files marked to skip the LLM are never decoded
+2. Verifies that files still needing the LLM are decoded as before
+3. Verifies that the GUI renders a missing preview on demand and keeps it
+"""
+
+import sys
+import os
+import shutil
+import tempfile
+from types import SimpleNamespace
+
+# Add project root to path
+project_root = os.path.dirname(__file__)
+sys.path.insert(0, project_root)
+
+from tests.test_utils import verify_exiftool_available
+
+FIXTURE = os.path.join(project_root, "tests", "fixtures", "test_image.jpg")
+
+def make_processor():
+    from src.llmii import FileProcessor, Config
+
+    config = Config()
+    config.directory = tempfile.mkdtemp()
+
+    messages = []
+    processor = FileProcessor(config, callback=messages.append)
+    processor.indexer.join()
+
+    file_path = os.path.join(config.directory, "done.jpg")
+    shutil.copy(FIXTURE, file_path)
+    return processor, file_path, messages
+
+def count_decodes(processor):
+    """Wrap the processor's image decoding and count calls"""
+    decoded = []
+    original = processor.image_processor.process_image
+
+    def counting_process_image(file_path, file_stat=None):
+        decoded.append(file_path)
+        return original(file_path, file_stat)
+
+    processor.image_processor.process_image = counting_process_image
+    return decoded
+
+def test_skipped_file_not_decoded():
+    """Test that an already processed file is reported without decoding it"""
+    if not verify_exiftool_available():
+        print("✗ ExifTool not available - skipping test")
+        return False
+
+    processor, file_path, messages = make_processor()
+    decoded = count_decodes(processor)
+
+    try:
+        metadata = {
+            "SourceFile": file_path,
+            "XMP:Identifier": "a4c4f3a8-0000-4000-8000-000000000000",
+            "XMP:Status": "success",
+            "MWG:Keywords": ["done"],
+            "MWG:Description": "Already done",
+        }
+
+        job = processor.prepare_file(metadata)
+        assert job is not None, "Skipped file should still be reported"
+        assert job["processed_image"] is None, "Skipped file should have no image"
+        assert not decoded, "Skipped file should not be decoded"
+
+        job = processor.infer_file(job)
+        assert processor.finish_file(job) == False, "Skipped file should not be written"
+
+        image_data = [m for m in messages if isinstance(m, dict)]
+        assert len(image_data) == 1, "Skipped file should be sent to the GUI"
+        assert image_data[0]["base64_image"] is None, "GUI should get no image for a skipped file"
+        assert image_data[0]["file_path"] == file_path, "GUI should get the path to load the preview from"
+        assert image_data[0]["save_status"] == "saved", "Skipped file is already saved"
+    finally:
+        processor.reader_pool.terminate()
+        processor.et.terminate()
+        shutil.rmtree(processor.config.directory, ignore_errors=True)
+
+    print("✓ Already processed files are not decoded")
+    return True
+
+def test_new_file_still_decoded():
+    """Test that a file that needs the LLM is still decoded"""
+    if not verify_exiftool_available():
+        print("✗ ExifTool not available - skipping test")
+        return False
+
+    processor, file_path, messages = make_processor()
+    decoded = count_decodes(processor)
+
+    try:
+        job = processor.prepare_file({"SourceFile": file_path})
+        assert job is not None, "New file should be prepared"
+        assert decoded == [file_path], "New file should be decoded once"
+        assert job["processed_image"], "New file should have an image for the LLM"
+    finally:
+        processor.reader_pool.terminate()
+        processor.et.terminate()
+        shutil.rmtree(processor.config.directory, ignore_errors=True)
+
+    print("✓ New files are decoded for the LLM")
+    return True
+
+def test_gui_preview_rendered_on_demand():
+    """Test that the GUI renders a missing preview once and keeps it"""
+    from src.llmii_gui import ImageIndexerGUI
+    from src.image_processor import ImageProcessor
+
+    decoded = []
+    original = ImageProcessor.process_image
+
+    def counting_process_image(self, file_path, file_stat=None):
+        decoded.append((file_path, self.image_format))
+        return original(self, file_path, file_stat)
+
+    # Only the widgets ensure_preview reads, with the image cache off
+    window = SimpleNamespace(
+        image_history=[("", "Already done", ["done"], "done.jpg", FIXTURE, "saved", {})],
+        settings_dialog=SimpleNamespace(
+            res_limit=SimpleNamespace(value=lambda: 448),
+            image_cache_checkbox=SimpleNamespace(isChecked=lambda: False),
+        ),
+    )
+
+    ImageProcessor.process_image = counting_process_image
+    try:
+        first = ImageIndexerGUI.ensure_preview(window, 0)
+        second = ImageIndexerGUI.ensure_preview(window, 0)
+    finally:
+        ImageProcessor.process_image = original
+
+    assert first, "Preview should be rendered from the file"
+    assert second == first, "Rendered preview should be reused"
+    assert decoded == [(FIXTURE, "JPEG")], f"Preview should be decoded once as JPEG, got {decoded}"
+    assert window.image_history[0][0] == first, "Preview should be stored in the history"
+
+    window.image_history[0] = ("", "Gone", [], "gone.jpg", "/nonexistent/gone.jpg", "saved", {})
+    assert ImageIndexerGUI.ensure_preview(window, 0) == "", "Missing file should give no preview"
+
+    print("✓ GUI renders previews on demand")
+    return True
+
+def main():
+    """Run all tests"""
+    print("Testing lazy previews...\n")
+
+    tests = [
+        test_skipped_file_not_decoded,
+        test_new_file_still_decoded,
+        test_gui_preview_rendered_on_demand,
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+            print()
+        except Exception as e:
+            print(f"✗ Test failed: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append(False)
+            print()
+
+    if all(results):
+        print("✓ All lazy preview tests passed!")
+        return 0
+    else:
+        print("✗ Some tests failed")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
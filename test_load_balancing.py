@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Test script for spreading LLM requests over several API servers:
+1. Verifies that API URLs can be given as one string or a list
+2. Verifies that requests go to the server with the fewest outstanding
+   and that throughput scales with the number of servers
+3. Verifies that the latency strategy prefers the faster server
+4. Verifies that an unreachable server is skipped and ejected
+5. Verifies that health checks eject and readmit servers
+6. Verifies that the async client spreads its requests too
+"""
+
+import sys
+import os
+import time
+import threading
+
+# Add project root to path
+project_root = os.path.dirname(__file__)
+sys.path.insert(0, project_root)
+
+from tests.test_utils import StubLLMServer, chat_response
+
+def make_processor(urls, **options):
+    from src.llmii import LLMProcessor, Config
+
+    config = Config()
+    config.api_url = ",".join(urls)
+    config.health_interval = 0
+    for key, value in options.items():
+        setattr(config, key, value)
+    return LLMProcessor(config)
+
+def run_parallel(processor, count, workers):
+    """Send count requests from workers threads, returns the answers"""
+    results = []
+    lock = threading.Lock()
+    remaining = [count]
+
+    def work():
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            result = processor.describe_content("caption", "aW1hZ2U=")
+            with lock:
+                results.append(result)
+
+    threads = [threading.Thread(target=work) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def test_parse_api_urls():
+    """Test that one or several URLs are accepted"""
+    from src.endpoints import parse_api_urls
+
+    assert parse_api_urls("http://localhost:5001") == ["http://localhost:5001"], "Single URL should be kept"
+    assert parse_api_urls("http://a:5001/, http://b:5001") == ["http://a:5001", "http://b:5001"], "Comma separated URLs should be split"
+    assert parse_api_urls(["http://a:5001", " http://b:5001 "]) == ["http://a:5001", "http://b:5001"], "Lists should be accepted"
+    assert parse_api_urls("") == [], "Empty string should give no URLs"
+
+    print("✓ API URLs are parsed")
+    return True
+
+def test_least_outstanding_scales():
+    """Test that work is spread evenly and finishes faster with more servers"""
+    with StubLLMServer(delay=0.1, slots=1) as one:
+        processor = make_processor([one.url], parallel=2)
+        started = time.time()
+        assert all(run_parallel(processor, 12, workers=2)), "Every request should be answered"
+        single = time.time() - started
+        processor.close()
+
+    with StubLLMServer(delay=0.1, slots=1) as a, StubLLMServer(delay=0.1, slots=1) as b:
+        processor = make_processor([a.url, b.url], parallel=2)
+        started = time.time()
+        assert all(run_parallel(processor, 12, workers=2)), "Every request should be answered"
+        double = time.time() - started
+        processor.close()
+
+        assert len(a.requests) == len(b.requests) == 6, f"Requests should be split evenly, got {len(a.requests)} and {len(b.requests)}"
+        assert a.peak_in_flight == b.peak_in_flight == 1, "Each server should get one request at a time"
+
+    assert double < single * 0.7, f"Two servers should be close to twice as fast: {single:.2f}s vs {double:.2f}s"
+
+    print(f"✓ Requests are spread evenly ({single:.2f}s on one server, {double:.2f}s on two)")
+    return True
+
+def test_latency_strategy():
+    """Test that the faster server gets most of the work"""
+    with StubLLMServer(delay=0.01) as fast, StubLLMServer(delay=0.2) as slow:
+        processor = make_processor([slow.url, fast.url], load_balance="latency")
+        for _ in range(10):
+            assert processor.describe_content("caption", "aW1hZ2U="), "Request should be answered"
+        processor.close()
+
+        assert len(slow.requests) == 1, f"Slow server should only be measured once, got {len(slow.requests)}"
+        assert len(fast.requests) == 9, f"Fast server should get the rest, got {len(fast.requests)}"
+
+    print("✓ Latency strategy prefers the faster server")
+    return True
+
+def test_unreachable_server_skipped():
+    """Test that requests fail over and a dead server is ejected"""
+    with StubLLMServer() as alive:
+        dead = StubLLMServer()
+        dead_url = dead.url
+        dead.httpd.server_close()
+
+        processor = make_processor([dead_url, alive.url], http_retries=0)
+        for _ in range(5):
+            assert processor.describe_content("caption", "aW1hZ2U="), "Requests should fail over to the live server"
+
+        dead_endpoint = processor.endpoints.endpoints[0]
+        assert not dead_endpoint.healthy, "Dead server should be ejected"
+        assert dead_endpoint.requests == 3, f"Dead server should stop getting requests once ejected, got {dead_endpoint.requests}"
+        assert len(alive.requests) == 5, "Live server should answer every request"
+        processor.close()
+
+    print("✓ Unreachable server is skipped and ejected")
+    return True
+
+def test_health_checks():
+    """Test that failing probes eject a server and passing ones readmit it"""
+    from src.endpoints import EndpointPool
+
+    with StubLLMServer() as a, StubLLMServer() as b:
+        pool = EndpointPool([a.url, b.url], health_interval=0)
+
+        b.healthy = False
+        pool.check_health()
+        assert [e.healthy for e in pool.endpoints] == [True, False], "Failing server should be ejected"
+        assert all(pool.acquire() is pool.endpoints[0] for _ in range(3)), "Ejected server should get no requests"
+
+        b.healthy = True
+        pool.check_health()
+        assert pool.endpoints[1].healthy, "Recovered server should be readmitted"
+        assert pool.acquire() is pool.endpoints[1], "Readmitted server should get the next request"
+        pool.close()
+
+    with StubLLMServer() as a, StubLLMServer() as b:
+        b.healthy = False
+        pool = EndpointPool([a.url, b.url], health_interval=0.1)
+        deadline = time.time() + 3
+        while pool.endpoints[1].healthy and time.time() < deadline:
+            time.sleep(0.05)
+        assert not pool.endpoints[1].healthy, "Background checks should eject the failing server"
+        pool.close()
+
+    with StubLLMServer() as a:
+        a.healthy = False
+        pool = EndpointPool([a.url], health_interval=0)
+        pool.check_health()
+        assert pool.endpoints[0].healthy, "A single server should never be ejected"
+        assert pool.thread is None, "A single server should not be probed in the background"
+        pool.close()
+
+    print("✓ Health checks eject and readmit servers")
+    return True
+
+def test_async_client_spreads_requests():
+    """Test that the async client uses every server"""
+    try:
+        import httpx
+    except ImportError:
+        print("✗ httpx not available - skipping test")
+        return False
+
+    from src.llmii import Config
+    from src.async_llm import AsyncLLMProcessor
+
+    with StubLLMServer(delay=0.1) as a, StubLLMServer(delay=0.1) as b:
+        config = Config()
+        config.api_url = f"{a.url},{b.url}"
+        config.health_interval = 0
+        config.parallel = 8
+        processor = AsyncLLMProcessor(config)
+        try:
+            assert all(run_parallel(processor, 16, workers=8)), "Every request should be answered"
+        finally:
+            processor.close()
+
+        assert len(a.requests) == len(b.requests) == 8, f"Requests should be split evenly, got {len(a.requests)} and {len(b.requests)}"
+
+    print("✓ Async client spreads requests over the servers")
+    return True
+
+def main():
+    """Run all tests"""
+    print("Testing load balancing...\n")
+
+    tests = [
+        test_parse_api_urls,
+        test_least_outstanding_scales,
+        test_latency_strategy,
+        test_unreachable_server_skipped,
+        test_health_checks,
+        test_async_client_spreads_requests,
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+            print()
+        except Exception as e:
+            print(f"✗ Test failed: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append(False)
+            print()
+
+    if all(results):
+        print("✓ All load balancing tests passed!")
+        return 0
+    else:
+        print("✗ Some tests failed")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Test script for sizing images per model:
+1. Verifies that model list entries are found by name and by the id a server reports
+2. Verifies that images are sized to whole vision tokens within the model's resolution
+3. Verifies that FileProcessor sizes images for the model the server reports
+4. Verifies that the resolution benchmark compares speed and keyword agreement
+"""
+
+import sys
+import os
+import io
+import base64
+import shutil
+import tempfile
+
+# Add project root to path
+project_root = os.path.dirname(__file__)
+sys.path.insert(0, project_root)
+
+from PIL import Image
+
+from tests.test_utils import StubLLMServer, chat_response, verify_exiftool_available
+
+QWEN_ID = "koboldcpp/Qwen2-VL-2B-Instruct-Q6_K"
+
+def test_find_profile():
+    """Test looking up model list entries"""
+    from src.model_profiles import find_model_profile, load_model_list
+
+    models = load_model_list()
+    assert models and all("patch_size" in m and "preferred_resolution" in m for m in models), "Every model should declare its patch size and resolution"
+
+    assert find_model_profile("gemma-3 4b (6bit)")["model"] == "Gemma-3 4B (6bit)", "Names should match ignoring case"
+    assert find_model_profile(QWEN_ID)["model"] == "Qwen2-VL 2B (6bit)", "Server model ids should match the language model file"
+    assert find_model_profile("some-other-model") is None, "Unknown models have no profile"
+    assert find_model_profile(None) is None, "No name has no profile"
+
+    print("✓ Profiles are found by name and server id")
+    return True
+
+def test_dimensions():
+    """Test that images are sized to whole vision tokens"""
+    from src.image_processor import ImageProcessor
+    from src.model_profiles import find_model_profile, make_image_processor, vision_tokens
+
+    qwen = find_model_profile(QWEN_ID)
+    processor = make_image_processor(448, qwen)
+    width, height = processor._calculate_dimensions(1000, 700)
+    assert width <= 448 and height <= 448, f"Image should fit the limit, got {width}x{height}"
+    assert width % 28 == 0 and height % 28 == 0, f"Sides should be whole 2x2 patch tokens, got {width}x{height}"
+
+    old = ImageProcessor(max_dimension=448, patch_sizes=[14])._calculate_dimensions(1000, 700)
+    assert vision_tokens(width, height, qwen) < vision_tokens(*old, qwen), f"Should cost fewer tokens than {old}, got {width}x{height}"
+
+    assert processor._calculate_dimensions(200, 150) == (196, 140), "Small images should not be scaled up"
+    assert old == (448, 322), "Without a profile images are sized as before"
+
+    smolvlm = find_model_profile("SmolVLM2 2B (6 bit)")
+    assert make_image_processor(448, smolvlm).max_dimension == 384, "Images should not be larger than the model uses"
+    assert make_image_processor(224, smolvlm).max_dimension == 224, "res_limit should still apply"
+
+    gemma = find_model_profile("Gemma-3 4B (6bit)")
+    assert vision_tokens(448, 336, gemma) == vision_tokens(896, 896, gemma) == 256, "Fixed size models cost the same for every image"
+
+    print(f"✓ Images sized to whole tokens ({width}x{height} instead of {old[0]}x{old[1]})")
+    return True
+
+def test_processor_uses_served_model():
+    """Test that FileProcessor looks up the model the server has loaded"""
+    if not verify_exiftool_available():
+        print("✗ ExifTool not available - skipping test")
+        return False
+
+    from src.llmii import Config, FileProcessor
+
+    for model_id, profile_name, expected in [(QWEN_ID, None, 28), (None, None, 14), (None, "Pixtral Captioner 12B (4bit)", 16)]:
+        with StubLLMServer(model_id=model_id) as server:
+            config = Config()
+            config.api_url = server.url
+            config.health_interval = 0
+            config.model_profile = profile_name
+            config.directory = tempfile.gettempdir()
+            processor = FileProcessor(config, callback=lambda message: None)
+            try:
+                token_size = processor.image_processor.token_size
+                minimize = processor.image_processor.minimize_tokens
+            finally:
+                processor.indexer.join()
+                processor.llm_processor.close()
+                processor.reader_pool.terminate()
+                processor.et.terminate()
+
+            assert token_size == expected, f"Expected {expected} pixel tokens for {model_id or profile_name}, got {token_size}"
+            assert minimize == (expected != 14), "Only known models should change how images are sized"
+
+    print("✓ FileProcessor sizes images for the served model")
+    return True
+
+def test_benchmark():
+    """Test the resolution sweep against a stub server"""
+    from src.llmii import Config
+    from src.res_benchmark import run_res_benchmark
+
+    def answer(payload):
+        # More detail at the higher resolution finds one more keyword
+        url = payload["messages"][1]["content"][1]["image_url"]["url"]
+        with Image.open(io.BytesIO(base64.b64decode(url.split(",", 1)[1]))) as img:
+            keywords = ["tree", "river", "boat"] if img.width > 300 else ["tree", "river"]
+        return chat_response('{"Description": "A river.", "Keywords": %s}' % str(keywords).replace("'", '"'),
+                             usage={"prompt_tokens": 300, "completion_tokens": 20})
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        for i in range(3):
+            Image.new("RGB", (800, 600), (i * 60, 120, 200)).save(os.path.join(temp_dir, f"image_{i}.jpg"))
+        with open(os.path.join(temp_dir, "notes.txt"), "w") as f:
+            f.write("not an image")
+
+        with StubLLMServer([(200, answer)]) as server:
+            config = Config()
+            config.api_url = server.url
+            config.health_interval = 0
+            config.directory = temp_dir
+            config.benchmark_res = "448,224"
+            messages = []
+            results = run_res_benchmark(config, callback=messages.append)
+
+            assert len(server.requests) == 6, f"Each image should be sent once per resolution, got {len(server.requests)}"
+
+        assert [r["requested"] for r in results] == [224, 448], "Resolutions should be sorted"
+        low, high = results
+        assert high["agreement"] == 1.0, "The highest resolution is the reference"
+        assert abs(low["agreement"] - 2 / 3) < 1e-9, f"Two of three keywords should agree, got {low['agreement']}"
+        assert low["vision_tokens"] < high["vision_tokens"], "Lower resolutions should cost fewer tokens"
+        assert high["tokens_per_second"], "Reported usage should give a generation speed"
+        assert any("--res-limit 448" in m for m in messages), f"Fastest acceptable setting should be suggested, got {messages}"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Resolution benchmark compares speed and agreement")
+    return True
+
+def main():
+    """Run all tests"""
+    print("Testing model profiles...\n")
+
+    tests = [
+        test_find_profile,
+        test_dimensions,
+        test_processor_uses_served_model,
+        test_benchmark,
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+            print()
+        except Exception as e:
+            print(f"✗ Test failed: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append(False)
+            print()
+
+    if all(results):
+        print("✓ All model profile tests passed!")
+        return 0
+    else:
+        print("✗ Some tests failed")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
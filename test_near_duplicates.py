@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Test script for giving near-duplicate images the metadata of the first one:
+1. Verifies that dHash and pHash are close for variants and far for other images
+2. Verifies that the BK-tree finds the same hashes as comparing against all of them
+3. Verifies that images wait for their representative and fall back when it fails
+4. Verifies that FileProcessor only describes one image of a burst
+5. Verifies that near-duplicates are skipped later unless they are to be reprocessed
+"""
+
+import sys
+import os
+import io
+import base64
+import random
+import shutil
+import tempfile
+import threading
+
+# Add project root to path
+project_root = os.path.dirname(__file__)
+sys.path.insert(0, project_root)
+
+from PIL import Image, ImageDraw, ImageEnhance
+
+from tests.test_utils import StubLLMServer, verify_exiftool_available
+
+def scene(seed, size=(800, 600)):
+    """A picture of a few shapes, different for every seed"""
+    rng = random.Random(seed)
+    img = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(8):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        draw.ellipse((x, y, x + rng.randrange(80, 300), y + rng.randrange(80, 300)), fill=tuple(rng.randrange(256) for _ in range(3)))
+    return img
+
+def encoded(img, **save_args):
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", **save_args)
+    return base64.b64encode(buffer.getvalue()).decode()
+
+def test_hashes():
+    """Test that variants hash close together"""
+    from src.near_duplicates import image_hash, hamming
+
+    original = scene(1)
+    variants = {
+        "recompressed": encoded(original, quality=40),
+        "resized": encoded(original.resize((448, 336))),
+        "brighter": encoded(ImageEnhance.Brightness(original).enhance(1.15)),
+        "shifted": encoded(original.crop((6, 4, 800, 600)).resize((800, 600))),
+    }
+    for method in ("dhash", "phash"):
+        reference = image_hash(encoded(original), method)
+        for name, variant in variants.items():
+            distance = hamming(reference, image_hash(variant, method))
+            assert distance <= 6, f"{method}: {name} copy should be within 6 bits, got {distance}"
+        for seed in range(2, 6):
+            distance = hamming(reference, image_hash(encoded(scene(seed)), method))
+            assert distance > 12, f"{method}: other image should be far, got {distance}"
+
+    print("✓ Variants hash close together, other images far apart")
+    return True
+
+def test_bk_tree():
+    """Test the BK-tree against a linear search"""
+    from src.near_duplicates import BKTree, hamming
+
+    rng = random.Random(7)
+    values = [rng.getrandbits(64) for _ in range(500)]
+    # Some near copies, so there is something to find
+    values += [value ^ (1 << rng.randrange(64)) for value in values[:50]]
+    tree = BKTree()
+    for index, value in enumerate(values):
+        tree.add(value, index)
+
+    for query in values[:20] + [rng.getrandbits(64) for _ in range(20)]:
+        for threshold in (0, 3, 10):
+            expected = sorted(i for i, value in enumerate(values) if hamming(query, value) <= threshold)
+            found = sorted(item for _, item in tree.search(query, threshold))
+            assert found == expected, f"Search within {threshold} should match a linear search"
+
+    print("✓ BK-tree finds every hash within the threshold")
+    return True
+
+def test_waiting():
+    """Test representatives that are still being described or fail"""
+    from src.near_duplicates import NearDuplicateIndex
+
+    index = NearDuplicateIndex(threshold=4)
+    group, metadata = index.match(0b1010, "first.jpg")
+    assert metadata is None and group.file_path == "first.jpg", "First image should represent its group"
+
+    results = []
+    waiting = threading.Thread(target=lambda: results.append(index.match(0b1011, "second.jpg")))
+    waiting.start()
+    waiting.join(timeout=0.2)
+    assert waiting.is_alive(), "Near-duplicate should wait for its representative"
+    index.resolve(group, {"MWG:Keywords": ["tree"]})
+    waiting.join(timeout=5)
+    assert results[0][1] == {"MWG:Keywords": ["tree"]}, "Near-duplicate should get the representative's metadata"
+    assert index.matched == 1, "Matches should be counted"
+
+    # A representative that fails hands over to the next image
+    failing, _ = index.match(0xFF00, "fails.jpg")
+    index.abandon(failing)
+    group, metadata = index.match(0xFF01, "next.jpg")
+    assert metadata is None and group.file_path == "next.jpg", "Next image should be described itself"
+
+    try:
+        NearDuplicateIndex(method="md5")
+        assert False, "Unknown hash methods should be rejected"
+    except ValueError:
+        pass
+
+    print("✓ Near-duplicates wait for their representative")
+    return True
+
+def make_processor(server, temp_dir, **settings):
+    from src.llmii import Config, FileProcessor
+
+    config = Config()
+    config.api_url = server.url
+    config.health_interval = 0
+    config.directory = temp_dir
+    config.near_duplicates = True
+    for key, value in settings.items():
+        setattr(config, key, value)
+    return FileProcessor(config, callback=lambda message: None)
+
+def close(processor):
+    processor.indexer.join()
+    processor.llm_processor.close()
+    processor.reader_pool.terminate()
+    processor.et.terminate()
+
+def test_processor_burst():
+    """Test that one image of a burst is described"""
+    if not verify_exiftool_available():
+        print("✗ ExifTool not available - skipping test")
+        return False
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        burst = scene(1)
+        files = {
+            "frame_1.jpg": burst,
+            "frame_2.jpg": ImageEnhance.Brightness(burst).enhance(1.05),
+            "frame_3.jpg": burst.crop((4, 4, 800, 600)).resize((800, 600)),
+            "other.jpg": scene(2),
+        }
+        for name, img in files.items():
+            img.save(os.path.join(temp_dir, name), quality=90)
+
+        with StubLLMServer() as server:
+            processor = make_processor(server, temp_dir)
+            try:
+                jobs = {}
+                for name in files:
+                    job = processor.prepare_file({"SourceFile": os.path.join(temp_dir, name)})
+                    jobs[name] = processor.infer_file(job)
+            finally:
+                close(processor)
+
+            assert len(server.requests) == 2, f"Only the first frame and the other image should be described, got {len(server.requests)}"
+
+        assert jobs["frame_1.jpg"]["status"] == "success" and jobs["other.jpg"]["status"] == "success"
+        for name in ("frame_2.jpg", "frame_3.jpg"):
+            job = jobs[name]
+            assert job["status"] == "duplicate", f"{name} should be a near-duplicate, got {job['status']}"
+            assert job["duplicate_of"] == os.path.join(temp_dir, "frame_1.jpg"), f"{name} should name its representative"
+            assert job["updated_metadata"]["MWG:Keywords"] == jobs["frame_1.jpg"]["updated_metadata"]["MWG:Keywords"], "Keywords should be copied"
+            assert job["updated_metadata"]["XMP:Identifier"] != jobs["frame_1.jpg"]["updated_metadata"]["XMP:Identifier"], "Each file keeps its own identifier"
+        assert processor.near_duplicates.matched == 2, "Matches should be counted"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Only one image of a burst is described")
+    return True
+
+def test_reprocess():
+    """Test what happens to near-duplicates on the next run"""
+    if not verify_exiftool_available():
+        print("✗ ExifTool not available - skipping test")
+        return False
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(temp_dir, "frame.jpg")
+        scene(1).save(path)
+        marked = {"SourceFile": path, "XMP:Identifier": "uuid", "XMP:Status": "duplicate", "MWG:Keywords": ["tree"]}
+
+        with StubLLMServer() as server:
+            processor = make_processor(server, temp_dir)
+            try:
+                assert processor.check_uuid(dict(marked), path).get("_skip_llm"), "Near-duplicates should be skipped"
+                assert "duplicate" in processor.done_statuses, "The index should treat them as done"
+            finally:
+                close(processor)
+
+            processor = make_processor(server, temp_dir, reprocess_duplicates=True)
+            try:
+                metadata = processor.check_uuid(dict(marked), path)
+                assert not metadata.get("_skip_llm") and metadata["XMP:Status"] is None, "Near-duplicates should be described again"
+                assert "duplicate" not in processor.done_statuses, "The index should not skip them"
+            finally:
+                close(processor)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Near-duplicates are skipped unless they are to be reprocessed")
+    return True
+
+def main():
+    """Run all tests"""
+    print("Testing near-duplicates...\n")
+
+    tests = [
+        test_hashes,
+        test_bk_tree,
+        test_waiting,
+        test_processor_burst,
+        test_reprocess,
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+            print()
+        except Exception as e:
+            print(f"✗ Test failed: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append(False)
+            print()
+
+    if all(results):
+        print("✓ All near-duplicate tests passed!")
+        return 0
+    else:
+        print("✗ Some tests failed")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
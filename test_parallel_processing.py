@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Test script for concurrent file processing:
+1. Verifies that FileProcessor keeps up to `parallel` LLM requests in flight
+2. Verifies that the file checkpoint follows the oldest unfinished file
+3. Verifies that files stay in flight until the metadata writer has written them
+4. Verifies the prepare/infer/write pipeline keeps memory bounded and reports utilization
+5. Verifies that files still queued when the user stops are dropped without errors
+"""
+
+import sys
+import os
+import time
+import shutil
+import tempfile
+import threading
+
+# Add project root to path
+project_root = os.path.dirname(__file__)
+sys.path.insert(0, project_root)
+
+from tests.test_utils import verify_exiftool_available
+
+def make_processor(parallel):
+    from src.llmii import FileProcessor, Config
+
+    config = Config()
+    config.directory = tempfile.mkdtemp()
+    config.parallel = parallel
+
+    processor = FileProcessor(config, callback=lambda message: None)
+    processor.indexer.join()
+    return processor
+
+def test_parallel_default():
+    """Test that the default config processes one file at a time"""
+    if not verify_exiftool_available():
+        print("✗ ExifTool not available - skipping test")
+        return False
+
+    from src.llmii import Config
+
+    config = Config()
+    assert config.parallel == 1, "Default parallel should be 1"
+
+    processor = make_processor(1)
+    try:
+        assert processor.parallel == 1, "Processor should use a single worker"
+    finally:
+        processor._wait_for_workers()
+        shutil.rmtree(processor.config.directory, ignore_errors=True)
+
+    print("✓ Default config processes one file at a time")
+    return True
+
+def test_files_overlap_up_to_limit():
+    """Test that at most `parallel` files are processed at the same time"""
+    if not verify_exiftool_available():
+        print("✗ ExifTool not available - skipping test")
+        return False
+
+    processor = make_processor(3)
+
+    lock = threading.Lock()
+    state = {"active": 0, "peak": 0, "done": []}
+
+    def fake_prepare_file(metadata, file_stat=None):
+        return {"file_path": metadata["SourceFile"]}
+
+    def fake_infer_file(job):
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+        time.sleep(0.1)
+        with lock:
+            state["active"] -= 1
+        return job
+
+    def fake_finish_file(job):
+        with lock:
+            state["done"].append(job["file_path"])
+
+    processor.prepare_file = fake_prepare_file
+    processor.infer_file = fake_infer_file
+    processor.finish_file = fake_finish_file
+
+    try:
+        files = [f"/test/image_{i}.jpg" for i in range(9)]
+        for file_path in files:
+            assert processor._submit_file({"SourceFile": file_path}), "Submit should succeed"
+
+        processor._wait_for_workers()
+
+        assert sorted(state["done"]) == sorted(files), "Every file should be processed"
+        assert state["peak"] == 3, f"Expected 3 files in flight, got {state['peak']}"
+        assert not processor.in_flight, "Nothing should be left in flight"
+        assert not os.path.exists(processor.file_checkpoint_path), "Checkpoint should be cleared"
+    finally:
+        shutil.rmtree(processor.config.directory, ignore_errors=True)
+
+    print("✓ Files overlap up to the parallel limit")
+    return True
+
+def test_checkpoint_tracks_oldest_in_flight():
+    """Test that the checkpoint points at the oldest unfinished file"""
+    if not verify_exiftool_available():
+        print("✗ ExifTool not available - skipping test")
+        return False
+
+    processor = make_processor(2)
+
+    try:
+        processor._start_in_flight("/test/a.jpg")
+        processor._start_in_flight("/test/b.jpg")
+
+        with open(processor.file_checkpoint_path) as f:
+            assert f.read() == "/test/a.jpg", "Checkpoint should be the oldest file"
+
+        # Finishing a newer file leaves the checkpoint alone
+        processor._finish_in_flight("/test/b.jpg")
+        with open(processor.file_checkpoint_path) as f:
+            assert f.read() == "/test/a.jpg", "Checkpoint should not move past unfinished files"
+
+        processor._finish_in_flight("/test/a.jpg")
+        assert not os.path.exists(processor.file_checkpoint_path), "Checkpoint should be cleared"
+    finally:
+        processor._wait_for_workers()
+        shutil.rmtree(processor.config.directory, ignore_errors=True)
+
+    print("✓ Checkpoint tracks the oldest file in flight")
+    return True
+
+def test_files_stay_in_flight_until_written():
+    """Test that queued writes hold the checkpoint until they are on disk"""
+    if not verify_exiftool_available():
+        print("✗ ExifTool not available - skipping test")
+        return False
+
+    processor = make_processor(2)
+    processor.metadata_writer.batch_size = 10
+    processor.metadata_writer.flush_interval = 60
+
+    reported = []
+    processor.callback = lambda message: reported.append(message) if isinstance(message, dict) else None
+
+    def fake_prepare_file(metadata, file_stat=None):
+        return {"file_path": metadata["SourceFile"], "processed_image": None, "start_time": time.time()}
+
+    def fake_infer_file(job):
+        job["updated_metadata"] = {"MWG:Keywords": ["queued"], "XMP:Status": "success"}
+        job["status"] = "success"
+        job["save_status"] = "saved"
+        job["write"] = True
+        return job
+
+    processor.prepare_file = fake_prepare_file
+    processor.infer_file = fake_infer_file
+
+    try:
+        fixture = os.path.join(project_root, "tests", "fixtures", "test_image.jpg")
+        files = []
+        for i in range(3):
+            file_path = os.path.join(processor.config.directory, f"image_{i}.jpg")
+            shutil.copy(fixture, file_path)
+            files.append(file_path)
+            assert processor._submit_file({"SourceFile": file_path}), "Submit should succeed"
+
+        deadline = time.time() + 5
+        while len(processor.metadata_writer.pending) < 3 and time.time() < deadline:
+            time.sleep(0.05)
+
+        assert len(processor.metadata_writer.pending) == 3, "Every file should be waiting to be written"
+        assert sorted(processor.in_flight) == sorted(files), "Queued files should still be in flight"
+        assert not reported, "Files should not be reported before they are written"
+
+        processor._wait_for_workers()
+
+        assert sorted(r["file_path"] for r in reported) == sorted(files), "Every file should be reported once written"
+        assert all(r["save_status"] == "saved" for r in reported), "Written files should be reported as saved"
+        assert not processor.in_flight, "Nothing should be left in flight"
+        assert not os.path.exists(processor.file_checkpoint_path), "Checkpoint should be cleared"
+    finally:
+        processor.et.terminate()
+        shutil.rmtree(processor.config.directory, ignore_errors=True)
+
+    print("✓ Files stay in flight until their metadata is written")
+    return True
+
+def test_stop_drops_queued_files():
+    """Test that stopping drops queued files without reporting errors"""
+    if not verify_exiftool_available():
+        print("✗ ExifTool not available - skipping test")
+        return False
+
+    processor = make_processor(1)
+    messages = []
+    processor.callback = lambda message: messages.append(message)
+
+    stop = threading.Event()
+    release = threading.Event()
+
+    def check_paused_or_stopped():
+        # The GUI stops a run by raising from this callback
+        if stop.is_set():
+            raise Exception("Indexer stopped by user")
+        return False
+
+    inferred = []
+
+    def fake_infer_file(job):
+        inferred.append(job["file_path"])
+        release.wait(5)
+        return None
+
+    processor.check_paused_or_stopped = check_paused_or_stopped
+    processor.prepare_file = lambda metadata, file_stat=None: {"file_path": metadata["SourceFile"]}
+    processor.infer_file = fake_infer_file
+
+    try:
+        files = [f"/test/image_{i}.jpg" for i in range(4)]
+        for file_path in files:
+            assert processor._submit_file({"SourceFile": file_path}), "Submit should succeed"
+
+        stop.set()
+        release.set()
+        processor._wait_for_workers()
+
+        assert processor.stopped.is_set(), "Stop should be noticed"
+        assert len(inferred) < len(files), "Queued files should not be processed after a stop"
+        errors = [m for m in messages if isinstance(m, str) and "Error processing" in m]
+        assert not errors, f"Dropped files should not be reported as errors: {errors}"
+        assert not processor.in_flight, "Nothing should be left in flight"
+    finally:
+        shutil.rmtree(processor.config.directory, ignore_errors=True)
+
+    print("✓ Stopping drops queued files quietly")
+    return True
+
+def test_pipeline_backpressure():
+    """Test that a slow stage blocks the stages in front of it"""
+    from src.pipeline import Pipeline, PipelineStage
+
+    lock = threading.Lock()
+    state = {"prepared": 0, "written": 0}
+
+    def prepare(item):
+        with lock:
+            state["prepared"] += 1
+        return item
+
+    release = threading.Event()
+
+    def infer(item):
+        release.wait()
+        return item
+
+    def write(item):
+        with lock:
+            state["written"] += 1
+        return None
+
+    pipeline = Pipeline([
+        PipelineStage("prepare", prepare, workers=2),
+        PipelineStage("infer", infer, workers=1),
+        PipelineStage("write", write, workers=1),
+    ])
+    pipeline.start()
+
+    accepted = 0
+    for i in range(50):
+        if pipeline.offer(i, timeout=0.05):
+            accepted += 1
+
+    # infer holds one item and its queue two more, and each prepare
+    # worker is left holding one item it cannot pass on
+    assert accepted < 50, "Pipeline should refuse work when every queue is full"
+    assert state["prepared"] <= 5, f"Prepare stage ran too far ahead: {state['prepared']}"
+
+    release.set()
+    pipeline.close()
+
+    assert state["written"] == accepted, "Every accepted item should reach the last stage"
+
+    print("✓ Pipeline applies backpressure and drains on close")
+    return True
+
+def test_pipeline_utilization_report():
+    """Test that per-stage utilization is reported and the slow stage is named"""
+    from src.pipeline import Pipeline, PipelineStage
+
+    pipeline = Pipeline([
+        PipelineStage("prepare", lambda item: item, workers=1),
+        PipelineStage("infer", lambda item: time.sleep(0.05) or item, workers=1),
+        PipelineStage("write", lambda item: None, workers=1),
+    ])
+    pipeline.start()
+    for i in range(5):
+        pipeline.put(i)
+    pipeline.close()
+
+    stats = {s["name"]: s for s in pipeline.stats()}
+    assert stats["infer"]["items"] == 5, "Infer stage should see every item"
+    assert stats["infer"]["utilization"] > stats["prepare"]["utilization"], "Infer should be the busiest stage"
+    assert pipeline.bottleneck() == "infer", "Infer should be reported as the limiting stage"
+
+    report = pipeline.utilization_report()
+    assert "Limiting stage: infer" in report, f"Report should name the limiting stage: {report}"
+
+    print("✓ Pipeline reports per-stage utilization")
+    return True
+
+def main():
+    """Run all tests"""
+    print("Testing concurrent file processing...\n")
+
+    tests = [
+        test_parallel_default,
+        test_files_overlap_up_to_limit,
+        test_checkpoint_tracks_oldest_in_flight,
+        test_files_stay_in_flight_until_written,
+        test_stop_drops_queued_files,
+        test_pipeline_backpressure,
+        test_pipeline_utilization_report,
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+            print()
+        except Exception as e:
+            print(f"✗ Test failed: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append(False)
+            print()
+
+    if all(results):
+        print("✓ All concurrent processing tests passed!")
+        return 0
+    else:
+        print("✗ Some tests failed")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
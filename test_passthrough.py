@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Test script for sending JPEGs without re-encoding them:
+1. Verifies that a small baseline JPEG is sent byte for byte without being decoded
+2. Verifies that progressive, CMYK, large and non-JPEG images are still re-encoded
+3. Verifies that a large enough EXIF thumbnail is sent in place of a large JPEG
+4. Verifies that small or letterboxed EXIF thumbnails are not used
+5. Verifies that passthrough can be turned off
+6. Verifies that metadata written into a JPEG is not sent with it
+"""
+
+import sys
+import os
+import io
+import base64
+import shutil
+import struct
+import tempfile
+
+# Add project root to path
+project_root = os.path.dirname(__file__)
+sys.path.insert(0, project_root)
+
+from PIL import Image, ImageFile
+
+def exif_with_thumbnail(thumbnail):
+    """EXIF data holding only a JPEG thumbnail in IFD1"""
+    ifd0 = struct.pack("<HI", 0, 14)
+    ifd1 = struct.pack("<H", 2)
+    ifd1 += struct.pack("<HHII", 0x0201, 4, 1, 44)
+    ifd1 += struct.pack("<HHII", 0x0202, 4, 1, len(thumbnail))
+    ifd1 += struct.pack("<I", 0)
+    return b"Exif\x00\x00" + b"II*\x00" + struct.pack("<I", 8) + ifd0 + ifd1 + thumbnail
+
+def jpeg_bytes(size, **save_args):
+    buffer = io.BytesIO()
+    Image.new(save_args.pop("mode", "RGB"), size, "gray").save(buffer, format="JPEG", **save_args)
+    return buffer.getvalue()
+
+def save(directory, name, size, **save_args):
+    path = os.path.join(directory, name)
+    mode = save_args.pop("mode", "RGB")
+    Image.new(mode, size, "gray").save(path, **save_args)
+    return path
+
+def sent(processor, path):
+    encoded, _ = processor.process_image(path)
+    return base64.b64decode(encoded)
+
+def count_decodes():
+    """Count full decodes by wrapping ImageFile.load, returns (counts, restore)"""
+    original = ImageFile.ImageFile.load
+    counts = []
+
+    def counting_load(self):
+        counts.append(self.format)
+        return original(self)
+
+    ImageFile.ImageFile.load = counting_load
+
+    def restore():
+        ImageFile.ImageFile.load = original
+    return counts, restore
+
+def test_small_jpeg_sent_as_is():
+    """Test that a small baseline JPEG goes out untouched"""
+    from src.image_processor import ImageProcessor
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = save(temp_dir, "small.jpg", (400, 300), format="JPEG", quality=80)
+        grayscale = save(temp_dir, "gray.jpg", (300, 300), format="JPEG", mode="L")
+        processor = ImageProcessor(max_dimension=448, patch_sizes=[14], passthrough=True)
+
+        counts, restore = count_decodes()
+        try:
+            data = sent(processor, path)
+            gray_data = sent(processor, grayscale)
+        finally:
+            restore()
+
+        with open(path, "rb") as f:
+            assert data == f.read(), "File should be sent byte for byte"
+        with open(grayscale, "rb") as f:
+            assert gray_data == f.read(), "Grayscale JPEGs can be sent as they are"
+        assert counts == [], f"Nothing should be decoded, got {counts}"
+        assert processor.stats["passthrough"] == 2, "Passthroughs should be counted"
+        assert "2 sent as they are" in processor.report(), "Report should show passthroughs"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Small baseline JPEGs are sent as they are")
+    return True
+
+def test_reencoded_when_needed():
+    """Test the images that still have to be re-encoded"""
+    from src.image_processor import ImageProcessor
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        cases = {
+            "progressive": save(temp_dir, "progressive.jpg", (400, 300), format="JPEG", progressive=True),
+            "CMYK": save(temp_dir, "cmyk.jpg", (400, 300), format="JPEG", mode="CMYK"),
+            "too large": save(temp_dir, "large.jpg", (1200, 900), format="JPEG"),
+            "PNG": save(temp_dir, "small.png", (400, 300), format="PNG"),
+        }
+        processor = ImageProcessor(max_dimension=448, patch_sizes=[14], passthrough=True)
+        for case, path in cases.items():
+            with open(path, "rb") as f:
+                original = f.read()
+            data = sent(processor, path)
+            assert data != original, f"{case} image should be re-encoded"
+            with Image.open(io.BytesIO(data)) as img:
+                assert img.format == "JPEG" and img.mode == "RGB", f"{case} image should become an RGB JPEG"
+                assert not img.info.get("progressive"), f"{case} image should be sent as baseline"
+        assert processor.stats["encoded"] == len(cases), f"Every case should be counted as encoded, got {processor.stats}"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Progressive, CMYK, large and non-JPEG images are re-encoded")
+    return True
+
+def test_exif_thumbnail():
+    """Test that a large enough EXIF thumbnail stands in for the image"""
+    from src.image_processor import ImageProcessor
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        thumbnail = jpeg_bytes((400, 300))
+        path = save(temp_dir, "camera.jpg", (4000, 3000), format="JPEG", exif=exif_with_thumbnail(thumbnail))
+        processor = ImageProcessor(max_dimension=448, patch_sizes=[14], passthrough=True)
+
+        counts, restore = count_decodes()
+        try:
+            data = sent(processor, path)
+        finally:
+            restore()
+
+        assert data == thumbnail, "EXIF thumbnail should be sent as it is"
+        assert counts == [], f"Nothing should be decoded, got {counts}"
+        assert processor.stats["exif_thumbnail"] == 1, "Thumbnail use should be counted"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Large enough EXIF thumbnails are sent in place of the image")
+    return True
+
+def test_unsuitable_thumbnails():
+    """Test that small or letterboxed thumbnails are ignored"""
+    from src.image_processor import ImageProcessor
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        cases = {
+            "small": jpeg_bytes((160, 120)),
+            "letterboxed": jpeg_bytes((400, 400)),
+            "progressive": jpeg_bytes((400, 300), progressive=True),
+        }
+        processor = ImageProcessor(max_dimension=448, patch_sizes=[14], passthrough=True)
+        for case, thumbnail in cases.items():
+            path = save(temp_dir, f"{case}.jpg", (4000, 3000), format="JPEG", exif=exif_with_thumbnail(thumbnail))
+            data = sent(processor, path)
+            assert data != thumbnail, f"{case} thumbnail should not be used"
+            with Image.open(io.BytesIO(data)) as img:
+                assert img.size == (448, 336), f"Image should be resized instead, got {img.size}"
+        assert processor.stats["exif_thumbnail"] == 0, "No thumbnail should have been used"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Small and letterboxed thumbnails are not used")
+    return True
+
+def test_passthrough_off():
+    """Test that images are always re-encoded with passthrough off"""
+    from src.image_processor import ImageProcessor
+    from src.model_profiles import make_image_processor
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = save(temp_dir, "small.jpg", (400, 300), format="JPEG")
+        with open(path, "rb") as f:
+            original = f.read()
+
+        processor = ImageProcessor(max_dimension=448, patch_sizes=[14])
+        assert sent(processor, path) != original, "Passthrough should be off by default"
+        assert make_image_processor(448, passthrough=True).passthrough, "Factory should pass the setting on"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Passthrough can be turned off")
+    return True
+
+def segment(marker, payload):
+    return bytes([0xFF, marker]) + struct.pack(">H", len(payload) + 2) + payload
+
+def test_metadata_not_sent():
+    """Test that EXIF, XMP and IPTC are stripped from passthrough payloads"""
+    from src.image_processor import ImageProcessor, strip_jpeg_metadata
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        clean = jpeg_bytes((400, 300), quality=80)
+        xmp = b"http://ns.adobe.com/xap/1.0/\x00<x:xmpmeta><dc:subject>gray</dc:subject><xmp:Identifier>uuid</xmp:Identifier></x:xmpmeta>"
+        tags = (
+            segment(0xE1, b"Exif\x00\x00II*\x00" + b"\x00" * 16)
+            + segment(0xE1, xmp)
+            + segment(0xED, b"Photoshop 3.0\x00IPTC")
+            + segment(0xFE, b"A comment")
+        )
+        # Tags go after the JFIF segment, where ExifTool puts them
+        jfif_end = 4 + struct.unpack(">H", clean[4:6])[0]
+        tagged = clean[:jfif_end] + tags + clean[jfif_end:]
+        path = os.path.join(temp_dir, "tagged.jpg")
+        with open(path, "wb") as f:
+            f.write(tagged)
+
+        processor = ImageProcessor(max_dimension=448, patch_sizes=[14], passthrough=True)
+        data = sent(processor, path)
+        assert processor.stats["passthrough"] == 1, "The tagged file should still be passed through"
+        assert b"xmpmeta" not in data and b"Exif" not in data and b"Photoshop" not in data, "No metadata should be sent"
+        assert data == clean, "Only the metadata segments should be removed"
+        assert data[6:11] == b"JFIF\x00", "The JFIF header should be kept"
+        with Image.open(io.BytesIO(data)) as img:
+            img.load()
+
+        assert strip_jpeg_metadata(b"not a jpeg") == b"not a jpeg", "Other data should be left alone"
+        assert strip_jpeg_metadata(tagged[:jfif_end + 10]) == tagged[:jfif_end + 10], "Truncated JPEGs should be left alone"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Metadata is not sent with passed through JPEGs")
+    return True
+
+def main():
+    """Run all tests"""
+    print("Testing JPEG passthrough...\n")
+
+    tests = [
+        test_small_jpeg_sent_as_is,
+        test_reencoded_when_needed,
+        test_exif_thumbnail,
+        test_unsuitable_thumbnails,
+        test_passthrough_off,
+        test_metadata_not_sent,
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+            print()
+        except Exception as e:
+            print(f"✗ Test failed: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append(False)
+            print()
+
+    if all(results):
+        print("✓ All passthrough tests passed!")
+        return 0
+    else:
+        print("✗ Some tests failed")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
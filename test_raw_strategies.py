@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Test script for how RAW files are prepared:
+1. Verifies that a large enough ExifTool preview is used without opening the RAW,
+   and the full size JpgFromRaw is only fetched when the preview is too small
+2. Verifies that LibRaw's JPEG and bitmap thumbnails are used next
+3. Verifies that the last resort demosaics at half size
+4. Verifies that the strategy and its time are recorded per file and reported
+5. Verifies that binary tags from ExifTool's JSON are decoded
+"""
+
+import sys
+import os
+import io
+import base64
+import shutil
+import tempfile
+
+# Add project root to path
+project_root = os.path.dirname(__file__)
+sys.path.insert(0, project_root)
+
+import numpy as np
+import rawpy
+from PIL import Image
+
+def jpeg_bytes(size):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "gray").save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+class FakeThumb:
+    def __init__(self, format, data):
+        self.format = format
+        self.data = data
+
+class FakeRaw:
+    """Stands in for rawpy's RawPy, recording what was asked of it"""
+    def __init__(self, thumb=None):
+        self.thumb = thumb
+        self.postprocess_args = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def extract_thumb(self):
+        if self.thumb is None:
+            raise rawpy.LibRawNoThumbnailError()
+        return self.thumb
+
+    def postprocess(self, **kwargs):
+        self.postprocess_args = kwargs
+        return np.full((1000, 1500, 3), 128, dtype=np.uint8)
+
+def with_raw(fake, test):
+    """Run test with rawpy.imread returning fake, returns the opened paths"""
+    opened = []
+    original = rawpy.imread
+
+    def imread(path):
+        opened.append(path)
+        return fake
+
+    rawpy.imread = imread
+    try:
+        test()
+    finally:
+        rawpy.imread = original
+    return opened
+
+def raw_file(directory):
+    path = os.path.join(directory, "photo.nef")
+    with open(path, "wb") as f:
+        f.write(b"not really a raw file")
+    return path
+
+def test_exiftool_preview():
+    """Test that the ExifTool preview is used first"""
+    from src.image_processor import ImageProcessor
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = raw_file(temp_dir)
+        small, preview, full = jpeg_bytes((160, 120)), jpeg_bytes((1600, 1200)), jpeg_bytes((6000, 4000))
+        requested = []
+
+        def extractor_for(embedded):
+            def extractor(file_path, tags):
+                requested.append((file_path, tags))
+                return [embedded[tag] for tag in tags if tag in embedded]
+            return extractor
+
+        processor = ImageProcessor(max_dimension=448, patch_sizes=[14], preview_extractor=extractor_for({"PreviewImage": preview, "JpgFromRaw": full}))
+        results = []
+        opened = with_raw(FakeRaw(), lambda: results.append(processor.process_image(path)))
+
+        assert requested == [(os.path.normpath(path), ("PreviewImage",))], f"Only the preview should be fetched, got {requested}"
+        assert opened == [], "The RAW file should not be opened"
+        with Image.open(io.BytesIO(base64.b64decode(results[0][0]))) as img:
+            assert img.size == processor._calculate_dimensions(1600, 1200), f"Preview should be resized, got {img.size}"
+        assert processor.stats["raw_exiftool_preview"] == 1, "Strategy should be counted"
+
+        # A preview that is too small: the full size JPEG is fetched next
+        requested.clear()
+        processor = ImageProcessor(max_dimension=448, patch_sizes=[14], preview_extractor=extractor_for({"PreviewImage": small, "JpgFromRaw": full}))
+        results = []
+        opened = with_raw(FakeRaw(), lambda: results.append(processor.process_image(path)))
+        assert [tags for _, tags in requested] == [("PreviewImage",), ("JpgFromRaw",)], f"JpgFromRaw should follow, got {requested}"
+        assert opened == [], "The RAW file should not be opened"
+        with Image.open(io.BytesIO(base64.b64decode(results[0][0]))) as img:
+            assert img.size == processor._calculate_dimensions(6000, 4000), f"Full size JPEG should be used, got {img.size}"
+
+        # Only previews that are too small: fall through to LibRaw
+        processor = ImageProcessor(max_dimension=448, patch_sizes=[14], preview_extractor=extractor_for({"PreviewImage": small}))
+        fake = FakeRaw()
+        opened = with_raw(fake, lambda: processor.process_image(path))
+        assert opened and fake.postprocess_args is not None, "Small previews should not be used"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Large enough ExifTool previews are used first")
+    return True
+
+def test_libraw_thumbnails():
+    """Test the JPEG and bitmap thumbnails LibRaw finds"""
+    from src.image_processor import ImageProcessor
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = raw_file(temp_dir)
+        processor = ImageProcessor(max_dimension=448, patch_sizes=[14])
+
+        jpeg = FakeRaw(FakeThumb(rawpy.ThumbFormat.JPEG, jpeg_bytes((1600, 1200))))
+        with_raw(jpeg, lambda: processor.process_image(path))
+        assert jpeg.postprocess_args is None, "JPEG thumbnail should spare the demosaic"
+        assert processor.last_preparation()["method"] == "embedded_thumbnail", f"Got {processor.last_preparation()}"
+
+        bitmap = FakeRaw(FakeThumb(rawpy.ThumbFormat.BITMAP, np.zeros((800, 1200, 3), dtype=np.uint8)))
+        results = []
+        with_raw(bitmap, lambda: results.append(processor.process_image(path)))
+        assert bitmap.postprocess_args is None, "Bitmap thumbnail should spare the demosaic"
+        assert processor.last_preparation()["method"] == "bitmap_thumbnail", f"Got {processor.last_preparation()}"
+        with Image.open(io.BytesIO(base64.b64decode(results[0][0]))) as img:
+            assert img.size == processor._calculate_dimensions(1200, 800), f"Bitmap should be resized, got {img.size}"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ LibRaw's JPEG and bitmap thumbnails are used next")
+    return True
+
+def test_half_size_fallback():
+    """Test that the demosaic is done at half size"""
+    from src.image_processor import ImageProcessor
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = raw_file(temp_dir)
+        processor = ImageProcessor(max_dimension=448, patch_sizes=[14])
+        cases = {
+            "no thumbnail": FakeRaw(),
+            "small thumbnail": FakeRaw(FakeThumb(rawpy.ThumbFormat.JPEG, jpeg_bytes((160, 120)))),
+            "broken thumbnail": FakeRaw(FakeThumb(rawpy.ThumbFormat.JPEG, b"\xff\xd8 truncated")),
+        }
+        for case, fake in cases.items():
+            with_raw(fake, lambda: processor.process_image(path))
+            assert fake.postprocess_args and fake.postprocess_args.get("half_size") is True, f"{case}: should demosaic at half size"
+        assert processor.stats["raw_half_size"] == len(cases), f"Fallbacks should be counted, got {processor.stats}"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ RAW files without a usable preview are demosaiced at half size")
+    return True
+
+def test_recorded_per_file():
+    """Test that the strategy and time are recorded and reported"""
+    from src.image_processor import ImageProcessor
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = raw_file(temp_dir)
+        jpeg = os.path.join(temp_dir, "photo.jpg")
+        Image.new("RGB", (1200, 900), "gray").save(jpeg)
+
+        processor = ImageProcessor(max_dimension=448, patch_sizes=[14], preview_extractor=lambda p, tags: [])
+        assert processor.last_preparation() is None, "Nothing prepared yet"
+
+        with_raw(FakeRaw(), lambda: processor.process_image(path))
+        preparation = processor.last_preparation()
+        assert preparation["method"] == "half_size" and preparation["seconds"] > 0, f"Got {preparation}"
+
+        processor.process_image(jpeg)
+        assert processor.last_preparation()["method"] == "encoded", "Other images record how they were encoded"
+
+        report = processor.report()
+        assert "RAW files: 1 demosaiced at half size" in report, f"Report should show RAW strategies: {report}"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Strategy and time are recorded per file")
+    return True
+
+def test_binary_values():
+    """Test decoding ExifTool's base64 binary tags"""
+    from src.exiftool_pool import binary_values
+
+    preview, full = jpeg_bytes((640, 480)), jpeg_bytes((1600, 1200))
+    result = {
+        "SourceFile": "photo.nef",
+        "EXIF:PreviewImage": "base64:" + base64.b64encode(preview).decode(),
+        "EXIF:JpgFromRaw": "base64:" + base64.b64encode(full).decode(),
+        "MakerNotes:PreviewImage": "(Binary data 1234 bytes, use -b option to extract)",
+    }
+    assert binary_values(result, ("JpgFromRaw", "PreviewImage")) == [full, preview], "Values should follow the tag order"
+    assert binary_values({"SourceFile": "photo.nef"}, ("PreviewImage",)) == [], "Missing tags are left out"
+
+    print("✓ Binary tags are decoded")
+    return True
+
+def main():
+    """Run all tests"""
+    print("Testing RAW strategies...\n")
+
+    tests = [
+        test_exiftool_preview,
+        test_libraw_thumbnails,
+        test_half_size_fallback,
+        test_recorded_per_file,
+        test_binary_values,
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+            print()
+        except Exception as e:
+            print(f"✗ Test failed: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append(False)
+            print()
+
+    if all(results):
+        print("✓ All RAW strategy tests passed!")
+        return 0
+    else:
+        print("✗ Some tests failed")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
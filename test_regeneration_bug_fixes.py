@@ -3,6 +3,7 @@
 Test script for Regeneration Bug Fixes:
 1. Description preservation when regenerating keywords only
 2. Keyword duplication prevention during regeneration
+3. Cleanup closing the helper's LLM client and health checks
 """
 
 import sys
@@ -309,6 +310,40 @@ def test_keywords_only_preserves_description_in_metadata():
         traceback.print_exc()
         return False
 
+def test_cleanup_closes_llm_processor():
+    """Test that cleanup closes the LLM client, and reading or saving never opens one"""
+    try:
+        import threading
+        from src.llmii_gui import RegenerationHelper
+        import src.llmii as llmii
+        
+        config = llmii.Config()
+        config.api_url = "http://127.0.0.1:9,http://127.0.0.1:10"
+        config.health_interval = 60
+        
+        helper = RegenerationHelper(config)
+        helper.cleanup()
+        assert helper._llm_processor is None, "A helper that never regenerated should not open an LLM client"
+        
+        helper = RegenerationHelper(config)
+        llm_processor = helper.llm_processor
+        assert helper.llm_processor is llm_processor, "The helper should keep one LLM client"
+        health_thread = llm_processor.endpoints.thread
+        assert health_thread is not None and health_thread.is_alive(), "Two endpoints should be health checked"
+        
+        helper.cleanup()
+        assert not health_thread.is_alive(), "cleanup should stop the health checks"
+        assert helper._llm_processor is None, "cleanup should drop the LLM client"
+        assert not any(t.name == "llmii-health" for t in threading.enumerate()), "No health check thread should be left"
+        
+        print("✓ cleanup closes the LLM client and its health checks")
+        return True
+    except Exception as e:
+        print(f"✗ Cleanup test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
 def main():
     """Run all tests"""
     print("Testing Regeneration Bug Fixes...\n")
@@ -320,6 +355,7 @@ def main():
         test_caption_read_from_ui,
         test_metadata_without_keywords_creation,
         test_keywords_only_preserves_description_in_metadata,
+        test_cleanup_closes_llm_processor,
     ]
     
     results = []
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Test script for reusing LLM answers:
+1. Verifies that an identical request at temperature 0 is answered from the cache
+2. Verifies that sampled answers are only reused when the cache is set to all
+3. Verifies that the image key, instructions, sampler settings and model are part of the key, the bytes sent are not
+4. Verifies that refreshing asks again and replaces the cached answer
+5. Verifies that unusable answers are not cached and follow-up turns still work
+6. Verifies that the cache is only opened when it can be hit, and lookups are written in batches
+7. Verifies that a copy of an image with other metadata written into it reuses the answer
+"""
+
+import sys
+import os
+import shutil
+import tempfile
+
+# Add project root to path
+project_root = os.path.dirname(__file__)
+sys.path.insert(0, project_root)
+
+from tests.test_utils import StubLLMServer, chat_response
+
+IMAGE = "/9j/4AAQSkZJRgABAQ"  # Only has to look like a base64 JPEG
+IMAGE_KEY = "image-key"  # Stands in for the hash of the image and how it was prepared
+KEYWORDS = '{"Description": "A test image.", "Keywords": ["test"]}'
+
+def make_processor(server, cache_path, **settings):
+    from src.llmii import Config, LLMProcessor
+
+    config = Config()
+    config.api_url = server.url
+    config.health_interval = 0
+    config.temperature = 0
+    config.response_cache_path = cache_path
+    for key, value in settings.items():
+        setattr(config, key, value)
+    return LLMProcessor(config)
+
+def ask(processor, task="keywords", image=IMAGE, image_key=IMAGE_KEY):
+    try:
+        return processor.describe_content(task, image, image_key=image_key)
+    finally:
+        processor.close()
+
+def test_deterministic_reuse():
+    """Test that temperature 0 answers are reused"""
+    temp_dir = tempfile.mkdtemp()
+    try:
+        cache_path = os.path.join(temp_dir, "responses.db")
+        with StubLLMServer(model_id="stub-model") as server:
+            first = ask(make_processor(server, cache_path))
+            processor = make_processor(server, cache_path)
+            second = ask(processor)
+
+            assert first == second == KEYWORDS, f"Same answer expected, got {first!r} and {second!r}"
+            assert len(server.requests) == 1, f"Identical request should be sent once, sent {len(server.requests)}"
+            assert processor.cache_hits == 1, "Reuse should be counted"
+            assert "1 answers reused" in processor.cache_report(), processor.cache_report()
+
+            ask(make_processor(server, cache_path, response_cache="off"))
+            assert len(server.requests) == 2, "Cache off should always ask"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Identical requests at temperature 0 are answered once")
+    return True
+
+def test_sampled_answers():
+    """Test that sampled answers are only reused when asked"""
+    temp_dir = tempfile.mkdtemp()
+    try:
+        cache_path = os.path.join(temp_dir, "responses.db")
+        with StubLLMServer() as server:
+            for _ in range(2):
+                ask(make_processor(server, cache_path, temperature=0.7))
+            assert len(server.requests) == 2, "Sampled answers should not be reused by default"
+
+            for _ in range(2):
+                ask(make_processor(server, cache_path, temperature=0.7, response_cache="all"))
+            assert len(server.requests) == 3, "Sampled answers should be reused with all"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Sampled answers are reused only when the cache is set to all")
+    return True
+
+def test_key():
+    """Test what makes a request different"""
+    temp_dir = tempfile.mkdtemp()
+    try:
+        cache_path = os.path.join(temp_dir, "responses.db")
+        with StubLLMServer(model_id="model-a") as server:
+            ask(make_processor(server, cache_path))
+            changes = [
+                ({}, {"image_key": "other-image"}),
+                ({}, {"task": "caption"}),
+                ({"keyword_instruction": "Other keywords please", "instruction": "Other keywords please"}, {}),
+                ({"top_p": 0.5}, {}),
+                ({"top_k": 5}, {}),
+                ({"min_p": 0.1}, {}),
+                ({"rep_pen": 1.2}, {}),
+                ({"gen_count": 100}, {}),
+            ]
+            for settings, request in changes:
+                sent = len(server.requests)
+                ask(make_processor(server, cache_path, **settings), **request)
+                assert len(server.requests) == sent + 1, f"{settings or request} should not reuse the answer"
+
+            # The same image sent as other bytes, like a file with other tags
+            sent = len(server.requests)
+            ask(make_processor(server, cache_path), image=IMAGE + "AAAA")
+            assert len(server.requests) == sent, "The bytes sent should not be part of the key"
+            ask(make_processor(server, cache_path), image_key=None)
+            assert len(server.requests) == sent + 1, "Requests without an image key should not be cached"
+
+        with StubLLMServer(model_id="model-b") as server:
+            ask(make_processor(server, cache_path))
+            assert len(server.requests) == 1, "Another model should not reuse the answer"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Image key, instructions, sampler settings and model are part of the key")
+    return True
+
+def test_refresh():
+    """Test that refreshing asks again and keeps the new answer"""
+    temp_dir = tempfile.mkdtemp()
+    try:
+        cache_path = os.path.join(temp_dir, "responses.db")
+        newer = '{"Description": "Newer.", "Keywords": ["new"]}'
+        with StubLLMServer([(200, chat_response(KEYWORDS)), (200, chat_response(newer))]) as server:
+            ask(make_processor(server, cache_path))
+            assert ask(make_processor(server, cache_path, refresh_responses=True)) == newer, "Refresh should ask again"
+            assert ask(make_processor(server, cache_path)) == newer, "Refreshed answer should replace the old one"
+            assert len(server.requests) == 2, f"Expected 2 requests, got {len(server.requests)}"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Refreshing asks again and replaces the cached answer")
+    return True
+
+def test_unusable_and_conversation():
+    """Test that bad answers are not kept and conversations get cached turns"""
+    from src.llmii import Conversation
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        cache_path = os.path.join(temp_dir, "responses.db")
+        with StubLLMServer([(200, chat_response("I can't see an image")), (200, chat_response(KEYWORDS))]) as server:
+            ask(make_processor(server, cache_path))
+            assert ask(make_processor(server, cache_path)) == KEYWORDS, "Unusable answer should not be reused"
+
+            processor = make_processor(server, cache_path)
+            try:
+                conversation = Conversation()
+                processor.describe_content("keywords", IMAGE, conversation, image_key=IMAGE_KEY)
+                assert conversation.turns == [("keywords", KEYWORDS)], "Cached answer should become a turn"
+                processor.describe_content("caption", IMAGE, conversation, image_key=IMAGE_KEY)
+            finally:
+                processor.close()
+            follow_up = server.requests[-1]["messages"]
+            assert follow_up[2] == {"role": "assistant", "content": KEYWORDS}, "Follow-up should include the cached turn"
+            assert len(server.requests) == 3, f"Only the follow-up should be sent, got {len(server.requests)} requests"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Unusable answers are not cached and conversations continue from cached turns")
+    return True
+
+def test_opened_when_usable():
+    """Test when the cache is opened and that lookups don't commit each time"""
+    import time
+    import sqlite3
+    import src.res_benchmark as res_benchmark
+    from src.llmii import Config
+    from src.response_cache import ResponseCache
+    from PIL import Image
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        cache_path = os.path.join(temp_dir, "responses.db")
+        with StubLLMServer() as server:
+            processor = make_processor(server, cache_path, temperature=0.2)
+            processor.close()
+            assert processor.response_cache is None, "Sampled answers are never reused by default"
+            assert not os.path.exists(cache_path), "The cache should not be opened"
+
+            processor = make_processor(server, cache_path, temperature=0.2, response_cache="all")
+            processor.close()
+            assert processor.response_cache is not None, "The cache should be opened when set to all"
+
+        # Recency is written in batches
+        batch_path = os.path.join(temp_dir, "batch.db")
+        cache = ResponseCache(batch_path, commit_every=3)
+        cache.put("a", "answer")
+        reader = sqlite3.connect(batch_path)
+        stored = reader.execute("SELECT used FROM responses WHERE key = 'a'").fetchone()[0]
+        time.sleep(0.01)
+        assert cache.get("a") == "answer" and cache.get("a") == "answer", "Stored answer should be found"
+        assert reader.execute("SELECT used FROM responses WHERE key = 'a'").fetchone()[0] == stored, "Lookups should not commit one by one"
+        cache.commit()
+        assert reader.execute("SELECT used FROM responses WHERE key = 'a'").fetchone()[0] > stored, "commit should write when it was used"
+        reader.close()
+        cache.close()
+
+        # The resolution benchmark measures the model, never the cache
+        Image.new("RGB", (64, 64), "gray").save(os.path.join(temp_dir, "photo.jpg"))
+        config = Config()
+        config.directory = temp_dir
+        config.benchmark_res = "224"
+        used = []
+
+        def fake_make_llm_processor(llm_config, callback=print):
+            used.append(llm_config.response_cache)
+            raise RuntimeError("stop here")
+
+        original = res_benchmark.make_llm_processor
+        res_benchmark.make_llm_processor = fake_make_llm_processor
+        try:
+            res_benchmark.run_res_benchmark(config, callback=lambda message: None)
+        except RuntimeError:
+            pass
+        finally:
+            res_benchmark.make_llm_processor = original
+        assert used == ["off"], f"The benchmark should not use the response cache, got {used}"
+        assert config.response_cache == "deterministic", "The caller's config should be left alone"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ The cache is only opened when it can be hit and lookups are batched")
+    return True
+
+def test_tagged_copy_reuses_answer():
+    """Test that files differing only in their metadata share answers"""
+    import struct
+    from src.llmii import Config, FileProcessor
+    from PIL import Image
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        clean = os.path.join(temp_dir, "clean.jpg")
+        tagged = os.path.join(temp_dir, "tagged.jpg")
+        Image.new("RGB", (400, 300), "gray").save(clean, quality=80)
+        with open(clean, "rb") as f:
+            data = f.read()
+        xmp = b"http://ns.adobe.com/xap/1.0/\x00<x:xmpmeta><xmp:Identifier>a4c4f3a8</xmp:Identifier></x:xmpmeta>"
+        jfif_end = 4 + struct.unpack(">H", data[4:6])[0]
+        with open(tagged, "wb") as f:
+            f.write(data[:jfif_end] + b"\xff\xe1" + struct.pack(">H", len(xmp) + 2) + xmp + data[jfif_end:])
+
+        with StubLLMServer() as server:
+            config = Config()
+            config.api_url = server.url
+            config.health_interval = 0
+            config.temperature = 0
+            config.directory = temp_dir
+            config.response_cache_path = os.path.join(temp_dir, "responses.db")
+            processor = FileProcessor(config, callback=lambda message: None)
+            try:
+                for file_path in (clean, tagged):
+                    job = processor.infer_file(processor.prepare_file({"SourceFile": file_path}))
+                    assert job is not None and job["status"] == "success", f"{file_path} should be described"
+                per_file = len(server.requests)
+                assert per_file > 0, "The first file should be sent to the LLM"
+                assert processor.llm_processor.cache_hits == per_file, f"The tagged copy should be answered from the cache, {per_file} requests sent"
+            finally:
+                processor.llm_processor.close()
+                processor.reader_pool.terminate()
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ A copy with other metadata reuses the answers")
+    return True
+
+def main():
+    """Run all tests"""
+    print("Testing the response cache...\n")
+
+    tests = [
+        test_deterministic_reuse,
+        test_sampled_answers,
+        test_key,
+        test_refresh,
+        test_unusable_and_conversation,
+        test_opened_when_usable,
+        test_tagged_copy_reuses_answer,
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+            print()
+        except Exception as e:
+            print(f"✗ Test failed: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append(False)
+            print()
+
+    if all(results):
+        print("✓ All response cache tests passed!")
+        return 0
+    else:
+        print("✗ Some tests failed")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Test script for streamed answers:
+1. Verifies that the stream parser picks out keywords as they finish
+2. Verifies that the parser only stops once every required key was seen
+3. Verifies that a streamed request stops as soon as the keywords are complete
+4. Verifies that free text captions are not streamed
+5. Verifies that the async client streams and stops early too
+6. Verifies that FileProcessor passes partial keywords to the callback
+"""
+
+import sys
+import os
+import json
+import time
+import shutil
+import tempfile
+
+# Add project root to path
+project_root = os.path.dirname(__file__)
+sys.path.insert(0, project_root)
+
+from tests.test_utils import StubLLMServer, ChatStream, chat_response, verify_exiftool_available
+
+ANSWER = '{"Description": "A \\"tall\\" tree.", "Keywords": ["tree", "river", "sky"]}'
+RAMBLE = ["\n\nI", " chose", " these", " keywords", " because"] * 20
+
+def pieces(text, size=4):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def feed_all(parser, text, size=1):
+    finished = []
+    for piece in pieces(text, size):
+        finished.extend(parser.feed(piece))
+    return finished
+
+def make_config(server, **options):
+    from src.llmii import Config
+
+    config = Config()
+    config.api_url = server.url
+    config.health_interval = 0
+    config.stream = True
+    for key, value in options.items():
+        setattr(config, key, value)
+    return config
+
+def test_parser_keywords():
+    """Test that keywords come out one at a time and the result parses"""
+    from src.json_stream import KeywordStreamParser
+
+    parser = KeywordStreamParser(required=["Description", "Keywords"])
+    seen = []
+    for piece in pieces("Sure!\n```json\n" + ANSWER[:-1], 1):
+        for keyword in parser.feed(piece):
+            seen.append((keyword, list(parser.keywords)))
+
+    assert [k for k, _ in seen] == ["tree", "river", "sky"], f"Keywords should come out in order, got {seen}"
+    assert seen[0][1] == ["tree"], "Each keyword should be reported as soon as it is finished"
+    assert parser.complete, "Closing the keyword list should complete the answer"
+    assert json.loads(parser.result()) == json.loads(ANSWER), f"Result should parse, got {parser.result()!r}"
+
+    parser.feed(' "Extra": "ignored"} and then some')
+    assert json.loads(parser.result()) == json.loads(ANSWER), "Text after completion should be left out"
+    assert "and then some" in parser.text, "Everything generated should still be kept"
+
+    print("✓ Parser picks out keywords as they finish")
+    return True
+
+def test_parser_waits_for_required_keys():
+    """Test that keywords written first do not end the answer early"""
+    from src.json_stream import KeywordStreamParser
+
+    parser = KeywordStreamParser(required=["Description", "Keywords"])
+    feed_all(parser, '{"Keywords": ["a", "b"], ')
+    assert not parser.complete, "Description has not been written yet"
+    feed_all(parser, '"Description": "Text, with [brackets]."}')
+    assert parser.complete, "Closing the object should complete the answer"
+    assert json.loads(parser.result())["Description"] == "Text, with [brackets].", "Strings should not confuse the parser"
+
+    parser = KeywordStreamParser()
+    feed_all(parser, '{"Keywords": ["one"]')
+    assert parser.complete, "Keywords only answers are complete when the list closes"
+
+    parser = KeywordStreamParser()
+    feed_all(parser, "I can't describe this image.")
+    assert not parser.complete and parser.result() == "I can't describe this image.", "Non JSON answers should be kept whole"
+
+    print("✓ Parser waits for every required key")
+    return True
+
+def test_stream_stops_early():
+    """Test that the request ends once the keywords are complete"""
+    from src.llmii import LLMProcessor
+
+    stream = ChatStream(pieces(ANSWER) + RAMBLE, delay=0.01)
+    with StubLLMServer([(200, stream)]) as server:
+        processor = LLMProcessor(make_config(server))
+        progress = []
+        started = time.time()
+        answer = processor.describe_content("caption_and_keywords", "aW1hZ2U=", on_keywords=progress.append)
+        elapsed = time.time() - started
+
+        assert json.loads(answer) == json.loads(ANSWER), f"Answer should be the complete JSON, got {answer!r}"
+        assert progress == [["tree"], ["tree", "river"], ["tree", "river", "sky"]], f"Keywords should be reported as they arrive, got {progress}"
+        assert server.requests[0]["stream"] is True, "Request should ask for a stream"
+        assert elapsed < len(stream.pieces) * 0.01 * 0.6, f"Request should stop before the rambling, took {elapsed:.2f}s"
+        assert processor.early_stops == 1, "Early stop should be counted"
+        assert processor.endpoints.endpoints[0].repaired == 0, "Cut off answer should still parse as is"
+
+        # The server notices the client hung up on its next write
+        deadline = time.time() + 2
+        while not server.pieces_sent and time.time() < deadline:
+            time.sleep(0.05)
+        assert server.pieces_sent and server.pieces_sent[0] < len(stream.pieces), "Server should stop sending"
+
+        answer = processor.describe_content("keywords", "aW1hZ2U=")
+        assert json.loads(answer) == json.loads(ANSWER), "Next request should work after the aborted one"
+        processor.close()
+
+    print(f"✓ Streamed request stops early ({elapsed:.2f}s)")
+    return True
+
+def test_caption_not_streamed():
+    """Test that free text answers use a normal request"""
+    from src.llmii import LLMProcessor
+
+    with StubLLMServer([(200, chat_response("A tall tree."))]) as server:
+        processor = LLMProcessor(make_config(server))
+        assert processor.describe_content("caption", "aW1hZ2U=") == "A tall tree.", "Caption should come back whole"
+        assert "stream" not in server.requests[0], "Captions should not be streamed"
+        processor.close()
+
+    print("✓ Captions are not streamed")
+    return True
+
+def test_async_stream_stops_early():
+    """Test that the async client streams too"""
+    try:
+        import httpx
+    except ImportError:
+        print("✗ httpx not available - skipping test")
+        return False
+
+    from src.async_llm import AsyncLLMProcessor
+
+    stream = ChatStream(pieces(ANSWER) + RAMBLE, delay=0.01)
+    with StubLLMServer([(200, stream)]) as server:
+        processor = AsyncLLMProcessor(make_config(server))
+        try:
+            progress = []
+            started = time.time()
+            answer = processor.describe_content("caption_and_keywords", "aW1hZ2U=", on_keywords=progress.append)
+            elapsed = time.time() - started
+        finally:
+            processor.close()
+
+        assert json.loads(answer) == json.loads(ANSWER), f"Answer should be the complete JSON, got {answer!r}"
+        assert progress[-1] == ["tree", "river", "sky"], f"Keywords should be reported, got {progress}"
+        assert elapsed < len(stream.pieces) * 0.01 * 0.6, f"Request should stop before the rambling, took {elapsed:.2f}s"
+
+    print("✓ Async client stops streams early")
+    return True
+
+def test_processor_reports_partial_keywords():
+    """Test that partial keywords reach the GUI callback"""
+    if not verify_exiftool_available():
+        print("✗ ExifTool not available - skipping test")
+        return False
+
+    from src.llmii import FileProcessor
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        with StubLLMServer([(200, ChatStream(pieces(ANSWER) + RAMBLE))]) as server:
+            config = make_config(server)
+            config.directory = temp_dir
+            messages = []
+            processor = FileProcessor(config, callback=messages.append)
+            try:
+                file_path = os.path.join(temp_dir, "image.jpg")
+                result = processor.generate_metadata({"SourceFile": file_path}, "aW1hZ2U=")
+            finally:
+                processor.indexer.join()
+                processor.llm_processor.close()
+                processor.reader_pool.terminate()
+                processor.et.terminate()
+
+            partial = [m for m in messages if isinstance(m, dict) and m.get("type") == "partial_keywords"]
+            assert [m["keywords"] for m in partial] == [["tree"], ["tree", "river"], ["tree", "river", "sky"]], f"Unexpected partial keywords: {partial}"
+            assert all(m["file_path"] == file_path for m in partial), "Partial keywords should name the file"
+            assert result["XMP:Status"] == "success", f"Streamed answer should be used, got {result}"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ FileProcessor passes partial keywords on")
+    return True
+
+def main():
+    """Run all tests"""
+    print("Testing streamed answers...\n")
+
+    tests = [
+        test_parser_keywords,
+        test_parser_waits_for_required_keys,
+        test_stream_stops_early,
+        test_caption_not_streamed,
+        test_async_stream_stops_early,
+        test_processor_reports_partial_keywords,
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+            print()
+        except Exception as e:
+            print(f"✗ Test failed: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append(False)
+            print()
+
+    if all(results):
+        print("✓ All streaming tests passed!")
+        return 0
+    else:
+        print("✗ Some tests failed")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
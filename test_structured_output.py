@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Test script for structured output:
+1. Verifies that the GBNF grammar matches the Description/Keywords schema
+2. Verifies that grammar and json_schema modes constrain only JSON tasks
+3. Verifies that answers are classified as ok, repaired or invalid
+4. Verifies that repaired and unusable answers are counted per endpoint
+5. Verifies that FileProcessor counts retried and failed files
+"""
+
+import sys
+import os
+import json
+import shutil
+import tempfile
+
+# Add project root to path
+project_root = os.path.dirname(__file__)
+sys.path.insert(0, project_root)
+
+from tests.test_utils import StubLLMServer, chat_response, verify_exiftool_available
+
+def make_config(server, **options):
+    from src.llmii import Config
+
+    config = Config()
+    config.api_url = server.url
+    config.health_interval = 0
+    config.instruction = "keywords and caption please"
+    config.keyword_instruction = "keywords please"
+    config.caption_instruction = "caption please"
+    for key, value in options.items():
+        setattr(config, key, value)
+    return config
+
+def test_grammar():
+    """Test that the grammar lists the properties in order with the right types"""
+    from src.structured_output import gbnf_for_schema, CAPTION_AND_KEYWORDS_SCHEMA, KEYWORDS_SCHEMA
+
+    grammar = gbnf_for_schema(CAPTION_AND_KEYWORDS_SCHEMA)
+    rules = dict(line.split(" ::= ", 1) for line in grammar.splitlines())
+
+    assert set(rules) == {"root", "string", "string-array", "ws"}, f"Unexpected rules: {sorted(rules)}"
+    assert rules["root"] == r'"{" ws "\"Description\"" ws ":" ws string ws "," ws "\"Keywords\"" ws ":" ws string-array ws "}"', \
+        f"Root should be the Description string then the Keywords array, got {rules['root']}"
+    assert r'[^"\\\x7F\x00-\x1F]' in rules["string"], "Strings should not contain raw control characters"
+
+    keywords_only = dict(line.split(" ::= ", 1) for line in gbnf_for_schema(KEYWORDS_SCHEMA).splitlines())
+    assert "Description" not in keywords_only["root"], "Keywords only grammar should not ask for a description"
+
+    try:
+        gbnf_for_schema({"properties": {"Count": {"type": "integer"}}})
+        assert False, "Unsupported types should be rejected"
+    except ValueError:
+        pass
+
+    print("✓ Grammar matches the schema")
+    return True
+
+def test_payload_constraints():
+    """Test that only JSON tasks are constrained, in the chosen format"""
+    from src.llmii import LLMProcessor
+
+    with StubLLMServer() as server:
+        grammar = LLMProcessor(make_config(server, structured_output="grammar"))
+        payload, _ = grammar.build_request("caption_and_keywords", "aW1hZ2U=")
+        assert payload["grammar"].startswith('root ::= "{"'), "Grammar should be sent for keyword tasks"
+        assert "response_format" not in payload, "Grammar mode should not send a response_format"
+        payload, _ = grammar.build_request("caption", "aW1hZ2U=")
+        assert "grammar" not in payload, "Free text captions should not be constrained"
+        grammar.close()
+
+        schema = LLMProcessor(make_config(server, structured_output="json_schema"))
+        payload, _ = schema.build_request("keywords_only", "aW1hZ2U=")
+        response_format = payload["response_format"]
+        assert response_format["type"] == "json_schema", "OpenAI style response_format should be sent"
+        assert response_format["json_schema"]["schema"]["required"] == ["Keywords"], "Keywords only schema should be used"
+        assert "grammar" not in payload, "Schema mode should not send a grammar"
+        schema.close()
+
+        off = LLMProcessor(make_config(server))
+        payload, _ = off.build_request("caption_and_keywords", "aW1hZ2U=")
+        assert "grammar" not in payload and "response_format" not in payload, "Nothing should be sent when off"
+        off.close()
+
+    print("✓ Only JSON tasks are constrained")
+    return True
+
+def test_check_answer():
+    """Test how answers are classified"""
+    from src.llmii import check_answer
+
+    assert check_answer("keywords", '{"Description": "A tree.", "Keywords": ["tree"]}') == "ok", "Clean JSON is ok"
+    assert check_answer("keywords", 'Sure!\n```json\n{"Keywords": ["tree"]}\n```') == "repaired", "Wrapped JSON needs repair"
+    assert check_answer("keywords", '{"Keywords": []}') == "invalid", "No keywords is unusable"
+    assert check_answer("keywords_only", "I can't see an image.") == "invalid", "Prose is unusable"
+    assert check_answer("caption", "A tall tree.") == "ok", "Captions are free text"
+    assert check_answer("caption", None) == "invalid", "No answer is unusable"
+
+    print("✓ Answers are classified")
+    return True
+
+def test_counts_per_endpoint():
+    """Test that the endpoint report counts repaired and unusable answers"""
+    from src.llmii import LLMProcessor
+
+    responses = [
+        (200, chat_response('{"Description": "A tree.", "Keywords": ["tree"]}')),
+        (200, chat_response('Here you go: ```json\n{"Description": "A tree.", "Keywords": ["tree"]}\n```')),
+        (200, chat_response("I am unable to help with that.")),
+    ]
+    with StubLLMServer(responses) as server:
+        processor = LLMProcessor(make_config(server))
+        for _ in range(3):
+            processor.describe_content("caption_and_keywords", "aW1hZ2U=")
+
+        endpoint = processor.endpoints.endpoints[0]
+        assert (endpoint.repaired, endpoint.invalid) == (1, 1), f"Expected one repaired and one unusable, got {endpoint.repaired}, {endpoint.invalid}"
+        assert "1 repaired, 1 unusable answers" in processor.endpoints.report(), "Report should show the counts"
+        processor.close()
+
+    print("✓ Answers are counted per endpoint")
+    return True
+
+def test_processor_counts_retries():
+    """Test that retried and failed files are counted"""
+    if not verify_exiftool_available():
+        print("✗ ExifTool not available - skipping test")
+        return False
+
+    from src.llmii import FileProcessor
+
+    temp_dir = tempfile.mkdtemp()
+    good = chat_response(json.dumps({"Description": "A tree.", "Keywords": ["tree"]}))
+    bad = chat_response("No idea.")
+    try:
+        with StubLLMServer([(200, bad), (200, good), (200, bad)]) as server:
+            config = make_config(server)
+            config.directory = temp_dir
+            processor = FileProcessor(config, callback=lambda message: None)
+            try:
+                def job(name):
+                    file_path = os.path.join(temp_dir, name)
+                    return {"metadata": {"SourceFile": file_path}, "file_path": file_path, "processed_image": "aW1hZ2U="}
+
+                assert processor.infer_file(job("retried.jpg")) is not None, "Second try should succeed"
+                assert processor.infer_file(job("failed.jpg")) is None, "Two bad answers should fail the file"
+            finally:
+                processor.indexer.join()
+                processor.llm_processor.close()
+                processor.reader_pool.terminate()
+                processor.et.terminate()
+
+            assert processor.files_retried == 2, f"Both files should have been retried, got {processor.files_retried}"
+            assert processor.files_failed == 1, f"One file should have failed, got {processor.files_failed}"
+            assert processor.llm_processor.endpoints.endpoints[0].invalid == 3, "Every bad answer should be counted"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Retried and failed files are counted")
+    return True
+
+def main():
+    """Run all tests"""
+    print("Testing structured output...\n")
+
+    tests = [
+        test_grammar,
+        test_payload_constraints,
+        test_check_answer,
+        test_counts_per_endpoint,
+        test_processor_counts_retries,
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+            print()
+        except Exception as e:
+            print(f"✗ Test failed: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append(False)
+            print()
+
+    if all(results):
+        print("✓ All structured output tests passed!")
+        return 0
+    else:
+        print("✗ Some tests failed")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
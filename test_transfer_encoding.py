@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Test script for how prepared images are encoded for the request:
+1. Verifies that images can be sent as WebP or PNG with the right MIME type
+2. Verifies that a byte budget lowers the quality until the image fits
+3. Verifies that progressive and optimize are off unless asked for
+4. Verifies that payload sizes and encode times are reported
+5. Verifies that Config options reach the ImageProcessor
+"""
+
+import sys
+import os
+import io
+import base64
+import shutil
+import tempfile
+
+# Add project root to path
+project_root = os.path.dirname(__file__)
+sys.path.insert(0, project_root)
+
+from PIL import Image
+
+def noisy_image(directory, name="photo.png", size=(1200, 900)):
+    """A detailed image that doesn't compress well, saved losslessly"""
+    img = Image.effect_noise((size[0] // 4, size[1] // 4), 80).convert("RGB").resize(size)
+    path = os.path.join(directory, name)
+    img.save(path)
+    return path
+
+def decoded(encoded):
+    return Image.open(io.BytesIO(base64.b64decode(encoded)))
+
+def test_formats():
+    """Test WebP and PNG output and the data URL MIME type"""
+    from src.image_processor import ImageProcessor, image_mime
+    from src.llmii import Config, LLMProcessor
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = noisy_image(temp_dir)
+        for image_format, mime in (("JPEG", "image/jpeg"), ("WEBP", "image/webp"), ("PNG", "image/png")):
+            processor = ImageProcessor(max_dimension=448, patch_sizes=[14], image_format=image_format.lower())
+            encoded, _ = processor.process_image(path)
+            with decoded(encoded) as img:
+                assert img.format == image_format, f"Expected {image_format}, got {img.format}"
+                assert img.size == (448, 336), f"Image should be resized, got {img.size}"
+            assert image_mime(encoded) == mime, f"{image_format} should be sent as {mime}"
+
+            config = Config()
+            config.api_url = "http://127.0.0.1:9"
+            config.health_interval = 0
+            llm = LLMProcessor(config)
+            payload, _ = llm.build_request("caption", encoded)
+            llm.close()
+            url = payload["messages"][1]["content"][1]["image_url"]["url"]
+            assert url.startswith(f"data:{mime};base64,"), f"Data URL should name {mime}, got {url[:30]}"
+
+        try:
+            ImageProcessor(image_format="gif")
+            assert False, "Unsupported formats should be rejected"
+        except ValueError:
+            pass
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Images can be sent as JPEG, WebP or PNG")
+    return True
+
+def test_byte_budget():
+    """Test that quality is lowered until the image fits"""
+    from src.image_processor import ImageProcessor
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = noisy_image(temp_dir)
+        full = ImageProcessor(max_dimension=448, patch_sizes=[14])
+        full_size = len(base64.b64decode(full.process_image(path)[0]))
+
+        budget = full_size // 2
+        for image_format in ("jpeg", "webp"):
+            processor = ImageProcessor(max_dimension=448, patch_sizes=[14], image_format=image_format, max_bytes=budget)
+            data = base64.b64decode(processor.process_image(path)[0])
+            assert len(data) <= budget, f"{image_format} should fit in {budget} bytes, got {len(data)}"
+            assert processor.stats["encodes"] > 1, "Quality should have been searched"
+            assert processor.stats["encodes"] <= 8, f"Search should take few encodes, took {processor.stats['encodes']}"
+
+        # A budget nothing fits in gives the smallest image allowed
+        tiny = ImageProcessor(max_dimension=448, patch_sizes=[14], max_bytes=100)
+        data = base64.b64decode(tiny.process_image(path)[0])
+        lowest = ImageProcessor(max_dimension=448, patch_sizes=[14], quality=40)
+        assert len(data) == len(base64.b64decode(lowest.process_image(path)[0])), "Should stop at the lowest quality"
+
+        # A JPEG over the budget is re-encoded instead of passed through
+        small = os.path.join(temp_dir, "small.jpg")
+        Image.open(path).resize((400, 300)).save(small, quality=100)
+        passthrough = ImageProcessor(max_dimension=448, patch_sizes=[14], passthrough=True, max_bytes=os.path.getsize(small) // 2)
+        passthrough.process_image(small)
+        assert passthrough.stats["passthrough"] == 0 and passthrough.stats["encoded"] == 1, "Large JPEG should be re-encoded"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print(f"✓ Byte budget lowers the quality ({full_size} bytes down to at most {budget})")
+    return True
+
+def test_speed_options():
+    """Test that progressive and optimize are only used when asked"""
+    from src.image_processor import ImageProcessor
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = noisy_image(temp_dir)
+        with decoded(ImageProcessor(max_dimension=448, patch_sizes=[14]).process_image(path)[0]) as img:
+            assert not img.info.get("progressive"), "Baseline JPEG should be the default"
+
+        progressive = ImageProcessor(max_dimension=448, patch_sizes=[14], progressive=True, optimize=True)
+        with decoded(progressive.process_image(path)[0]) as img:
+            assert img.info.get("progressive"), "Progressive JPEG should be sent when asked for"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Progressive and optimize are off unless asked for")
+    return True
+
+def test_report():
+    """Test that payload sizes and encode times are reported"""
+    from src.image_processor import ImageProcessor
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = noisy_image(temp_dir)
+        processor = ImageProcessor(max_dimension=448, patch_sizes=[14], image_format="webp")
+        encoded, _ = processor.process_image(path)
+        processor.process_image(path)
+
+        assert processor.stats["payload_bytes"] == 2 * len(encoded), "Payload bytes should be counted"
+        assert processor.stats["encode_seconds"] > 0, "Encode time should be measured"
+        report = processor.report()
+        assert f"Payload {len(encoded) / 1024:.1f} KB per image" in report, f"Report should show the payload size: {report}"
+        assert "ms per image (WEBP, 2 encodes)" in report, f"Report should show encode time and format: {report}"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print("✓ Payload sizes and encode times are reported")
+    return True
+
+def test_config_options():
+    """Test that Config settings reach the ImageProcessor"""
+    from src.llmii import Config, image_options
+    from src.model_profiles import make_image_processor
+
+    config = Config()
+    config.image_format = "webp"
+    config.image_quality = 70
+    config.image_max_kb = 64
+    config.image_progressive = True
+    config.no_passthrough = True
+    processor = make_image_processor(448, **image_options(config))
+
+    assert processor.image_format == "WEBP" and processor.quality == 70, "Format and quality should be set"
+    assert processor.max_bytes == 64 * 1024, "Budget should be in bytes"
+    assert processor.progressive and not processor.optimize and not processor.passthrough, "Flags should be passed on"
+    assert make_image_processor(448, **image_options(Config())).max_bytes is None, "No budget by default"
+
+    print("✓ Config options reach the ImageProcessor")
+    return True
+
+def main():
+    """Run all tests"""
+    print("Testing transfer encoding...\n")
+
+    tests = [
+        test_formats,
+        test_byte_budget,
+        test_speed_options,
+        test_report,
+        test_config_options,
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+            print()
+        except Exception as e:
+            print(f"✗ Test failed: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append(False)
+            print()
+
+    if all(results):
+        print("✓ All transfer encoding tests passed!")
+        return 0
+    else:
+        print("✗ Some tests failed")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Test script for watch mode:
+1. Verifies that the debouncer holds files back until they stop changing
+2. Verifies that the polling watcher reports new and changed images only
+3. Verifies that the watchdog watcher sees files in newly created subdirectories
+4. Verifies that FileProcessor feeds settled files through processing while watching
+"""
+
+import sys
+import os
+import time
+import shutil
+import tempfile
+
+# Add project root to path
+project_root = os.path.dirname(__file__)
+sys.path.insert(0, project_root)
+
+from tests.test_utils import verify_exiftool_available
+
+def write(root, relative, content=b"image data"):
+    file_path = os.path.join(root, relative)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "ab") as f:
+        f.write(content)
+    return os.path.normpath(file_path)
+
+def poll_until(watcher, expected, timeout=5):
+    """Collect changed paths until every expected one was seen"""
+    seen = set()
+    deadline = time.time() + timeout
+    while not expected <= seen and time.time() < deadline:
+        seen.update(watcher.poll(timeout=0.1))
+    return seen
+
+def test_debouncer_waits_for_settle():
+    """Test that a file being written is not ready until it settles"""
+    from src.watcher import Debouncer
+
+    root = tempfile.mkdtemp()
+    try:
+        growing = write(root, "growing.jpg")
+        empty = write(root, "empty.jpg", b"")
+        gone = write(root, "gone.jpg")
+
+        debouncer = Debouncer(settle=0.3)
+        for file_path in (growing, empty, gone):
+            debouncer.touch(file_path)
+
+        assert debouncer.ready() == {}, "Nothing should be ready right away"
+        os.remove(gone)
+
+        deadline = time.time() + 0.6
+        while time.time() < deadline:
+            write(root, "growing.jpg")
+            assert growing not in debouncer.ready(), "A file still being written should not be ready"
+            time.sleep(0.05)
+
+        time.sleep(0.4)
+        ready = debouncer.ready()
+        assert list(ready) == [growing], f"Only the settled non-empty file should be ready, got {list(ready)}"
+        assert ready[growing].st_size == os.path.getsize(growing), "Ready files should come with their stat"
+        assert not debouncer.pending, "Vanished, empty and ready files should be dropped"
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print("✓ Debouncer waits for files to settle")
+    return True
+
+def test_polling_watcher():
+    """Test that polling reports new and changed images"""
+    from src.watcher import PollingWatcher
+
+    root = tempfile.mkdtemp()
+    try:
+        existing = write(root, "existing.jpg")
+        watcher = PollingWatcher(root, [".jpg"], interval=0.1)
+
+        added = write(root, os.path.join("sub", "added.JPG"))
+        write(root, "notes.txt")
+        assert poll_until(watcher, {added}) == {added}, "New image in a subdirectory should be reported"
+
+        changed_stat = os.stat(existing)
+        os.utime(existing, ns=(changed_stat.st_atime_ns, changed_stat.st_mtime_ns + 1_000_000_000))
+        assert poll_until(watcher, {existing}) == {existing}, "Changed image should be reported"
+
+        flat = PollingWatcher(root, [".jpg"], recursive=False, interval=0.1)
+        deep = write(root, os.path.join("sub", "deep.jpg"))
+        top = write(root, "top.jpg")
+        assert poll_until(flat, {top}, timeout=1) == {top}, "Non recursive watcher should ignore subdirectories"
+        assert deep not in flat.snapshot, "Subdirectories should not be listed"
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print("✓ Polling watcher reports new and changed images")
+    return True
+
+def test_watchdog_watcher():
+    """Test that watchdog reports files, including in new subdirectories"""
+    from src.watcher import WatchdogWatcher
+
+    root = tempfile.mkdtemp()
+    try:
+        try:
+            watcher = WatchdogWatcher(root, [".jpg"])
+        except (ImportError, OSError) as e:
+            print(f"✗ watchdog not available - skipping test: {e}")
+            return False
+
+        try:
+            top = write(root, "top.jpg")
+            assert top in poll_until(watcher, {top}), "New file should be reported"
+
+            # Files written before the new directory's watch was added
+            # must still be found
+            os.makedirs(os.path.join(root, "new", "deeper"))
+            nested = write(root, os.path.join("new", "deeper", "nested.jpg"))
+            assert nested in poll_until(watcher, {nested}), "File in a new subdirectory should be reported"
+
+            later = write(root, os.path.join("new", "deeper", "later.jpg"))
+            assert later in poll_until(watcher, {later}), "New subdirectory should be watched"
+        finally:
+            watcher.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print("✓ watchdog watcher follows new subdirectories")
+    return True
+
+def test_processor_watches_directory():
+    """Test that settled files are processed while watching"""
+    if not verify_exiftool_available():
+        print("✗ ExifTool not available - skipping test")
+        return False
+
+    from src.llmii import FileProcessor, Config
+    from src.watcher import PollingWatcher
+
+    root = tempfile.mkdtemp()
+    try:
+        config = Config()
+        config.directory = root
+        config.watch_settle = 0.2
+
+        seen = []
+
+        class Stopped(Exception):
+            pass
+
+        def stop_when_seen():
+            # The GUI stops a run by raising from this callback
+            if len(seen) >= 2:
+                raise Stopped()
+            return False
+
+        processor = FileProcessor(config, check_paused_or_stopped=stop_when_seen, callback=lambda message: None)
+        processor.indexer.join()
+
+        def fake_process_files(files, file_stats=None, quiet=False):
+            seen.extend(files)
+            assert all(file_stats[f].size > 0 for f in files), "Stats should travel with the files"
+            return True
+
+        processor._process_files = fake_process_files
+
+        watcher = PollingWatcher(root, [".jpg"], interval=0.1)
+        first = write(root, "first.jpg")
+        second = write(root, os.path.join("sub", "second.jpg"))
+
+        started = time.time()
+        try:
+            processor.watch_directory(watcher)
+        except Stopped:
+            pass
+        finally:
+            processor._wait_for_workers()
+            processor.reader_pool.terminate()
+            processor.et.terminate()
+
+        assert sorted(seen) == sorted([first, second]), f"Dropped files should be processed, got {seen}"
+        assert time.time() - started < 5, "Dropped files should be picked up within seconds"
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print("✓ FileProcessor processes files dropped while watching")
+    return True
+
+def main():
+    """Run all tests"""
+    print("Testing watch mode...\n")
+
+    tests = [
+        test_debouncer_waits_for_settle,
+        test_polling_watcher,
+        test_watchdog_watcher,
+        test_processor_watches_directory,
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+            print()
+        except Exception as e:
+            print(f"✗ Test failed: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append(False)
+            print()
+
+    if all(results):
+        print("✓ All watch mode tests passed!")
+        return 0
+    else:
+        print("✗ Some tests failed")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Integration tests for batched ExifTool writes through MetadataWriter
+"""
+import sys
+import os
+import time
+import threading
+
+project_root = os.path.dirname(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+from tests.test_utils import (
+    verify_exiftool_available,
+    setup_temp_directory,
+    cleanup_temp_directory,
+    copy_fixture
+)
+
+def read_subject(et, file_path):
+    """Read XMP:Subject as a list"""
+    keywords = et.get_tags([file_path], tags=["XMP:Subject"])[0].get("XMP:Subject", [])
+    if not isinstance(keywords, list):
+        keywords = [keywords]
+    return [str(kw).lower() for kw in keywords]
+
+def test_batch_written_in_one_command():
+    """Test that a full batch is written in a single ExifTool round trip"""
+    if not verify_exiftool_available():
+        print("✗ ExifTool not available - skipping test")
+        return False
+
+    try:
+        import exiftool
+        from src.metadata_writer import MetadataWriter
+
+        temp_dir = setup_temp_directory()
+        files = [copy_fixture("test_image.jpg", temp_dir, f"batch_{i}.jpg") for i in range(5)]
+
+        try:
+            et = exiftool.ExifToolHelper(encoding='utf-8')
+
+            try:
+                et.run()
+                calls = []
+                original_execute = et.execute
+
+                def counting_execute(*args, **kwargs):
+                    calls.append(args)
+                    return original_execute(*args, **kwargs)
+
+                et.execute = counting_execute
+
+                results = []
+                writer = MetadataWriter(
+                    et, threading.RLock(),
+                    params=["-P", "-overwrite_original"],
+                    batch_size=5,
+                    on_result=lambda context, success: results.append((context, success))
+                )
+
+                for i, file_path in enumerate(files):
+                    writer.add(file_path, {"MWG:Keywords": [f"batch{i}"], "XMP:Status": "success"}, i)
+
+                et.execute = original_execute
+
+                assert len(calls) == 1, f"Batch should be written in one command, got {len(calls)}"
+                assert sorted(results) == [(i, True) for i in range(5)], f"Every file should be reported written: {results}"
+
+                for i, file_path in enumerate(files):
+                    assert read_subject(et, file_path) == [f"batch{i}"], f"{file_path} should hold its own keywords"
+
+                print("✓ Batch written in one command")
+                return True
+
+            finally:
+                et.terminate()
+
+        finally:
+            cleanup_temp_directory(temp_dir)
+
+    except Exception as e:
+        print(f"✗ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_batch_reports_each_file():
+    """Test that one bad file in a batch does not fail the others"""
+    if not verify_exiftool_available():
+        print("✗ ExifTool not available - skipping test")
+        return False
+
+    try:
+        import exiftool
+        from src.metadata_writer import MetadataWriter
+
+        temp_dir = setup_temp_directory()
+        good_first = copy_fixture("test_image.jpg", temp_dir, "good_first.jpg")
+        missing = os.path.join(temp_dir, "missing.jpg")
+        good_last = copy_fixture("test_image.jpg", temp_dir, "good_last.jpg")
+
+        try:
+            et = exiftool.ExifToolHelper(encoding='utf-8')
+
+            try:
+                results = {}
+                writer = MetadataWriter(
+                    et, threading.RLock(),
+                    params=["-P", "-overwrite_original"],
+                    batch_size=10,
+                    on_result=lambda context, success: results.update({context: success})
+                )
+
+                for file_path in [good_first, missing, good_last]:
+                    writer.add(file_path, {"MWG:Keywords": ["reported"]}, file_path)
+
+                assert not results, "Nothing should be written before the batch is flushed"
+                writer.flush()
+
+                assert results[good_first] == True, "First file should be written"
+                assert results[missing] == False, "Missing file should be reported as failed"
+                assert results[good_last] == True, "Last file should be written"
+                assert read_subject(et, good_last) == ["reported"], "Keywords should be on disk"
+
+                print("✓ Batch reports success per file")
+                return True
+
+            finally:
+                et.terminate()
+
+        finally:
+            cleanup_temp_directory(temp_dir)
+
+    except Exception as e:
+        print(f"✗ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_writer_flushes_after_interval_and_on_close():
+    """Test that a partial batch is written after the interval and on close"""
+    if not verify_exiftool_available():
+        print("✗ ExifTool not available - skipping test")
+        return False
+
+    try:
+        import exiftool
+        from src.metadata_writer import MetadataWriter
+
+        temp_dir = setup_temp_directory()
+        first = copy_fixture("test_image.jpg", temp_dir, "first.jpg")
+        second = copy_fixture("test_image.jpg", temp_dir, "second.jpg")
+
+        try:
+            et = exiftool.ExifToolHelper(encoding='utf-8')
+
+            try:
+                results = []
+                writer = MetadataWriter(
+                    et, threading.RLock(),
+                    params=["-P", "-overwrite_original"],
+                    batch_size=10,
+                    flush_interval=0.2,
+                    on_result=lambda context, success: results.append(context)
+                )
+                writer.start()
+
+                # Nothing else arrives, e.g. because processing is paused
+                writer.add(first, {"MWG:Keywords": ["waited"]}, first)
+                deadline = time.time() + 5
+                while not results and time.time() < deadline:
+                    time.sleep(0.05)
+                assert results == [first], "Partial batch should be written after the flush interval"
+
+                writer.flush_interval = 60
+                writer.add(second, {"MWG:Keywords": ["closed"]}, second)
+                writer.close()
+                assert results == [first, second], "Close should write what is left"
+                assert read_subject(et, second) == ["closed"], "Keywords should be on disk after close"
+
+                print("✓ Writer flushes after the interval and on close")
+                return True
+
+            finally:
+                et.terminate()
+
+        finally:
+            cleanup_temp_directory(temp_dir)
+
+    except Exception as e:
+        print(f"✗ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_dry_run_writes_nothing():
+    """Test that dry run reports files without touching them"""
+    if not verify_exiftool_available():
+        print("✗ ExifTool not available - skipping test")
+        return False
+
+    try:
+        import exiftool
+        from src.metadata_writer import MetadataWriter
+
+        temp_dir = setup_temp_directory()
+        test_file = copy_fixture("test_image.jpg", temp_dir)
+
+        try:
+            et = exiftool.ExifToolHelper(encoding='utf-8')
+
+            try:
+                results = []
+                writer = MetadataWriter(
+                    et, threading.RLock(),
+                    params=["-P", "-overwrite_original"],
+                    dry_run=True,
+                    on_result=lambda context, success: results.append(success)
+                )
+                writer.add(test_file, {"MWG:Keywords": ["dryrun"]})
+                writer.flush()
+
+                assert results == [True], "Dry run should still report the file"
+                assert "dryrun" not in read_subject(et, test_file), "Dry run should not write"
+
+                print("✓ Dry run writes nothing")
+                return True
+
+            finally:
+                et.terminate()
+
+        finally:
+            cleanup_temp_directory(temp_dir)
+
+    except Exception as e:
+        print(f"✗ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def main():
+    """Run all batch write tests"""
+    print("Testing batched ExifTool writes...\n")
+
+    tests = [
+        test_batch_written_in_one_command,
+        test_batch_reports_each_file,
+        test_writer_flushes_after_interval_and_on_close,
+        test_dry_run_writes_nothing,
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+            print()
+        except Exception as e:
+            print(f"✗ Test failed: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append(False)
+            print()
+
+    if all(results):
+        print("✓ All batch write tests passed!")
+        return 0
+    else:
+        print("✗ Some tests failed")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
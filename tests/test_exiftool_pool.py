@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Integration tests for the pool of ExifTool metadata readers
+"""
+import sys
+import os
+
+project_root = os.path.dirname(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+from tests.test_utils import (
+    verify_exiftool_available,
+    setup_temp_directory,
+    cleanup_temp_directory,
+    copy_fixture
+)
+
+def make_files(temp_dir, count):
+    """Copy the keyword fixture count times"""
+    return [copy_fixture("test_with_keywords.jpg", temp_dir, f"pool_{i}.jpg") for i in range(count)]
+
+def test_pool_reads_in_order():
+    """Test that sharded reads come back complete and in file order"""
+    if not verify_exiftool_available():
+        print("✗ ExifTool not available - skipping test")
+        return False
+
+    try:
+        from src.exiftool_pool import ExifToolPool
+
+        temp_dir = setup_temp_directory()
+        files = make_files(temp_dir, 7)
+
+        try:
+            pool = ExifToolPool(size=3)
+
+            try:
+                results = pool.get_tags(files, tags=["XMP:Subject"], params=["-validate"])
+
+                assert len(results) == len(files), f"Should read every file, got {len(results)}"
+                assert [r["SourceFile"] for r in results] == files, "Results should be in file order"
+                assert pool.get_tags([], tags=["XMP:Subject"]) == [], "Empty batch should read nothing"
+
+                print("✓ Pool reads every file in order")
+                return True
+
+            finally:
+                pool.terminate()
+
+        finally:
+            cleanup_temp_directory(temp_dir)
+
+    except Exception as e:
+        print(f"✗ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_pool_restarts_dead_worker():
+    """Test that a crashed ExifTool process is replaced"""
+    if not verify_exiftool_available():
+        print("✗ ExifTool not available - skipping test")
+        return False
+
+    try:
+        from src.exiftool_pool import ExifToolPool
+
+        temp_dir = setup_temp_directory()
+        files = make_files(temp_dir, 4)
+
+        try:
+            pool = ExifToolPool(size=2)
+
+            try:
+                assert pool.started() == 0, "No process should start before the first read"
+                pool.get_tags(files, tags=["XMP:Subject"])
+                assert pool.started() == 2, "The first read should start every process it uses"
+
+                # Simulate a crash between batches
+                crashed = pool.workers[1]
+                crashed._process.kill()
+                crashed._process.wait()
+
+                results = pool.get_tags(files, tags=["XMP:Subject"])
+
+                assert [r["SourceFile"] for r in results] == files, "Every file should still be read"
+                assert pool.restarts == 1, f"Dead worker should be restarted once, got {pool.restarts}"
+                assert pool.workers[1] is not crashed, "Dead worker should be replaced"
+                assert pool.workers[1].running, "Replacement worker should be running"
+
+                print("✓ Pool restarts a dead worker")
+                return True
+
+            finally:
+                pool.terminate()
+
+        finally:
+            cleanup_temp_directory(temp_dir)
+
+    except Exception as e:
+        print(f"✗ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_file_processor_pool_size():
+    """Test that FileProcessor reads through a pool of the configured size"""
+    if not verify_exiftool_available():
+        print("✗ ExifTool not available - skipping test")
+        return False
+
+    try:
+        import src.llmii as llmii
+
+        temp_dir = setup_temp_directory()
+        files = make_files(temp_dir, 3)
+
+        try:
+            config = llmii.Config()
+            assert config.read_workers == 2, "Default should be two readers"
+
+            config.directory = temp_dir
+            config.read_workers = 3
+            processor = llmii.FileProcessor(config, callback=lambda message: None)
+            processor.indexer.join()
+
+            try:
+                assert processor.reader_pool.size == 3, "Pool should use the configured size"
+
+                metadata = processor._get_metadata_batch(files)
+                assert [m["SourceFile"] for m in metadata] == files, "Batch should be read through the pool"
+
+                print("✓ FileProcessor uses the configured reader pool")
+                return True
+
+            finally:
+                processor.reader_pool.terminate()
+                processor.et.terminate()
+
+        finally:
+            cleanup_temp_directory(temp_dir)
+
+    except Exception as e:
+        print(f"✗ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def main():
+    """Run all reader pool tests"""
+    print("Testing ExifTool reader pool...\n")
+
+    tests = [
+        test_pool_reads_in_order,
+        test_pool_restarts_dead_worker,
+        test_file_processor_pool_size,
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+            print()
+        except Exception as e:
+            print(f"✗ Test failed: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append(False)
+            print()
+
+    if all(results):
+        print("✓ All reader pool tests passed!")
+        return 0
+    else:
+        print("✗ Some tests failed")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -197,6 +197,93 @@ def test_two_pass_write_prevents_duplicates():
         traceback.print_exc()
         return False
 
+def test_rewrite_leaves_no_stale_keywords():
+    """Test that rewriting a file leaves no stale keywords and spawns no extra ExifTool"""
+    if not verify_exiftool_available():
+        print("✗ ExifTool not available - skipping test")
+        return False
+
+    try:
+        import exiftool
+        import src.llmii as llmii
+
+        temp_dir = setup_temp_directory()
+        test_file = copy_fixture("test_with_keywords.jpg", temp_dir)
+
+        try:
+            config = llmii.Config()
+            config.directory = temp_dir
+            config.no_backup = True
+
+            processor = llmii.FileProcessor(config, callback=lambda message: None)
+            processor.indexer.join()
+
+            try:
+                stale_keywords = ["stale1", "stale2", "stale3", "stale4"]
+                fresh_keywords = ["fresh1", "fresh2"]
+
+                # Count ExifTool processes started while writing
+                spawned = []
+                original_init = exiftool.ExifToolHelper.__init__
+
+                def counting_init(self, *args, **kwargs):
+                    spawned.append(self)
+                    original_init(self, *args, **kwargs)
+
+                exiftool.ExifToolHelper.__init__ = counting_init
+                try:
+                    result = processor.write_metadata(test_file, {
+                        "MWG:Keywords": stale_keywords,
+                        "MWG:Description": "Stale description",
+                        "SourceFile": test_file
+                    })
+                    assert result == True, "First write should succeed"
+
+                    result = processor.write_metadata(test_file, {
+                        "MWG:Keywords": fresh_keywords,
+                        "MWG:Description": "Fresh description",
+                        "SourceFile": test_file
+                    })
+                    assert result == True, "Second write should succeed"
+                finally:
+                    exiftool.ExifToolHelper.__init__ = original_init
+
+                assert not spawned, f"Writes should reuse the persistent instance, {len(spawned)} were started"
+
+                read_metadata = processor.et.get_tags(
+                    [test_file],
+                    tags=["IPTC:Keywords", "XMP:Subject", "XMP:Description"]
+                )[0]
+
+                for field in ["IPTC:Keywords", "XMP:Subject"]:
+                    keywords = read_metadata.get(field, [])
+                    if isinstance(keywords, str):
+                        keywords = [keywords]
+                    keywords_lower = [str(kw).lower() for kw in keywords]
+                    for stale_kw in stale_keywords:
+                        assert stale_kw not in keywords_lower, f"Stale keyword '{stale_kw}' survived in {field}: {keywords_lower}"
+
+                subject = read_metadata.get("XMP:Subject", [])
+                if isinstance(subject, str):
+                    subject = [subject]
+                assert sorted(str(kw).lower() for kw in subject) == fresh_keywords, f"XMP:Subject should hold only the new keywords, got: {subject}"
+                assert read_metadata.get("XMP:Description") == "Fresh description", "Description should be replaced"
+
+                print("✓ Rewrite leaves no stale keywords")
+                return True
+
+            finally:
+                processor.et.terminate()
+
+        finally:
+            cleanup_temp_directory(temp_dir)
+
+    except Exception as e:
+        print(f"✗ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
 def main():
     """Run all write tests"""
     print("Testing ExifTool Write Operations...\n")
@@ -205,6 +292,7 @@ def main():
         test_write_keywords_roundtrip,
         test_write_description_roundtrip,
         test_two_pass_write_prevents_duplicates,
+        test_rewrite_leaves_no_stale_keywords,
     ]
     
     results = []
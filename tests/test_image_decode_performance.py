@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Performance tests for preparing images for the LLM: decode time and peak
+memory per megapixel of the full decode + resize the image processor used
+to do, against the reduced decode it does now
+"""
+import sys
+import os
+import json
+import subprocess
+
+project_root = os.path.dirname(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+from PIL import Image
+
+from tests.test_utils import setup_temp_directory, cleanup_temp_directory
+
+# Runs in a fresh interpreter so each method's peak memory is its own
+MEASURE = r'''
+import sys, json, time, resource, io
+sys.path.insert(0, sys.argv[1])
+from PIL import Image
+from src.image_processor import ImageProcessor
+
+file_path, method, runs = sys.argv[2], sys.argv[3], int(sys.argv[4])
+processor = ImageProcessor(max_dimension=448, patch_sizes=[14])
+
+def full_decode():
+    with Image.open(file_path) as img:
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        resized = img.resize(processor._calculate_dimensions(*img.size), Image.Resampling.BICUBIC)
+        resized.save(io.BytesIO(), format="JPEG", quality=95)
+        return resized.size
+
+def reduced_decode():
+    with Image.open(file_path) as img:
+        return processor._resize_image(img).size
+
+def rss(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) * 1024
+
+decode = full_decode if method == "full" else reduced_decode
+if sys.platform.startswith("linux"):
+    # Reset the peak to what is in use now, imports peak higher than that
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+    baseline = rss("VmRSS")
+else:
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+started = time.perf_counter()
+for _ in range(runs):
+    size = decode()
+elapsed = (time.perf_counter() - started) / runs
+if sys.platform.startswith("linux"):
+    peak = rss("VmHWM")
+else:
+    # ru_maxrss is in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"seconds": elapsed, "peak_bytes": max(0, peak - baseline), "size": size}))
+'''
+
+def measure(file_path, method, runs=3):
+    """Decode time and extra peak RSS of one method, in a child process"""
+    output = subprocess.run(
+        [sys.executable, "-c", MEASURE, project_root, file_path, method, str(runs)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def make_image(directory, name, size, **save_args):
+    """A noisy test image, so it compresses like a photo"""
+    noise = Image.effect_noise((size[0] // 8, size[1] // 8), 64).convert("RGB")
+    img = noise.resize(size, Image.Resampling.BILINEAR)
+    path = os.path.join(directory, name)
+    img.save(path, **save_args)
+    return path
+
+def compare(file_path, megapixels):
+    before = measure(file_path, "full")
+    after = measure(file_path, "reduced")
+    assert before["size"] == after["size"], f"Both methods should give the same size, got {before['size']} and {after['size']}"
+
+    for label, result in (("full decode", before), ("reduced decode", after)):
+        print(f"  {label:>14}: {result['seconds'] * 1000 / megapixels:6.1f} ms/MP, "
+              f"{result['peak_bytes'] / 2**20 / megapixels:5.2f} MB peak RSS/MP")
+    return before, after
+
+def test_jpeg_decode():
+    """Test that large JPEGs are decoded at reduced size"""
+    if sys.platform == "win32":
+        print("✗ Peak RSS not available on Windows - skipping test")
+        return False
+
+    temp_dir = setup_temp_directory()
+    try:
+        file_path = make_image(temp_dir, "large.jpg", (6000, 4000), quality=90)
+        print("JPEG 6000x4000 to 448px:")
+        before, after = compare(file_path, 24)
+
+        assert after["seconds"] < before["seconds"], "Reduced decode should be faster"
+        assert after["peak_bytes"] < before["peak_bytes"] / 4, "Reduced decode should not hold the full size image"
+        print("✓ JPEG decoded at reduced size")
+        return True
+    finally:
+        cleanup_temp_directory(temp_dir)
+
+def test_png_decode():
+    """Test that other formats are reduced before resampling"""
+    if sys.platform == "win32":
+        print("✗ Peak RSS not available on Windows - skipping test")
+        return False
+
+    temp_dir = setup_temp_directory()
+    try:
+        file_path = make_image(temp_dir, "large.png", (4000, 3000), compress_level=1)
+        print("PNG 4000x3000 to 448px:")
+        before, after = compare(file_path, 12)
+
+        # PNG has to be decoded in full, only resampling gets cheaper
+        assert after["seconds"] < before["seconds"] * 1.2, "Reduced resample should not be slower"
+        print("✓ PNG reduced before resampling")
+        return True
+    finally:
+        cleanup_temp_directory(temp_dir)
+
+def main():
+    """Run all performance tests"""
+    print("Testing Image Decode Performance...\n")
+    
+    tests = [
+        test_jpeg_decode,
+        test_png_decode,
+    ]
+    
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+            print()
+        except Exception as e:
+            print(f"✗ Test failed: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append(False)
+            print()
+    
+    if all(results):
+        print("✓ All performance tests passed!")
+        return 0
+    else:
+        print("✗ Some tests failed")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
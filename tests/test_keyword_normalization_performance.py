@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Performance tests for keyword normalization: time per keyword over a large
+corpus of model keywords, for the normalize_keyword FileProcessor used to
+call for every keyword against the shared KeywordNormalizer it uses now
+"""
+import sys
+import os
+import re
+import time
+import random
+
+project_root = os.path.dirname(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+from src.llmii import (Config, KeywordNormalizer, BANNED_WORDS, AND_EXCEPTIONS,
+                       split_on_internal_capital, de_pluralize)
+
+# normalize_keyword as it was, compiling its patterns and building its
+# config for every keyword
+def legacy_normalize_keyword(keyword, banned_words, config=None):
+    """ Normalizes keywords according to specific rules:
+        - Splits unhyphenated compound words on internal capitals
+        - Max words determined by config (default 2) unless middle word is 'and'/'or' (then +1)
+        - If split_and_entries enabled, remove and/or unless in exceptions list
+        - Hyphens between alphanumeric chars count as two words
+        - Cannot start with 3+ digits if no_digits_start is enabled
+        - Each word must be 2+ chars if min_word_length enabled (unless it is x or u)
+        - Removes all non-alphanumeric except spaces and valid hyphens
+        - Checks against banned words if ban_prompt_words enabled
+        - Makes singular if depluralize_keywords enabled
+        - Returns lowercase result
+    """   
+    if config is None:
+        class DefaultConfig:
+            def __init__(self):
+                self.normalize_keywords = True
+                self.depluralize_keywords = True
+                self.limit_word_count = True
+                self.max_words_per_keyword = 2
+                self.split_and_entries = True
+                self.ban_prompt_words = True
+                self.no_digits_start = True
+                self.min_word_length = True
+                self.latin_only = True
+        
+        config = DefaultConfig()
+    
+    if not config.normalize_keywords:
+        return keyword.strip()
+    
+    if not isinstance(keyword, str):
+        keyword = str(keyword)
+    
+    # Handle internal capitalization before lowercase conversion
+    words = keyword.strip().split()
+    split_words = []
+    
+    for word in words:
+        split_words.extend(split_on_internal_capital(word).split())
+    
+    keyword = " ".join(split_words)
+    
+    # Convert to lowercase after handling capitals
+    keyword = keyword.lower().strip()
+    
+    # Remove non-Latin characters if latin_only is enabled
+    if config.latin_only:
+        keyword = re.sub(r'[^\x00-\x7F]', '', keyword)
+    
+    # Remove all non-alphanumeric chars except spaces and hyphens
+    keyword = re.sub(r'[^\w\s-]', '', keyword)
+    
+    # Replace multiple spaces/hyphens with single space/hyphen
+    keyword = re.sub(r'\s+', ' ', keyword)
+    keyword = re.sub(r'-+', '-', keyword)
+    keyword = re.sub(r'_', ' ', keyword)
+    
+    # Check for banned words if enabled
+    if config.ban_prompt_words and keyword in banned_words:
+        return None
+    
+    # For validation, we'll track both original tokens and split words
+    tokens = keyword.split()
+    words = []
+    
+    # Validate and collect words for length checking
+    for token in tokens:    
+        
+        # Handle hyphenated words
+        if '-' in token:
+            
+            # Check if hyphen is between alphanumeric chars
+            if not re.match(r'^[\w]+-[\w]+$', token):
+                return None
+           
+            # Add hyphenated parts to words list for validation
+            parts = token.split('-')
+            words.extend(parts)
+        
+        else:
+            words.append(token)
+    
+    # Validate word count if limit_word_count is enabled
+    if config.limit_word_count:
+        max_words = config.max_words_per_keyword
+        if len(words) > max_words + 1:
+            return None
+        
+    # Handle and/or splitting if enabled
+    if config.split_and_entries and len(words) == 3 and words[1] in ['and', 'or']:
+        if ' '.join(words) in AND_EXCEPTIONS:
+            pass
+        else:
+            # Remove and/or and make singular if depluralize_keywords is enabled
+            if config.depluralize_keywords:
+                tokens = [de_pluralize(words[0]), de_pluralize(words[2])]
+            else:
+                tokens = [words[0], words[2]]
+    
+    # Word validation
+    for word in words:
+        
+        # Check minimum length if enabled
+        if config.min_word_length:
+            if len(word) < 2 and word not in ['x', 'u']:
+                return None
+        
+    # Check if starts with 3+ digits if enabled
+    if config.no_digits_start and re.match(r'^\d{3,}', words[0]):
+        return None
+    
+    # Make words singular if depluralize_keywords is enabled
+    if config.depluralize_keywords:
+        # Make solo words singular
+        if len(words) == 1:
+            tokens = [de_pluralize(words[0])]
+        # If two or more words make the last word singular
+        elif len(tokens) > 1:
+            tokens[-1] = de_pluralize(tokens[-1])
+    
+    # Return the original tokens (preserving hyphens)
+    return ' '.join(tokens)
+
+
+WORDS = ["tree", "trees", "dog", "dogs", "sky", "clouds", "mountain", "mountains", "river", "beach",
+         "sunset", "city", "buildings", "car", "cars", "person", "people", "woman", "man", "child",
+         "flowers", "grass", "water", "boat", "boats", "bridge", "road", "light", "shadows", "window",
+         "glasses", "bus", "leaves", "berries", "horse", "cat", "forest", "snow", "rain", "street"]
+MODIFIERS = ["", "red ", "blue ", "old ", "small ", "bright ", "wooden ", "urban ", "green ", "dark "]
+
+def make_corpus(size=100000, variants=5000, seed=11):
+    """Keywords the way models return them: a few thousand variants,
+    repeated across many images"""
+    rng = random.Random(seed)
+    shapes = [
+        lambda: rng.choice(MODIFIERS) + rng.choice(WORDS),
+        lambda: rng.choice(WORDS).capitalize(),
+        lambda: rng.choice(WORDS).upper(),
+        lambda: f"{rng.choice(WORDS)} and {rng.choice(WORDS)}",
+        lambda: f"{rng.choice(WORDS)} or {rng.choice(WORDS)}",
+        lambda: f"{rng.choice(WORDS)}-{rng.choice(WORDS)}",
+        lambda: f"{rng.choice(WORDS)}--{rng.choice(WORDS)}",
+        lambda: "".join(word.capitalize() for word in rng.sample(WORDS, 2)),
+        lambda: f"  {rng.choice(WORDS)}!  ",
+        lambda: f"{rng.choice(WORDS)}_{rng.choice(WORDS)}",
+        lambda: f"{rng.randrange(100, 3000)} {rng.choice(WORDS)}",
+        lambda: f"{rng.choice(WORDS)} {rng.randrange(10)}",
+        lambda: f"café {rng.choice(WORDS)}",
+        lambda: " ".join(rng.sample(WORDS, 4)),
+        lambda: rng.choice(BANNED_WORDS),
+        lambda: rng.choice(BANNED_WORDS).lower(),
+        lambda: rng.choice(sorted(AND_EXCEPTIONS)),
+        lambda: f"{rng.choice(WORDS)} -{rng.choice(WORDS)}",
+    ]
+    pool = [rng.choice(shapes)() for _ in range(variants)]
+    return [rng.choice(pool) for _ in range(size)]
+
+def timed(normalize, corpus):
+    started = time.perf_counter()
+    results = [normalize(keyword) for keyword in corpus]
+    return time.perf_counter() - started, results
+
+def test_same_results():
+    """Test that the normalizer gives the same keywords as before"""
+    corpus = make_corpus(size=5000)
+    banned_words = list(BANNED_WORDS)
+    configs = [None, Config()]
+    relaxed = Config()
+    relaxed.depluralize_keywords = True
+    relaxed.max_words_per_keyword = 3
+    relaxed.latin_only = False
+    relaxed.min_word_length = False
+    configs.append(relaxed)
+    off = Config()
+    off.normalize_keywords = False
+    configs.append(off)
+
+    for config in configs:
+        normalizer = KeywordNormalizer(config, banned_words)
+        for keyword in corpus:
+            expected = legacy_normalize_keyword(keyword, banned_words, config)
+            assert normalizer.normalize(keyword) == expected, f"{keyword!r} should normalize to {expected!r}"
+
+    print("✓ Normalizer gives the same keywords as before")
+    return True
+
+def test_normalize_speed():
+    """Test that normalizing a large corpus is faster"""
+    corpus = make_corpus()
+    banned_words = list(BANNED_WORDS)
+    config = Config()
+    config.depluralize_keywords = True
+
+    before, expected = timed(lambda keyword: legacy_normalize_keyword(keyword, banned_words, config), corpus)
+    compiled, compiled_results = timed(KeywordNormalizer(config, banned_words, memo_size=0).normalize, corpus)
+    memoized = KeywordNormalizer(config, banned_words)
+    after, results = timed(memoized.normalize, corpus)
+    assert results == compiled_results == expected, "All methods should give the same keywords"
+
+    print(f"{len(corpus)} keywords, {len(set(corpus))} different:")
+    for label, seconds in (("before", before), ("compiled", compiled), ("memoized", after)):
+        print(f"  {label:>9}: {seconds * 1e6 / len(corpus):6.2f} µs/keyword")
+    print(f"  memo: {memoized.memo_info()}")
+
+    assert after < before / 3, "Memoized normalizer should be several times faster"
+    print("✓ Keywords normalized faster")
+    return True
+
+def main():
+    """Run all performance tests"""
+    print("Testing Keyword Normalization Performance...\n")
+    
+    tests = [
+        test_same_results,
+        test_normalize_speed,
+    ]
+    
+    results = []
+    for test in tests:
+        try:
+            results.append(test())
+            print()
+        except Exception as e:
+            print(f"✗ Test failed: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append(False)
+            print()
+    
+    if all(results):
+        print("✓ All performance tests passed!")
+        return 0
+    else:
+        print("✗ Some tests failed")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
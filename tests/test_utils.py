@@ -1,11 +1,16 @@
 #!/usr/bin/env python3
 """
-Test utilities for ExifTool integration tests
+Test utilities for ExifTool integration tests and LLM API tests
 """
 import os
+import sys
+import json
+import time
 import shutil
 import tempfile
+import threading
 from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 # Get the project root directory
 PROJECT_ROOT = Path(__file__).parent.parent
@@ -189,3 +194,184 @@ def get_fixture_list():
     return sorted(fixtures)
 
 
+
+def chat_response(content, model="stub-model", usage=None):
+    """Body of an OpenAI-compatible chat completion returning content"""
+    body = {
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]
+    }
+    if usage:
+        body["usage"] = usage
+    return body
+
+class ChatStream:
+    """
+    A streamed chat completion for StubLLMServer. Each piece of text is
+    sent as a server-sent event, delay seconds apart.
+    """
+    def __init__(self, pieces, delay=0, model="stub-model"):
+        self.pieces = list(pieces)
+        self.delay = delay
+        self.model = model
+
+class StubLLMServer:
+    """
+    Local OpenAI-compatible server for testing API clients without a model.
+    
+    Args:
+        responses: List of (status, body) tuples served in order for
+            POST requests, the last one repeating. body is a dict sent
+            as JSON, a ChatStream, or a callable taking the request
+            payload and returning either.
+        delay: Seconds to wait before answering each POST
+        slots: Most POSTs worked on at once, like a KoboldCpp server
+            started with that many parallel slots. None for no limit.
+        model_id: Model id listed at /v1/models, None to answer 404
+    
+    Records every POST payload in `requests`, counts the TCP connections
+    opened in `connections` and the most POSTs answered at once in
+    `peak_in_flight`. `pieces_sent` lists how many pieces of each
+    ChatStream went out before it ended or the client hung up. Set `healthy` to False to fail the health probes.
+    Use as a context manager.
+    """
+    def __init__(self, responses=None, delay=0, slots=None, model_id=None):
+        self.responses = list(responses or [(200, chat_response('{"Description": "A test image.", "Keywords": ["test"]}'))])
+        self.delay = delay
+        self.model_id = model_id  # Listed at /v1/models when set
+        self.requests = []
+        self.connections = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.pieces_sent = []
+        self.healthy = True
+        self.lock = threading.Lock()
+        self.slots = threading.Semaphore(slots) if slots else None
+        
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out separately, don't let them wait on
+            # the client's delayed ACK
+            disable_nagle_algorithm = True
+            
+            def setup(self):
+                super().setup()
+                with server.lock:
+                    server.connections += 1
+            
+            def log_message(self, format, *args):
+                pass
+            
+            def _send(self, status, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                try:
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up, e.g. on a read timeout
+                    self.close_connection = True
+            
+            def _send_chunk(self, data):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+            
+            def _send_stream(self, stream):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                
+                sent = 0
+                try:
+                    for piece in stream.pieces:
+                        event = {"model": stream.model, "choices": [{"index": 0, "delta": {"content": piece}}]}
+                        self._send_chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                        sent += 1
+                        if stream.delay:
+                            time.sleep(stream.delay)
+                    self._send_chunk(b"data: [DONE]\n\n")
+                    self._send_chunk(b"")
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client stopped reading
+                    self.close_connection = True
+                finally:
+                    with server.lock:
+                        server.pieces_sent.append(sent)
+            
+            def do_GET(self):
+                if self.path in ("/api/extra/version", "/health"):
+                    if server.healthy:
+                        self._send(200, {"result": "KoboldCpp", "version": "stub"})
+                    else:
+                        self._send(503, {"error": "unavailable"})
+                elif self.path == "/v1/models" and server.model_id:
+                    self._send(200, {"object": "list", "data": [{"id": server.model_id, "object": "model"}]})
+                else:
+                    self._send(404, {"error": "not found"})
+            
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                
+                if server.slots is not None:
+                    with server.slots:
+                        self._answer(payload)
+                else:
+                    self._answer(payload)
+            
+            def _answer(self, payload):
+                with server.lock:
+                    server.requests.append(payload)
+                    index = min(len(server.requests), len(server.responses)) - 1
+                    status, body = server.responses[index]
+                    server.in_flight += 1
+                    server.peak_in_flight = max(server.peak_in_flight, server.in_flight)
+                
+                try:
+                    if server.delay:
+                        time.sleep(server.delay)
+                    body = body(payload) if callable(body) else body
+                    if isinstance(body, ChatStream):
+                        self._send_stream(body)
+                    else:
+                        self._send(status, body)
+                finally:
+                    with server.lock:
+                        server.in_flight -= 1
+        
+        class Server(ThreadingHTTPServer):
+            # Room for many clients connecting at once
+            request_queue_size = 128
+
+            def handle_error(self, request, client_address):
+                # Clients hang up on streams they no longer need
+                if not isinstance(sys.exc_info()[1], ConnectionError):
+                    super().handle_error(request, client_address)
+        
+        self.httpd = Server(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+    
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def start(self):
+        self.thread.start()
+        return self
+    
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc):
+        self.stop()
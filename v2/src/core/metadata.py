@@ -2,7 +2,6 @@
 Metadata read/write operations using ExifTool
 """
 import os
-import exiftool
 
 
 # Comprehensive list of keyword fields to read/write
@@ -82,14 +81,13 @@ def read_metadata(file_path, et, use_sidecar=False):
 
 def write_metadata(file_path, metadata, et, use_sidecar=False, no_backup=False, dry_run=False):
     """
-    Write metadata to file using ExifTool with two-pass approach:
-    1. Delete all existing keyword/description fields using separate ExifTool instance
-    2. Write new metadata using main ExifTool instance
+    Write metadata to file using ExifTool. Existing keyword/description
+    fields are cleared and the new values written in the same command.
     
     Args:
         file_path: Path to the image file
         metadata: Metadata dictionary to write
-        et: Main ExifToolHelper instance for writing
+        et: ExifToolHelper instance for writing
         use_sidecar: Whether to write to sidecar .xmp file
         no_backup: Whether to skip creating backup files
         dry_run: If True, don't actually write (for testing)
@@ -112,45 +110,24 @@ def write_metadata(file_path, metadata, et, use_sidecar=False, no_backup=False,
         if use_sidecar:
             write_path = file_path + ".xmp"
         
-        # FIRST PASS: Use a SEPARATE ExifTool instance for deletion
-        # This prevents any state/cache issues from interfering with deletion
-        # The deletion instance is created, used, and terminated before writing
-        delete_et = None
-        try:
-            # Create a fresh ExifTool instance specifically for deletion
-            delete_et = exiftool.ExifToolHelper(encoding='utf-8')
-            
-            # Delete ALL keyword and description fields comprehensively
-            delete_params = DELETE_KEYWORD_FIELDS + DELETE_DESCRIPTION_FIELDS
-            
-            if no_backup or use_sidecar:
-                delete_params.append("-overwrite_original")
-            
-            delete_params.append("-P")
-            delete_params.append(write_path)
-            
-            # Execute deletion with separate instance
-            print(f"DEBUG WRITE: Deleting with separate ExifTool instance, params: {delete_params}")
-            delete_et.execute(*delete_params)
-            print(f"DEBUG WRITE: Deletion completed with separate instance")
-            
-        except Exception as delete_error:
-            print(f"DEBUG WRITE: Warning - deletion failed: {delete_error}")
-            # Continue anyway - the write might still work
-        finally:
-            # CRITICAL: Terminate the deletion instance before proceeding
-            # This ensures no state is carried over to the main instance
-            if delete_et is not None:
-                try:
-                    delete_et.terminate()
-                    print(f"DEBUG WRITE: Deletion instance terminated")
-                except Exception as term_error:
-                    print(f"DEBUG WRITE: Warning - termination error: {term_error}")
+        # Clear the old keyword and description fields and write the new
+        # ones in a single command on the caller's ExifTool instance.
+        # ExifTool applies assignments in order, so the empty ones go first.
+        write_params = DELETE_KEYWORD_FIELDS + DELETE_DESCRIPTION_FIELDS
         
-        # SECOND PASS: Use the main instance for writing
-        # The deletion instance is now terminated, so this is a clean write
-        print(f"DEBUG WRITE: Writing metadata with main instance, keywords: {metadata.get('MWG:Keywords', 'NOT FOUND')}")
-        et.set_tags(write_path, tags=metadata, params=params)
+        for tag, value in metadata.items():
+            if tag == "SourceFile":
+                continue
+            if isinstance(value, list):
+                for item in value:
+                    write_params.append(f"-{tag}={item}")
+            else:
+                write_params.append(f"-{tag}={value}")
+        
+        write_params.extend(params)
+        write_params.append(write_path)
+        
+        et.execute(*write_params)
         
         return True
         